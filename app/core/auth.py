@@ -138,6 +138,8 @@ def resolve_required_role(path: str, method: str) -> str:
             return ROLE_ADMIN
         if clean_path.startswith("/agents/memory/"):
             return ROLE_ADMIN
+        if clean_method == "DELETE" and clean_path.startswith("/queue/dead-letters"):
+            return ROLE_ADMIN
         return ROLE_OPERATOR
 
     # Default for read-only endpoints.
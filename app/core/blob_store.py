@@ -0,0 +1,56 @@
+import gzip
+import hashlib
+import os
+from pathlib import Path
+from typing import Optional
+
+
+REF_PREFIX = "sha256:"
+
+
+class BlobStore:
+    """Content-addressed, gzip-compressed blobs on the local filesystem.
+
+    A blob lives at ``<dir>/<first two hex chars>/<sha256>.gz``; identical payloads share one
+    file, so writing the same output again is a no-op.
+    """
+
+    def __init__(self, data_dir: str, *, compress_level: int = 6):
+        self.data_dir = Path(data_dir)
+        self.compress_level = compress_level
+
+    def _path(self, digest: str) -> Path:
+        return self.data_dir / digest[:2] / f"{digest}.gz"
+
+    @staticmethod
+    def _digest_dari_ref(ref: str) -> Optional[str]:
+        ref = str(ref or "")
+        if not ref.startswith(REF_PREFIX):
+            return None
+        digest = ref[len(REF_PREFIX) :]
+        if len(digest) != 64 or any(char not in "0123456789abcdef" for char in digest):
+            return None
+        return digest
+
+    def put(self, payload: bytes) -> str:
+        digest = hashlib.sha256(payload).hexdigest()
+        path = self._path(digest)
+        if not path.exists():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+            with open(tmp_path, "wb") as handle:
+                handle.write(gzip.compress(payload, compresslevel=self.compress_level))
+                handle.flush()
+                os.fsync(handle.fileno())
+            os.replace(tmp_path, path)
+        return f"{REF_PREFIX}{digest}"
+
+    def get(self, ref: str) -> Optional[bytes]:
+        digest = self._digest_dari_ref(ref)
+        if digest is None:
+            return None
+        try:
+            with open(self._path(digest), "rb") as handle:
+                return gzip.decompress(handle.read())
+        except FileNotFoundError:
+            return None
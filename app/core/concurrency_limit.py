@@ -0,0 +1,112 @@
+import asyncio
+from typing import List, Optional
+
+
+class AdaptiveConcurrencyLimit:
+    """AIMD limit on the number of worker slots allowed to take jobs.
+
+    Every ``adjust`` call closes a sampling window. The limit is cut multiplicatively when the window shows
+    overload (handler latency well above its baseline, a high error rate or a lagging event loop), grows by
+    one while the queue has lag and every permitted slot was busy, and shrinks by one while the queue is
+    drained and fewer than half the slots were needed.
+    """
+
+    def __init__(
+        self,
+        initial: int,
+        minimum: int,
+        maximum: int,
+        *,
+        latency_ratio: float = 2.0,
+        loop_lag_ms: float = 200.0,
+        error_rate: float = 0.5,
+        decrease_factor: float = 0.7,
+        baseline_alpha: float = 0.1,
+    ):
+        self.minimum = max(1, int(minimum))
+        self.maximum = max(self.minimum, int(maximum))
+        self.limit = max(self.minimum, min(int(initial), self.maximum))
+        self.latency_ratio = max(1.0, float(latency_ratio))
+        self.loop_lag_ms = max(1.0, float(loop_lag_ms))
+        self.error_rate = min(1.0, max(0.0, float(error_rate)))
+        self.decrease_factor = min(0.95, max(0.1, float(decrease_factor)))
+        self.baseline_alpha = min(1.0, max(0.01, float(baseline_alpha)))
+        self.baseline_ms: Optional[float] = None
+        self.last_reason = ""
+        self._permits = 0
+        self._kondisi: Optional[asyncio.Condition] = None
+        self._sibuk = 0
+        self._reset_window()
+
+    def _reset_window(self) -> None:
+        self._durasi_ms: List[float] = []
+        self._gagal = 0
+        self._lag_loop_ms = 0.0
+        self._sibuk_puncak = self._sibuk
+
+    def _ambil_kondisi(self) -> asyncio.Condition:
+        # Created lazily so it binds to the loop that runs the worker.
+        if self._kondisi is None:
+            self._kondisi = asyncio.Condition()
+        return self._kondisi
+
+    async def acquire(self) -> None:
+        """Wait until the slot may take a job under the current limit."""
+        kondisi = self._ambil_kondisi()
+        async with kondisi:
+            await kondisi.wait_for(lambda: self._permits < self.limit)
+            self._permits += 1
+
+    async def release(self) -> None:
+        kondisi = self._ambil_kondisi()
+        async with kondisi:
+            self._permits = max(0, self._permits - 1)
+            kondisi.notify()
+
+    def job_started(self) -> None:
+        self._sibuk += 1
+        self._sibuk_puncak = max(self._sibuk_puncak, self._sibuk)
+
+    def job_finished(self, duration_ms: float, success: bool) -> None:
+        self._sibuk = max(0, self._sibuk - 1)
+        self._durasi_ms.append(max(0.0, float(duration_ms)))
+        if not success:
+            self._gagal += 1
+
+    def record_loop_lag(self, lag_ms: float) -> None:
+        self._lag_loop_ms = max(self._lag_loop_ms, float(lag_ms))
+
+    def _alasan_kelebihan_beban(self, rata_rata_ms: Optional[float]) -> str:
+        if self._lag_loop_ms >= self.loop_lag_ms:
+            return "loop_lag"
+        if self._durasi_ms and self._gagal / len(self._durasi_ms) >= self.error_rate:
+            return "error_rate"
+        if rata_rata_ms is not None and self.baseline_ms and rata_rata_ms > self.baseline_ms * self.latency_ratio:
+            return "latency"
+        return ""
+
+    async def adjust(self, queue_lag: Optional[int]) -> int:
+        """Close the sampling window and move the limit; ``queue_lag`` None means unknown (never grows)."""
+        rata_rata_ms = sum(self._durasi_ms) / len(self._durasi_ms) if self._durasi_ms else None
+        alasan = self._alasan_kelebihan_beban(rata_rata_ms)
+        if alasan:
+            self.limit = max(self.minimum, min(self.limit - 1, int(self.limit * self.decrease_factor)))
+        elif queue_lag and self._sibuk_puncak >= self.limit:
+            alasan = "queue_lag"
+            self.limit = min(self.maximum, self.limit + 1)
+        elif queue_lag == 0 and self._sibuk_puncak < self.limit // 2:
+            alasan = "idle"
+            self.limit = max(self.minimum, self.limit - 1)
+        if rata_rata_ms is not None and alasan != "latency":
+            # Overloaded windows stay out of the baseline, otherwise it would chase the slowdown.
+            if self.baseline_ms is None:
+                self.baseline_ms = rata_rata_ms
+            else:
+                self.baseline_ms += self.baseline_alpha * (rata_rata_ms - self.baseline_ms)
+        self.last_reason = alasan
+        self._reset_window()
+
+        kondisi = self._ambil_kondisi()
+        async with kondisi:
+            kondisi.notify_all()
+        return self.limit
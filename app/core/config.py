@@ -9,6 +9,9 @@ class Settings:
     REDIS_PORT: int = int(os.getenv("REDIS_PORT", 6379))
     REDIS_DB: int = int(os.getenv("REDIS_DB", 0))
     REDIS_PASSWORD: str = os.getenv("REDIS_PASSWORD", "")
+    # Connection pool caps per process (0 = unbounded): short commands, and blocking queue/event reads.
+    REDIS_MAX_CONNECTIONS: int = int(os.getenv("REDIS_MAX_CONNECTIONS", 0))
+    REDIS_BLOCKING_MAX_CONNECTIONS: int = int(os.getenv("REDIS_BLOCKING_MAX_CONNECTIONS", 0))
 
     # API configuration
     API_HOST: str = os.getenv("API_HOST", "0.0.0.0")
@@ -16,11 +19,82 @@ class Settings:
 
     # Worker configuration
     WORKER_CONCURRENCY: int = int(os.getenv("WORKER_CONCURRENCY", 5))
+    # "per_slot" reads one message per slot; "batched" runs one reader feeding a prefetch buffer.
+    WORKER_FETCH_MODE: str = os.getenv("WORKER_FETCH_MODE", "per_slot")
+    # Prefetch buffer depth for batched mode; 0 = auto (2x concurrency).
+    WORKER_PREFETCH_COUNT: int = int(os.getenv("WORKER_PREFETCH_COUNT", 0))
+    # "fixed" runs WORKER_CONCURRENCY slots; "adaptive" starts there and moves the limit (AIMD) between
+    # WORKER_CONCURRENCY_MIN and WORKER_CONCURRENCY_MAX every WORKER_CONCURRENCY_ADJUST_SEC.
+    WORKER_CONCURRENCY_MODE: str = os.getenv("WORKER_CONCURRENCY_MODE", "fixed")
+    WORKER_CONCURRENCY_MIN: int = int(os.getenv("WORKER_CONCURRENCY_MIN", 1))
+    WORKER_CONCURRENCY_MAX: int = int(os.getenv("WORKER_CONCURRENCY_MAX", 64))
+    WORKER_CONCURRENCY_ADJUST_SEC: float = float(os.getenv("WORKER_CONCURRENCY_ADJUST_SEC", 5))
+    # Overload signals that cut the adaptive limit: window latency above baseline x ratio, error share, loop lag.
+    WORKER_CONCURRENCY_LATENCY_RATIO: float = float(os.getenv("WORKER_CONCURRENCY_LATENCY_RATIO", 2.0))
+    WORKER_CONCURRENCY_ERROR_RATE: float = float(os.getenv("WORKER_CONCURRENCY_ERROR_RATE", 0.5))
+    WORKER_CONCURRENCY_LOOP_LAG_MS: float = float(os.getenv("WORKER_CONCURRENCY_LOOP_LAG_MS", 200))
+    # Processes for job types with executor "process"; 0 = one per CPU core. Started on first use.
+    WORKER_PROCESS_POOL_SIZE: int = int(os.getenv("WORKER_PROCESS_POOL_SIZE", 0))
+
+    # Queue delivery configuration
+    # "immediate" acks on read (at-most-once); "deferred" acks after the handler finishes (at-least-once).
+    QUEUE_ACK_MODE: str = os.getenv("QUEUE_ACK_MODE", "immediate")
+    QUEUE_VISIBILITY_TIMEOUT_MS: int = int(os.getenv("QUEUE_VISIBILITY_TIMEOUT_MS", 300000))
+    QUEUE_RECLAIM_INTERVAL_SEC: int = int(os.getenv("QUEUE_RECLAIM_INTERVAL_SEC", 15))
+    QUEUE_RECLAIM_BATCH: int = int(os.getenv("QUEUE_RECLAIM_BATCH", 20))
+    # How long an idle worker blocks on XREADGROUP/BLPOP before polling again; enqueues wake it immediately.
+    QUEUE_BLOCK_MS: int = int(os.getenv("QUEUE_BLOCK_MS", 1000))
+    # Sharded queue: comma-separated redis:// URLs that hold the job streams ("" = streams on the main Redis),
+    # and what picks a job's shard: "job_id" or "pool".
+    QUEUE_SHARD_URLS: str = os.getenv("QUEUE_SHARD_URLS", "")
+    QUEUE_SHARD_KEY: str = os.getenv("QUEUE_SHARD_KEY", "job_id")
+    # Weighted-fair dequeue share per priority lane (high/normal/low).
+    QUEUE_LANE_WEIGHTS: str = os.getenv("QUEUE_LANE_WEIGHTS", "high:6,normal:3,low:1")
+    # Reclaimed messages delivered more often than this go to the dead-letter stream (deferred mode).
+    QUEUE_MAX_DELIVERIES: int = int(os.getenv("QUEUE_MAX_DELIVERIES", 5))
+    # Dead-letter stream cap (MAXLEN ~) and default bulk replay rate (messages per second).
+    DEAD_LETTER_MAXLEN: int = int(os.getenv("DEAD_LETTER_MAXLEN", 10000))
+    DEAD_LETTER_REPLAY_RATE: int = int(os.getenv("DEAD_LETTER_REPLAY_RATE", 50))
+    # How often the scheduler trims consumed entries off the job streams, and the max entries removed per stream.
+    QUEUE_TRIM_INTERVAL_SEC: int = int(os.getenv("QUEUE_TRIM_INTERVAL_SEC", 60))
+    QUEUE_TRIM_BATCH: int = int(os.getenv("QUEUE_TRIM_BATCH", 10000))
+    # A repeated enqueue of the same idempotency key (default run_id:attempt) within this window is a no-op (0 = off).
+    QUEUE_DEDUP_TTL_SEC: int = int(os.getenv("QUEUE_DEDUP_TTL_SEC", 3600))
+
+    # Persistent fallback: journal + snapshots of the in-memory store when Redis is down ("" = memory only).
+    FALLBACK_PERSIST_DIR: str = os.getenv("FALLBACK_PERSIST_DIR", "")
+    FALLBACK_COMPACT_EVERY: int = int(os.getenv("FALLBACK_COMPACT_EVERY", 10000))
+    FALLBACK_FSYNC: bool = os.getenv("FALLBACK_FSYNC", "false").strip().lower() in {"1", "true", "yes", "on"}
+    # How often a process in fallback mode probes Redis, and the pipeline size used to migrate back.
+    REDIS_RECOVERY_PROBE_SEC: float = float(os.getenv("REDIS_RECOVERY_PROBE_SEC", 2))
+    FALLBACK_MIGRATION_BATCH: int = int(os.getenv("FALLBACK_MIGRATION_BATCH", 500))
 
     # Scheduler pressure-control configuration
     SCHEDULER_MAX_DISPATCH_PER_TICK: int = int(os.getenv("SCHEDULER_MAX_DISPATCH_PER_TICK", 80))
     SCHEDULER_PRESSURE_DEPTH_HIGH: int = int(os.getenv("SCHEDULER_PRESSURE_DEPTH_HIGH", 300))
     SCHEDULER_PRESSURE_DEPTH_LOW: int = int(os.getenv("SCHEDULER_PRESSURE_DEPTH_LOW", 180))
+    # Backlog measure the pressure thresholds apply to: "lag" (undelivered messages) or "depth" (stream length).
+    SCHEDULER_PRESSURE_METRIC: str = os.getenv("SCHEDULER_PRESSURE_METRIC", "lag")
+    # Max delayed jobs promoted into the job streams per scheduler tick.
+    SCHEDULER_DUE_BATCH_LIMIT: int = int(os.getenv("SCHEDULER_DUE_BATCH_LIMIT", 200))
+
+    # How often a process re-checks the job spec revision counter before trusting its spec cache.
+    JOB_SPEC_CACHE_CHECK_SEC: float = float(os.getenv("JOB_SPEC_CACHE_CHECK_SEC", 1.0))
+    # Job specs fetched per MGET when listing; chunks are requested concurrently.
+    JOB_SPEC_MGET_CHUNK: int = int(os.getenv("JOB_SPEC_MGET_CHUNK", 500))
+
+    # Event timeline stream: approximate entry cap (MAXLEN ~) and how long SSE clients block per XREAD.
+    EVENTS_STREAM_MAXLEN: int = int(os.getenv("EVENTS_STREAM_MAXLEN", 100000))
+    EVENTS_SSE_BLOCK_MS: int = int(os.getenv("EVENTS_SSE_BLOCK_MS", 5000))
+
+    # Run retention: runs older than RUN_RETENTION_SEC move to gzip segments in RUN_ARCHIVE_DIR ("" keeps them in Redis).
+    RUN_ARCHIVE_DIR: str = os.getenv("RUN_ARCHIVE_DIR", "")
+    RUN_RETENTION_SEC: int = int(os.getenv("RUN_RETENTION_SEC", 7 * 24 * 3600))
+    RUN_ARCHIVE_INTERVAL_SEC: int = int(os.getenv("RUN_ARCHIVE_INTERVAL_SEC", 300))
+    RUN_ARCHIVE_BATCH: int = int(os.getenv("RUN_ARCHIVE_BATCH", 500))
+    # Run outputs at least RUN_OUTPUT_OFFLOAD_BYTES (as JSON) go to a content-addressed blob store in RUN_BLOB_DIR.
+    RUN_BLOB_DIR: str = os.getenv("RUN_BLOB_DIR", "")
+    RUN_OUTPUT_OFFLOAD_BYTES: int = int(os.getenv("RUN_OUTPUT_OFFLOAD_BYTES", 32768))
 
     # Private AI Factory (Phase 21)
     AI_NODE_URL: str = os.getenv("AI_NODE_URL", "") # IP VPS 2
@@ -0,0 +1,95 @@
+import json
+import os
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+
+SNAPSHOT_FILE = "snapshot.json"
+SEGMENT_PREFIX = "journal-"
+SEGMENT_SUFFIX = ".log"
+
+
+class FallbackJournal:
+    """Append-only op log plus compacted snapshots for the in-memory Redis fallback.
+
+    Every snapshot records the generation of the segment that follows it, so a crash between
+    writing a snapshot and removing the old segment never replays an op twice.
+    """
+
+    def __init__(self, data_dir: str, *, compact_every: int = 10000, fsync: bool = False):
+        self.data_dir = Path(data_dir)
+        self.compact_every = max(1, int(compact_every))
+        self.fsync = bool(fsync)
+        self.generation = 0
+        self.ops_since_snapshot = 0
+        self._handle = None
+
+    def _segment_path(self, generation: int) -> Path:
+        return self.data_dir / f"{SEGMENT_PREFIX}{generation}{SEGMENT_SUFFIX}"
+
+    def _buka_segment(self):
+        if self._handle is None:
+            self.data_dir.mkdir(parents=True, exist_ok=True)
+            self._handle = open(self._segment_path(self.generation), "a", encoding="utf-8")
+        return self._handle
+
+    def _tulis_durable(self, handle) -> None:
+        handle.flush()
+        if self.fsync:
+            os.fsync(handle.fileno())
+
+    def load(self) -> Tuple[Optional[Dict[str, Any]], List[List[Any]]]:
+        """Read the latest snapshot and the ops appended after it."""
+        snapshot: Optional[Dict[str, Any]] = None
+        snapshot_path = self.data_dir / SNAPSHOT_FILE
+        if snapshot_path.exists():
+            with open(snapshot_path, "r", encoding="utf-8") as handle:
+                snapshot = json.load(handle)
+            self.generation = int(snapshot.get("generation", 0))
+
+        ops: List[List[Any]] = []
+        segment_path = self._segment_path(self.generation)
+        if segment_path.exists():
+            with open(segment_path, "r", encoding="utf-8") as handle:
+                for line in handle:
+                    try:
+                        ops.append(json.loads(line))
+                    except ValueError:
+                        # A torn final write from a crash; everything before it is intact.
+                        break
+        self.ops_since_snapshot = len(ops)
+        return (snapshot.get("state") if snapshot else None), ops
+
+    def append(self, op: str, *args: Any) -> None:
+        handle = self._buka_segment()
+        handle.write(json.dumps([op, *args], separators=(",", ":")) + "\n")
+        self._tulis_durable(handle)
+        self.ops_since_snapshot += 1
+
+    def needs_compaction(self) -> bool:
+        return self.ops_since_snapshot >= self.compact_every
+
+    def write_snapshot(self, state: Dict[str, Any]) -> None:
+        """Persist ``state`` atomically and start a fresh segment."""
+        self.data_dir.mkdir(parents=True, exist_ok=True)
+        generation_lama = self.generation
+        snapshot_path = self.data_dir / SNAPSHOT_FILE
+        tmp_path = snapshot_path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as handle:
+            json.dump({"generation": generation_lama + 1, "state": state}, handle, separators=(",", ":"))
+            handle.flush()
+            os.fsync(handle.fileno())
+        os.replace(tmp_path, snapshot_path)
+
+        self.close()
+        self.generation = generation_lama + 1
+        self.ops_since_snapshot = 0
+        try:
+            self._segment_path(generation_lama).unlink()
+        except FileNotFoundError:
+            pass
+
+    def close(self) -> None:
+        if self._handle is not None:
+            self._handle.close()
+            self._handle = None
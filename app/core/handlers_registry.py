@@ -1,9 +1,12 @@
+from .process_executor import EXECUTOR_PROCESS, normalisasi_executor
 from .registry import tool_registry, policy_manager
 from app.jobs.handlers.monitor_channel import run as monitor_channel_handler
 from app.jobs.handlers.daily_report import run as daily_report_handler
 from app.jobs.handlers.backup_export import run as backup_export_handler
 from app.jobs.handlers.agent_workflow import run as agent_workflow_handler
 from app.jobs.handlers.simulation_heavy import run as simulation_heavy_handler
+from app.jobs.handlers.simulation_cpu import run as simulation_cpu_handler
+from app.jobs.handlers.report_aggregate import run as report_aggregate_handler
 
 # Register job handlers
 peta_handler_job = {
@@ -12,6 +15,16 @@ peta_handler_job = {
     "backup.export": backup_export_handler,
     "agent.workflow": agent_workflow_handler,
     "simulation.heavy": simulation_heavy_handler,
+    "simulation.cpu": simulation_cpu_handler,
+    "report.aggregate": report_aggregate_handler,
+}
+
+# Job types whose handlers run in the worker's process pool unless their spec sets `executor`.
+# Process handlers must be CPU-bound and self-contained: ctx carries ids only (no redis, tools or metrics).
+# Only job types listed here may run with executor "process".
+peta_executor_job = {
+    "simulation.cpu": EXECUTOR_PROCESS,
+    "report.aggregate": EXECUTOR_PROCESS,
 }
 
 # Set policies for each job type
@@ -20,7 +33,14 @@ policy_manager.set_allowlist("report.daily", ["metrics", "messaging"])
 policy_manager.set_allowlist("backup.export", ["files", "kv"])
 policy_manager.set_allowlist("agent.workflow", ["http", "kv", "messaging", "files", "metrics", "command"])
 policy_manager.set_allowlist("simulation.heavy", ["metrics"])
+policy_manager.set_allowlist("simulation.cpu", [])
+policy_manager.set_allowlist("report.aggregate", [])
 
 def get_handler(job_type: str):
     """Get handler function for a job type"""
     return peta_handler_job.get(job_type)
+
+def validate_job_executor(job_type: str, executor) -> None:
+    """Raise ValueError when a spec asks for the process pool but its handler is not registered for it."""
+    if normalisasi_executor(executor) == EXECUTOR_PROCESS and peta_executor_job.get(job_type) != EXECUTOR_PROCESS:
+        raise ValueError(f"Job type '{job_type}' is not registered for executor 'process'")
@@ -0,0 +1,68 @@
+import copy
+from typing import Any, Dict, List
+
+
+def _escape(token: str) -> str:
+    return str(token).replace("~", "~0").replace("/", "~1")
+
+
+def _unescape(token: str) -> str:
+    return token.replace("~1", "/").replace("~0", "~")
+
+
+def make_patch(source: Any, target: Any, path: str = "") -> List[Dict[str, Any]]:
+    """RFC 6902 operations turning ``source`` into ``target``.
+
+    Objects are diffed key by key; lists and scalars that differ are replaced whole, which keeps
+    patches small for job specs (mostly nested objects with short lists).
+    """
+    if isinstance(source, dict) and isinstance(target, dict):
+        ops: List[Dict[str, Any]] = []
+        for key in source:
+            if key not in target:
+                ops.append({"op": "remove", "path": f"{path}/{_escape(key)}"})
+        for key, value in target.items():
+            child = f"{path}/{_escape(key)}"
+            if key not in source:
+                ops.append({"op": "add", "path": child, "value": value})
+            else:
+                ops.extend(make_patch(source[key], value, child))
+        return ops
+    # 1 == 1.0 == True in Python, but they serialize differently.
+    if type(source) is type(target) and source == target:
+        return []
+    return [{"op": "replace", "path": path, "value": target}]
+
+
+def apply_patch(document: Any, patch: List[Dict[str, Any]]) -> Any:
+    """Return a patched copy of ``document`` (add/remove/replace only)."""
+    hasil = copy.deepcopy(document)
+    for op in patch:
+        path = str(op.get("path") or "")
+        tokens = [_unescape(token) for token in path.split("/")[1:]] if path else []
+        kind = op.get("op")
+        if kind not in {"add", "remove", "replace"}:
+            raise ValueError(f"Unsupported patch op: {kind}")
+        if not tokens:
+            if kind == "remove":
+                raise ValueError("Cannot remove the document root")
+            hasil = copy.deepcopy(op.get("value"))
+            continue
+
+        parent = hasil
+        for token in tokens[:-1]:
+            parent = parent[int(token)] if isinstance(parent, list) else parent[token]
+        last = tokens[-1]
+        if isinstance(parent, list):
+            index = len(parent) if last == "-" else int(last)
+            if kind == "remove":
+                del parent[index]
+            elif kind == "add":
+                parent.insert(index, copy.deepcopy(op.get("value")))
+            else:
+                parent[index] = copy.deepcopy(op.get("value"))
+        elif kind == "remove":
+            del parent[last]
+        else:
+            parent[last] = copy.deepcopy(op.get("value"))
+    return hasil
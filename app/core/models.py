@@ -22,6 +22,8 @@ class JobSpec(BaseModel):
     agent_pool: Optional[str] = None
     priority: int = Field(default=0)
     concurrency_key: Optional[str] = None
+    # "async" runs on the worker loop, "process" in the worker's process pool; None = handler registry default.
+    executor: Optional[str] = None
 
 # Run status model
 class RunStatus(str, Enum):
@@ -35,6 +37,9 @@ class RunResult(BaseModel):
     output: Optional[Dict[str, Any]] = None
     error: Optional[str] = None
     duration_ms: Optional[int] = None
+    # Set when a large output was offloaded to the blob store; `output` is then loaded on demand.
+    output_ref: Optional[str] = None
+    output_bytes: Optional[int] = None
 
 class Run(BaseModel):
     run_id: str
@@ -61,6 +66,7 @@ class QueueEvent(BaseModel):
     trace_id: Optional[str] = None
     agent_pool: Optional[str] = None
     priority: int = 0
+    executor: Optional[str] = None
 
 # Trigger models
 class Trigger(BaseModel):
@@ -68,3 +68,43 @@ def expose_metrics() -> str:
                     daftar_baris.append(f'job_runs_total {nilai}')
 
     return "\n".join(daftar_baris)
+
+
+def _label_prometheus(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def expose_queue_metrics(stats: Dict[str, Any]) -> str:
+    """Render get_queue_stats() output as Prometheus gauges"""
+    daftar_baris = [
+        "# HELP queue_lag Messages not yet delivered to any worker",
+        "# TYPE queue_lag gauge",
+    ]
+    for pool, lanes in sorted((stats.get("pools") or {}).items()):
+        for lane, row in sorted(lanes.items()):
+            daftar_baris.append(f'queue_lag{{pool="{_label_prometheus(pool)}",lane="{lane}"}} {int(row.get("lag") or 0)}')
+
+    daftar_baris += ["# HELP queue_pending Messages delivered but not acknowledged", "# TYPE queue_pending gauge"]
+    for pool, lanes in sorted((stats.get("pools") or {}).items()):
+        for lane, row in sorted(lanes.items()):
+            daftar_baris.append(
+                f'queue_pending{{pool="{_label_prometheus(pool)}",lane="{lane}"}} {int(row.get("pending") or 0)}'
+            )
+
+    daftar_baris += ["# HELP queue_consumer_pending Unacknowledged messages per consumer", "# TYPE queue_consumer_pending gauge"]
+    for consumer, pending in sorted((stats.get("consumers") or {}).items()):
+        daftar_baris.append(f'queue_consumer_pending{{consumer="{_label_prometheus(consumer)}"}} {int(pending)}')
+
+    umur = stats.get("oldest_undelivered_age_sec")
+    daftar_baris += [
+        "# HELP queue_oldest_undelivered_age_seconds Age of the oldest undelivered message",
+        "# TYPE queue_oldest_undelivered_age_seconds gauge",
+        f"queue_oldest_undelivered_age_seconds {float(umur or 0.0)}",
+        "# HELP queue_delayed Delayed (retry) jobs",
+        "# TYPE queue_delayed gauge",
+        f'queue_delayed {int(stats.get("delayed") or 0)}',
+        "# HELP queue_delayed_due Delayed jobs already due for promotion",
+        "# TYPE queue_delayed_due gauge",
+        f'queue_delayed_due {int(stats.get("delayed_due") or 0)}',
+    ]
+    return "\n".join(daftar_baris)
@@ -0,0 +1,199 @@
+import asyncio
+import inspect
+import logging
+import multiprocessing
+import os
+import signal
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, Optional, Set
+
+from .config import settings
+
+EXECUTOR_ASYNC = "async"
+EXECUTOR_PROCESS = "process"
+EXECUTORS = (EXECUTOR_ASYNC, EXECUTOR_PROCESS)
+
+# How long a timed-out or cancelled handler may keep its pool process before the pool is recycled.
+PROCESS_STOP_GRACE_SEC = 5.0
+
+_pool: Optional[ProcessPoolExecutor] = None
+# Per pool: the queue its processes report their PID on at start-up, and the PIDs read from it so far.
+_antrean_pid: Dict[ProcessPoolExecutor, Any] = {}
+_pid_pool: Dict[ProcessPoolExecutor, Set[int]] = {}
+# Per pool: futures of the calls still running in it, and those past their grace period.
+_future_pool: Dict[ProcessPoolExecutor, Set[asyncio.Future]] = {}
+_future_macet: Set[asyncio.Future] = set()
+# Strong refs to the grace-period watchers, which nobody awaits.
+_pengawas_recycle: set = set()
+
+
+class ProcessJobContext:
+    """Picklable stand-in for ``JobContext`` inside a pool process.
+
+    Only the identifiers and the timeout cross the process boundary; Redis, tools and metrics stay in the
+    worker, so process handlers are pure functions of their inputs.
+    """
+
+    def __init__(self, job_id: str, run_id: str, trace_id: str, timeout_ms: int):
+        self.job_id = job_id
+        self.run_id = run_id
+        self.trace_id = trace_id
+        self.timeout_ms = timeout_ms
+        self.redis = None
+        self.tools: Dict[str, Any] = {}
+        self.metrics = None
+        self.span = None
+        self.logger = logging.getLogger("job.process")
+
+    def __getstate__(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.job_id,
+            "run_id": self.run_id,
+            "trace_id": self.trace_id,
+            "timeout_ms": self.timeout_ms,
+        }
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.__init__(**state)
+
+
+def normalisasi_executor(raw: Any) -> str:
+    value = str(raw or "").strip().lower()
+    return value if value in EXECUTORS else EXECUTOR_ASYNC
+
+
+def _jumlah_proses() -> int:
+    try:
+        value = int(settings.WORKER_PROCESS_POOL_SIZE)
+    except Exception:
+        value = 0
+    if value <= 0:
+        value = os.cpu_count() or 1
+    return max(1, min(value, 64))
+
+
+def _daftarkan_pid(antrean: Any) -> None:
+    antrean.put(os.getpid())
+
+
+def _ambil_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        # spawn: forking a process that runs an event loop and Redis sockets is not safe.
+        konteks = multiprocessing.get_context("spawn")
+        antrean = konteks.SimpleQueue()
+        _pool = ProcessPoolExecutor(
+            max_workers=_jumlah_proses(), mp_context=konteks, initializer=_daftarkan_pid, initargs=(antrean,)
+        )
+        _antrean_pid[_pool] = antrean
+        _pid_pool[_pool] = set()
+        _future_pool[_pool] = set()
+    return _pool
+
+
+def _pid_proses_pool(pool: ProcessPoolExecutor) -> Set[int]:
+    pids = _pid_pool.get(pool, set())
+    antrean = _antrean_pid.get(pool)
+    while antrean is not None and not antrean.empty():
+        pids.add(antrean.get())
+    return pids
+
+
+def _hentikan_pool(pool: ProcessPoolExecutor) -> None:
+    """Kill the pool's processes; the next process job starts a fresh pool."""
+    global _pool
+    if _pool is pool:
+        _pool = None
+    # ProcessPoolExecutor cannot stop a running call, so its processes are terminated directly. Only
+    # live children of this process are signalled, so a PID reused after a process exited is never hit.
+    pids = _pid_proses_pool(pool)
+    for proses in multiprocessing.active_children():
+        if proses.pid in pids:
+            proses.terminate()
+    pool.shutdown(wait=False, cancel_futures=True)
+    _pid_pool.pop(pool, None)
+    _future_pool.pop(pool, None)
+    antrean = _antrean_pid.pop(pool, None)
+    if antrean is not None:
+        antrean.close()
+
+
+def shutdown_process_pool() -> None:
+    """Stop the process pool, and any retired one still draining, killing handlers still running in them."""
+    for pool in list(_pid_pool):
+        _hentikan_pool(pool)
+
+
+def _batas_waktu_habis(signum, frame):
+    raise TimeoutError("Handler exceeded its timeout in the process pool")
+
+
+def _jalankan_di_proses(handler: Callable, ctx: ProcessJobContext, inputs: Dict[str, Any]) -> Any:
+    # The pool process enforces the timeout itself, so a CPU loop stops without the pool being recycled.
+    timer_aktif = hasattr(signal, "setitimer") and ctx.timeout_ms > 0
+    if timer_aktif:
+        signal.signal(signal.SIGALRM, _batas_waktu_habis)
+        signal.setitimer(signal.ITIMER_REAL, ctx.timeout_ms / 1000.0)
+    try:
+        hasil = handler(ctx, inputs)
+        if inspect.isawaitable(hasil):
+            hasil = asyncio.run(hasil)
+        return hasil
+    finally:
+        if timer_aktif:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+
+
+async def _recycle_jika_macet(future: asyncio.Future, pool: ProcessPoolExecutor) -> None:
+    global _pool
+    try:
+        await asyncio.wait_for(asyncio.shield(future), timeout=PROCESS_STOP_GRACE_SEC)
+        return
+    except asyncio.TimeoutError:
+        pass
+    except BaseException:
+        return
+
+    # Stuck in native code that ignores SIGALRM. A pool cannot lose one process without failing every
+    # call in it, so the pool is retired instead: new jobs start a fresh pool, and the old one is killed
+    # once the jobs still running in it have finished (or are stuck as well).
+    _future_macet.add(future)
+    if _pool is pool:
+        _pool = None
+    try:
+        while not future.done():
+            lain = [f for f in _future_pool.get(pool, ()) if not f.done() and f not in _future_macet]
+            if not lain:
+                _hentikan_pool(pool)
+                return
+            await asyncio.wait(lain, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        _future_macet.discard(future)
+
+
+async def run_in_process_pool(handler: Callable, ctx: Any, inputs: Dict[str, Any]) -> Any:
+    """Run ``handler(ctx, inputs)`` in the worker's process pool and return its (pickled) output.
+
+    ``handler`` must be a module-level function so the pool process can import it; async handlers are
+    driven with ``asyncio.run`` there. Cancelling the awaiting task (e.g. the runner's timeout) leaves the
+    process to its own timer; if it has not stopped within ``PROCESS_STOP_GRACE_SEC`` the pool is retired
+    and killed once its other running jobs are done.
+    """
+    pool = _ambil_pool()
+    ctx_proses = ProcessJobContext(ctx.job_id, ctx.run_id, ctx.trace_id, int(ctx.timeout_ms))
+    future = asyncio.get_running_loop().run_in_executor(pool, _jalankan_di_proses, handler, ctx_proses, inputs)
+    berjalan = _future_pool.setdefault(pool, set())
+    berjalan.add(future)
+    future.add_done_callback(berjalan.discard)
+    try:
+        return await asyncio.shield(future)
+    except BrokenProcessPool:
+        # A pool process died (OOM kill, segfault); drop the pool so later jobs get a working one.
+        _hentikan_pool(pool)
+        raise
+    except asyncio.CancelledError:
+        pengawas = asyncio.get_running_loop().create_task(_recycle_jika_macet(future, pool))
+        _pengawas_recycle.add(pengawas)
+        pengawas.add_done_callback(_pengawas_recycle.discard)
+        raise
@@ -1,60 +1,162 @@
+import asyncio
+import bisect
+import heapq
 import json
+import re
 import time
 import uuid
-from collections import defaultdict
+import zlib
+from collections import defaultdict, deque
 from datetime import datetime, timezone
-from typing import Any, Dict, List, Optional, Union
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple, Union
 
 from redis.exceptions import RedisError, ResponseError, TimeoutError as RedisTimeoutError
 
-from .models import QueueEvent, Run
-from .redis_client import redis_client
+from .blob_store import BlobStore
+from .config import settings
+from .fallback_journal import FallbackJournal
+from .json_patch import apply_patch, make_patch
+from .models import QueueEvent, Run, RunStatus
+from .redis_client import queue_shard_blocking_clients, queue_shard_clients, redis_blocking_client, redis_client
+from .run_archive import RunArchive
 
 # Redis stream key for jobs
 STREAM_JOBS = "stream:jobs"
+# Priority lanes; the normal lane keeps the original stream key for compatibility.
+LANE_HIGH = "high"
+LANE_NORMAL = "normal"
+LANE_LOW = "low"
+QUEUE_LANES = (LANE_HIGH, LANE_NORMAL, LANE_LOW)
+# Agent pools get their own streams; "global" workers consume every registered pool.
+DEFAULT_AGENT_POOL = "default"
+GLOBAL_AGENT_POOL = "global"
+QUEUE_POOLS_SET = "stream:jobs:pools"
+QUEUE_POOLS_CACHE_TTL_SEC = 5
 # Redis list key for compatibility mode on older Redis without Streams support.
 LIST_JOBS = "list:jobs"
 # Consumer group for workers
 CG_WORKERS = "cg:workers"
+# Dead letters: poison payloads, invalid events, over-delivered messages and runs out of retries.
+DEAD_LETTER_STREAM = "stream:dead_letter"
+DEAD_LETTER_LIST = "list:dead_letter"
+DEAD_LETTER_FALLBACK_MAX = 1000
+# Idempotent enqueue: dedup key -> message ID of the first enqueue, expiring after QUEUE_DEDUP_TTL_SEC.
+QUEUE_DEDUP_PREFIX = "queue:dedup:"
 # ZSET for delayed jobs (score = unix timestamp)
 ZSET_DELAYED = "zset:delayed"
 # Job registry keys
 JOB_SPEC_PREFIX = "job:spec:"
 JOB_ENABLED_SET = "job:enabled"
 JOB_ALL_SET = "job:all"
+# Per-job spec revision (HASH job_id -> counter) plus one global counter, bumped together by save_job_spec.
+JOB_SPEC_REV_HASH = "job:spec_rev"
+JOB_SPEC_REV_GLOBAL = "job:spec_rev:all"
 JOB_SPEC_VERSIONS_PREFIX = "job:spec:versions:"
+# version_id -> sequence number, plus the "_head" sequence; list position = head - seq.
+JOB_SPEC_VERSION_INDEX_PREFIX = "job:spec:version_idx:"
 RUN_PREFIX = "run:"
 ZSET_RUNS = "zset:runs"
+# Secondary run indexes: per-status and per-job zsets (score = scheduled_at) plus a lex zset for run_id prefixes.
+RUN_STATUS_INDEX_PREFIX = "zset:runs:status:"
+RUN_JOB_INDEX_PREFIX = "zset:runs:job:"
+ZSET_RUNS_LEX = "zset:runs:lex"
+RUN_INDEX_READY_KEY = "zset:runs:indexed"
+# Upper bound on candidates a search collects from each index.
+RUN_SEARCH_SCAN_MAX = 5000
+# Held by the process running a retention pass so parallel schedulers do not archive the same runs.
+RUN_ARCHIVE_LOCK_KEY = "runs:archive:lock"
 JOB_RUNS_PREFIX = "job:runs:"
 JOB_ACTIVE_RUNS_PREFIX = "job:active:runs:"
 FLOW_ACTIVE_RUNS_PREFIX = "flow:active:runs:"
 JOB_FAILURE_STATE_PREFIX = "job:failure:state:"
+# Event timeline: a Redis Stream trimmed with MAXLEN ~ (EVENTS_STREAM_MAXLEN); the capped list is the legacy-mode store.
+EVENTS_STREAM = "stream:events"
 EVENTS_LOG = "events:log"
 EVENTS_MAX = 500
 JOB_SPEC_VERSIONS_MAX = 100
+# Every Nth stored version (by sequence) keeps the full spec; the others are JSON patches on the previous one.
+JOB_SPEC_VERSION_SNAPSHOT_EVERY = 10
 
 
 # In-memory fallback store used when Redis is unavailable.
-_fallback_stream: List[Dict[str, Any]] = []
+_fallback_streams: Dict[str, deque] = defaultdict(deque)
 _fallback_stream_seq = 0
-_fallback_delayed: List[Dict[str, Any]] = []
+# Min-heap of (due_ts, seq, member) so promotion only touches due entries.
+_fallback_delayed: List[Tuple[int, int, str]] = []
 _fallback_job_specs: Dict[str, Dict[str, Any]] = {}
 _fallback_job_all: set = set()
 _fallback_job_enabled: set = set()
 _fallback_job_spec_versions: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
 _fallback_runs: Dict[str, Dict[str, Any]] = {}
 _fallback_run_scores: Dict[str, float] = {}
+# (score, run_id) kept sorted for list_runs; entries whose score no longer matches are stale.
+_fallback_run_urutan: List[Tuple[float, str]] = []
 _fallback_job_runs: Dict[str, List[str]] = defaultdict(list)
 _fallback_active_runs: Dict[str, set] = defaultdict(set)
 _fallback_active_flow_runs: Dict[str, set] = defaultdict(set)
 _fallback_failure_state: Dict[str, Dict[str, Any]] = {}
-_fallback_events: List[Dict[str, Any]] = []
+_fallback_events: deque = deque(maxlen=EVENTS_MAX)
+_fallback_dead_letters: deque = deque(maxlen=DEAD_LETTER_FALLBACK_MAX)
+# Dedup window while Redis is down; not journaled, it only has to outlive a retry or restart race.
+_fallback_dedup: Dict[str, Tuple[str, float]] = {}
+_fallback_dedup_kedaluwarsa: deque = deque()
 _mode_fallback_redis = False
 _mode_legacy_redis_queue = False
+_mode_deferred_ack = str(settings.QUEUE_ACK_MODE or "").strip().lower() == "deferred"
+# Messages already read from Redis but not yet handed out, per consumer and lane.
+_stash_konsumen: Dict[str, Dict[str, deque]] = defaultdict(lambda: {lane: deque() for lane in QUEUE_LANES})
+_kredit_lane: Dict[str, int] = {lane: 0 for lane in QUEUE_LANES}
+_pool_terdaftar: set = set()
+# Per-consumer start offset into the shard list, so sharded reads rotate fairly.
+_giliran_shard: Dict[str, int] = defaultdict(int)
+# Process-local job spec cache: job_id -> (revision, spec), validated against JOB_SPEC_REV_GLOBAL.
+_cache_job_spec: Dict[str, Tuple[int, Dict[str, Any]]] = {}
+_cache_job_spec_meta: Dict[str, Any] = {"global_rev": None, "checked_at": 0.0}
+_cache_pool_aktif: Dict[str, Any] = {"pools": [], "expires_at": 0.0}
+# Optional on-disk journal so fallback state survives a process restart.
+_jurnal_fallback: Optional[FallbackJournal] = (
+    FallbackJournal(
+        settings.FALLBACK_PERSIST_DIR,
+        compact_every=settings.FALLBACK_COMPACT_EVERY,
+        fsync=settings.FALLBACK_FSYNC,
+    )
+    if str(settings.FALLBACK_PERSIST_DIR or "").strip()
+    else None
+)
+# Optional blob store for run outputs above RUN_OUTPUT_OFFLOAD_BYTES; the run record keeps only a reference.
+_blob_output_run: Optional[BlobStore] = (
+    BlobStore(settings.RUN_BLOB_DIR) if str(settings.RUN_BLOB_DIR or "").strip() else None
+)
+# Optional on-disk archive for runs past RUN_RETENTION_SEC; get_run reads it when Redis misses.
+_arsip_run: Optional[RunArchive] = (
+    RunArchive(settings.RUN_ARCHIVE_DIR) if str(settings.RUN_ARCHIVE_DIR or "").strip() else None
+)
+_jurnal_fallback_dimuat = False
+_sedang_replay_jurnal = False
+_loop_pemulihan_aktif = False
+
+
+def _parse_bobot_lane(raw: str) -> Dict[str, int]:
+    bobot = {LANE_HIGH: 6, LANE_NORMAL: 3, LANE_LOW: 1}
+    for part in str(raw or "").split(","):
+        lane, _, value = part.partition(":")
+        lane = lane.strip().lower()
+        if lane not in bobot:
+            continue
+        try:
+            bobot[lane] = max(1, int(value))
+        except ValueError:
+            continue
+    return bobot
+
+
+_bobot_lane = _parse_bobot_lane(settings.QUEUE_LANE_WEIGHTS)
 
 
 def set_mode_fallback_redis(enabled: bool) -> None:
     global _mode_fallback_redis
+    if enabled and not _mode_fallback_redis:
+        _muat_jurnal_fallback()
     _mode_fallback_redis = bool(enabled)
 
 
@@ -63,6 +165,11 @@ def set_mode_legacy_redis_queue(enabled: bool) -> None:
     _mode_legacy_redis_queue = bool(enabled)
 
 
+def set_mode_deferred_ack(enabled: bool) -> None:
+    global _mode_deferred_ack
+    _mode_deferred_ack = bool(enabled)
+
+
 def _sedang_mode_fallback_redis() -> bool:
     return _mode_fallback_redis
 
@@ -75,6 +182,10 @@ def is_mode_legacy_redis_queue() -> bool:
     return _mode_legacy_redis_queue
 
 
+def is_mode_deferred_ack() -> bool:
+    return _mode_deferred_ack
+
+
 def _aktifkan_mode_fallback() -> None:
     set_mode_fallback_redis(True)
 
@@ -90,12 +201,22 @@ def _error_stream_tidak_didukung(exc: Exception) -> bool:
     return any(cmd in msg for cmd in ("XGROUP", "XADD", "XREADGROUP", "XLEN"))
 
 
+def _error_xautoclaim_tidak_didukung(exc: Exception) -> bool:
+    msg = str(exc or "").upper()
+    return "UNKNOWN COMMAND" in msg and "XAUTOCLAIM" in msg
+
+
 def _sekarang_iso() -> str:
     return datetime.now(timezone.utc).isoformat()
 
 
 def _salin_nilai(value: Any) -> Any:
-    return json.loads(json.dumps(value))
+    # Structural copy of JSON-shaped data; immutable leaves are shared instead of re-encoded.
+    if isinstance(value, dict):
+        return {key: _salin_nilai(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_salin_nilai(item) for item in value]
+    return value
 
 
 def _serialisasi_model(model: Any) -> Dict[str, Any]:
@@ -126,6 +247,97 @@ def _status_run_aktif(value: Any) -> bool:
     return status in {"queued", "running"}
 
 
+def _lane_dari_event(event_data: Dict[str, Any]) -> str:
+    inputs = event_data.get("inputs") if isinstance(event_data.get("inputs"), dict) else {}
+    pressure_priority = str(inputs.get("pressure_priority") or "").strip().lower()
+    try:
+        priority = int(event_data.get("priority") or 0)
+    except (TypeError, ValueError):
+        priority = 0
+
+    if pressure_priority == "critical" or priority > 0:
+        return LANE_HIGH
+    if pressure_priority == "low" or priority < 0:
+        return LANE_LOW
+    return LANE_NORMAL
+
+
+def _normalisasi_agent_pool(raw: Any) -> str:
+    value = re.sub(r"[^a-z0-9_.-]+", "_", str(raw or "").strip().lower())[:64]
+    return value or DEFAULT_AGENT_POOL
+
+
+def _kunci_stream(pool: str, lane: str) -> str:
+    # Layout: stream:jobs[:pool:<pool>][:<lane>]; default pool + normal lane stays stream:jobs.
+    key = STREAM_JOBS if pool == DEFAULT_AGENT_POOL else f"{STREAM_JOBS}:pool:{pool}"
+    if lane == LANE_NORMAL:
+        return key
+    return f"{key}:{lane}"
+
+
+def _kunci_list_pool(pool: str) -> str:
+    return LIST_JOBS if pool == DEFAULT_AGENT_POOL else f"{LIST_JOBS}:pool:{pool}"
+
+
+def _info_stream(stream: str) -> Tuple[str, str]:
+    bagian = str(stream or "")[len(STREAM_JOBS):].split(":")[1:]
+    pool = DEFAULT_AGENT_POOL
+    if len(bagian) >= 2 and bagian[0] == "pool":
+        pool = bagian[1]
+        bagian = bagian[2:]
+    lane = bagian[0] if bagian and bagian[0] in QUEUE_LANES else LANE_NORMAL
+    return pool, lane
+
+
+def _lane_dari_stream(stream: str) -> str:
+    return _info_stream(stream)[1]
+
+
+def _urutan_lane_berbobot(lanes: List[str]) -> List[str]:
+    """Smooth weighted round-robin: the first lane is this turn's pick, the rest are fallbacks by weight."""
+    if not lanes:
+        return []
+    total = sum(_bobot_lane[lane] for lane in lanes)
+    for lane in lanes:
+        _kredit_lane[lane] += _bobot_lane[lane]
+    terpilih = max(lanes, key=lambda lane: _kredit_lane[lane])
+    _kredit_lane[terpilih] -= total
+    sisa = sorted((lane for lane in lanes if lane != terpilih), key=lambda lane: -_bobot_lane[lane])
+    return [terpilih] + sisa
+
+
+def is_mode_sharded_queue() -> bool:
+    return bool(queue_shard_clients)
+
+
+def _daftar_shard() -> List[Optional[int]]:
+    # None stands for the main Redis, which holds the job streams when no shards are configured.
+    return list(range(len(queue_shard_clients))) or [None]
+
+
+def _shard_untuk_event(event_data: Dict[str, Any]) -> Optional[int]:
+    if not queue_shard_clients:
+        return None
+    if str(settings.QUEUE_SHARD_KEY).strip().lower() == "pool":
+        kunci = _normalisasi_agent_pool(event_data.get("agent_pool"))
+    else:
+        kunci = str(event_data.get("job_id") or event_data.get("run_id") or "")
+    return zlib.crc32(kunci.encode("utf-8")) % len(queue_shard_clients)
+
+
+def _klien_stream(shard: Optional[int], *, blocking: bool = False) -> Any:
+    if shard is None:
+        return redis_blocking_client if blocking else redis_client
+    return (queue_shard_blocking_clients if blocking else queue_shard_clients)[shard]
+
+
+def _urutan_shard(consumer_id: str) -> List[Optional[int]]:
+    shards = _daftar_shard()
+    mulai = _giliran_shard[consumer_id] % len(shards)
+    _giliran_shard[consumer_id] = mulai + 1
+    return shards[mulai:] + shards[:mulai]
+
+
 def _kunci_active_runs(job_id: str) -> str:
     return f"{JOB_ACTIVE_RUNS_PREFIX}{job_id}"
 
@@ -142,6 +354,10 @@ def _kunci_job_spec_versions(job_id: str) -> str:
     return f"{JOB_SPEC_VERSIONS_PREFIX}{job_id}"
 
 
+def _kunci_index_versi(job_id: str) -> str:
+    return f"{JOB_SPEC_VERSION_INDEX_PREFIX}{job_id}"
+
+
 def _ke_datetime_utc(raw: Any) -> datetime:
     if isinstance(raw, datetime):
         if raw.tzinfo is None:
@@ -212,30 +428,54 @@ def _refresh_index_active_runs_fallback(previous_data: Optional[Dict[str, Any]],
         _fallback_active_flow_runs[flow_group].discard(run_id)
 
 
-async def _refresh_index_active_runs_redis(previous_data: Optional[Dict[str, Any]], current_data: Dict[str, Any], run_id: str) -> None:
-    if isinstance(previous_data, dict):
-        prev_job_id = str(previous_data.get("job_id") or "").strip()
-        prev_status = previous_data.get("status")
-        if prev_job_id and _status_run_aktif(prev_status):
-            await redis_client.srem(_kunci_active_runs(prev_job_id), run_id)
-        prev_flow_group = _ambil_flow_group_dari_run_data(previous_data)
-        if prev_flow_group and _status_run_aktif(prev_status):
-            await redis_client.srem(_kunci_active_flow_runs(prev_flow_group), run_id)
+def _kunci_index_status_run(status: str) -> str:
+    return f"{RUN_STATUS_INDEX_PREFIX}{status}"
+
+
+def _kunci_index_job_run(job_id: str) -> str:
+    return f"{RUN_JOB_INDEX_PREFIX}{job_id}"
 
-    job_id = str(current_data.get("job_id") or "").strip()
-    flow_group = _ambil_flow_group_dari_run_data(current_data)
-    status_aktif = _status_run_aktif(current_data.get("status"))
 
+def _member_lex_run(run_id: str) -> str:
+    # Lowercased prefix for case-insensitive search; the original id follows the separator.
+    return f"{run_id.lower()}\n{run_id}"
+
+
+def _status_run_teks(value: Any) -> str:
+    return str(getattr(value, "value", value) or "").strip().lower()
+
+
+def _field_index_run(run_data: Dict[str, Any]) -> Dict[str, str]:
+    return {
+        "status": _status_run_teks(run_data.get("status")),
+        "job_id": str(run_data.get("job_id") or "").strip(),
+        "flow_group": _ambil_flow_group_dari_run_data(run_data),
+    }
+
+
+def _payload_run_redis(run_data: Dict[str, Any]) -> str:
+    # `_index` records the values the run was indexed under, so the save script never re-derives them.
+    return json.dumps({**run_data, "_index": _field_index_run(run_data)})
+
+
+def _perintah_index_run(run_id: str, run_data: Dict[str, Any], score: float) -> List[Tuple[str, tuple]]:
+    """Index writes for a run with no earlier record (bulk enqueue, migration, backfill)."""
+    status = _status_run_teks(run_data.get("status"))
+    job_id = str(run_data.get("job_id") or "").strip()
+    perintah: List[Tuple[str, tuple]] = [
+        ("zadd", (ZSET_RUNS, {run_id: score})),
+        ("zadd", (ZSET_RUNS_LEX, {_member_lex_run(run_id): 0})),
+    ]
+    if status:
+        perintah.append(("zadd", (_kunci_index_status_run(status), {run_id: score})))
     if job_id:
-        if status_aktif:
-            await redis_client.sadd(_kunci_active_runs(job_id), run_id)
-        else:
-            await redis_client.srem(_kunci_active_runs(job_id), run_id)
+        perintah.append(("zadd", (_kunci_index_job_run(job_id), {run_id: score})))
+    return perintah
 
-    if flow_group and status_aktif:
-        await redis_client.sadd(_kunci_active_flow_runs(flow_group), run_id)
-    elif flow_group:
-        await redis_client.srem(_kunci_active_flow_runs(flow_group), run_id)
+
+def _antrekan_perintah(pipe: Any, perintah: List[Tuple[str, tuple]]) -> None:
+    for method, args in perintah:
+        getattr(pipe, method)(*args)
 
 
 def _id_pesan_fallback_berikutnya() -> str:
@@ -244,184 +484,1522 @@ def _id_pesan_fallback_berikutnya() -> str:
     return f"{int(time.time() * 1000)}-{_fallback_stream_seq}"
 
 
+def _catat_jurnal_fallback(op: str, *args: Any) -> None:
+    if _jurnal_fallback is None or _sedang_replay_jurnal:
+        return
+    _jurnal_fallback.append(op, *args)
+    if _jurnal_fallback.needs_compaction():
+        _jurnal_fallback.write_snapshot(_snapshot_state_fallback())
+
+
+def _snapshot_state_fallback() -> Dict[str, Any]:
+    return {
+        "stream_seq": _fallback_stream_seq,
+        "streams": {stream: list(rows) for stream, rows in _fallback_streams.items() if rows},
+        "delayed": [list(item) for item in _fallback_delayed],
+        "job_specs": _fallback_job_specs,
+        "job_all": sorted(_fallback_job_all),
+        "job_enabled": sorted(_fallback_job_enabled),
+        "job_spec_versions": _fallback_job_spec_versions,
+        "runs": _fallback_runs,
+        "run_scores": _fallback_run_scores,
+        "job_runs": _fallback_job_runs,
+        "failure_state": _fallback_failure_state,
+        "events": list(_fallback_events),
+        "dead_letters": list(_fallback_dead_letters),
+    }
+
+
+def _pulihkan_snapshot_fallback(state: Dict[str, Any]) -> None:
+    global _fallback_stream_seq
+    _fallback_stream_seq = max(_fallback_stream_seq, int(state.get("stream_seq") or 0))
+    for stream, rows in (state.get("streams") or {}).items():
+        _fallback_streams[stream].extend(rows)
+    _fallback_delayed.extend(tuple(item) for item in state.get("delayed") or [])
+    # The snapshot stores the heap array as-is; heapify only matters when merging into existing entries.
+    heapq.heapify(_fallback_delayed)
+    _fallback_job_specs.update(state.get("job_specs") or {})
+    _fallback_job_all.update(state.get("job_all") or [])
+    _fallback_job_enabled.update(state.get("job_enabled") or [])
+    for job_id, rows in (state.get("job_spec_versions") or {}).items():
+        _fallback_job_spec_versions[job_id] = rows
+    scores = state.get("run_scores") or {}
+    for run_id, run_data in (state.get("runs") or {}).items():
+        _simpan_fallback_run(run_id, run_data, float(scores.get(run_id, _ke_timestamp(run_data.get("scheduled_at")))))
+    for job_id, rows in (state.get("job_runs") or {}).items():
+        _fallback_job_runs[job_id] = rows
+    _fallback_failure_state.update(state.get("failure_state") or {})
+    _fallback_events.extend(state.get("events") or [])
+    _fallback_dead_letters.extend(state.get("dead_letters") or [])
+
+
+def _terapkan_op_fallback(op: str, args: List[Any]) -> None:
+    global _fallback_stream_seq
+    if op == "stream_push":
+        stream, item = args
+        _fallback_streams[stream].append(item)
+        _fallback_stream_seq = max(_fallback_stream_seq, int(str(item["id"]).rpartition("-")[2] or 0))
+    elif op == "stream_pop":
+        if _fallback_streams.get(args[0]):
+            _fallback_streams[args[0]].popleft()
+    elif op == "delayed_push":
+        score, seq, member = args
+        heapq.heappush(_fallback_delayed, (score, seq, member))
+        _fallback_stream_seq = max(_fallback_stream_seq, int(seq))
+    elif op == "delayed_pop":
+        for _ in range(min(int(args[0]), len(_fallback_delayed))):
+            heapq.heappop(_fallback_delayed)
+    elif op == "version_push":
+        _simpan_fallback_versi(*args)
+    elif op == "spec_set":
+        _simpan_fallback_spec(*args)
+    elif op == "job_enabled":
+        _set_fallback_job_enabled(*args)
+    elif op == "run_set":
+        _simpan_fallback_run(*args)
+    elif op == "job_run_push":
+        _tambah_fallback_job_run(*args)
+    elif op == "failure_set":
+        _simpan_fallback_failure_state(*args)
+    elif op == "event_push":
+        _simpan_fallback_event(args[0])
+    elif op == "dead_letter_push":
+        _simpan_fallback_dead_letter(args[0])
+    elif op == "dead_letter_drop":
+        _hapus_fallback_dead_letters(args[0])
+
+
+def _muat_jurnal_fallback() -> None:
+    """Replay the on-disk fallback journal once per process, before fallback state is first used."""
+    global _jurnal_fallback_dimuat, _sedang_replay_jurnal
+    if _jurnal_fallback is None or _jurnal_fallback_dimuat:
+        return
+    _jurnal_fallback_dimuat = True
+    snapshot, ops = _jurnal_fallback.load()
+    _sedang_replay_jurnal = True
+    try:
+        if snapshot:
+            _pulihkan_snapshot_fallback(snapshot)
+        for row in ops:
+            _terapkan_op_fallback(row[0], row[1:])
+    finally:
+        _sedang_replay_jurnal = False
+
+
 async def init_queue():
-    """Initialize Redis streams and consumer group."""
+    """Initialize Redis streams, consumer group and run indexes.
+
+    The fallback journal is replayed first; state a previous process left there (jobs, runs, events
+    buffered during an outage) is migrated into Redis before the caller starts consuming.
+    """
+    _muat_jurnal_fallback()
     if _sedang_mode_fallback_redis():
         return
+    await _siapkan_stream_antrean()
+    if not _sedang_mode_fallback_redis():
+        await _pastikan_index_run()
+    if not _sedang_mode_fallback_redis() and not is_mode_legacy_redis_queue():
+        try:
+            await _pindahkan_event_log_lama()
+        except RedisError:
+            _aktifkan_mode_fallback()
+    if not _sedang_mode_fallback_redis() and _ada_state_fallback():
+        try:
+            await migrate_fallback_to_redis()
+        except RedisError:
+            # The replayed state stays in fallback mode; redis_recovery_loop retries the migration.
+            return
+
+
+async def _siapkan_stream_antrean() -> None:
     if is_mode_legacy_redis_queue():
         return
 
-    try:
-        await redis_client.xgroup_create(name=STREAM_JOBS, groupname=CG_WORKERS, id="$", mkstream=True)
-    except ResponseError as exc:
-        if "BUSYGROUP" in str(exc):
+    for client in [redis_client, *queue_shard_clients]:
+        try:
+            await client.xgroup_create(name=STREAM_JOBS, groupname=CG_WORKERS, id="$", mkstream=True)
+        except ResponseError as exc:
+            if "BUSYGROUP" in str(exc):
+                continue
+            if _error_stream_tidak_didukung(exc):
+                _aktifkan_mode_legacy_redis_queue()
+                return
+            raise
+        except RedisError:
+            _aktifkan_mode_fallback()
+            # Fallback mode: no setup required.
             return
-        if _error_stream_tidak_didukung(exc):
-            _aktifkan_mode_legacy_redis_queue()
+
+
+async def rebuild_run_indexes(batch_size: int = 500) -> int:
+    """Backfill the per-status, per-job and lex run indexes from ``zset:runs``."""
+    batas = max(1, int(batch_size))
+    total = 0
+    cursor = 0
+    while True:
+        batch = await redis_client.zrange(ZSET_RUNS, cursor, cursor + batas - 1, withscores=True)
+        if not batch:
+            break
+        payloads = await redis_client.mget([f"{RUN_PREFIX}{run_id}" for run_id, _ in batch])
+        pipe = redis_client.pipeline(transaction=False)
+        for (run_id, score), payload in zip(batch, payloads):
+            if payload:
+                _antrekan_perintah(pipe, _perintah_index_run(run_id, json.loads(payload), score))
+                total += 1
+        await pipe.execute()
+        if len(batch) < batas:
+            break
+        cursor += len(batch)
+    return total
+
+
+async def _pastikan_index_run() -> None:
+    try:
+        # Only one process claims the backfill; runs saved meanwhile are indexed by save_run itself.
+        if not await redis_client.set(RUN_INDEX_READY_KEY, "1", nx=True):
             return
-        raise
+        try:
+            await rebuild_run_indexes()
+        except RedisError:
+            await redis_client.delete(RUN_INDEX_READY_KEY)
+            raise
     except RedisError:
         _aktifkan_mode_fallback()
-        # Fallback mode: no setup required.
+
+
+def _simpan_fallback_stream(stream: str, event_data: Dict[str, Any]) -> str:
+    message_id = _id_pesan_fallback_berikutnya()
+    item = {"id": message_id, "data": _salin_nilai(event_data)}
+    _fallback_streams[stream].append(item)
+    _catat_jurnal_fallback("stream_push", stream, item)
+    return message_id
+
+
+def _ambil_fallback_stream(streams: List[str]) -> Optional[Dict[str, Any]]:
+    lane_tersedia = sorted({_lane_dari_stream(stream) for stream in streams if _fallback_streams.get(stream)})
+    if not lane_tersedia:
+        return None
+    lane = _urutan_lane_berbobot(lane_tersedia)[0]
+    stream = next(stream for stream in streams if _lane_dari_stream(stream) == lane and _fallback_streams.get(stream))
+    # The entry leaves the store here, so it is handed over without another copy.
+    item = _fallback_streams[stream].popleft()
+    _catat_jurnal_fallback("stream_pop", stream)
+    alasan = _alasan_event_tidak_valid(item["data"])
+    if alasan:
+        entry = _buat_dead_letter(
+            item["data"], reason=alasan, source_stream=stream, source_message_id=item["id"], deliveries=1
+        )
+        entry["dead_letter_id"] = _id_pesan_fallback_berikutnya()
+        _simpan_fallback_dead_letter(entry)
+        return None
+    return {"message_id": item["id"], "data": item["data"], "stream": stream}
+
+
+def _pool_dari_fallback() -> List[str]:
+    pools = {DEFAULT_AGENT_POOL}
+    pools.update(_info_stream(stream)[0] for stream in _fallback_streams)
+    return sorted(pools)
+
+
+async def _daftar_pool_terdaftar() -> List[str]:
+    sekarang = time.time()
+    if _cache_pool_aktif["expires_at"] > sekarang:
+        return list(_cache_pool_aktif["pools"])
+
+    members = await redis_client.smembers(QUEUE_POOLS_SET)
+    pools = {DEFAULT_AGENT_POOL} | set(_pool_terdaftar)
+    pools.update(_normalisasi_agent_pool(member) for member in members or [])
+    _cache_pool_aktif["pools"] = sorted(pools)
+    _cache_pool_aktif["expires_at"] = sekarang + QUEUE_POOLS_CACHE_TTL_SEC
+    return list(_cache_pool_aktif["pools"])
+
+
+async def _daftarkan_pool(pool: str) -> None:
+    if pool == DEFAULT_AGENT_POOL or pool in _pool_terdaftar:
         return
+    await redis_client.sadd(QUEUE_POOLS_SET, pool)
+    _pool_terdaftar.add(pool)
+
+
+async def list_agent_pools() -> List[str]:
+    """List agent pools that have a job stream."""
+    if _sedang_mode_fallback_redis():
+        return _pool_dari_fallback()
+
+    try:
+        return await _daftar_pool_terdaftar()
+    except RedisError:
+        _aktifkan_mode_fallback()
+        return _pool_dari_fallback()
+
+
+async def _pool_untuk_konsumen(agent_pool: Optional[str]) -> List[str]:
+    pool = _normalisasi_agent_pool(agent_pool)
+    if pool != GLOBAL_AGENT_POOL:
+        return [pool]
+    if _sedang_mode_fallback_redis():
+        return _pool_dari_fallback()
+    return await _daftar_pool_terdaftar()
+
+
+# Shared by every script that enqueues. Returns {message_id, 1} for a new entry or
+# {original_message_id, 0} when the dedup key is still held; a nil dedup key always enqueues.
+_LUA_ENQUEUE_IDEMPOTEN = """
+local function enqueue_idempoten(dedup_key, stream, payload, ttl)
+    if dedup_key then
+        local ada = redis.call('GET', dedup_key)
+        if ada then return {ada, 0} end
+    end
+    local message_id = redis.call('XADD', stream, '*', 'data', payload)
+    if dedup_key then redis.call('SET', dedup_key, message_id, 'EX', ttl) end
+    return {message_id, 1}
+end
+"""
 
+_SKRIP_ENQUEUE_IDEMPOTEN = _LUA_ENQUEUE_IDEMPOTEN + """
+return enqueue_idempoten(KEYS[1], KEYS[2], ARGV[1], tonumber(ARGV[2]))
+"""
 
-async def enqueue_job(event: Union[QueueEvent, Dict[str, Any]]) -> str:
-    """Enqueue a job to the stream."""
+
+def _ttl_dedup() -> int:
+    return max(0, int(settings.QUEUE_DEDUP_TTL_SEC))
+
+
+def _kunci_dedup(event_data: Dict[str, Any], idempotency_key: Optional[str]) -> Optional[str]:
+    """Dedup key of an enqueue; defaults to ``<run_id>:<attempt>``. None when dedup is off or there is no key."""
+    if not _ttl_dedup():
+        return None
+    key = str(idempotency_key or "").strip()
+    if not key:
+        run_id = str(event_data.get("run_id") or "").strip()
+        if not run_id:
+            return None
+        key = f"{run_id}:{int(event_data.get('attempt') or 0)}"
+    return f"{QUEUE_DEDUP_PREFIX}{key}"
+
+
+def _cek_fallback_dedup(key: str) -> Optional[str]:
+    sekarang = time.time()
+    # Every entry shares one TTL, so expiry order is insertion order.
+    while _fallback_dedup_kedaluwarsa and _fallback_dedup_kedaluwarsa[0][0] <= sekarang:
+        _, lama = _fallback_dedup_kedaluwarsa.popleft()
+        row = _fallback_dedup.get(lama)
+        if row and row[1] <= sekarang:
+            del _fallback_dedup[lama]
+    row = _fallback_dedup.get(key)
+    return row[0] if row else None
+
+
+def _catat_fallback_dedup(key: str, message_id: str) -> None:
+    kedaluwarsa = time.time() + _ttl_dedup()
+    _fallback_dedup[key] = (message_id, kedaluwarsa)
+    _fallback_dedup_kedaluwarsa.append((kedaluwarsa, key))
+
+
+def _enqueue_fallback_idempoten(stream: str, event_data: Dict[str, Any], dedup_key: Optional[str]) -> str:
+    if dedup_key:
+        ada = _cek_fallback_dedup(dedup_key)
+        if ada:
+            return ada
+    message_id = _simpan_fallback_stream(stream, event_data)
+    if dedup_key:
+        _catat_fallback_dedup(dedup_key, message_id)
+    return message_id
+
+
+# List counterpart of enqueue_idempoten for Redis without streams: the generated ID is stored as the dedup
+# marker and returned again for repeats. Returns {message_id, 1} or {original_message_id, 0}.
+_SKRIP_ENQUEUE_LEGACY_IDEMPOTEN = """
+if not redis.call('SET', KEYS[1], ARGV[2], 'NX', 'EX', tonumber(ARGV[3])) then
+    local ada = redis.call('GET', KEYS[1])
+    if ada then return {ada, 0} end
+end
+redis.call('RPUSH', KEYS[2], ARGV[1])
+return {ARGV[2], 1}
+"""
+
+
+def _perintah_enqueue_legacy(pool: str, event_data: Dict[str, Any]) -> Tuple[str, tuple]:
+    dedup_key = _kunci_dedup(event_data, None)
+    payload = json.dumps(event_data)
+    if not dedup_key:
+        return ("rpush", (_kunci_list_pool(pool), payload))
+    args = (dedup_key, _kunci_list_pool(pool), payload, _id_pesan_fallback_berikutnya(), _ttl_dedup())
+    return ("eval", (_SKRIP_ENQUEUE_LEGACY_IDEMPOTEN, 2, *args))
+
+
+async def _enqueue_legacy_idempoten(pool: str, event_data: Dict[str, Any], dedup_key: Optional[str]) -> str:
+    # List entries have no server-side ID, so the generated one doubles as the dedup marker.
+    message_id = _id_pesan_fallback_berikutnya()
+    if dedup_key and not await redis_client.set(dedup_key, message_id, nx=True, ex=_ttl_dedup()):
+        ada = await redis_client.get(dedup_key)
+        if ada:
+            return ada
+    await redis_client.rpush(_kunci_list_pool(pool), json.dumps(event_data))
+    return message_id
+
+
+async def _xadd_idempoten(stream: str, payload: str, dedup_key: Optional[str], shard: Optional[int] = None) -> str:
+    # The dedup key lives next to the stream so the script stays on one instance.
+    client = _klien_stream(shard)
+    if not dedup_key:
+        return await client.xadd(stream, {"data": payload})
+    message_id, _ = await client.eval(_SKRIP_ENQUEUE_IDEMPOTEN, 2, dedup_key, stream, payload, _ttl_dedup())
+    return message_id
+
+
+async def enqueue_job(event: Union[QueueEvent, Dict[str, Any]], *, idempotency_key: Optional[str] = None) -> str:
+    """Enqueue a job to the stream of its agent pool and priority lane.
+
+    Enqueues are idempotent per ``idempotency_key`` (default ``<run_id>:<attempt>``) for
+    ``QUEUE_DEDUP_TTL_SEC``: a repeat within the window adds nothing and returns the original message ID.
+    With ``QUEUE_SHARD_URLS`` set the entry goes to the shard picked by ``QUEUE_SHARD_KEY``.
+    """
     event_data = _ke_dict_event(event)
     event_data["enqueued_at"] = _sekarang_iso()
+    pool = _normalisasi_agent_pool(event_data.get("agent_pool"))
+    stream = _kunci_stream(pool, _lane_dari_event(event_data))
+    dedup_key = _kunci_dedup(event_data, idempotency_key)
 
     if _sedang_mode_fallback_redis():
-        message_id = _id_pesan_fallback_berikutnya()
-        _fallback_stream.append({"id": message_id, "data": _salin_nilai(event_data)})
-        return message_id
+        return _enqueue_fallback_idempoten(stream, event_data, dedup_key)
 
     if is_mode_legacy_redis_queue():
         try:
-            message_id = _id_pesan_fallback_berikutnya()
-            await redis_client.rpush(LIST_JOBS, json.dumps(event_data))
-            return message_id
+            await _daftarkan_pool(pool)
+            return await _enqueue_legacy_idempoten(pool, event_data, dedup_key)
         except RedisError:
             _aktifkan_mode_fallback()
-            message_id = _id_pesan_fallback_berikutnya()
-            _fallback_stream.append({"id": message_id, "data": _salin_nilai(event_data)})
-            return message_id
+            return _enqueue_fallback_idempoten(stream, event_data, dedup_key)
 
     try:
-        return await redis_client.xadd(STREAM_JOBS, {"data": json.dumps(event_data)})
+        await _daftarkan_pool(pool)
+        return await _xadd_idempoten(stream, json.dumps(event_data), dedup_key, _shard_untuk_event(event_data))
     except ResponseError as exc:
         if _error_stream_tidak_didukung(exc):
             _aktifkan_mode_legacy_redis_queue()
             try:
-                message_id = _id_pesan_fallback_berikutnya()
-                await redis_client.rpush(LIST_JOBS, json.dumps(event_data))
-                return message_id
+                return await _enqueue_legacy_idempoten(pool, event_data, dedup_key)
             except RedisError:
                 _aktifkan_mode_fallback()
-                message_id = _id_pesan_fallback_berikutnya()
-                _fallback_stream.append({"id": message_id, "data": _salin_nilai(event_data)})
-                return message_id
+                return _enqueue_fallback_idempoten(stream, event_data, dedup_key)
         raise
     except RedisError:
         _aktifkan_mode_fallback()
-        message_id = _id_pesan_fallback_berikutnya()
-        _fallback_stream.append({"id": message_id, "data": _salin_nilai(event_data)})
-        return message_id
+        return _enqueue_fallback_idempoten(stream, event_data, dedup_key)
+
+
+def _run_queued_dari_event(event_data: Dict[str, Any]) -> Dict[str, Any]:
+    run = Run(
+        run_id=event_data["run_id"],
+        job_id=event_data["job_id"],
+        status=RunStatus.QUEUED,
+        attempt=int(event_data.get("attempt") or 0),
+        scheduled_at=event_data.get("scheduled_at") or _sekarang_iso(),
+        inputs=event_data.get("inputs") or {},
+        trace_id=event_data.get("trace_id"),
+        agent_pool=event_data.get("agent_pool"),
+    )
+    return _serialisasi_model(run)
+
+
+def _antrekan_event_timeline(pipe: Any, events: List[Dict[str, Any]], legacy: bool) -> None:
+    if not events:
+        return
+    if legacy:
+        for event in events:
+            pipe.lpush(EVENTS_LOG, json.dumps({**event, "stream_id": _id_pesan_fallback_berikutnya()}))
+        pipe.ltrim(EVENTS_LOG, 0, EVENTS_MAX - 1)
+        return
+    for event in events:
+        pipe.xadd(EVENTS_STREAM, {"data": json.dumps(event)}, maxlen=settings.EVENTS_STREAM_MAXLEN, approximate=True)
+
+
+def _event_timeline_queued(event_data: Dict[str, Any], source: Optional[str]) -> Dict[str, Any]:
+    data = {"run_id": event_data["run_id"], "job_id": event_data["job_id"], "job_type": event_data.get("type")}
+    if source:
+        data["source"] = source
+    return {"id": str(uuid.uuid4()), "type": "run.queued", "timestamp": _sekarang_iso(), "data": data}
+
 
+async def _enqueue_jobs_fallback(
+    items: List[Tuple[Dict[str, Any], Dict[str, Any], str]],
+    source: Optional[str],
+    max_history: int,
+) -> List[str]:
+    message_ids: List[str] = []
+    for event_data, run_data, stream in items:
+        await save_run(Run(**run_data))
+        await add_run_to_job_history(run_data["job_id"], run_data["run_id"], max_history=max_history)
+        message_ids.append(_enqueue_fallback_idempoten(stream, event_data, _kunci_dedup(event_data, None)))
+        await append_event("run.queued", _event_timeline_queued(event_data, source)["data"])
+    return message_ids
+
+
+async def enqueue_jobs(
+    events: List[Union[QueueEvent, Dict[str, Any]]],
+    *,
+    source: Optional[str] = None,
+    max_history: int = 50,
+) -> List[Optional[str]]:
+    """Queue a batch of new runs in one pipeline and return the message ID of each event in order.
+
+    For every event this writes the queued run record (plus its active-run indexes), the job run
+    history entry, the stream entry and a ``run.queued`` timeline event. Run IDs must be new; use
+    ``save_run`` + ``enqueue_job`` when re-queueing an existing run. Stream and legacy list entries take
+    part in the ``<run_id>:<attempt>`` dedup window of ``enqueue_job``. List entries have no server-side
+    ID: with dedup on they report the ID kept in the dedup marker, otherwise None.
+    """
+    if not events:
+        return []
+
+    items: List[Tuple[Dict[str, Any], Dict[str, Any], str]] = []
+    for event in events:
+        event_data = _ke_dict_event(event)
+        event_data["enqueued_at"] = _sekarang_iso()
+        stream = _kunci_stream(_normalisasi_agent_pool(event_data.get("agent_pool")), _lane_dari_event(event_data))
+        items.append((event_data, _run_queued_dari_event(event_data), stream))
 
-async def dequeue_job(worker_id: str) -> Optional[Dict[str, Any]]:
-    """Dequeue a job from the stream for a worker."""
     if _sedang_mode_fallback_redis():
-        if not _fallback_stream:
-            return None
-        item = _fallback_stream.pop(0)
-        return {"message_id": item["id"], "data": _salin_nilai(item["data"])}
+        return await _enqueue_jobs_fallback(items, source, max_history)
+
+    legacy = is_mode_legacy_redis_queue()
+    pools_baru = sorted(
+        {
+            _info_stream(stream)[0]
+            for _, _, stream in items
+            if _info_stream(stream)[0] != DEFAULT_AGENT_POOL and _info_stream(stream)[0] not in _pool_terdaftar
+        }
+    )
+
+    pipe = redis_client.pipeline(transaction=False)
+    # Sharded streams get one pipeline per shard; run records and the timeline stay on the main Redis.
+    pipes_shard: Dict[int, Any] = {}
+    if pools_baru:
+        pipe.sadd(QUEUE_POOLS_SET, *pools_baru)
+    posisi_pesan: List[Tuple[Optional[int], int]] = []
+    events_timeline: List[Dict[str, Any]] = []
+    for event_data, run_data, stream in items:
+        run_id = run_data["run_id"]
+        job_id = str(run_data.get("job_id") or "").strip()
+        pipe.set(f"{RUN_PREFIX}{run_id}", _payload_run_redis(run_data))
+        _antrekan_perintah(pipe, _perintah_index_run(run_id, run_data, _ke_timestamp(run_data.get("scheduled_at"))))
+        if job_id:
+            pipe.sadd(_kunci_active_runs(job_id), run_id)
+            pipe.lpush(f"{JOB_RUNS_PREFIX}{job_id}", run_id)
+            pipe.ltrim(f"{JOB_RUNS_PREFIX}{job_id}", 0, max_history - 1)
+        flow_group = _ambil_flow_group_dari_run_data(run_data)
+        if flow_group:
+            pipe.sadd(_kunci_active_flow_runs(flow_group), run_id)
+        shard = None if legacy else _shard_untuk_event(event_data)
+        pipe_stream = pipe
+        if shard is not None:
+            if shard not in pipes_shard:
+                pipes_shard[shard] = _klien_stream(shard).pipeline(transaction=False)
+            pipe_stream = pipes_shard[shard]
+        posisi_pesan.append((shard, len(pipe_stream)))
+        dedup_key = _kunci_dedup(event_data, None)
+        if legacy:
+            _antrekan_perintah(pipe, [_perintah_enqueue_legacy(_info_stream(stream)[0], event_data)])
+        elif dedup_key:
+            pipe_stream.eval(_SKRIP_ENQUEUE_IDEMPOTEN, 2, dedup_key, stream, json.dumps(event_data), _ttl_dedup())
+        else:
+            pipe_stream.xadd(stream, {"data": json.dumps(event_data)})
+        events_timeline.append(_event_timeline_queued(event_data, source))
+    _antrekan_event_timeline(pipe, events_timeline, legacy)
+
+    try:
+        results = await pipe.execute(raise_on_error=False)
+        hasil_shard: Dict[Optional[int], List[Any]] = dict(
+            zip(pipes_shard, await asyncio.gather(*(p.execute(raise_on_error=False) for p in pipes_shard.values())))
+        )
+    except RedisError:
+        _aktifkan_mode_fallback()
+        return await _enqueue_jobs_fallback(items, source, max_history)
+    hasil_shard[None] = results
+
+    errors = [result for rows in hasil_shard.values() for result in rows if isinstance(result, Exception)]
+    if any(isinstance(error, ResponseError) and _error_stream_tidak_didukung(error) for error in errors):
+        # Run records and history landed; queue and timeline writes need the list fallback.
+        _aktifkan_mode_legacy_redis_queue()
+        try:
+            pipe = redis_client.pipeline(transaction=False)
+            for event_data, _, stream in items:
+                _antrekan_perintah(pipe, [_perintah_enqueue_legacy(_info_stream(stream)[0], event_data)])
+            _antrekan_event_timeline(pipe, events_timeline, True)
+            balasan = (await pipe.execute())[: len(items)]
+        except RedisError:
+            _aktifkan_mode_fallback()
+            return [
+                _enqueue_fallback_idempoten(stream, event_data, _kunci_dedup(event_data, None))
+                for event_data, _, stream in items
+            ]
+        return [_id_pesan_legacy(row) for row in balasan]
+    if errors:
+        raise errors[0]
+
+    _pool_terdaftar.update(pools_baru)
+    balasan = [hasil_shard[shard][index] for shard, index in posisi_pesan]
+    if legacy:
+        return [_id_pesan_legacy(row) for row in balasan]
+    # Dedup script replies are [message_id, is_new]; plain XADD replies are the ID itself.
+    return [row[0] if isinstance(row, list) else row for row in balasan]
+
+
+def _id_pesan_legacy(balasan: Any) -> Optional[str]:
+    # Dedup script replies are [message_id, is_new]; a plain RPUSH replies with the list length.
+    return balasan[0] if isinstance(balasan, list) else None
+
+
+async def _pastikan_consumer_group(streams: List[str], shard: Optional[int] = None) -> None:
+    client = _klien_stream(shard)
+    for stream in streams:
+        try:
+            # Lane streams get their group lazily; id=0 keeps entries added before the group existed.
+            await client.xgroup_create(name=stream, groupname=CG_WORKERS, id="0", mkstream=True)
+        except ResponseError as exc:
+            if "BUSYGROUP" not in str(exc):
+                raise
+
+
+def _alasan_event_tidak_valid(data: Any) -> Optional[str]:
+    if not isinstance(data, dict):
+        return "invalid_event"
+    if not str(data.get("run_id") or "").strip():
+        return "invalid_event"
+    return None
+
+
+def _parse_hasil_xreadgroup(
+    result: Any,
+    shard: Optional[int] = None,
+    consumer_id: Optional[str] = None,
+) -> Tuple[List[Dict[str, Any]], Dict[str, List[str]], List[Dict[str, Any]]]:
+    deferred = is_mode_deferred_ack()
+    rows: List[Dict[str, Any]] = []
+    ack_ids: Dict[str, List[str]] = defaultdict(list)
+    dead: List[Dict[str, Any]] = []
+    for stream, messages in result or []:
+        for message_id, message_data in messages or []:
+            raw = (message_data or {}).get("data") if isinstance(message_data, dict) else None
+            try:
+                data = json.loads(raw)
+                alasan = _alasan_event_tidak_valid(data)
+            except (TypeError, ValueError):
+                alasan = "unparseable_payload"
+            if alasan:
+                # Redelivering these would fail the same way; park them and ack so they leave the PEL.
+                dead.append(
+                    _buat_dead_letter(raw, reason=alasan, source_stream=stream, source_message_id=message_id, deliveries=1)
+                )
+                ack_ids[stream].append(message_id)
+                continue
+            row = {"message_id": message_id, "data": data, "stream": stream}
+            if shard is not None:
+                row["shard"] = shard
+            if deferred:
+                row["ack_pending"] = True
+                row["consumer"] = consumer_id
+            else:
+                ack_ids[stream].append(message_id)
+            rows.append(row)
+    return rows, ack_ids, dead
+
+
+async def _baca_stream_group(
+    consumer_id: str,
+    streams: List[str],
+    *,
+    count: int,
+    block: Optional[int],
+    shard: Optional[int] = None,
+) -> List[Dict[str, Any]]:
+    kwargs: Dict[str, Any] = {
+        "groupname": CG_WORKERS,
+        "consumername": consumer_id,
+        "streams": {stream: ">" for stream in streams},
+        "count": count,
+    }
+    # Blocking reads park a connection for the whole interval, so they go through the blocking pool.
+    if block is not None:
+        kwargs["block"] = block
+    client = _klien_stream(shard, blocking=block is not None)
+
+    try:
+        result = await client.xreadgroup(**kwargs)
+    except ResponseError as exc:
+        if "NOGROUP" not in str(exc).upper():
+            raise
+        await _pastikan_consumer_group(streams, shard)
+        result = await client.xreadgroup(**kwargs)
+
+    rows, ack_ids, dead = _parse_hasil_xreadgroup(result, shard, consumer_id)
+    if dead:
+        await _simpan_dead_letters_redis(dead)
+    for stream, ids in ack_ids.items():
+        await _klien_stream(shard).xack(stream, CG_WORKERS, *ids)
+    return rows
+
+
+async def _isi_stash_konsumen(
+    consumer_id: str,
+    lanes: List[str],
+    pools: List[str],
+    *,
+    block: Optional[int],
+    shard: Optional[int] = None,
+) -> None:
+    stash = _stash_konsumen[consumer_id]
+    rows = await _baca_stream_group(
+        consumer_id,
+        [_kunci_stream(pool, lane) for lane in lanes for pool in pools],
+        count=1,
+        block=block,
+        shard=shard,
+    )
+    for row in rows:
+        stash[_lane_dari_stream(row["stream"])].append(row)
+
+
+def _ambil_stash_konsumen(consumer_id: str, lanes: List[str]) -> Optional[Dict[str, Any]]:
+    stash = _stash_konsumen[consumer_id]
+    for lane in lanes:
+        if stash[lane]:
+            return stash[lane].popleft()
+    return None
+
+
+async def _dequeue_stream_berbobot(consumer_id: str, pools: List[str]) -> Optional[Dict[str, Any]]:
+    stash = _stash_konsumen[consumer_id]
+    urutan = _urutan_lane_berbobot(list(QUEUE_LANES))
+    shards = _urutan_shard(consumer_id)
+    if not stash[urutan[0]]:
+        # Refill every lane whose local slot is empty in one non-blocking read per shard, starting from a
+        # rotating shard so none of them is always read first.
+        for shard in shards:
+            lane_kosong = [lane for lane in QUEUE_LANES if not stash[lane]]
+            if not lane_kosong:
+                break
+            await _isi_stash_konsumen(consumer_id, lane_kosong, pools, block=None, shard=shard)
+    row = _ambil_stash_konsumen(consumer_id, urutan)
+    if row:
+        return row
+
+    # Block on one shard per call; the rotation moves the wait to the next shard on the following call.
+    block = max(1, _block_ms_antrean() // len(shards))
+    await _isi_stash_konsumen(consumer_id, list(QUEUE_LANES), pools, block=block, shard=shards[0])
+    return _ambil_stash_konsumen(consumer_id, list(QUEUE_LANES))
+
+
+def _block_ms_antrean() -> int:
+    return max(1, int(settings.QUEUE_BLOCK_MS))
+
+
+def _ambil_fallback_untuk_pool(pools: List[str]) -> Optional[Dict[str, Any]]:
+    return _ambil_fallback_stream([_kunci_stream(pool, lane) for lane in QUEUE_LANES for pool in pools])
+
+
+async def dequeue_job(worker_id: str, agent_pool: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """Dequeue a job for a worker of ``agent_pool``, weighted-fair across priority lanes.
+
+    Workers only read the streams of their own pool; the ``global`` pool reads all of them.
+    """
+    if _sedang_mode_fallback_redis():
+        return _ambil_fallback_untuk_pool(await _pool_untuk_konsumen(agent_pool))
 
     if is_mode_legacy_redis_queue():
         try:
-            row = await redis_client.blpop(LIST_JOBS, timeout=1)
+            pools = await _pool_untuk_konsumen(agent_pool)
+            # BLPOP takes whole seconds on Redis < 6, and 0 would block forever.
+            row = await redis_blocking_client.blpop(
+                [_kunci_list_pool(pool) for pool in pools], timeout=max(1, -(-_block_ms_antrean() // 1000))
+            )
             if not row:
                 return None
             payload = row[1] if isinstance(row, (list, tuple)) and len(row) > 1 else None
             if not payload:
                 return None
-            data = json.loads(payload)
+            try:
+                data = json.loads(payload)
+                alasan = _alasan_event_tidak_valid(data)
+            except ValueError:
+                alasan = "unparseable_payload"
+            if alasan:
+                await dead_letter_job(payload, reason=alasan, source_stream=row[0], deliveries=1)
+                return None
             return {"message_id": _id_pesan_fallback_berikutnya(), "data": data}
         except RedisTimeoutError:
             # Blocking pop may timeout when queue is empty; keep polling.
             return None
         except RedisError:
             _aktifkan_mode_fallback()
-            if not _fallback_stream:
-                return None
-            item = _fallback_stream.pop(0)
-            return {"message_id": item["id"], "data": _salin_nilai(item["data"])}
+            return _ambil_fallback_untuk_pool(await _pool_untuk_konsumen(agent_pool))
 
     try:
-        result = await redis_client.xreadgroup(
-            groupname=CG_WORKERS,
-            consumername=worker_id,
-            streams={STREAM_JOBS: ">"},
-            count=1,
-            block=1000,
-        )
-        if not result:
-            return None
-
-        _, messages = result[0]
-        if not messages:
-            return None
-
-        message_id, message_data = messages[0]
-        data = json.loads(message_data["data"])
-        await redis_client.xack(STREAM_JOBS, CG_WORKERS, message_id)
-        return {"message_id": message_id, "data": data}
+        pools = await _pool_untuk_konsumen(agent_pool)
+        return await _dequeue_stream_berbobot(worker_id, pools)
     except RedisTimeoutError:
         # Read timeout on blocking stream read should behave like no data.
         return None
     except ResponseError as exc:
         if _error_stream_tidak_didukung(exc):
             _aktifkan_mode_legacy_redis_queue()
-            return await dequeue_job(worker_id)
+            return await dequeue_job(worker_id, agent_pool)
+        raise
+    except RedisError:
+        _aktifkan_mode_fallback()
+        return _ambil_fallback_untuk_pool(await _pool_untuk_konsumen(agent_pool))
+
+
+def _bagi_kuota_lane(count: int) -> Dict[str, int]:
+    # Floor share per weight; the remainder follows the smooth WRR turn so small batches stay fair.
+    total = sum(_bobot_lane[lane] for lane in QUEUE_LANES)
+    kuota = {lane: count * _bobot_lane[lane] // total for lane in QUEUE_LANES}
+    for _ in range(count - sum(kuota.values())):
+        kuota[_urutan_lane_berbobot(list(QUEUE_LANES))[0]] += 1
+    return kuota
+
+
+async def _baca_batch_per_lane(
+    consumer_id: str, pools: List[str], count: int, shard: Optional[int] = None
+) -> List[Dict[str, Any]]:
+    kuota = _bagi_kuota_lane(count)
+    lanes = [lane for lane in QUEUE_LANES if kuota[lane] > 0]
+    client = _klien_stream(shard)
+
+    def _susun_pipeline():
+        pipe = client.pipeline(transaction=False)
+        for lane in lanes:
+            pipe.xreadgroup(
+                groupname=CG_WORKERS,
+                consumername=consumer_id,
+                streams={_kunci_stream(pool, lane): ">" for pool in pools},
+                count=kuota[lane],
+            )
+        return pipe
+
+    try:
+        results = await _susun_pipeline().execute()
+    except ResponseError as exc:
+        if "NOGROUP" not in str(exc).upper():
+            raise
+        await _pastikan_consumer_group([_kunci_stream(pool, lane) for lane in lanes for pool in pools], shard)
+        results = await _susun_pipeline().execute()
+
+    rows: List[Dict[str, Any]] = []
+    ack_ids: Dict[str, List[str]] = defaultdict(list)
+    dead: List[Dict[str, Any]] = []
+    for result in results:
+        lane_rows, lane_ack_ids, lane_dead = _parse_hasil_xreadgroup(result, shard, consumer_id)
+        rows.extend(lane_rows)
+        dead.extend(lane_dead)
+        for stream, ids in lane_ack_ids.items():
+            ack_ids[stream].extend(ids)
+
+    if ack_ids:
+        # Dead letters are written before the ack so none is lost in between. They live on the main Redis,
+        # so a shard gets its own round trip first; otherwise they share the ack pipeline.
+        if shard is not None and dead:
+            await _simpan_dead_letters_redis(dead)
+            dead = []
+        pipe = client.pipeline(transaction=False)
+        _antrekan_perintah(pipe, _perintah_dead_letter(dead))
+        for stream, ids in ack_ids.items():
+            pipe.xack(stream, CG_WORKERS, *ids)
+        await pipe.execute()
+    return rows
+
+
+def _urutkan_batch_berbobot(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    per_lane: Dict[str, deque] = {lane: deque() for lane in QUEUE_LANES}
+    for row in rows:
+        per_lane[_lane_dari_stream(row.get("stream", ""))].append(row)
+
+    hasil: List[Dict[str, Any]] = []
+    while len(hasil) < len(rows):
+        lane = _urutan_lane_berbobot([lane for lane in QUEUE_LANES if per_lane[lane]])[0]
+        hasil.append(per_lane[lane].popleft())
+    return hasil
+
+
+async def dequeue_jobs(
+    consumer_id: str,
+    agent_pool: Optional[str] = None,
+    *,
+    count: int = 10,
+    block_ms: Optional[int] = 1000,
+) -> List[Dict[str, Any]]:
+    """Dequeue up to ``count`` jobs in one round trip, interleaved weighted-fair across lanes.
+
+    Every lane is read in a single pipelined call with a weight-proportional share of ``count``;
+    only when all lanes are empty does it block on all streams for up to ``block_ms``. Shards are read
+    in a per-consumer rotation, and the blocking wait goes to the first shard of the turn.
+    """
+    batas = max(1, int(count))
+
+    if _sedang_mode_fallback_redis() or is_mode_legacy_redis_queue():
+        rows: List[Dict[str, Any]] = []
+        while len(rows) < batas:
+            row = await dequeue_job(consumer_id, agent_pool)
+            if not row:
+                break
+            rows.append(row)
+            if is_mode_legacy_redis_queue():
+                # BLPOP hands out one entry per call; avoid blocking again once work has arrived.
+                break
+        return rows
+
+    try:
+        pools = await _pool_untuk_konsumen(agent_pool)
+        shards = _urutan_shard(consumer_id)
+        rows = []
+        for shard in shards:
+            if len(rows) >= batas:
+                break
+            rows.extend(await _baca_batch_per_lane(consumer_id, pools, batas - len(rows), shard))
+        if not rows and block_ms:
+            streams = [_kunci_stream(pool, lane) for lane in QUEUE_LANES for pool in pools]
+            # XREADGROUP applies COUNT per stream, so split the budget to keep the batch near ``count``.
+            rows = await _baca_stream_group(
+                consumer_id,
+                streams,
+                count=max(1, batas // len(streams)),
+                block=max(1, int(block_ms) // len(shards)),
+                shard=shards[0],
+            )
+        return _urutkan_batch_berbobot(rows)
+    except RedisTimeoutError:
+        return []
+    except ResponseError as exc:
+        if _error_stream_tidak_didukung(exc):
+            _aktifkan_mode_legacy_redis_queue()
+            return await dequeue_jobs(consumer_id, agent_pool, count=batas, block_ms=block_ms)
         raise
     except RedisError:
         _aktifkan_mode_fallback()
-        if not _fallback_stream:
+        return await dequeue_jobs(consumer_id, agent_pool, count=batas, block_ms=block_ms)
+
+
+async def ack_job(message_id: str, stream: Optional[str] = None, shard: Optional[int] = None) -> None:
+    """Acknowledge a message delivered in deferred-ack mode once its handler has finished.
+
+    ``shard`` is the ``shard`` field of the dequeued row when the queue is sharded.
+    """
+    if not message_id or _sedang_mode_fallback_redis() or is_mode_legacy_redis_queue():
+        return
+
+    try:
+        await _klien_stream(shard).xack(stream or STREAM_JOBS, CG_WORKERS, message_id)
+    except RedisTimeoutError:
+        # The entry stays pending and is reclaimed after the visibility timeout.
+        return
+    except RedisError:
+        _aktifkan_mode_fallback()
+
+
+# XCLAIM with min-idle 0 resets an entry's idle time; the XPENDING check keeps an entry another consumer
+# already reclaimed from being pulled back. JUSTID leaves the delivery count alone.
+_SKRIP_PERPANJANG_KLAIM = """
+local diperpanjang = 0
+for i = 3, #ARGV do
+    local pending = redis.call('XPENDING', KEYS[1], ARGV[1], ARGV[i], ARGV[i], 1, ARGV[2])
+    if #pending > 0 then
+        redis.call('XCLAIM', KEYS[1], ARGV[1], ARGV[2], 0, ARGV[i], 'JUSTID')
+        diperpanjang = diperpanjang + 1
+    end
+end
+return diperpanjang
+"""
+
+
+async def extend_job_claims(rows: List[Dict[str, Any]]) -> int:
+    """Reset the idle time of deferred-ack messages this process still holds, so they are not reclaimed.
+
+    ``rows`` are dequeued rows whose handler is running or that wait in a prefetch buffer; rows parked in
+    a consumer's local lane stash are refreshed too. Entries their consumer no longer owns are skipped.
+    Returns the number of entries refreshed.
+    """
+    if not is_mode_deferred_ack() or _sedang_mode_fallback_redis() or is_mode_legacy_redis_queue():
+        return 0
+
+    per_stream: Dict[Tuple[Optional[int], str, str], List[str]] = defaultdict(list)
+    tersimpan = [row for stash in _stash_konsumen.values() for lane in stash.values() for row in lane]
+    for row in list(rows) + tersimpan:
+        if row.get("ack_pending") and row.get("consumer") and row.get("message_id"):
+            kunci = (row.get("shard"), row.get("stream") or STREAM_JOBS, row["consumer"])
+            per_stream[kunci].append(row["message_id"])
+
+    jumlah = 0
+    for (shard, stream, consumer), ids in per_stream.items():
+        try:
+            jumlah += int(
+                await _klien_stream(shard).eval(_SKRIP_PERPANJANG_KLAIM, 1, stream, CG_WORKERS, consumer, *ids) or 0
+            )
+        except RedisTimeoutError:
+            continue
+        except RedisError:
+            _aktifkan_mode_fallback()
+            return jumlah
+    return jumlah
+
+
+async def _klaim_pesan_via_xpending(
+    stream: str, consumer_id: str, min_idle_ms: int, count: int, shard: Optional[int] = None
+) -> List[Any]:
+    client = _klien_stream(shard)
+    rows = await client.xpending_range(stream, CG_WORKERS, min="-", max="+", count=count)
+    message_ids = [
+        row["message_id"]
+        for row in rows or []
+        if int(row.get("time_since_delivered") or 0) >= min_idle_ms
+    ]
+    if not message_ids:
+        return []
+    return await client.xclaim(stream, CG_WORKERS, consumer_id, min_idle_ms, message_ids)
+
+
+async def _klaim_pesan_stream(
+    stream: str, consumer_id: str, min_idle_ms: int, count: int, shard: Optional[int] = None
+) -> List[Any]:
+    try:
+        result = await _klien_stream(shard).xautoclaim(
+            stream,
+            CG_WORKERS,
+            consumer_id,
+            min_idle_time=min_idle_ms,
+            start_id="0-0",
+            count=count,
+        )
+        return result[1] if isinstance(result, (list, tuple)) and len(result) > 1 else []
+    except ResponseError as exc:
+        if "NOGROUP" in str(exc).upper():
+            return []
+        if not _error_xautoclaim_tidak_didukung(exc):
+            raise
+    # Redis < 6.2: emulate XAUTOCLAIM with XPENDING + XCLAIM.
+    return await _klaim_pesan_via_xpending(stream, consumer_id, min_idle_ms, count, shard)
+
+
+async def reclaim_stalled_jobs(
+    consumer_id: str,
+    *,
+    agent_pool: Optional[str] = None,
+    min_idle_ms: Optional[int] = None,
+    count: Optional[int] = None,
+) -> List[Dict[str, Any]]:
+    """Claim messages of ``agent_pool`` left pending by dead consumers past the visibility timeout."""
+    if not is_mode_deferred_ack() or _sedang_mode_fallback_redis() or is_mode_legacy_redis_queue():
+        return []
+
+    idle = max(1000, int(min_idle_ms if min_idle_ms is not None else settings.QUEUE_VISIBILITY_TIMEOUT_MS))
+    batas = max(1, int(count if count is not None else settings.QUEUE_RECLAIM_BATCH))
+
+    try:
+        pools = await _pool_untuk_konsumen(agent_pool)
+    except RedisError:
+        return []
+
+    rows: List[Dict[str, Any]] = []
+    streams = [_kunci_stream(pool, lane) for lane in QUEUE_LANES for pool in pools]
+    for shard, stream in [(shard, stream) for shard in _daftar_shard() for stream in streams]:
+        if len(rows) >= batas:
+            break
+        try:
+            messages = await _klaim_pesan_stream(stream, consumer_id, idle, batas - len(rows), shard)
+        except RedisTimeoutError:
+            return rows
+        except RedisError:
+            _aktifkan_mode_fallback()
+            return rows
+
+        try:
+            deliveries = await _jumlah_pengiriman(stream, consumer_id, messages, shard)
+        except RedisError:
+            deliveries = {}
+        for message_id, message_data in messages or []:
+            raw = (message_data or {}).get("data") if isinstance(message_data, dict) else None
+            try:
+                data = json.loads(raw)
+                alasan = _alasan_event_tidak_valid(data)
+            except (TypeError, ValueError):
+                alasan = "unparseable_payload"
+            jumlah = deliveries.get(message_id, 0)
+            if not alasan and jumlah > max(1, int(settings.QUEUE_MAX_DELIVERIES)):
+                # Every earlier delivery died mid-handler; stop feeding it to workers.
+                alasan = "max_deliveries"
+            if alasan:
+                await dead_letter_job(
+                    raw, reason=alasan, source_stream=stream, source_message_id=message_id, deliveries=jumlah
+                )
+                await ack_job(message_id, stream, shard)
+                continue
+            row = {
+                "message_id": message_id,
+                "data": data,
+                "stream": stream,
+                "ack_pending": True,
+                "reclaimed": True,
+                "deliveries": jumlah,
+                "consumer": consumer_id,
+            }
+            if shard is not None:
+                row["shard"] = shard
+            rows.append(row)
+    return rows
+
+
+async def _jumlah_pengiriman(
+    stream: str, consumer_id: str, messages: List[Any], shard: Optional[int] = None
+) -> Dict[str, int]:
+    """Delivery counts (claims included) of freshly claimed messages, read from the consumer's PEL."""
+    ids = [message_id for message_id, _ in messages or []]
+    if not ids:
+        return {}
+    rows = await _klien_stream(shard).xpending_range(
+        stream,
+        CG_WORKERS,
+        min=min(ids, key=_urutan_id_stream),
+        max=max(ids, key=_urutan_id_stream),
+        count=max(100, len(ids) * 2),
+        consumername=consumer_id,
+    )
+    return {row["message_id"]: int(row.get("times_delivered") or 0) for row in rows or []}
+
+
+def _buat_dead_letter(
+    payload: Any,
+    *,
+    reason: str,
+    error: str = "",
+    source_stream: str = "",
+    source_message_id: str = "",
+    deliveries: int = 0,
+) -> Dict[str, Any]:
+    # The payload is kept verbatim (it may not be JSON); run/job IDs are lifted out when readable.
+    raw = payload if isinstance(payload, str) or payload is None else json.dumps(payload)
+    data = payload if isinstance(payload, dict) else None
+    if data is None and raw:
+        try:
+            data = json.loads(raw)
+        except ValueError:
+            data = None
+    data = data if isinstance(data, dict) else {}
+    return {
+        "reason": str(reason or "").strip(),
+        "error": str(error or "")[:2000],
+        "payload": raw,
+        "run_id": str(data.get("run_id") or ""),
+        "job_id": str(data.get("job_id") or ""),
+        "source_stream": str(source_stream or ""),
+        "source_message_id": str(source_message_id or ""),
+        "deliveries": int(deliveries or 0),
+        "dead_at": _sekarang_iso(),
+    }
+
+
+def _perintah_dead_letter(entries: List[Dict[str, Any]]) -> List[Tuple[str, tuple]]:
+    return [
+        ("xadd", (DEAD_LETTER_STREAM, {"data": json.dumps(entry)}, "*", settings.DEAD_LETTER_MAXLEN, True))
+        for entry in entries
+    ]
+
+
+async def _simpan_dead_letters_redis(entries: List[Dict[str, Any]]) -> None:
+    pipe = redis_client.pipeline(transaction=False)
+    _antrekan_perintah(pipe, _perintah_dead_letter(entries))
+    await pipe.execute()
+
+
+def _simpan_fallback_dead_letter(entry: Dict[str, Any]) -> None:
+    _fallback_dead_letters.append(entry)
+    _catat_jurnal_fallback("dead_letter_push", entry)
+
+
+def _hapus_fallback_dead_letters(ids: List[str]) -> int:
+    target = set(ids)
+    sisa = [entry for entry in _fallback_dead_letters if entry.get("dead_letter_id") not in target]
+    terhapus = len(_fallback_dead_letters) - len(sisa)
+    _fallback_dead_letters.clear()
+    _fallback_dead_letters.extend(sisa)
+    if terhapus:
+        _catat_jurnal_fallback("dead_letter_drop", sorted(target))
+    return terhapus
+
+
+def _dead_letter_dari_stream(message_id: str, fields: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    try:
+        entry = json.loads((fields or {})["data"])
+    except (KeyError, TypeError, ValueError):
+        return None
+    entry["dead_letter_id"] = message_id
+    return entry
+
+
+async def dead_letter_job(
+    payload: Any,
+    *,
+    reason: str,
+    error: str = "",
+    source_stream: str = "",
+    source_message_id: str = "",
+    deliveries: int = 0,
+) -> str:
+    """Park a message that cannot (or can no longer) be processed; returns its dead-letter ID."""
+    entry = _buat_dead_letter(
+        payload,
+        reason=reason,
+        error=error,
+        source_stream=source_stream,
+        source_message_id=source_message_id,
+        deliveries=deliveries,
+    )
+    if not _sedang_mode_fallback_redis():
+        try:
+            if is_mode_legacy_redis_queue():
+                entry["dead_letter_id"] = _id_pesan_fallback_berikutnya()
+                await redis_client.lpush(DEAD_LETTER_LIST, json.dumps(entry))
+                await redis_client.ltrim(DEAD_LETTER_LIST, 0, max(1, int(settings.DEAD_LETTER_MAXLEN)) - 1)
+                return entry["dead_letter_id"]
+            return await redis_client.xadd(
+                DEAD_LETTER_STREAM,
+                {"data": json.dumps(entry)},
+                maxlen=settings.DEAD_LETTER_MAXLEN,
+                approximate=True,
+            )
+        except RedisError:
+            _aktifkan_mode_fallback()
+
+    entry["dead_letter_id"] = _id_pesan_fallback_berikutnya()
+    _simpan_fallback_dead_letter(entry)
+    return entry["dead_letter_id"]
+
+
+async def _baca_dead_letters(count: int, *, terbaru_dulu: bool = True) -> List[Dict[str, Any]]:
+    if _sedang_mode_fallback_redis():
+        rows = list(_fallback_dead_letters)
+        if terbaru_dulu:
+            rows.reverse()
+        return [_salin_nilai(entry) for entry in rows[:count]]
+
+    if is_mode_legacy_redis_queue():
+        # LPUSHed, so the head of the list is the newest entry.
+        raws = await redis_client.lrange(DEAD_LETTER_LIST, 0, -1 if not terbaru_dulu else count - 1)
+        if not terbaru_dulu:
+            raws = list(reversed(raws))[:count]
+        return [json.loads(raw) for raw in raws]
+
+    if terbaru_dulu:
+        rows = await redis_client.xrevrange(DEAD_LETTER_STREAM, count=count)
+    else:
+        rows = await redis_client.xrange(DEAD_LETTER_STREAM, count=count)
+    return [entry for entry in (_dead_letter_dari_stream(message_id, fields) for message_id, fields in rows) if entry]
+
+
+async def list_dead_letters(limit: int = 50, reason: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Newest dead letters first, optionally only those with ``reason``."""
+    batas = max(1, int(limit))
+    filter_reason = str(reason or "").strip()
+    # A reason filter may skip entries, so read the whole (capped) store in that case.
+    count = max(batas, int(settings.DEAD_LETTER_MAXLEN)) if filter_reason else batas
+    try:
+        rows = await _baca_dead_letters(count)
+    except RedisError:
+        _aktifkan_mode_fallback()
+        rows = await _baca_dead_letters(count)
+    if filter_reason:
+        rows = [entry for entry in rows if entry.get("reason") == filter_reason]
+    return rows[:batas]
+
+
+async def get_dead_letter(dead_letter_id: str) -> Optional[Dict[str, Any]]:
+    target = str(dead_letter_id or "").strip()
+    if not target:
+        return None
+
+    if not _sedang_mode_fallback_redis() and not is_mode_legacy_redis_queue():
+        try:
+            rows = await redis_client.xrange(DEAD_LETTER_STREAM, min=target, max=target, count=1)
+            return _dead_letter_dari_stream(*rows[0]) if rows else None
+        except ResponseError:
+            # Not a stream ID.
             return None
-        item = _fallback_stream.pop(0)
-        return {"message_id": item["id"], "data": _salin_nilai(item["data"])}
+        except RedisError:
+            _aktifkan_mode_fallback()
+
+    for entry in await list_dead_letters(limit=int(settings.DEAD_LETTER_MAXLEN)):
+        if entry.get("dead_letter_id") == target:
+            return entry
+    return None
+
+
+async def _hapus_dead_letters(ids: List[str]) -> int:
+    if not ids:
+        return 0
+    if _sedang_mode_fallback_redis():
+        return _hapus_fallback_dead_letters(ids)
+
+    try:
+        if is_mode_legacy_redis_queue():
+            target = set(ids)
+            terhapus = 0
+            for raw in await redis_client.lrange(DEAD_LETTER_LIST, 0, -1):
+                if json.loads(raw).get("dead_letter_id") in target:
+                    terhapus += int(await redis_client.lrem(DEAD_LETTER_LIST, 1, raw) or 0)
+            return terhapus
+        return int(await redis_client.xdel(DEAD_LETTER_STREAM, *ids) or 0)
+    except RedisError:
+        _aktifkan_mode_fallback()
+        return _hapus_fallback_dead_letters(ids)
+
+
+async def requeue_dead_letters(dead_letter_ids: List[str]) -> Dict[str, List[str]]:
+    """Enqueue the original events again and drop them from the dead-letter store.
+
+    Entries whose payload still is not a valid event stay where they are and are reported as failed.
+    """
+    hasil: Dict[str, List[str]] = {"requeued": [], "failed": [], "missing": []}
+    for dead_letter_id in dict.fromkeys(str(item or "").strip() for item in dead_letter_ids):
+        if not dead_letter_id:
+            continue
+        entry = await get_dead_letter(dead_letter_id)
+        if not entry:
+            hasil["missing"].append(dead_letter_id)
+            continue
+        try:
+            data = json.loads(entry.get("payload") or "")
+        except ValueError:
+            data = None
+        if _alasan_event_tidak_valid(data):
+            hasil["failed"].append(dead_letter_id)
+            continue
+        # The original run_id/attempt may still be inside the dedup window; the dead letter is its own enqueue.
+        await enqueue_job(data, idempotency_key=f"dead_letter:{dead_letter_id}")
+        await _hapus_dead_letters([dead_letter_id])
+        hasil["requeued"].append(dead_letter_id)
+    return hasil
+
+
+async def purge_dead_letters(dead_letter_ids: Optional[List[str]] = None, reason: Optional[str] = None) -> int:
+    """Delete the given dead letters, those with ``reason``, or (neither given) all of them."""
+    if dead_letter_ids:
+        return await _hapus_dead_letters([str(item) for item in dead_letter_ids])
+    if reason:
+        rows = await list_dead_letters(limit=int(settings.DEAD_LETTER_MAXLEN), reason=reason)
+        return await _hapus_dead_letters([entry["dead_letter_id"] for entry in rows])
+
+    if _sedang_mode_fallback_redis():
+        return _hapus_fallback_dead_letters([entry.get("dead_letter_id") for entry in _fallback_dead_letters])
+    try:
+        if is_mode_legacy_redis_queue():
+            jumlah = int(await redis_client.llen(DEAD_LETTER_LIST) or 0)
+            await redis_client.delete(DEAD_LETTER_LIST)
+            return jumlah
+        jumlah = int(await redis_client.xlen(DEAD_LETTER_STREAM) or 0)
+        await redis_client.delete(DEAD_LETTER_STREAM)
+        return jumlah
+    except RedisError:
+        _aktifkan_mode_fallback()
+        return _hapus_fallback_dead_letters([entry.get("dead_letter_id") for entry in _fallback_dead_letters])
+
+
+async def replay_dead_letters(
+    limit: int = 100,
+    *,
+    rate_per_sec: Optional[int] = None,
+    reason: Optional[str] = None,
+) -> Dict[str, int]:
+    """Requeue up to ``limit`` dead letters, oldest first, at most ``rate_per_sec`` per second."""
+    batas = max(1, int(limit))
+    laju = max(1, int(rate_per_sec if rate_per_sec is not None else settings.DEAD_LETTER_REPLAY_RATE))
+    filter_reason = str(reason or "").strip()
+    count = max(batas, int(settings.DEAD_LETTER_MAXLEN)) if filter_reason else batas
+    try:
+        rows = await _baca_dead_letters(count, terbaru_dulu=False)
+    except RedisError:
+        _aktifkan_mode_fallback()
+        rows = await _baca_dead_letters(count, terbaru_dulu=False)
+    ids = [entry["dead_letter_id"] for entry in rows if not filter_reason or entry.get("reason") == filter_reason]
+    ids = ids[:batas]
+
+    total = {"requeued": 0, "failed": 0, "missing": 0}
+    for start in range(0, len(ids), laju):
+        if start:
+            await asyncio.sleep(1.0)
+        hasil = await requeue_dead_letters(ids[start : start + laju])
+        for key in total:
+            total[key] += len(hasil[key])
+    return total
+
+
+# Claims up to ARGV[2] due members in one atomic step so concurrent schedulers never return the same
+# entry twice. Used where the caller enqueues the claimed entries itself.
+_SKRIP_KLAIM_DELAYED = """
+local due = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, tonumber(ARGV[2]))
+for _, member in ipairs(due) do
+    redis.call('ZREM', KEYS[1], member)
+end
+return due
+"""
+
+# Moves due members of one target stream. KEYS: delayed zset, the stream, then the dedup keys.
+# ARGV: dedup TTL, then (member, payload, index of its dedup key in KEYS or 0) triples. Members another
+# scheduler already moved are skipped; enqueue before ZREM so a failing XADD leaves the member scheduled.
+_SKRIP_PROMOSI_DELAYED = _LUA_ENQUEUE_IDEMPOTEN + """
+local hasil = {}
+for i = 2, #ARGV, 3 do
+    local member = ARGV[i]
+    if redis.call('ZSCORE', KEYS[1], member) then
+        local indeks = tonumber(ARGV[i + 2])
+        local dedup_key = nil
+        if indeks > 0 then dedup_key = KEYS[indeks] end
+        local message_id = enqueue_idempoten(dedup_key, KEYS[2], ARGV[i + 1], tonumber(ARGV[1]))[1]
+        redis.call('ZREM', KEYS[1], member)
+        table.insert(hasil, {member, message_id})
+    end
+end
+return hasil
+"""
+
+
+def _member_delayed(stream: str, payload: str) -> str:
+    return f"{stream}\n{payload}"
+
+
+def _pisah_member_delayed(member: str) -> Tuple[Optional[str], str]:
+    # Entries written before routing was stored are bare JSON payloads.
+    if member.startswith("{"):
+        return None, member
+    stream, _, payload = member.partition("\n")
+    return stream, payload
+
+
+def _tujuan_member_delayed(member: str) -> Tuple[str, str, Dict[str, Any]]:
+    """Target stream, payload and event of a delayed member."""
+    stream, payload = _pisah_member_delayed(member)
+    data = json.loads(payload)
+    stream = stream or _kunci_stream(_normalisasi_agent_pool(data.get("agent_pool")), _lane_dari_event(data))
+    return stream, payload, data
+
+
+def _batas_promosi_delayed(limit: Optional[int]) -> int:
+    return max(1, int(limit if limit is not None else settings.SCHEDULER_DUE_BATCH_LIMIT))
+
+
+def _jadwalkan_fallback_delayed(score: int, member: str) -> None:
+    global _fallback_stream_seq
+    _fallback_stream_seq += 1
+    heapq.heappush(_fallback_delayed, (score, _fallback_stream_seq, member))
+    _catat_jurnal_fallback("delayed_push", score, _fallback_stream_seq, member)
+
+
+def _klaim_fallback_delayed(now: int, limit: int) -> List[str]:
+    due: List[str] = []
+    while _fallback_delayed and _fallback_delayed[0][0] <= now and len(due) < limit:
+        due.append(heapq.heappop(_fallback_delayed)[2])
+    if due:
+        _catat_jurnal_fallback("delayed_pop", len(due))
+    return due
+
+
+def _promosi_fallback_delayed(now: int, limit: int) -> List[Dict[str, Any]]:
+    rows: List[Dict[str, Any]] = []
+    for member in _klaim_fallback_delayed(now, limit):
+        stream, _, data = _tujuan_member_delayed(member)
+        rows.append({"data": data, "message_id": _enqueue_fallback_idempoten(stream, data, _kunci_dedup(data, None))})
+    return rows
 
 
 async def schedule_delayed_job(event: Union[QueueEvent, Dict[str, Any]], delay_seconds: int):
     """Schedule a job to be processed after a delay."""
     score = int(time.time()) + max(0, delay_seconds)
-    payload = json.dumps(_ke_dict_event(event))
+    event_data = _ke_dict_event(event)
+    pool = _normalisasi_agent_pool(event_data.get("agent_pool"))
+    member = _member_delayed(_kunci_stream(pool, _lane_dari_event(event_data)), json.dumps(event_data))
 
     if _sedang_mode_fallback_redis():
-        _fallback_delayed.append({"score": score, "payload": payload})
+        _jadwalkan_fallback_delayed(score, member)
         return
 
     try:
-        await redis_client.zadd(ZSET_DELAYED, {payload: score})
+        await _daftarkan_pool(pool)
+        await redis_client.zadd(ZSET_DELAYED, {member: score})
     except RedisError:
         _aktifkan_mode_fallback()
-        _fallback_delayed.append({"score": score, "payload": payload})
+        _jadwalkan_fallback_delayed(score, member)
+
+
+async def _klaim_delayed_redis(now: int, limit: int) -> List[str]:
+    return list(await redis_client.eval(_SKRIP_KLAIM_DELAYED, 1, ZSET_DELAYED, now, limit) or [])
+
+
+async def _promosi_delayed_redis(now: int, limit: int) -> List[Dict[str, Any]]:
+    due = await redis_client.zrangebyscore(ZSET_DELAYED, "-inf", now, start=0, num=limit)
+    per_stream: Dict[str, List[Tuple[str, str, Dict[str, Any]]]] = defaultdict(list)
+    for member in due or []:
+        stream, payload, data = _tujuan_member_delayed(member)
+        per_stream[stream].append((member, payload, data))
+
+    rows: List[Dict[str, Any]] = []
+    for stream, entries in per_stream.items():
+        # Every key the script touches is declared, so it stays valid on a cluster.
+        keys = [ZSET_DELAYED, stream]
+        args: List[Any] = [_ttl_dedup()]
+        data_member: Dict[str, Dict[str, Any]] = {}
+        for member, payload, data in entries:
+            dedup_key = _kunci_dedup(data, None)
+            if dedup_key:
+                keys.append(dedup_key)
+            args.extend([member, payload, len(keys) if dedup_key else 0])
+            data_member[member] = data
+        hasil = await redis_client.eval(_SKRIP_PROMOSI_DELAYED, len(keys), *keys, *args)
+        rows.extend({"data": data_member[member], "message_id": message_id} for member, message_id in hasil or [])
+    return rows
+
+
+async def promote_due_jobs(limit: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Atomically move up to ``limit`` due delayed jobs into their job streams.
+
+    Each row is ``{"data": event, "message_id": id}``. Promotion goes through the idempotent enqueue, so a
+    retry whose ``<run_id>:<attempt>`` is still in the dedup window returns the original message ID.
+    ``message_id`` is None when the entry could not be moved server-side (legacy list queue or sharded
+    queue); the caller must enqueue it.
+    """
+    now = int(time.time())
+    batas = _batas_promosi_delayed(limit)
 
+    if _sedang_mode_fallback_redis():
+        return _promosi_fallback_delayed(now, batas)
 
-async def get_due_jobs() -> List[Dict[str, Any]]:
-    """Get all jobs that are due (timestamp <= now)."""
+    try:
+        if is_mode_legacy_redis_queue() or is_mode_sharded_queue():
+            # Shard streams live on another instance, out of reach of the script.
+            claimed = await _klaim_delayed_redis(now, batas)
+            return [{"data": json.loads(_pisah_member_delayed(member)[1]), "message_id": None} for member in claimed]
+        return await _promosi_delayed_redis(now, batas)
+    except ResponseError as exc:
+        if not _error_stream_tidak_didukung(exc):
+            raise
+        _aktifkan_mode_legacy_redis_queue()
+        return await promote_due_jobs(limit=batas)
+    except RedisError:
+        _aktifkan_mode_fallback()
+        return _promosi_fallback_delayed(now, batas)
+
+
+async def get_due_jobs(limit: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Claim up to ``limit`` due delayed jobs without enqueueing them."""
     now = int(time.time())
+    batas = _batas_promosi_delayed(limit)
 
     if _sedang_mode_fallback_redis():
-        due_payloads: List[str] = []
-        remaining: List[Dict[str, Any]] = []
-        for item in _fallback_delayed:
-            if int(item["score"]) <= now:
-                due_payloads.append(item["payload"])
-            else:
-                remaining.append(item)
-        _fallback_delayed[:] = remaining
-        return [json.loads(payload) for payload in due_payloads]
+        return [json.loads(_pisah_member_delayed(member)[1]) for member in _klaim_fallback_delayed(now, batas)]
 
     try:
-        rows = await redis_client.zrangebyscore(ZSET_DELAYED, min=0, max=now, withscores=True)
-        if not rows:
-            return []
-
-        payloads = [row[0] for row in rows]
-        await redis_client.zrem(ZSET_DELAYED, *payloads)
-        return [json.loads(payload) for payload in payloads]
+        claimed = await _klaim_delayed_redis(now, batas)
     except RedisError:
         _aktifkan_mode_fallback()
-        due_payloads: List[str] = []
-        remaining: List[Dict[str, Any]] = []
-        for item in _fallback_delayed:
-            if int(item["score"]) <= now:
-                due_payloads.append(item["payload"])
-            else:
-                remaining.append(item)
-        _fallback_delayed[:] = remaining
-        return [json.loads(payload) for payload in due_payloads]
+        return [json.loads(_pisah_member_delayed(member)[1]) for member in _klaim_fallback_delayed(now, batas)]
+    return [json.loads(_pisah_member_delayed(member)[1]) for member in claimed]
 
 
 def _buat_job_spec_version(
@@ -443,6 +2021,109 @@ def _buat_job_spec_version(
     }
 
 
+def _simpan_fallback_versi(job_id: str, row: Dict[str, Any], batas: int) -> None:
+    rows = _fallback_job_spec_versions[job_id]
+    rows.insert(0, row)
+    del rows[batas:]
+    _catat_jurnal_fallback("version_push", job_id, row, batas)
+
+
+# Pushes a stored version row only if "_head" is still what the caller diffed against, then trims the
+# list (dropping trimmed version_ids from the index). Returns 0 when another writer got there first.
+_SKRIP_TAMBAH_VERSI_SPEC = """
+local head = redis.call('HGET', KEYS[2], '_head')
+if (head or '') ~= ARGV[1] then
+    return 0
+end
+redis.call('LPUSH', KEYS[1], ARGV[2])
+redis.call('HSET', KEYS[2], '_head', ARGV[4], ARGV[3], ARGV[4])
+local akhir = tonumber(ARGV[5])
+for _, raw in ipairs(redis.call('LRANGE', KEYS[1], akhir + 1, -1)) do
+    local ok, row = pcall(cjson.decode, raw)
+    if ok and type(row) == 'table' and row['version_id'] then
+        redis.call('HDEL', KEYS[2], row['version_id'])
+    end
+end
+redis.call('LTRIM', KEYS[1], 0, akhir)
+return 1
+"""
+
+
+def _rakit_versi(raw_rows: List[Any]) -> List[Dict[str, Any]]:
+    """Stored rows (newest first) -> public rows with full specs; rows cut off from their snapshot are skipped."""
+    rows: List[Dict[str, Any]] = []
+    spec: Optional[Dict[str, Any]] = None
+    for item in reversed(raw_rows):
+        row = json.loads(item) if isinstance(item, (str, bytes)) else item
+        if not isinstance(row, dict):
+            continue
+        patch = row.pop("patch", None)
+        row.pop("seq", None)
+        if isinstance(row.get("spec"), dict):
+            spec = row["spec"]
+        elif patch is not None and spec is not None:
+            spec = apply_patch(spec, patch)
+            row["spec"] = spec
+        else:
+            spec = None
+            continue
+        rows.append(row)
+    rows.reverse()
+    return rows
+
+
+def _akhir_trim_versi(seq: int, batas: int) -> int:
+    # The oldest kept row must be a snapshot, so the cut lands on a snapshot boundary and up to
+    # JOB_SPEC_VERSION_SNAPSHOT_EVERY - 1 extra rows may be kept.
+    tertua = seq - batas + 1
+    if tertua <= 0:
+        return batas - 1
+    return seq - (tertua - tertua % JOB_SPEC_VERSION_SNAPSHOT_EVERY)
+
+
+async def _versi_redis_dari_seq(job_id: str, seq: int, head: int) -> Optional[Dict[str, Any]]:
+    """The version at ``seq``: one LRANGE from it back to its snapshot (at most SNAPSHOT_EVERY rows)."""
+    basis = seq - seq % JOB_SPEC_VERSION_SNAPSHOT_EVERY
+    raw_rows = await redis_client.lrange(_kunci_job_spec_versions(job_id), head - seq, head - basis)
+    rows = _rakit_versi(raw_rows)
+    return rows[0] if rows else None
+
+
+async def _tambah_versi_redis(job_id: str, row: Dict[str, Any], batas: int) -> None:
+    key = _kunci_job_spec_versions(job_id)
+    index_key = _kunci_index_versi(job_id)
+    for _ in range(5):
+        head_raw = await redis_client.hget(index_key, "_head")
+        seq = int(head_raw) + 1 if head_raw is not None else 0
+        stored = {field: value for field, value in row.items() if field != "spec"}
+        stored["seq"] = seq
+        sebelumnya = None
+        if seq % JOB_SPEC_VERSION_SNAPSHOT_EVERY:
+            sebelumnya = await _versi_redis_dari_seq(job_id, seq - 1, seq - 1)
+        if sebelumnya is None:
+            stored["spec"] = row["spec"]
+        else:
+            stored["patch"] = make_patch(sebelumnya["spec"], row["spec"])
+
+        ditulis = await redis_client.eval(
+            _SKRIP_TAMBAH_VERSI_SPEC,
+            2,
+            key,
+            index_key,
+            "" if head_raw is None else str(head_raw),
+            json.dumps(stored),
+            row["version_id"],
+            str(seq),
+            str(_akhir_trim_versi(seq, batas)),
+        )
+        if int(ditulis or 0):
+            return
+    # Persistent contention on one job: store a snapshot without the CAS so the version is not lost.
+    await redis_client.lpush(key, json.dumps(row))
+    await redis_client.ltrim(key, 0, batas - 1)
+    await redis_client.delete(index_key)
+
+
 async def append_job_spec_version(
     job_id: str,
     spec: Dict[str, Any],
@@ -453,23 +2134,17 @@ async def append_job_spec_version(
     max_versions: int = JOB_SPEC_VERSIONS_MAX,
 ) -> Dict[str, Any]:
     row = _buat_job_spec_version(job_id, spec, source=source, actor=actor, note=note)
-    key = _kunci_job_spec_versions(job_id)
     batas = max(1, int(max_versions))
 
     if _sedang_mode_fallback_redis():
-        rows = _fallback_job_spec_versions[job_id]
-        rows.insert(0, _salin_nilai(row))
-        del rows[batas:]
+        _simpan_fallback_versi(job_id, _salin_nilai(row), batas)
         return row
 
     try:
-        await redis_client.lpush(key, json.dumps(row))
-        await redis_client.ltrim(key, 0, batas - 1)
+        await _tambah_versi_redis(job_id, row, batas)
     except RedisError:
         _aktifkan_mode_fallback()
-        rows = _fallback_job_spec_versions[job_id]
-        rows.insert(0, _salin_nilai(row))
-        del rows[batas:]
+        _simpan_fallback_versi(job_id, _salin_nilai(row), batas)
     return row
 
 
@@ -481,13 +2156,11 @@ async def list_job_spec_versions(job_id: str, limit: int = 20) -> List[Dict[str,
         return [_salin_nilai(row) for row in rows[:safe_limit]]
 
     try:
-        raw_rows = await redis_client.lrange(_kunci_job_spec_versions(job_id), 0, safe_limit - 1)
-        rows: List[Dict[str, Any]] = []
-        for item in raw_rows:
-            row = json.loads(item)
-            if isinstance(row, dict):
-                rows.append(row)
-        return rows
+        # Read past the limit far enough to reach the snapshot the oldest requested row is based on.
+        raw_rows = await redis_client.lrange(
+            _kunci_job_spec_versions(job_id), 0, safe_limit + JOB_SPEC_VERSION_SNAPSHOT_EVERY - 2
+        )
+        return _rakit_versi(raw_rows)[:safe_limit]
     except RedisError:
         _aktifkan_mode_fallback()
         rows = _fallback_job_spec_versions.get(job_id, [])
@@ -499,6 +2172,17 @@ async def get_job_spec_version(job_id: str, version_id: str, limit_scan: int = 5
     if not target_id:
         return None
 
+    if not _sedang_mode_fallback_redis():
+        try:
+            seq_raw, head_raw = await redis_client.hmget(_kunci_index_versi(job_id), [target_id, "_head"])
+            if seq_raw is not None and head_raw is not None:
+                row = await _versi_redis_dari_seq(job_id, int(seq_raw), int(head_raw))
+                if row and row.get("version_id") == target_id:
+                    return row
+        except RedisError:
+            _aktifkan_mode_fallback()
+
+    # Fallback memory, rows written before the index existed, or a head that moved mid-read.
     rows = await list_job_spec_versions(job_id, limit=max(1, int(limit_scan)))
     for row in rows:
         if str(row.get("version_id") or "").strip() == target_id:
@@ -534,6 +2218,12 @@ async def rollback_job_spec_to_version(
     return await get_job_spec(job_id)
 
 
+def _simpan_fallback_spec(job_id: str, spec: Dict[str, Any]) -> None:
+    _fallback_job_specs[job_id] = spec
+    _fallback_job_all.add(job_id)
+    _catat_jurnal_fallback("spec_set", job_id, spec)
+
+
 async def save_job_spec(
     job_id: str,
     spec: Dict[str, Any],
@@ -545,85 +2235,163 @@ async def save_job_spec(
 ):
     """Save job specification to Redis."""
     if _sedang_mode_fallback_redis():
-        _fallback_job_specs[job_id] = _salin_nilai(spec)
-        _fallback_job_all.add(job_id)
+        _simpan_fallback_spec(job_id, _salin_nilai(spec))
         if save_version:
             await append_job_spec_version(job_id, spec, source=source, actor=actor, note=note)
         return
 
     try:
-        await redis_client.set(f"{JOB_SPEC_PREFIX}{job_id}", json.dumps(spec))
-        await redis_client.sadd(JOB_ALL_SET, job_id)
+        pipe = redis_client.pipeline(transaction=True)
+        pipe.set(f"{JOB_SPEC_PREFIX}{job_id}", json.dumps(spec))
+        pipe.sadd(JOB_ALL_SET, job_id)
+        pipe.hincrby(JOB_SPEC_REV_HASH, job_id, 1)
+        pipe.incr(JOB_SPEC_REV_GLOBAL)
+        _, _, revisi, _ = await pipe.execute()
+        _cache_job_spec[job_id] = (int(revisi), _salin_nilai(spec))
         if save_version:
             await append_job_spec_version(job_id, spec, source=source, actor=actor, note=note)
     except RedisError:
         _aktifkan_mode_fallback()
-        _fallback_job_specs[job_id] = _salin_nilai(spec)
-        _fallback_job_all.add(job_id)
+        _simpan_fallback_spec(job_id, _salin_nilai(spec))
         if save_version:
             await append_job_spec_version(job_id, spec, source=source, actor=actor, note=note)
 
 
-async def get_job_spec(job_id: str) -> Optional[Dict[str, Any]]:
-    """Get job specification from Redis."""
+async def _validasi_cache_job_spec() -> None:
+    """Drop cached specs whose revision moved; costs one GET per check interval while nothing changes."""
+    sekarang = time.monotonic()
+    if sekarang - float(_cache_job_spec_meta["checked_at"]) < max(0.0, float(settings.JOB_SPEC_CACHE_CHECK_SEC)):
+        return
+    _cache_job_spec_meta["checked_at"] = sekarang
+    global_rev = await redis_client.get(JOB_SPEC_REV_GLOBAL)
+    if global_rev == _cache_job_spec_meta["global_rev"]:
+        return
+    if _cache_job_spec:
+        revisi = await redis_client.hgetall(JOB_SPEC_REV_HASH)
+        for job_id, (rev_cache, _) in list(_cache_job_spec.items()):
+            if int(revisi.get(job_id) or 0) != rev_cache:
+                _cache_job_spec.pop(job_id, None)
+    _cache_job_spec_meta["global_rev"] = global_rev
+
+
+async def get_job_spec(job_id: str) -> Optional[Dict[str, Any]]:
+    """Get job specification, served from the process cache while its revision is current."""
+    if _sedang_mode_fallback_redis():
+        spec = _fallback_job_specs.get(job_id)
+        return _salin_nilai(spec) if spec else None
+
+    try:
+        await _validasi_cache_job_spec()
+        cached = _cache_job_spec.get(job_id)
+        if cached is not None:
+            return _salin_nilai(cached[1])
+
+        pipe = redis_client.pipeline(transaction=True)
+        pipe.get(f"{JOB_SPEC_PREFIX}{job_id}")
+        pipe.hget(JOB_SPEC_REV_HASH, job_id)
+        payload, revisi = await pipe.execute()
+        if not payload:
+            return None
+        spec = json.loads(payload)
+        _cache_job_spec[job_id] = (int(revisi or 0), spec)
+        return _salin_nilai(spec)
+    except RedisError:
+        _aktifkan_mode_fallback()
+        spec = _fallback_job_specs.get(job_id)
+        return _salin_nilai(spec) if spec else None
+
+
+async def _muat_chunk_job_spec(job_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    pipe = redis_client.pipeline(transaction=True)
+    pipe.mget([f"{JOB_SPEC_PREFIX}{job_id}" for job_id in job_ids])
+    pipe.hmget(JOB_SPEC_REV_HASH, job_ids)
+    payloads, daftar_revisi = await pipe.execute()
+
+    specs: Dict[str, Dict[str, Any]] = {}
+    for job_id, payload, revisi in zip(job_ids, payloads, daftar_revisi):
+        if not payload:
+            continue
+        spec = json.loads(payload)
+        _cache_job_spec[job_id] = (int(revisi or 0), spec)
+        specs[job_id] = spec
+    return specs
+
+
+async def _muat_job_specs(job_ids: List[str]) -> List[Dict[str, Any]]:
+    """Specs for ``job_ids`` in order; cache misses are fetched in concurrent MGET chunks."""
+    if _sedang_mode_fallback_redis():
+        return [_salin_nilai(_fallback_job_specs[job_id]) for job_id in job_ids if _fallback_job_specs.get(job_id)]
+
+    await _validasi_cache_job_spec()
+    specs: Dict[str, Dict[str, Any]] = {}
+    belum_ada: List[str] = []
+    for job_id in job_ids:
+        cached = _cache_job_spec.get(job_id)
+        if cached is not None:
+            specs[job_id] = cached[1]
+        else:
+            belum_ada.append(job_id)
+
+    ukuran = max(1, int(settings.JOB_SPEC_MGET_CHUNK))
+    chunks = [belum_ada[start : start + ukuran] for start in range(0, len(belum_ada), ukuran)]
+    for hasil in await asyncio.gather(*(_muat_chunk_job_spec(chunk) for chunk in chunks)):
+        specs.update(hasil)
+    return [_salin_nilai(specs[job_id]) for job_id in job_ids if job_id in specs]
+
+
+async def _daftar_spec_dari_set(key: str, fallback_ids: set) -> List[Dict[str, Any]]:
     if _sedang_mode_fallback_redis():
-        spec = _fallback_job_specs.get(job_id)
-        return _salin_nilai(spec) if spec else None
+        return await _muat_job_specs(sorted(fallback_ids))
 
     try:
-        payload = await redis_client.get(f"{JOB_SPEC_PREFIX}{job_id}")
-        if not payload:
-            return None
-        return json.loads(payload)
+        return await _muat_job_specs(sorted(await redis_client.smembers(key)))
     except RedisError:
         _aktifkan_mode_fallback()
-        spec = _fallback_job_specs.get(job_id)
-        return _salin_nilai(spec) if spec else None
+        return await _muat_job_specs(sorted(fallback_ids))
 
 
 async def list_job_specs() -> List[Dict[str, Any]]:
-    """Get all stored job specs."""
-    if _sedang_mode_fallback_redis():
-        job_ids = sorted(_fallback_job_all)
-    else:
-        try:
-            job_ids = sorted(await redis_client.smembers(JOB_ALL_SET))
-        except RedisError:
-            _aktifkan_mode_fallback()
-            job_ids = sorted(_fallback_job_all)
+    """Get all stored job specs, sorted by job_id."""
+    return await _daftar_spec_dari_set(JOB_ALL_SET, _fallback_job_all)
 
-    specs: List[Dict[str, Any]] = []
-    for job_id in job_ids:
-        spec = await get_job_spec(job_id)
-        if spec:
-            specs.append(spec)
-    return specs
+
+async def list_enabled_specs() -> List[Dict[str, Any]]:
+    """Get the specs of all enabled jobs, sorted by job_id; enabled IDs without a spec are skipped."""
+    return await _daftar_spec_dari_set(JOB_ENABLED_SET, _fallback_job_enabled)
+
+
+def _set_fallback_job_enabled(job_id: str, enabled: bool) -> None:
+    if enabled:
+        _fallback_job_enabled.add(job_id)
+    else:
+        _fallback_job_enabled.discard(job_id)
+    _catat_jurnal_fallback("job_enabled", job_id, enabled)
 
 
 async def enable_job(job_id: str):
     """Mark job as enabled."""
     if _sedang_mode_fallback_redis():
-        _fallback_job_enabled.add(job_id)
+        _set_fallback_job_enabled(job_id, True)
         return
 
     try:
         await redis_client.sadd(JOB_ENABLED_SET, job_id)
     except RedisError:
         _aktifkan_mode_fallback()
-        _fallback_job_enabled.add(job_id)
+        _set_fallback_job_enabled(job_id, True)
 
 
 async def disable_job(job_id: str):
     """Mark job as disabled."""
     if _sedang_mode_fallback_redis():
-        _fallback_job_enabled.discard(job_id)
+        _set_fallback_job_enabled(job_id, False)
         return
 
     try:
         await redis_client.srem(JOB_ENABLED_SET, job_id)
     except RedisError:
         _aktifkan_mode_fallback()
-        _fallback_job_enabled.discard(job_id)
+        _set_fallback_job_enabled(job_id, False)
 
 
 async def is_job_enabled(job_id: str) -> bool:
@@ -650,53 +2418,359 @@ async def list_enabled_job_ids() -> List[str]:
         return sorted(_fallback_job_enabled)
 
 
+def _simpan_fallback_run(run_id: str, run_data: Dict[str, Any], score: float) -> None:
+    # run_data is freshly serialized by the caller, so it is stored without another copy.
+    previous = _fallback_runs.get(run_id)
+    _fallback_runs[run_id] = run_data
+    previous_score = _fallback_run_scores.get(run_id)
+    if previous_score != score:
+        if previous_score is not None:
+            index = bisect.bisect_left(_fallback_run_urutan, (previous_score, run_id))
+            if index < len(_fallback_run_urutan) and _fallback_run_urutan[index] == (previous_score, run_id):
+                del _fallback_run_urutan[index]
+        index = bisect.bisect_left(_fallback_run_urutan, (score, run_id))
+        if index == len(_fallback_run_urutan) or _fallback_run_urutan[index] != (score, run_id):
+            _fallback_run_urutan.insert(index, (score, run_id))
+        _fallback_run_scores[run_id] = score
+    _refresh_index_active_runs_fallback(previous, run_data, run_id)
+    _catat_jurnal_fallback("run_set", run_id, run_data, score)
+
+
+def _run_id_fallback_terbaru():
+    for score, run_id in reversed(_fallback_run_urutan):
+        if _fallback_run_scores.get(run_id) == score:
+            yield run_id
+
+
+async def _offload_output_run(run_data: Dict[str, Any]) -> None:
+    result = run_data.get("result")
+    if _blob_output_run is None or not isinstance(result, dict) or result.get("output") is None:
+        return
+    raw = json.dumps(result["output"], sort_keys=True, separators=(",", ":")).encode("utf-8")
+    if len(raw) < max(1, int(settings.RUN_OUTPUT_OFFLOAD_BYTES)):
+        return
+    result["output_ref"] = await asyncio.to_thread(_blob_output_run.put, raw)
+    result["output_bytes"] = len(raw)
+    result["output"] = None
+
+
+async def load_run_output(run: Run) -> Run:
+    """Fill ``run.result.output`` from the blob store when it was offloaded."""
+    result = run.result
+    if result is None or result.output is not None or not result.output_ref or _blob_output_run is None:
+        return run
+    raw = await asyncio.to_thread(_blob_output_run.get, result.output_ref)
+    if raw is not None:
+        result.output = json.loads(raw)
+    return run
+
+
+# Writes a run and applies the index changes the client derived from the run's previous index, but only
+# while that previous index is still current (compare-and-set). Every index key is declared in KEYS.
+# ARGV: expected previous index ('' = no record), payload, then (op, key position, member, score) rows.
+# Returns {1, ''} on success or {0, <current index>} for the caller to recompute and retry.
+_SKRIP_SIMPAN_RUN = """
+local function teks(value)
+    if type(value) == 'string' then return value end
+    if type(value) == 'number' then return tostring(value) end
+    return ''
+end
+local function rapikan(value)
+    local hasil = string.gsub(teks(value), '^%s+', '')
+    hasil = string.gsub(hasil, '%s+$', '')
+    return hasil
+end
+
+local lama = ''
+local prev = redis.call('GET', KEYS[1])
+if prev then
+    local status, job_id, flow_group = '', '', ''
+    local ok, data = pcall(cjson.decode, prev)
+    if ok and type(data) == 'table' then
+        local index = data['_index']
+        if type(index) == 'table' then
+            status, job_id, flow_group = teks(index['status']), teks(index['job_id']), teks(index['flow_group'])
+        else
+            -- Records written before `_index` existed.
+            status = string.lower(rapikan(data['status']))
+            job_id = rapikan(data['job_id'])
+            if type(data['inputs']) == 'table' then
+                flow_group = string.sub(rapikan(data['inputs']['flow_group']), 1, 64)
+            end
+        end
+    end
+    lama = status .. '\n' .. job_id .. '\n' .. flow_group
+end
+if lama ~= ARGV[1] then return {0, lama} end
+
+redis.call('SET', KEYS[1], ARGV[2])
+for i = 3, #ARGV, 4 do
+    local op, key, member = ARGV[i], KEYS[tonumber(ARGV[i + 1])], ARGV[i + 2]
+    if op == 'zadd' then
+        redis.call('ZADD', key, ARGV[i + 3], member)
+    elseif op == 'zrem' then
+        redis.call('ZREM', key, member)
+    elseif op == 'sadd' then
+        redis.call('SADD', key, member)
+    else
+        redis.call('SREM', key, member)
+    end
+end
+return {1, ''}
+"""
+
+
+def _teks_index_run(index: Optional[Dict[str, str]]) -> str:
+    if index is None:
+        return ""
+    return "\n".join((index["status"], index["job_id"], index["flow_group"]))
+
+
+def _index_dari_teks(raw: Any) -> Optional[Dict[str, str]]:
+    if not raw:
+        return None
+    status, job_id, flow_group = (str(raw).split("\n") + ["", ""])[:3]
+    return {"status": status, "job_id": job_id, "flow_group": flow_group}
+
+
+def _tebak_index_lama(index: Dict[str, str]) -> Optional[Dict[str, str]]:
+    """Likely previous index of a run about to be saved with ``index``.
+
+    Runs mostly move queued -> running -> finished under one job, so guessing the previous step keeps the
+    usual save at one round trip; a wrong guess costs one retry with the index the script reports.
+    """
+    if index["status"] == "queued":
+        return None
+    return {**index, "status": "queued" if index["status"] == "running" else "running"}
+
+
+def _argumen_simpan_run(
+    run_id: str, run_data: Dict[str, Any], score: float, lama: Optional[Dict[str, str]]
+) -> List[Any]:
+    """``eval`` arguments that save ``run_data`` and move its indexes from ``lama``."""
+    index = _field_index_run(run_data)
+    keys = [f"{RUN_PREFIX}{run_id}"]
+    ops: List[Any] = []
+
+    def _op(nama: str, key: str, member: str, skor: float = 0) -> None:
+        if key not in keys:
+            keys.append(key)
+        ops.extend([nama, keys.index(key) + 1, member, skor])
+
+    prev = lama or {"status": "", "job_id": "", "flow_group": ""}
+    status, job_id, flow_group = index["status"], index["job_id"], index["flow_group"]
+    _op("zadd", ZSET_RUNS, run_id, score)
+    _op("zadd", ZSET_RUNS_LEX, _member_lex_run(run_id))
+    if prev["status"] and prev["status"] != status:
+        _op("zrem", _kunci_index_status_run(prev["status"]), run_id)
+    if status:
+        _op("zadd", _kunci_index_status_run(status), run_id, score)
+    if prev["job_id"] and prev["job_id"] != job_id:
+        _op("zrem", _kunci_index_job_run(prev["job_id"]), run_id)
+    if job_id:
+        _op("zadd", _kunci_index_job_run(job_id), run_id, score)
+    if _status_run_aktif(prev["status"]):
+        if prev["job_id"]:
+            _op("srem", _kunci_active_runs(prev["job_id"]), run_id)
+        if prev["flow_group"]:
+            _op("srem", _kunci_active_flow_runs(prev["flow_group"]), run_id)
+    aksi = "sadd" if _status_run_aktif(status) else "srem"
+    if job_id:
+        _op(aksi, _kunci_active_runs(job_id), run_id)
+    if flow_group:
+        _op(aksi, _kunci_active_flow_runs(flow_group), run_id)
+    return [_SKRIP_SIMPAN_RUN, len(keys), *keys, _teks_index_run(lama), _payload_run_redis(run_data), *ops]
+
+
+async def _simpan_run_redis(
+    run_id: str, run_data: Dict[str, Any], score: float, lama: Optional[Dict[str, str]]
+) -> Tuple[bool, Optional[Dict[str, str]]]:
+    """One compare-and-set save; returns (saved, current previous index)."""
+    ok, aktual = await redis_client.eval(*_argumen_simpan_run(run_id, run_data, score, lama))
+    return bool(int(ok)), _index_dari_teks(aktual)
+
+
 async def save_run(run: Run):
-    """Save run status to Redis."""
+    """Save run status and every run index in one atomic server-side step."""
     run_data = _serialisasi_model(run)
+    await _offload_output_run(run_data)
     score = _ke_timestamp(run_data.get("scheduled_at"))
 
     if _sedang_mode_fallback_redis():
-        previous = _fallback_runs.get(run.run_id)
-        _fallback_runs[run.run_id] = _salin_nilai(run_data)
-        _fallback_run_scores[run.run_id] = score
-        _refresh_index_active_runs_fallback(previous, run_data, run.run_id)
+        _simpan_fallback_run(run.run_id, run_data, score)
         return
 
+    lama = _tebak_index_lama(_field_index_run(run_data))
     try:
-        previous_payload = await redis_client.get(f"{RUN_PREFIX}{run.run_id}")
-        previous = json.loads(previous_payload) if previous_payload else None
-        await redis_client.set(f"{RUN_PREFIX}{run.run_id}", json.dumps(run_data))
-        await redis_client.zadd(ZSET_RUNS, {run.run_id: score})
-        await _refresh_index_active_runs_redis(previous, run_data, run.run_id)
+        # Each retry means another writer committed in between, so this always makes progress.
+        while True:
+            tersimpan, lama = await _simpan_run_redis(run.run_id, run_data, score, lama)
+            if tersimpan:
+                return
     except RedisError:
         _aktifkan_mode_fallback()
-        previous = _fallback_runs.get(run.run_id)
-        _fallback_runs[run.run_id] = _salin_nilai(run_data)
-        _fallback_run_scores[run.run_id] = score
-        _refresh_index_active_runs_fallback(previous, run_data, run.run_id)
+        _simpan_fallback_run(run.run_id, run_data, score)
+
+
+def _waktu_dari_run_id(run_id: str) -> Optional[float]:
+    # Run IDs are minted as run_<unix_ts>_<hex>; anything else (legacy or caller-chosen IDs) has no timestamp.
+    bagian = str(run_id or "").split("_")
+    if len(bagian) < 3 or bagian[0] != "run" or not bagian[1].isdigit():
+        return None
+    return float(bagian[1])
+
+
+def _mungkin_diarsipkan(run_id: str) -> bool:
+    # A run is only archived once it is older than the retention window, and it cannot be older than its ID.
+    waktu = _waktu_dari_run_id(run_id)
+    return waktu is None or waktu <= time.time() - max(0, int(settings.RUN_RETENTION_SEC))
 
 
-async def get_run(run_id: str) -> Optional[Run]:
-    """Get run status from Redis."""
+async def _ambil_run_arsip(run_id: str, include_archived: Optional[bool]) -> Optional[Run]:
+    if _arsip_run is None or include_archived is False:
+        return None
+    if include_archived is None and not _mungkin_diarsipkan(run_id):
+        return None
+    payload = await asyncio.to_thread(_arsip_run.get, run_id)
+    return Run(**payload) if payload else None
+
+
+async def get_run(run_id: str, include_archived: Optional[bool] = None) -> Optional[Run]:
+    """Get run status from Redis, falling back to the run archive.
+
+    By default the archive is only read for run IDs minted before the retention cutoff (or without a
+    timestamp), so misses on recent runs stay off the disk. ``include_archived`` forces it on or off.
+    """
     if _sedang_mode_fallback_redis():
         payload = _fallback_runs.get(run_id)
         if not payload:
-            return None
+            return await _ambil_run_arsip(run_id, include_archived)
         return Run(**_salin_nilai(payload))
 
     try:
         payload = await redis_client.get(f"{RUN_PREFIX}{run_id}")
         if not payload:
-            return None
+            return await _ambil_run_arsip(run_id, include_archived)
         return Run(**json.loads(payload))
     except RedisError:
         _aktifkan_mode_fallback()
         payload = _fallback_runs.get(run_id)
         if not payload:
-            return None
+            return await _ambil_run_arsip(run_id, include_archived)
         return Run(**_salin_nilai(payload))
 
 
+# Releases a lock only while it still holds the caller's token, so a pass that outlived the TTL cannot
+# drop a lock another instance has taken since.
+_SKRIP_LEPAS_KUNCI = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+async def archive_old_runs(
+    older_than_sec: Optional[int] = None,
+    limit: Optional[int] = None,
+    now: Optional[float] = None,
+) -> int:
+    """Move finished runs scheduled before the retention window into the run archive.
+
+    Handles at most ``limit`` runs per call and returns how many were archived, so callers can
+    keep draining while a full batch comes back. Queued/running runs are never archived.
+    """
+    if _arsip_run is None or _sedang_mode_fallback_redis():
+        return 0
+
+    retensi = max(0, int(older_than_sec if older_than_sec is not None else settings.RUN_RETENTION_SEC))
+    batas = max(1, int(limit or settings.RUN_ARCHIVE_BATCH))
+    cutoff = (time.time() if now is None else float(now)) - retensi
+
+    try:
+        token = uuid.uuid4().hex
+        if not await redis_client.set(RUN_ARCHIVE_LOCK_KEY, token, nx=True, ex=max(30, settings.RUN_ARCHIVE_INTERVAL_SEC)):
+            return 0
+        try:
+            run_ids: List[str] = []
+            lewati = 0
+            payloads: List[Dict[str, Any]] = []
+            while len(run_ids) < batas:
+                batch = await redis_client.zrangebyscore(
+                    ZSET_RUNS, "-inf", cutoff, start=lewati + len(run_ids), num=batas
+                )
+                if not batch:
+                    break
+                for run_id, payload in zip(batch, await redis_client.mget([f"{RUN_PREFIX}{run_id}" for run_id in batch])):
+                    run_data = json.loads(payload) if payload else None
+                    if run_data and _status_run_aktif(run_data.get("status")):
+                        lewati += 1
+                        continue
+                    run_ids.append(run_id)
+                    if run_data:
+                        payloads.append(run_data)
+                    if len(run_ids) >= batas:
+                        break
+                if len(batch) < batas or len(run_ids) >= batas:
+                    break
+
+            if not run_ids:
+                return 0
+            # Written before anything is deleted, so a failure here leaves Redis untouched.
+            await asyncio.to_thread(_arsip_run.append, payloads)
+
+            pipe = redis_client.pipeline(transaction=False)
+            per_id = {run_data["run_id"]: run_data for run_data in payloads}
+            for run_id in run_ids:
+                run_data = per_id.get(run_id) or {}
+                pipe.delete(f"{RUN_PREFIX}{run_id}")
+                pipe.zrem(ZSET_RUNS, run_id)
+                pipe.zrem(ZSET_RUNS_LEX, _member_lex_run(run_id))
+                status = _status_run_teks(run_data.get("status"))
+                job_id = str(run_data.get("job_id") or "").strip()
+                if status:
+                    pipe.zrem(_kunci_index_status_run(status), run_id)
+                if job_id:
+                    pipe.zrem(_kunci_index_job_run(job_id), run_id)
+            await pipe.execute()
+            return len(payloads)
+        finally:
+            await redis_client.eval(_SKRIP_LEPAS_KUNCI, 1, RUN_ARCHIVE_LOCK_KEY, token)
+    except RedisError:
+        _aktifkan_mode_fallback()
+        return 0
+
+
+async def _muat_runs_batch(run_ids: List[str]) -> List[Run]:
+    if not run_ids:
+        return []
+    payloads = await redis_client.mget([f"{RUN_PREFIX}{run_id}" for run_id in run_ids])
+    return [Run(**json.loads(payload)) for payload in payloads if payload]
+
+
+async def _kandidat_run_pencarian(search: str) -> List[str]:
+    """Run IDs matching ``search`` (run_id prefix or job_id substring), newest first."""
+    members = await redis_client.zrangebylex(ZSET_RUNS_LEX, f"[{search}", f"[{search}\xff", start=0, num=RUN_SEARCH_SCAN_MAX)
+    run_ids = [member.partition("\n")[2] for member in members]
+    job_ids = [job_id for job_id in await redis_client.smembers(JOB_ALL_SET) if search in job_id.lower()]
+
+    pipe = redis_client.pipeline(transaction=False)
+    for run_id in run_ids:
+        pipe.zscore(ZSET_RUNS, run_id)
+    for job_id in job_ids:
+        pipe.zrevrange(_kunci_index_job_run(job_id), 0, RUN_SEARCH_SCAN_MAX - 1, withscores=True)
+    hasil = await pipe.execute()
+
+    skor: Dict[str, float] = {}
+    for run_id, score in zip(run_ids, hasil[: len(run_ids)]):
+        if score is not None:
+            skor[run_id] = float(score)
+    for rows in hasil[len(run_ids) :]:
+        for run_id, score in rows or []:
+            skor[run_id] = float(score)
+    return [run_id for run_id, _ in sorted(skor.items(), key=lambda item: (item[1], item[0]), reverse=True)]
+
+
 async def list_runs(
     limit: int = 50,
     job_id: Optional[str] = None,
@@ -704,7 +2778,11 @@ async def list_runs(
     offset: int = 0,
     search: Optional[str] = None,
 ) -> List[Run]:
-    """List runs ordered by latest schedule time."""
+    """List runs ordered by latest schedule time.
+
+    On Redis, ``job_id``/``status`` pages come from the per-job/per-status indexes and ``search``
+    matches a run_id prefix or a job_id substring; runs are loaded with batched MGET.
+    """
     page_limit = max(int(limit), 0)
     page_offset = max(int(offset), 0)
     if page_limit == 0:
@@ -736,9 +2814,7 @@ async def list_runs(
     runs: List[Run] = []
 
     if _sedang_mode_fallback_redis():
-        ordered = sorted(_fallback_run_scores.items(), key=lambda item: item[1], reverse=True)
-        run_ids = [run_id for run_id, _ in ordered]
-        for run_id in run_ids:
+        for run_id in _run_id_fallback_terbaru():
             run = await get_run(run_id)
             if not run:
                 continue
@@ -749,25 +2825,37 @@ async def list_runs(
                 break
     else:
         try:
-            cursor = 0
-            while len(runs) < page_end:
-                batch = await redis_client.zrevrange(ZSET_RUNS, cursor, cursor + scan_limit - 1)
-                if not batch:
-                    break
-
-                for run_id in batch:
-                    run = await get_run(run_id)
-                    if not run:
-                        continue
-                    if not _run_match(run):
-                        continue
-                    runs.append(run)
+            if normalized_search:
+                kandidat = await _kandidat_run_pencarian(normalized_search)
+                for start in range(0, len(kandidat), scan_limit):
+                    for run in await _muat_runs_batch(kandidat[start : start + scan_limit]):
+                        if _run_match(run):
+                            runs.append(run)
+                            if len(runs) >= page_end:
+                                break
                     if len(runs) >= page_end:
                         break
-
-                if len(batch) < scan_limit:
-                    break
-                cursor += len(batch)
+            else:
+                # The narrowest index answers the page; any remaining filter is checked on the loaded run.
+                if normalized_job_id:
+                    index_key = _kunci_index_job_run(normalized_job_id)
+                elif normalized_status:
+                    index_key = _kunci_index_status_run(normalized_status)
+                else:
+                    index_key = ZSET_RUNS
+                cursor = 0
+                while len(runs) < page_end:
+                    batch = await redis_client.zrevrange(index_key, cursor, cursor + scan_limit - 1)
+                    if not batch:
+                        break
+                    for run in await _muat_runs_batch(batch):
+                        if _run_match(run):
+                            runs.append(run)
+                            if len(runs) >= page_end:
+                                break
+                    if len(batch) < scan_limit:
+                        break
+                    cursor += len(batch)
         except RedisError:
             _aktifkan_mode_fallback()
             return await list_runs(
@@ -781,13 +2869,18 @@ async def list_runs(
     return runs[page_offset:page_end]
 
 
+def _tambah_fallback_job_run(job_id: str, run_id: str, max_history: int) -> None:
+    rows = _fallback_job_runs[job_id]
+    if not rows or rows[0] != run_id:
+        rows.insert(0, run_id)
+    del rows[max_history:]
+    _catat_jurnal_fallback("job_run_push", job_id, run_id, max_history)
+
+
 async def add_run_to_job_history(job_id: str, run_id: str, max_history: int = 50):
     """Add run_id to job's run history list."""
     if _sedang_mode_fallback_redis():
-        rows = _fallback_job_runs[job_id]
-        if not rows or rows[0] != run_id:
-            rows.insert(0, run_id)
-        del rows[max_history:]
+        _tambah_fallback_job_run(job_id, run_id, max_history)
         return
 
     try:
@@ -798,10 +2891,7 @@ async def add_run_to_job_history(job_id: str, run_id: str, max_history: int = 50
             await redis_client.ltrim(key, 0, max_history - 1)
     except RedisError:
         _aktifkan_mode_fallback()
-        rows = _fallback_job_runs[job_id]
-        if not rows or rows[0] != run_id:
-            rows.insert(0, run_id)
-        del rows[max_history:]
+        _tambah_fallback_job_run(job_id, run_id, max_history)
 
 
 async def get_job_run_ids(job_id: str, limit: int = 20) -> List[str]:
@@ -816,24 +2906,34 @@ async def get_job_run_ids(job_id: str, limit: int = 20) -> List[str]:
         return list(_fallback_job_runs.get(job_id, []))[:limit]
 
 
+def _kedalaman_fallback_stream() -> int:
+    return sum(len(rows) for rows in _fallback_streams.values())
+
+
 async def get_queue_metrics() -> Dict[str, int]:
     """Get queue metrics for dashboard."""
     if _sedang_mode_fallback_redis():
-        return {"depth": len(_fallback_stream), "delayed": len(_fallback_delayed)}
+        return {"depth": _kedalaman_fallback_stream(), "delayed": len(_fallback_delayed)}
 
     if is_mode_legacy_redis_queue():
         try:
-            depth = await redis_client.llen(LIST_JOBS)
+            depth = 0
+            for pool in await _daftar_pool_terdaftar():
+                depth += int(await redis_client.llen(_kunci_list_pool(pool)))
             delayed = await redis_client.zcard(ZSET_DELAYED)
-            return {"depth": int(depth), "delayed": int(delayed)}
+            return {"depth": depth, "delayed": int(delayed)}
         except RedisError:
             _aktifkan_mode_fallback()
-            return {"depth": len(_fallback_stream), "delayed": len(_fallback_delayed)}
+            return {"depth": _kedalaman_fallback_stream(), "delayed": len(_fallback_delayed)}
 
     try:
-        depth = await redis_client.xlen(STREAM_JOBS)
+        depth = 0
+        for pool in await _daftar_pool_terdaftar():
+            for lane in QUEUE_LANES:
+                for shard in _daftar_shard():
+                    depth += int(await _klien_stream(shard).xlen(_kunci_stream(pool, lane)))
         delayed = await redis_client.zcard(ZSET_DELAYED)
-        return {"depth": int(depth), "delayed": int(delayed)}
+        return {"depth": depth, "delayed": int(delayed)}
     except ResponseError as exc:
         if _error_stream_tidak_didukung(exc):
             _aktifkan_mode_legacy_redis_queue()
@@ -841,7 +2941,312 @@ async def get_queue_metrics() -> Dict[str, int]:
         raise
     except RedisError:
         _aktifkan_mode_fallback()
-        return {"depth": len(_fallback_stream), "delayed": len(_fallback_delayed)}
+        return {"depth": _kedalaman_fallback_stream(), "delayed": len(_fallback_delayed)}
+
+
+def _umur_id_stream(message_id: Any, sekarang: float) -> Optional[float]:
+    try:
+        return max(0.0, round(sekarang - int(str(message_id).partition("-")[0]) / 1000.0, 3))
+    except ValueError:
+        return None
+
+
+def _statistik_kosong(mode: str) -> Dict[str, Any]:
+    return {
+        "mode": mode,
+        "depth": 0,
+        "lag": 0,
+        "pending": 0,
+        "delayed": 0,
+        "delayed_due": 0,
+        "oldest_undelivered_age_sec": None,
+        "consumers": {},
+        "pools": {},
+    }
+
+
+def _catat_statistik_stream(
+    stats: Dict[str, Any], pool: str, lane: str, length: int, lag: int, pending: int, umur: Optional[float]
+) -> None:
+    stats["depth"] += length
+    stats["lag"] += lag
+    stats["pending"] += pending
+    # A pool/lane is recorded once per shard, so counts add up across calls.
+    row = stats["pools"].setdefault(pool, {}).setdefault(
+        lane, {"length": 0, "lag": 0, "pending": 0, "oldest_undelivered_age_sec": None}
+    )
+    row["length"] += length
+    row["lag"] += lag
+    row["pending"] += pending
+    if umur is not None:
+        row["oldest_undelivered_age_sec"] = max(umur, row["oldest_undelivered_age_sec"] or 0.0)
+        stats["oldest_undelivered_age_sec"] = max(umur, stats["oldest_undelivered_age_sec"] or 0.0)
+
+
+def _statistik_fallback() -> Dict[str, Any]:
+    sekarang = time.time()
+    stats = _statistik_kosong("fallback")
+    for pool in _pool_dari_fallback():
+        for lane in QUEUE_LANES:
+            rows = _fallback_streams.get(_kunci_stream(pool, lane)) or ()
+            umur = _umur_id_stream(rows[0]["id"], sekarang) if rows else None
+            # Fallback dequeue removes the entry, so everything still stored is undelivered.
+            _catat_statistik_stream(stats, pool, lane, len(rows), len(rows), 0, umur)
+    stats["delayed"] = len(_fallback_delayed)
+    stats["delayed_due"] = sum(1 for due_ts, _, _ in _fallback_delayed if due_ts <= sekarang)
+    return stats
+
+
+async def _statistik_legacy() -> Dict[str, Any]:
+    sekarang = time.time()
+    stats = _statistik_kosong("legacy")
+    pools = await _daftar_pool_terdaftar()
+    pipe = redis_client.pipeline(transaction=False)
+    for pool in pools:
+        pipe.llen(_kunci_list_pool(pool))
+        pipe.lindex(_kunci_list_pool(pool), 0)
+    pipe.zcard(ZSET_DELAYED)
+    pipe.zcount(ZSET_DELAYED, "-inf", sekarang)
+    hasil = await pipe.execute()
+
+    for index, pool in enumerate(pools):
+        length, kepala = int(hasil[2 * index] or 0), hasil[2 * index + 1]
+        umur = None
+        if kepala:
+            enqueued_at = json.loads(kepala).get("enqueued_at")
+            umur = max(0.0, round(sekarang - _ke_timestamp(enqueued_at), 3)) if enqueued_at else None
+        _catat_statistik_stream(stats, pool, LANE_NORMAL, length, length, 0, umur)
+    stats["delayed"], stats["delayed_due"] = int(hasil[-2] or 0), int(hasil[-1] or 0)
+    return stats
+
+
+def _grup_pekerja(groups: Any) -> Optional[Dict[str, Any]]:
+    # XINFO GROUPS of a missing stream comes back as a ResponseError entry.
+    groups = groups if isinstance(groups, list) else []
+    return next((row for row in groups if str(row.get("name")) == CG_WORKERS), None)
+
+
+def _lag_grup(group: Optional[Dict[str, Any]], length: int) -> int:
+    lag = group.get("lag") if group else None
+    if lag is None:
+        # Redis < 7 has no group lag; entries-read (7.0) or the stream length are the best available bound.
+        entries_read = group.get("entries-read") if group else None
+        lag = length - int(entries_read) if entries_read is not None else length
+    return max(0, int(lag))
+
+
+async def _statistik_redis() -> Dict[str, Any]:
+    sekarang = time.time()
+    stats = _statistik_kosong("redis")
+    streams = [(pool, lane, _kunci_stream(pool, lane)) for pool in await _daftar_pool_terdaftar() for lane in QUEUE_LANES]
+    for shard in _daftar_shard():
+        # Unsharded, the delayed counts ride along in the stream pipeline; otherwise they come from the main Redis.
+        hasil = await _statistik_stream_shard(stats, streams, shard, sekarang, dengan_delayed=shard is None)
+    if is_mode_sharded_queue():
+        pipe = redis_client.pipeline(transaction=False)
+        pipe.zcard(ZSET_DELAYED)
+        pipe.zcount(ZSET_DELAYED, "-inf", sekarang)
+        hasil = await pipe.execute()
+    stats["delayed"], stats["delayed_due"] = int(hasil[-2] or 0), int(hasil[-1] or 0)
+    return stats
+
+
+async def _statistik_stream_shard(
+    stats: Dict[str, Any],
+    streams: List[Tuple[str, str, str]],
+    shard: Optional[int],
+    sekarang: float,
+    *,
+    dengan_delayed: bool,
+) -> List[Any]:
+    client = _klien_stream(shard)
+    pipe = client.pipeline(transaction=False)
+    for _, _, stream in streams:
+        pipe.xlen(stream)
+        pipe.xinfo_groups(stream)
+        pipe.xpending(stream, CG_WORKERS)
+    if dengan_delayed:
+        pipe.zcard(ZSET_DELAYED)
+        pipe.zcount(ZSET_DELAYED, "-inf", sekarang)
+    # Missing streams and groups come back as ResponseError entries and count as empty.
+    hasil = await pipe.execute(raise_on_error=False)
+    for item in hasil:
+        if isinstance(item, ResponseError) and _error_stream_tidak_didukung(item):
+            raise item
+
+    per_stream = []
+    for index, (pool, lane, stream) in enumerate(streams):
+        length, groups, pending = hasil[3 * index : 3 * index + 3]
+        length = int(length) if isinstance(length, int) else 0
+        group = _grup_pekerja(groups)
+        last_id = str(group.get("last-delivered-id") or "0-0") if group else "0-0"
+        lag = _lag_grup(group, length)
+        pending_count = 0
+        if isinstance(pending, dict):
+            pending_count = int(pending.get("pending") or 0)
+            for row in pending.get("consumers") or []:
+                nama = str(row.get("name"))
+                stats["consumers"][nama] = stats["consumers"].get(nama, 0) + int(row.get("pending") or 0)
+        per_stream.append((pool, lane, stream, length, lag, pending_count, last_id))
+
+    umur_per_stream: Dict[str, Optional[float]] = {}
+    dengan_lag = [row for row in per_stream if row[4] > 0]
+    if dengan_lag:
+        pipe = client.pipeline(transaction=False)
+        for _, _, stream, _, _, _, last_id in dengan_lag:
+            # Inclusive start, so the last delivered entry may come back first and is skipped.
+            pipe.xrange(stream, min=last_id, max="+", count=2)
+        for (_, _, stream, _, _, _, last_id), rows in zip(dengan_lag, await pipe.execute()):
+            berikutnya = next((message_id for message_id, _ in rows or [] if message_id != last_id), None)
+            umur_per_stream[stream] = _umur_id_stream(berikutnya, sekarang) if berikutnya else None
+
+    for pool, lane, stream, length, lag, pending_count, _ in per_stream:
+        _catat_statistik_stream(stats, pool, lane, length, lag, pending_count, umur_per_stream.get(stream))
+    return hasil
+
+
+async def get_queue_stats() -> Dict[str, Any]:
+    """Queue introspection: consumer-group lag, pending per consumer, oldest undelivered age and delayed counts.
+
+    ``depth`` is the raw stream length (acked entries included until trimmed); ``lag`` counts entries not yet
+    delivered to any worker and ``pending`` those delivered but not acked. ``pools`` breaks both down per pool
+    and priority lane.
+    """
+    if _sedang_mode_fallback_redis():
+        return _statistik_fallback()
+
+    try:
+        if is_mode_legacy_redis_queue():
+            return await _statistik_legacy()
+        return await _statistik_redis()
+    except ResponseError as exc:
+        if _error_stream_tidak_didukung(exc):
+            _aktifkan_mode_legacy_redis_queue()
+            return await get_queue_stats()
+        raise
+    except RedisError:
+        _aktifkan_mode_fallback()
+        return _statistik_fallback()
+
+
+async def _lag_redis(pools: List[str]) -> int:
+    streams = [_kunci_stream(pool, lane) for pool in pools for lane in QUEUE_LANES]
+    total = 0
+    for shard in _daftar_shard():
+        pipe = _klien_stream(shard).pipeline(transaction=False)
+        for stream in streams:
+            pipe.xlen(stream)
+            pipe.xinfo_groups(stream)
+        hasil = await pipe.execute(raise_on_error=False)
+        for item in hasil:
+            if isinstance(item, ResponseError) and _error_stream_tidak_didukung(item):
+                raise item
+        for index in range(len(streams)):
+            length, groups = hasil[2 * index : 2 * index + 2]
+            total += _lag_grup(_grup_pekerja(groups), int(length) if isinstance(length, int) else 0)
+    return total
+
+
+def _lag_fallback(pools: List[str]) -> int:
+    return sum(len(_fallback_streams.get(_kunci_stream(pool, lane), ())) for pool in pools for lane in QUEUE_LANES)
+
+
+async def get_queue_lag(agent_pool: Optional[str] = None) -> int:
+    """Entries not yet delivered on the streams a consumer of ``agent_pool`` reads, summed over lanes and shards.
+
+    Costs one ``XLEN`` + ``XINFO GROUPS`` per lane stream, so workers can poll it every few seconds where the
+    full ``get_queue_stats`` (pending, ages, delayed counts for every pool) would be too heavy.
+    """
+    if _sedang_mode_fallback_redis():
+        return _lag_fallback(await _pool_untuk_konsumen(agent_pool))
+
+    try:
+        pools = await _pool_untuk_konsumen(agent_pool)
+        if is_mode_legacy_redis_queue():
+            pipe = redis_client.pipeline(transaction=False)
+            for pool in pools:
+                pipe.llen(_kunci_list_pool(pool))
+            return sum(int(length or 0) for length in await pipe.execute())
+        return await _lag_redis(pools)
+    except ResponseError as exc:
+        if _error_stream_tidak_didukung(exc):
+            _aktifkan_mode_legacy_redis_queue()
+            return await get_queue_lag(agent_pool)
+        raise
+    except RedisError:
+        _aktifkan_mode_fallback()
+        return _lag_fallback(await _pool_untuk_konsumen(agent_pool))
+
+
+def _batas_trim_stream(group: Optional[Dict[str, Any]], pending: Any) -> Optional[str]:
+    """Lowest ID that must survive a trim: the oldest pending entry, else the first one after last-delivered-id."""
+    if not group:
+        return None
+    if isinstance(pending, dict) and int(pending.get("pending") or 0) > 0 and pending.get("min"):
+        return str(pending["min"])
+    ms, seq = _urutan_id_stream(group.get("last-delivered-id"))
+    if (ms, seq) == (0, 0):
+        return None
+    return f"{ms}-{seq + 1}"
+
+
+async def _trim_stream_via_xdel(stream: str, min_id: str, limit: int, shard: Optional[int] = None) -> int:
+    # Redis < 6.2 has no XTRIM MINID; delete the oldest entries below the bound in one bounded batch.
+    client = _klien_stream(shard)
+    rows = await client.xrange(stream, min="-", max=min_id, count=limit)
+    ids = [message_id for message_id, _ in rows or [] if _urutan_id_stream(message_id) < _urutan_id_stream(min_id)]
+    if not ids:
+        return 0
+    return int(await client.xdel(stream, *ids) or 0)
+
+
+async def trim_job_streams(limit: Optional[int] = None) -> Dict[str, int]:
+    """Drop job stream entries that every consumer is done with; returns entries removed per stream.
+
+    Each stream is trimmed with ``XTRIM MINID ~`` up to its oldest pending entry (or just past the group's
+    last-delivered-id when nothing is pending), so undelivered and unacked messages are never touched and
+    stream memory follows the backlog instead of all-time volume. Streams without the consumer group are
+    left alone. Fallback and legacy list modes remove entries on read and have nothing to trim. On a
+    sharded queue the counts of a stream are summed over its shards.
+    """
+    if _sedang_mode_fallback_redis() or is_mode_legacy_redis_queue():
+        return {}
+
+    batas = max(1, int(limit if limit is not None else settings.QUEUE_TRIM_BATCH))
+    try:
+        streams = [_kunci_stream(pool, lane) for pool in await _daftar_pool_terdaftar() for lane in QUEUE_LANES]
+        trimmed: Dict[str, int] = {}
+        for shard in _daftar_shard():
+            client = _klien_stream(shard)
+            pipe = client.pipeline(transaction=False)
+            for stream in streams:
+                # XINFO must run before XPENDING: a read in between then shows up as pending instead of being
+                # hidden behind a stale last-delivered-id.
+                pipe.xinfo_groups(stream)
+                pipe.xpending(stream, CG_WORKERS)
+            hasil = await pipe.execute(raise_on_error=False)
+
+            for index, stream in enumerate(streams):
+                groups, pending = hasil[2 * index : 2 * index + 2]
+                min_id = _batas_trim_stream(_grup_pekerja(groups), pending)
+                if not min_id:
+                    continue
+                try:
+                    jumlah = int(await client.xtrim(stream, minid=min_id, approximate=True, limit=batas) or 0)
+                except ResponseError as exc:
+                    if "SYNTAX" not in str(exc).upper():
+                        raise
+                    jumlah = await _trim_stream_via_xdel(stream, min_id, batas, shard)
+                if jumlah:
+                    trimmed[stream] = trimmed.get(stream, 0) + jumlah
+        return trimmed
+    except RedisTimeoutError:
+        return {}
+    except ResponseError:
+        raise
+    except RedisError:
+        _aktifkan_mode_fallback()
+        return {}
 
 
 async def has_active_runs(job_id: str) -> bool:
@@ -958,18 +3363,23 @@ async def record_job_outcome(
     row["updated_at"] = sekarang.isoformat()
 
     if _sedang_mode_fallback_redis():
-        _fallback_failure_state[normalized_job_id] = _salin_nilai(row)
+        _simpan_fallback_failure_state(normalized_job_id, _salin_nilai(row))
         return row
 
     try:
         await redis_client.set(_kunci_failure_state(normalized_job_id), json.dumps(row))
     except RedisError:
         _aktifkan_mode_fallback()
-        _fallback_failure_state[normalized_job_id] = _salin_nilai(row)
+        _simpan_fallback_failure_state(normalized_job_id, _salin_nilai(row))
 
     return row
 
 
+def _simpan_fallback_failure_state(job_id: str, row: Dict[str, Any]) -> None:
+    _fallback_failure_state[job_id] = row
+    _catat_jurnal_fallback("failure_set", job_id, row)
+
+
 async def get_job_cooldown_remaining(job_id: str) -> int:
     row = await get_job_failure_state(job_id)
     cooldown_until = row.get("cooldown_until")
@@ -981,6 +3391,39 @@ async def get_job_cooldown_remaining(job_id: str) -> int:
     return max(0, remaining)
 
 
+def _simpan_fallback_event(event: Dict[str, Any]) -> None:
+    global _fallback_stream_seq
+    # Fallback events get a stream-style ID too, so `since`/tailing works the same in both modes.
+    # A journal replay keeps the ID clients already saw and only moves the counter past it.
+    if event.get("stream_id"):
+        _fallback_stream_seq = max(_fallback_stream_seq, _urutan_id_stream(event["stream_id"])[1])
+    else:
+        event["stream_id"] = _id_pesan_fallback_berikutnya()
+    _fallback_events.appendleft(event)
+    _catat_jurnal_fallback("event_push", event)
+
+
+def _urutan_id_stream(stream_id: Any) -> Tuple[int, int]:
+    ms, _, seq = str(stream_id or "").partition("-")
+    try:
+        return int(ms), int(seq or 0)
+    except ValueError:
+        return 0, 0
+
+
+def _id_stream_valid(raw: Optional[str]) -> bool:
+    return bool(re.fullmatch(r"\d+-\d+", str(raw or "").strip()))
+
+
+def _event_dari_entry_stream(stream_id: str, fields: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    try:
+        event = json.loads((fields or {})["data"])
+    except (KeyError, TypeError, ValueError):
+        return None
+    event["stream_id"] = stream_id
+    return event
+
+
 async def append_event(event_type: str, data: Dict[str, Any]) -> Dict[str, Any]:
     """Append event to timeline."""
     event = {
@@ -991,22 +3434,37 @@ async def append_event(event_type: str, data: Dict[str, Any]) -> Dict[str, Any]:
     }
 
     if _sedang_mode_fallback_redis():
-        _fallback_events.insert(0, _salin_nilai(event))
-        del _fallback_events[EVENTS_MAX:]
+        _simpan_fallback_event(_salin_nilai(event))
         return event
 
     try:
-        await redis_client.lpush(EVENTS_LOG, json.dumps(event))
-        await redis_client.ltrim(EVENTS_LOG, 0, EVENTS_MAX - 1)
+        if is_mode_legacy_redis_queue():
+            await redis_client.lpush(EVENTS_LOG, json.dumps({**event, "stream_id": _id_pesan_fallback_berikutnya()}))
+            await redis_client.ltrim(EVENTS_LOG, 0, EVENTS_MAX - 1)
+        else:
+            await redis_client.xadd(
+                EVENTS_STREAM,
+                {"data": json.dumps(event)},
+                maxlen=settings.EVENTS_STREAM_MAXLEN,
+                approximate=True,
+            )
+    except ResponseError as exc:
+        if not _error_stream_tidak_didukung(exc):
+            raise
+        _aktifkan_mode_legacy_redis_queue()
+        return await append_event(event_type, data)
     except RedisError:
         _aktifkan_mode_fallback()
-        _fallback_events.insert(0, _salin_nilai(event))
-        del _fallback_events[EVENTS_MAX:]
+        _simpan_fallback_event(_salin_nilai(event))
     return event
 
 
 async def get_events(limit: int = 200, since: Optional[str] = None, offset: int = 0) -> List[Dict[str, Any]]:
-    """Get latest events in ascending time order."""
+    """Get latest events in ascending time order.
+
+    ``since`` is either an ISO timestamp or a ``stream_id`` returned with an earlier event;
+    on the Redis stream both become an XREVRANGE lower bound instead of a scan.
+    """
     page_limit = max(int(limit), 0)
     page_offset = max(int(offset), 0)
     if page_limit == 0:
@@ -1016,9 +3474,12 @@ async def get_events(limit: int = 200, since: Optional[str] = None, offset: int
     if page_end <= 0:
         return []
 
-    since_dt = _parse_iso_datetime(since)
+    since_id = str(since).strip() if _id_stream_valid(since) else None
+    since_dt = None if since_id else _parse_iso_datetime(since)
 
     def _event_match_since(row: Dict[str, Any]) -> bool:
+        if since_id is not None:
+            return _urutan_id_stream(row.get("stream_id")) > _urutan_id_stream(since_id)
         if since_dt is None:
             return True
         return _ke_datetime_utc(row.get("timestamp")).astimezone(timezone.utc) > since_dt
@@ -1034,42 +3495,491 @@ async def get_events(limit: int = 200, since: Optional[str] = None, offset: int
         for row in _fallback_events:
             event = _salin_nilai(row)
             if not _event_match_since(event):
-                if since_dt is not None:
+                if since_id is not None or since_dt is not None:
                     break
                 continue
             events_desc.append(event)
             if len(events_desc) >= page_end:
                 break
         return _finalize(events_desc)
-    else:
-        try:
-            scan_limit = max(page_limit * 4, 200)
-            cursor = 0
-            while True:
-                rows = await redis_client.lrange(EVENTS_LOG, cursor, cursor + scan_limit - 1)
-                if not rows:
+
+    try:
+        if is_mode_legacy_redis_queue():
+            await _kumpulkan_event_log_lama(events_desc, page_limit, page_end, _event_match_since, since is not None)
+            return _finalize(events_desc)
+
+        if since_id is not None:
+            batas_bawah = f"({since_id}"
+        elif since_dt is not None:
+            # Entry IDs carry the server's append time in ms; the boundary ms is re-checked per event.
+            batas_bawah = str(int(since_dt.timestamp() * 1000))
+        else:
+            batas_bawah = "-"
+        batas_atas = "+"
+        while len(events_desc) < page_end:
+            rows = await redis_client.xrevrange(EVENTS_STREAM, max=batas_atas, min=batas_bawah, count=page_end)
+            for stream_id, fields in rows or []:
+                event = _event_dari_entry_stream(stream_id, fields)
+                if event is None or not _event_match_since(event):
+                    continue
+                events_desc.append(event)
+                if len(events_desc) >= page_end:
                     break
+            if len(rows or []) < page_end:
+                break
+            batas_atas = f"({rows[-1][0]}"
+    except RedisError:
+        _aktifkan_mode_fallback()
+        return await get_events(limit=page_limit, since=since, offset=page_offset)
 
-                stop_scan = False
-                for raw in rows:
-                    event = json.loads(raw)
-                    if not _event_match_since(event):
-                        if since_dt is not None:
-                            stop_scan = True
-                            break
-                        continue
-                    events_desc.append(event)
-                    if len(events_desc) >= page_end:
-                        stop_scan = True
-                        break
+    return _finalize(events_desc)
 
-                if stop_scan:
-                    break
-                if len(rows) < scan_limit:
-                    break
-                cursor += len(rows)
+
+async def _kumpulkan_event_log_lama(
+    events_desc: List[Dict[str, Any]],
+    page_limit: int,
+    page_end: int,
+    event_match: Callable[[Dict[str, Any]], bool],
+    berhenti_di_batas: bool,
+) -> None:
+    scan_limit = max(page_limit * 4, 200)
+    cursor = 0
+    while True:
+        rows = await redis_client.lrange(EVENTS_LOG, cursor, cursor + scan_limit - 1)
+        if not rows:
+            return
+        for raw in rows:
+            event = json.loads(raw)
+            if not event_match(event):
+                if berhenti_di_batas:
+                    return
+                continue
+            events_desc.append(event)
+            if len(events_desc) >= page_end:
+                return
+        if len(rows) < scan_limit:
+            return
+        cursor += len(rows)
+
+
+async def read_events_after(
+    last_id: Optional[str], *, count: int = 200, block_ms: Optional[int] = None
+) -> List[Dict[str, Any]]:
+    """Events appended after ``last_id`` (oldest first), blocking up to ``block_ms`` when none are ready.
+
+    ``last_id=None`` only waits for new events. On the Redis stream this is a single XREAD BLOCK;
+    the fallback and legacy stores are polled instead.
+    """
+    batas = max(1, int(count))
+    tunggu_ms = max(0, int(settings.EVENTS_SSE_BLOCK_MS if block_ms is None else block_ms))
+
+    if not _sedang_mode_fallback_redis() and not is_mode_legacy_redis_queue():
+        try:
+            client = redis_blocking_client if tunggu_ms else redis_client
+            result = await client.xread({EVENTS_STREAM: last_id or "$"}, count=batas, block=tunggu_ms or None)
+        except RedisTimeoutError:
+            return []
         except RedisError:
             _aktifkan_mode_fallback()
-            return await get_events(limit=page_limit, since=since, offset=page_offset)
+            return []
+        events: List[Dict[str, Any]] = []
+        for _, messages in result or []:
+            for stream_id, fields in messages or []:
+                event = _event_dari_entry_stream(stream_id, fields)
+                if event is not None:
+                    events.append(event)
+        return events
+
+    if not last_id:
+        terbaru = await get_events(limit=1)
+        last_id = str(terbaru[-1].get("stream_id") or "0-0") if terbaru else "0-0"
+    tenggat = time.monotonic() + tunggu_ms / 1000
+    while True:
+        events = await get_events(limit=batas, since=last_id)
+        if events or time.monotonic() >= tenggat:
+            return events
+        await asyncio.sleep(min(0.5, max(0.0, tenggat - time.monotonic())))
+
+
+async def _pindahkan_event_log_lama() -> None:
+    """Copy the pre-stream capped event list into the events stream once, oldest first."""
+    rows = await redis_client.lrange(EVENTS_LOG, 0, EVENTS_MAX - 1)
+    if not rows:
+        return
+    pipe = redis_client.pipeline(transaction=False)
+    for raw in reversed(rows):
+        pipe.xadd(EVENTS_STREAM, {"data": raw}, maxlen=settings.EVENTS_STREAM_MAXLEN, approximate=True)
+    pipe.delete(EVENTS_LOG)
+    await pipe.execute()
 
-    return _finalize(events_desc)
+
+def _salin_state_fallback() -> Dict[str, Any]:
+    return {
+        "streams": {stream: list(rows) for stream, rows in _fallback_streams.items() if rows},
+        "delayed": list(_fallback_delayed),
+        "job_specs": dict(_fallback_job_specs),
+        "job_all": set(_fallback_job_all),
+        "job_enabled": set(_fallback_job_enabled),
+        "job_spec_versions": {job_id: list(rows) for job_id, rows in _fallback_job_spec_versions.items() if rows},
+        "runs": dict(_fallback_runs),
+        "run_scores": dict(_fallback_run_scores),
+        "job_runs": {job_id: list(rows) for job_id, rows in _fallback_job_runs.items() if rows},
+        "failure_state": dict(_fallback_failure_state),
+        "events": list(_fallback_events),
+        "dead_letters": list(_fallback_dead_letters),
+    }
+
+
+def _lepas_antrean_fallback() -> Dict[str, Any]:
+    """Copy the fallback state but detach only queued work (stream entries and delayed jobs).
+
+    Queued work changes owner: once copied to Redis it must not also be handed to a fallback consumer.
+    Specs, runs, indexes and the timeline stay readable until the final pass switches modes.
+    """
+    state = _salin_state_fallback()
+    _fallback_streams.clear()
+    _fallback_delayed.clear()
+    return state
+
+
+def _lepas_state_fallback() -> Dict[str, Any]:
+    # Synchronous swap: writes that land while the copy is being migrated go to fresh containers.
+    state = _salin_state_fallback()
+    for container in (
+        _fallback_streams,
+        _fallback_delayed,
+        _fallback_job_specs,
+        _fallback_job_all,
+        _fallback_job_enabled,
+        _fallback_job_spec_versions,
+        _fallback_runs,
+        _fallback_run_scores,
+        _fallback_run_urutan,
+        _fallback_job_runs,
+        _fallback_active_runs,
+        _fallback_active_flow_runs,
+        _fallback_failure_state,
+        _fallback_events,
+        _fallback_dead_letters,
+    ):
+        container.clear()
+    return state
+
+
+def _ada_state_fallback() -> bool:
+    return any(rows for rows in _fallback_streams.values()) or any(
+        (
+            _fallback_delayed,
+            _fallback_job_specs,
+            _fallback_job_all,
+            _fallback_job_enabled,
+            _fallback_job_spec_versions,
+            _fallback_runs,
+            _fallback_job_runs,
+            _fallback_failure_state,
+            _fallback_events,
+            _fallback_dead_letters,
+        )
+    )
+
+
+def _state_fallback_kosong(state: Dict[str, Any]) -> bool:
+    return not any(state[key] for key in state)
+
+
+def _hanya_antrean(state: Dict[str, Any]) -> Dict[str, Any]:
+    # The part of a first-pass copy that _lepas_antrean_fallback actually took out of memory.
+    kosong = {key: type(value)() for key, value in state.items()}
+    return {**kosong, "streams": state["streams"], "delayed": state["delayed"]}
+
+
+def _selisih_state_fallback(state: Dict[str, Any], tertulis: Dict[str, Any]) -> Dict[str, Any]:
+    """What ``state`` holds beyond ``tertulis``, the copy an earlier pass already wrote to Redis.
+
+    Keyed records are kept when new or changed; list entries (histories, timeline, dead letters) only
+    when new, since writing them twice would duplicate them. Queued work was detached, so it is all new.
+    """
+
+    def _berubah(key: str) -> Dict[str, Any]:
+        return {id_: row for id_, row in state[key].items() if tertulis[key].get(id_) != row}
+
+    def _baru(rows: List[Any], lama: List[Any], kunci: Callable[[Any], Any]) -> List[Any]:
+        ada = {kunci(row) for row in lama}
+        return [row for row in rows if kunci(row) not in ada]
+
+    runs = _berubah("runs")
+    # The enabled set is written as a whole (SADD plus SREM of disabled jobs), so it goes again only on change.
+    set_berubah = (state["job_all"], state["job_enabled"]) != (tertulis["job_all"], tertulis["job_enabled"])
+    return {
+        "streams": state["streams"],
+        "delayed": state["delayed"],
+        "job_specs": _berubah("job_specs"),
+        "job_all": set(state["job_all"]) if set_berubah else set(),
+        "job_enabled": set(state["job_enabled"]) if set_berubah else set(),
+        "job_spec_versions": {
+            job_id: baru
+            for job_id, rows in state["job_spec_versions"].items()
+            if (baru := _baru(rows, tertulis["job_spec_versions"].get(job_id, []), lambda row: row.get("version_id")))
+        },
+        "runs": runs,
+        "run_scores": {run_id: state["run_scores"][run_id] for run_id in runs if run_id in state["run_scores"]},
+        "job_runs": {
+            job_id: baru
+            for job_id, rows in state["job_runs"].items()
+            if (baru := _baru(rows, tertulis["job_runs"].get(job_id, []), lambda run_id: run_id))
+        },
+        "failure_state": _berubah("failure_state"),
+        "events": _baru(state["events"], tertulis["events"], lambda event: event.get("stream_id") or json.dumps(event)),
+        "dead_letters": _baru(state["dead_letters"], tertulis["dead_letters"], lambda entry: entry.get("dead_letter_id")),
+    }
+
+
+def _kembalikan_state_fallback(state: Dict[str, Any]) -> None:
+    """Merge a detached copy back in front of anything written since it was detached."""
+    for stream, rows in state["streams"].items():
+        _fallback_streams[stream].extendleft(reversed(rows))
+    for item in state["delayed"]:
+        heapq.heappush(_fallback_delayed, tuple(item))
+    for job_id, spec in state["job_specs"].items():
+        _fallback_job_specs.setdefault(job_id, spec)
+    _fallback_job_all.update(state["job_all"])
+    _fallback_job_enabled.update(state["job_enabled"])
+    for job_id, rows in state["job_spec_versions"].items():
+        _fallback_job_spec_versions[job_id].extend(rows)
+    for run_id, run_data in state["runs"].items():
+        if run_id not in _fallback_runs:
+            _simpan_fallback_run(run_id, run_data, state["run_scores"].get(run_id, 0.0))
+    for job_id, rows in state["job_runs"].items():
+        _fallback_job_runs[job_id].extend(run_id for run_id in rows if run_id not in _fallback_job_runs[job_id])
+    for job_id, row in state["failure_state"].items():
+        _fallback_failure_state.setdefault(job_id, row)
+    _fallback_events.extend(state["events"])
+    _fallback_dead_letters.extendleft(reversed(state["dead_letters"]))
+
+
+def _perintah_enqueue_migrasi(stream: str, event_data: Dict[str, Any]) -> Tuple[str, tuple]:
+    # Same <run_id>:<attempt> marker as enqueue_job, so re-running a migration (or replaying its journal
+    # after a crash) does not add an entry twice.
+    payload = json.dumps(event_data)
+    dedup_key = _kunci_dedup(event_data, None)
+    if not dedup_key:
+        return ("xadd", (stream, {"data": payload}))
+    return ("eval", (_SKRIP_ENQUEUE_IDEMPOTEN, 2, dedup_key, stream, payload, _ttl_dedup()))
+
+
+def _perintah_migrasi_fallback(state: Dict[str, Any]) -> List[Tuple[str, tuple]]:
+    perintah: List[Tuple[str, tuple]] = []
+    legacy = is_mode_legacy_redis_queue()
+    pools = set()
+    for stream, rows in state["streams"].items():
+        pool = _info_stream(stream)[0]
+        pools.add(pool)
+        for item in rows:
+            if legacy:
+                perintah.append(_perintah_enqueue_legacy(pool, item["data"]))
+            elif not is_mode_sharded_queue():
+                # Sharded stream entries are written per shard by _tulis_state_fallback_ke_redis.
+                perintah.append(_perintah_enqueue_migrasi(stream, item["data"]))
+    pools.discard(DEFAULT_AGENT_POOL)
+    if pools:
+        perintah.append(("sadd", (QUEUE_POOLS_SET, *sorted(pools))))
+
+    for score, _, member in state["delayed"]:
+        perintah.append(("zadd", (ZSET_DELAYED, {member: score})))
+
+    for job_id, spec in state["job_specs"].items():
+        perintah.append(("set", (f"{JOB_SPEC_PREFIX}{job_id}", json.dumps(spec))))
+        perintah.append(("hincrby", (JOB_SPEC_REV_HASH, job_id, 1)))
+    if state["job_specs"]:
+        perintah.append(("incr", (JOB_SPEC_REV_GLOBAL,)))
+    if state["job_all"]:
+        perintah.append(("sadd", (JOB_ALL_SET, *sorted(state["job_all"]))))
+    if state["job_enabled"]:
+        perintah.append(("sadd", (JOB_ENABLED_SET, *sorted(state["job_enabled"]))))
+    dinonaktifkan = sorted(set(state["job_all"]) - set(state["job_enabled"]))
+    if dinonaktifkan:
+        perintah.append(("srem", (JOB_ENABLED_SET, *dinonaktifkan)))
+    for job_id, rows in state["job_spec_versions"].items():
+        key = _kunci_job_spec_versions(job_id)
+        # Full rows go on top of any delta history; dropping the index restarts sequencing with a snapshot.
+        perintah.append(("lpush", (key, *[json.dumps(row) for row in reversed(rows)])))
+        perintah.append(("ltrim", (key, 0, JOB_SPEC_VERSIONS_MAX - 1)))
+        perintah.append(("delete", (_kunci_index_versi(job_id),)))
+
+    # Run records go through _migrasi_runs_fallback, which never replaces a newer Redis copy.
+    for job_id, rows in state["job_runs"].items():
+        key = f"{JOB_RUNS_PREFIX}{job_id}"
+        perintah.append(("lpush", (key, *reversed(rows))))
+        perintah.append(("ltrim", (key, 0, 49)))
+
+    for job_id, row in state["failure_state"].items():
+        perintah.append(("set", (_kunci_failure_state(job_id), json.dumps(row))))
+
+    if state["events"]:
+        # Stored newest-first; push oldest-first so the Redis list keeps the same order.
+        if is_mode_legacy_redis_queue():
+            perintah.append(("lpush", (EVENTS_LOG, *[json.dumps(event) for event in reversed(state["events"])])))
+            perintah.append(("ltrim", (EVENTS_LOG, 0, EVENTS_MAX - 1)))
+        else:
+            for event in reversed(state["events"]):
+                perintah.append(("xadd", (EVENTS_STREAM, {"data": json.dumps(event)}, "*", settings.EVENTS_STREAM_MAXLEN, True)))
+
+    dead_letters = [{key: value for key, value in entry.items() if key != "dead_letter_id"} for entry in state["dead_letters"]]
+    if dead_letters and is_mode_legacy_redis_queue():
+        perintah.append(("lpush", (DEAD_LETTER_LIST, *[json.dumps(entry) for entry in state["dead_letters"]])))
+        perintah.append(("ltrim", (DEAD_LETTER_LIST, 0, max(1, int(settings.DEAD_LETTER_MAXLEN)) - 1)))
+    elif dead_letters:
+        perintah.extend(_perintah_dead_letter(dead_letters))
+    return perintah
+
+
+async def _perintah_migrasi_shard(state: Dict[str, Any]) -> Dict[int, List[Tuple[str, tuple]]]:
+    per_shard: Dict[int, List[Tuple[str, tuple]]] = defaultdict(list)
+    streams_per_shard: Dict[int, set] = defaultdict(set)
+    for stream, rows in state["streams"].items():
+        for item in rows:
+            shard = _shard_untuk_event(item["data"])
+            streams_per_shard[shard].add(stream)
+            per_shard[shard].append(_perintah_enqueue_migrasi(stream, item["data"]))
+    for shard, streams in streams_per_shard.items():
+        await _pastikan_consumer_group(sorted(streams), shard)
+    return per_shard
+
+
+def _urutan_versi_run(run_data: Dict[str, Any]) -> Tuple[int, int, float]:
+    # Runs only move forward: a later attempt, then queued -> running -> finished, then a later timestamp.
+    status = _status_run_teks(run_data.get("status"))
+    tahap = {"queued": 0, "running": 1}.get(status, 2)
+    waktu = run_data.get("finished_at") or run_data.get("started_at") or run_data.get("scheduled_at")
+    return int(run_data.get("attempt") or 0), tahap, _ke_timestamp(waktu)
+
+
+async def _ganti_run_jika_lebih_baru(
+    run_id: str, run_data: Dict[str, Any], score: float, lama: Optional[Dict[str, str]]
+) -> bool:
+    while True:
+        payload = await redis_client.get(f"{RUN_PREFIX}{run_id}")
+        if payload and _urutan_versi_run(run_data) <= _urutan_versi_run(json.loads(payload)):
+            return False
+        tersimpan, lama = await _simpan_run_redis(run_id, run_data, score, lama if payload else None)
+        if tersimpan:
+            return True
+
+
+async def _migrasi_runs_fallback(state: Dict[str, Any], batch_size: int) -> None:
+    """Write fallback runs that Redis does not have, or has an older copy of.
+
+    A run a Redis-side worker moved on since recovery (e.g. to success) keeps its Redis record and indexes.
+    """
+    rows = list(state["runs"].items())
+    for start in range(0, len(rows), batch_size):
+        batch = rows[start : start + batch_size]
+        scores = [state["run_scores"].get(run_id, _ke_timestamp(run_data.get("scheduled_at"))) for run_id, run_data in batch]
+        pipe = redis_client.pipeline(transaction=False)
+        for (run_id, run_data), score in zip(batch, scores):
+            # Expecting no record makes the common case a plain insert; existing ones are compared below.
+            pipe.eval(*_argumen_simpan_run(run_id, run_data, score, None))
+        hasil = await pipe.execute()
+        for (run_id, run_data), score, (ok, aktual) in zip(batch, scores, hasil):
+            if not int(ok):
+                await _ganti_run_jika_lebih_baru(run_id, run_data, score, _index_dari_teks(aktual))
+
+
+async def _tulis_state_fallback_ke_redis(state: Dict[str, Any], batch_size: int) -> int:
+    legacy = is_mode_legacy_redis_queue()
+    perintah_shard: Dict[Optional[int], List[Tuple[str, tuple]]] = {}
+    if not legacy and is_mode_sharded_queue():
+        perintah_shard.update(await _perintah_migrasi_shard(state))
+    elif not legacy and state["streams"]:
+        await _pastikan_consumer_group(sorted(state["streams"]))
+    perintah_shard[None] = _perintah_migrasi_fallback(state)
+    for shard, perintah in perintah_shard.items():
+        for start in range(0, len(perintah), batch_size):
+            pipe = _klien_stream(shard).pipeline(transaction=False)
+            _antrekan_perintah(pipe, perintah[start : start + batch_size])
+            await pipe.execute()
+    await _migrasi_runs_fallback(state, batch_size)
+    return sum(len(perintah) for perintah in perintah_shard.values())
+
+
+def _hitung_state_fallback(state: Dict[str, Any]) -> Dict[str, int]:
+    return {
+        "stream_items": sum(len(rows) for rows in state["streams"].values()),
+        "delayed": len(state["delayed"]),
+        "runs": len(state["runs"]),
+        "job_specs": len(state["job_specs"]),
+        "events": len(state["events"]),
+        "failure_state": len(state["failure_state"]),
+    }
+
+
+async def migrate_fallback_to_redis(batch_size: Optional[int] = None) -> Dict[str, int]:
+    """Copy buffered fallback state into Redis in pipelined batches, then leave fallback mode.
+
+    A first pass copies the bulk while fallback mode still serves reads and absorbs new writes (only
+    queued work is taken out, so it is not consumed twice). The second pass detaches everything and
+    switches modes in one step, then writes only what changed since the copy, so nothing is left behind
+    and readers never see the state emptied early. On a Redis error the detached part is merged back and
+    fallback mode stays on.
+    """
+    batas = max(1, int(batch_size or settings.FALLBACK_MIGRATION_BATCH))
+    total = {key: 0 for key in ("stream_items", "delayed", "runs", "job_specs", "events", "failure_state")}
+
+    tertulis = _lepas_antrean_fallback()
+    if not _state_fallback_kosong(tertulis):
+        try:
+            await _tulis_state_fallback_ke_redis(tertulis, batas)
+        except RedisError:
+            _kembalikan_state_fallback(_hanya_antrean(tertulis))
+            raise
+
+    state = _lepas_state_fallback()
+    set_mode_fallback_redis(False)
+    sisa = _selisih_state_fallback(state, tertulis)
+    if not _state_fallback_kosong(sisa):
+        try:
+            await _tulis_state_fallback_ke_redis(sisa, batas)
+        except RedisError:
+            set_mode_fallback_redis(True)
+            _kembalikan_state_fallback(state)
+            raise
+
+    for bagian in (tertulis, sisa):
+        for key, value in _hitung_state_fallback(bagian).items():
+            total[key] += value
+
+    if _jurnal_fallback is not None:
+        # Everything now lives in Redis; a fresh snapshot keeps a restart from replaying it again.
+        _jurnal_fallback.write_snapshot(_snapshot_state_fallback())
+    return total
+
+
+async def probe_redis_recovery(timeout_sec: float = 0.5) -> Optional[Dict[str, int]]:
+    """Return migration counts when Redis answered and fallback state was moved back, else None."""
+    if not _sedang_mode_fallback_redis():
+        return None
+    try:
+        await asyncio.wait_for(redis_client.ping(), timeout=timeout_sec)
+        return await migrate_fallback_to_redis()
+    except (RedisError, asyncio.TimeoutError, OSError):
+        return None
+
+
+async def redis_recovery_loop(
+    on_recovered: Optional[Callable[[Dict[str, int]], Awaitable[None]]] = None,
+    interval_sec: Optional[float] = None,
+) -> None:
+    """Probe Redis while in fallback mode; one loop per process is enough."""
+    global _loop_pemulihan_aktif
+    if _loop_pemulihan_aktif:
+        return
+    _loop_pemulihan_aktif = True
+    interval = max(0.2, float(interval_sec or settings.REDIS_RECOVERY_PROBE_SEC))
+    try:
+        while True:
+            hasil = await probe_redis_recovery()
+            if hasil is not None and on_recovered is not None:
+                await on_recovered(hasil)
+            await asyncio.sleep(interval)
+    finally:
+        _loop_pemulihan_aktif = False
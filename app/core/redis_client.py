@@ -1,32 +1,78 @@
 import inspect
+from typing import Any, Dict, List, Optional
 
 import redis.asyncio as redis
 from .config import settings
 
-# Global Redis client instance
-redis_client = redis.Redis(
-    host=settings.REDIS_HOST,
-    port=settings.REDIS_PORT,
-    db=settings.REDIS_DB,
-    password=settings.REDIS_PASSWORD,
-    decode_responses=True,
-    encoding="utf-8",
-    # Keep failures fast when Redis is unavailable so API endpoints return quickly.
-    socket_connect_timeout=0.2,
-    socket_timeout=0.2,
-    retry_on_timeout=False,
-)
+# Blocking reads hold their connection for the whole block interval; allow this much on top before the socket gives up.
+BLOCKING_SOCKET_MARGIN_SEC = 1.0
+
+
+def _buat_client(socket_timeout: float, max_connections: int, url: Optional[str] = None) -> redis.Redis:
+    kwargs: Dict[str, Any] = {
+        "decode_responses": True,
+        "encoding": "utf-8",
+        # Keep failures fast when Redis is unavailable so API endpoints return quickly.
+        "socket_connect_timeout": 0.2,
+        "socket_timeout": socket_timeout,
+        "retry_on_timeout": False,
+    }
+    if url:
+        if max_connections <= 0:
+            return redis.Redis.from_url(url, **kwargs)
+        pool = redis.BlockingConnectionPool.from_url(url, max_connections=max_connections, timeout=None, **kwargs)
+        return redis.Redis(connection_pool=pool)
+
+    kwargs.update(
+        host=settings.REDIS_HOST,
+        port=settings.REDIS_PORT,
+        db=settings.REDIS_DB,
+        password=settings.REDIS_PASSWORD,
+    )
+    if max_connections <= 0:
+        return redis.Redis(**kwargs)
+    # A bounded pool makes callers wait for a free connection instead of failing with "Too many connections".
+    pool = redis.BlockingConnectionPool(max_connections=max_connections, timeout=None, **kwargs)
+    return redis.Redis(connection_pool=pool)
+
+
+def _url_shard_antrean() -> List[str]:
+    return [url.strip() for url in str(settings.QUEUE_SHARD_URLS or "").split(",") if url.strip()]
+
+
+def _timeout_blocking_sec() -> float:
+    block_ms = max(int(settings.QUEUE_BLOCK_MS), int(settings.EVENTS_SSE_BLOCK_MS))
+    return block_ms / 1000 + BLOCKING_SOCKET_MARGIN_SEC
+
+
+# Global Redis client instance for short commands.
+redis_client = _buat_client(0.2, int(settings.REDIS_MAX_CONNECTIONS))
+# Separate pool for XREADGROUP BLOCK / BLPOP / XREAD BLOCK, so an empty poll waits server-side
+# instead of hitting the 0.2s socket timeout and short commands never queue behind a parked read.
+redis_blocking_client = _buat_client(_timeout_blocking_sec(), int(settings.REDIS_BLOCKING_MAX_CONNECTIONS))
+# Optional queue shards (QUEUE_SHARD_URLS): job streams live on these instances, everything else stays on redis_client.
+queue_shard_clients: List[redis.Redis] = [
+    _buat_client(0.2, int(settings.REDIS_MAX_CONNECTIONS), url) for url in _url_shard_antrean()
+]
+queue_shard_blocking_clients: List[redis.Redis] = [
+    _buat_client(_timeout_blocking_sec(), int(settings.REDIS_BLOCKING_MAX_CONNECTIONS), url) for url in _url_shard_antrean()
+]
 
 # Helper functions for common Redis operations
 async def get_redis():
     return redis_client
 
 
-async def close_redis():
-    fungsi_tutup_async = getattr(redis_client, "aclose", None)
+async def _tutup_client(client: redis.Redis) -> None:
+    fungsi_tutup_async = getattr(client, "aclose", None)
     if callable(fungsi_tutup_async):
         await fungsi_tutup_async()
         return
-    hasil_tutup = redis_client.close()
+    hasil_tutup = client.close()
     if inspect.isawaitable(hasil_tutup):
         await hasil_tutup
+
+
+async def close_redis():
+    for client in [redis_client, redis_blocking_client, *queue_shard_clients, *queue_shard_blocking_clients]:
+        await _tutup_client(client)
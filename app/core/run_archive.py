@@ -0,0 +1,152 @@
+import gzip
+import json
+import os
+import zlib
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+
+INDEX_FILE = "index.json"
+SEGMENT_PREFIX = "runs-"
+SEGMENT_SUFFIX = ".jsonl.gz"
+IDS_SUFFIX = ".ids"
+
+
+def _partisi_dari_run(run_data: Dict[str, Any]) -> str:
+    raw = run_data.get("scheduled_at")
+    try:
+        waktu = datetime.fromisoformat(str(raw))
+    except ValueError:
+        waktu = datetime.now(timezone.utc)
+    if waktu.tzinfo is None:
+        waktu = waktu.replace(tzinfo=timezone.utc)
+    return waktu.astimezone(timezone.utc).strftime("%Y-%m-%d")
+
+
+def _ke_timestamp(raw: Any) -> float:
+    try:
+        return datetime.fromisoformat(str(raw)).timestamp()
+    except ValueError:
+        return 0.0
+
+
+class RunArchive:
+    """Gzip JSONL run segments partitioned by UTC day of ``scheduled_at``.
+
+    Each archive pass appends one gzip member to the day's segment, the run_ids to a plain
+    ``.ids`` sidecar, and refreshes ``index.json`` (count and time range per partition).
+    Data is written before the index, so a crash leaves at worst a run archived twice.
+    """
+
+    def __init__(self, data_dir: str):
+        self.data_dir = Path(data_dir)
+        # partition -> (bytes of the .ids file read so far, ids). Keyed on file size because other
+        # processes (the scheduler) append to partitions this process has already read.
+        self._cache_ids: Dict[str, Tuple[int, Set[str]]] = {}
+        # (inode, mtime_ns, size) of index.json -> parsed index. The index is replaced atomically on
+        # every write, so a changed stat means another writer refreshed it.
+        self._cache_index: Optional[Tuple[Tuple[int, int, int], Dict[str, Dict[str, Any]]]] = None
+
+    def _segment_path(self, partition: str) -> Path:
+        return self.data_dir / f"{SEGMENT_PREFIX}{partition}{SEGMENT_SUFFIX}"
+
+    def _ids_path(self, partition: str) -> Path:
+        return self.data_dir / f"{SEGMENT_PREFIX}{partition}{IDS_SUFFIX}"
+
+    def load_index(self) -> Dict[str, Dict[str, Any]]:
+        """Partition index, re-read only when ``index.json`` changed on disk. Callers must not mutate it."""
+        index_path = self.data_dir / INDEX_FILE
+        try:
+            stat = index_path.stat()
+        except FileNotFoundError:
+            self._cache_index = None
+            return {}
+        kunci = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        if self._cache_index is None or self._cache_index[0] != kunci:
+            with open(index_path, "r", encoding="utf-8") as handle:
+                self._cache_index = (kunci, json.load(handle))
+        return self._cache_index[1]
+
+    def _tulis_index(self, index: Dict[str, Dict[str, Any]]) -> None:
+        index_path = self.data_dir / INDEX_FILE
+        tmp_path = index_path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as handle:
+            json.dump(index, handle, separators=(",", ":"), sort_keys=True)
+            handle.flush()
+            os.fsync(handle.fileno())
+        os.replace(tmp_path, index_path)
+        stat = index_path.stat()
+        self._cache_index = ((stat.st_ino, stat.st_mtime_ns, stat.st_size), index)
+
+    def append(self, runs: Iterable[Dict[str, Any]]) -> int:
+        """Archive serialized runs; returns how many were written."""
+        per_partisi: Dict[str, List[Dict[str, Any]]] = {}
+        for run_data in runs:
+            per_partisi.setdefault(_partisi_dari_run(run_data), []).append(run_data)
+        if not per_partisi:
+            return 0
+
+        self.data_dir.mkdir(parents=True, exist_ok=True)
+        index = dict(self.load_index())
+        total = 0
+        for partition, rows in sorted(per_partisi.items()):
+            with gzip.open(self._segment_path(partition), "at", encoding="utf-8") as handle:
+                for run_data in rows:
+                    handle.write(json.dumps(run_data, separators=(",", ":")) + "\n")
+            with open(self._ids_path(partition), "a", encoding="utf-8") as handle:
+                handle.write("".join(f"{run_data['run_id']}\n" for run_data in rows))
+
+            scores = [_ke_timestamp(run_data.get("scheduled_at")) for run_data in rows]
+            entry = dict(index.get(partition) or {"count": 0, "min_ts": min(scores), "max_ts": max(scores)})
+            entry["count"] = int(entry["count"]) + len(rows)
+            entry["min_ts"] = min(float(entry["min_ts"]), min(scores))
+            entry["max_ts"] = max(float(entry["max_ts"]), max(scores))
+            index[partition] = entry
+            total += len(rows)
+        self._tulis_index(index)
+        return total
+
+    def _ids_partisi(self, partition: str) -> Set[str]:
+        ids_path = self._ids_path(partition)
+        try:
+            ukuran = ids_path.stat().st_size
+        except FileNotFoundError:
+            self._cache_ids.pop(partition, None)
+            return set()
+        offset, ids = self._cache_ids.get(partition, (0, set()))
+        if ukuran < offset:
+            # Rewritten rather than appended to; start over.
+            offset, ids = 0, set()
+        if ukuran > offset:
+            with open(ids_path, "rb") as handle:
+                handle.seek(offset)
+                tambahan = handle.read(ukuran - offset)
+            # Only whole lines count; a line still being written is picked up on the next call.
+            tambahan = tambahan[: tambahan.rfind(b"\n") + 1]
+            ids = ids | {line.strip() for line in tambahan.decode("utf-8").splitlines() if line.strip()}
+            offset += len(tambahan)
+        self._cache_ids[partition] = (offset, ids)
+        return ids
+
+    def _cari_di_segment(self, partition: str, run_id: str) -> Optional[Dict[str, Any]]:
+        found: Optional[Dict[str, Any]] = None
+        try:
+            with gzip.open(self._segment_path(partition), "rt", encoding="utf-8") as handle:
+                for line in handle:
+                    # Cheap substring check before parsing; the last copy wins if a run was archived twice.
+                    if run_id not in line:
+                        continue
+                    row = json.loads(line)
+                    if row.get("run_id") == run_id:
+                        found = row
+        except (EOFError, OSError, zlib.error, ValueError):
+            # A torn trailing member from a crash; rows read before it are intact.
+            pass
+        return found
+
+    def get(self, run_id: str) -> Optional[Dict[str, Any]]:
+        for partition in sorted(self.load_index(), reverse=True):
+            if run_id in self._ids_partisi(partition):
+                return self._cari_di_segment(partition, run_id)
+        return None
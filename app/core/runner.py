@@ -6,6 +6,7 @@ from typing import Any, Callable, Dict, Optional
 
 from .approval_queue import create_approval_request
 from .models import RunStatus, Run, RunResult
+from .process_executor import EXECUTOR_ASYNC, EXECUTOR_PROCESS, normalisasi_executor, run_in_process_pool
 from .queue import add_run_to_job_history, append_event, get_run, record_job_outcome, save_run
 from .redis_client import redis_client
 
@@ -34,12 +35,21 @@ class JobContext:
         self.timeout_ms = timeout_ms
 
 
-async def execute_job_handler(handler: Callable, ctx: JobContext, inputs: Dict) -> RunResult:
-    """Execute a job handler with timeout and error handling"""
+async def execute_job_handler(
+    handler: Callable, ctx: JobContext, inputs: Dict, executor: str = EXECUTOR_ASYNC
+) -> RunResult:
+    """Execute a job handler with timeout and error handling.
+
+    ``executor="process"`` runs it in the worker's process pool so CPU-bound work does not stall the loop.
+    """
     waktu_mulai = time.time()
 
     try:
-        hasil_handler = await asyncio.wait_for(handler(ctx, inputs), timeout=ctx.timeout_ms / 1000.0)
+        if executor == EXECUTOR_PROCESS:
+            panggilan = run_in_process_pool(handler, ctx, inputs)
+        else:
+            panggilan = handler(ctx, inputs)
+        hasil_handler = await asyncio.wait_for(panggilan, timeout=ctx.timeout_ms / 1000.0)
         durasi_ms = int((time.time() - waktu_mulai) * 1000)
 
         # Convention: handlers may return {"success": false, "error": "..."} to signal logical failure.
@@ -54,7 +64,8 @@ async def execute_job_handler(handler: Callable, ctx: JobContext, inputs: Dict)
 
         return RunResult(success=True, output=hasil_handler, duration_ms=durasi_ms)
 
-    except asyncio.TimeoutError:
+    except (asyncio.TimeoutError, TimeoutError):
+        # The pool process raises the builtin TimeoutError when its own timer fires first.
         pesan_error = f"Job timed out after {ctx.timeout_ms}ms"
         ctx.logger.error(pesan_error, extra={"job_id": ctx.job_id, "run_id": ctx.run_id})
         return RunResult(success=False, error=pesan_error, duration_ms=int((time.time() - waktu_mulai) * 1000))
@@ -128,6 +139,7 @@ async def process_job_event(
     tools: dict,
     logger,
     metrics,
+    executor_registry: Optional[dict] = None,
 ) -> bool:
     """Process a single job event from the queue"""
     try:
@@ -233,8 +245,17 @@ async def process_job_event(
             timeout_ms=timeout_ms,
         )
 
-        # Execute handler
-        hasil_run = await execute_job_handler(handler, ctx, inputs)
+        # Execute handler; the spec's executor wins over the registry default for the job type, but only
+        # job types registered for the process pool may run there (their handlers need no tools or Redis).
+        executor_terdaftar = normalisasi_executor((executor_registry or {}).get(resolved_job_type))
+        executor = normalisasi_executor(event_data.get("executor") or executor_terdaftar)
+        if executor == EXECUTOR_PROCESS and executor_terdaftar != EXECUTOR_PROCESS:
+            logger.warning(
+                "Executor 'process' ignored for a job type not registered for the process pool",
+                extra={"job_id": job_id, "run_id": run_id, "job_type": resolved_job_type},
+            )
+            executor = EXECUTOR_ASYNC
+        hasil_run = await execute_job_handler(handler, ctx, inputs, executor)
 
         # Update run status
         data_run.status = RunStatus.SUCCESS if hasil_run.success else RunStatus.FAILED
@@ -361,9 +382,21 @@ async def handle_retry(job_id: str, run_id: str, attempt: int, retry_policy: dic
         timeout_ms=int(spesifikasi.get("timeout_ms", 30000)),
         agent_pool=spesifikasi.get("agent_pool"),
         priority=spesifikasi.get("priority", 0),
+        executor=spesifikasi.get("executor"),
     )
 
     await schedule_delayed_job(event_retry, jeda_detik)
+    # Promotion moves the entry into the stream server-side, so the run is marked queued for the
+    # next attempt now; writing it after promotion could overwrite a worker that already started it.
+    data_run = await get_run(run_id)
+    if data_run:
+        data_run.status = RunStatus.QUEUED
+        data_run.attempt = attempt + 1
+        data_run.scheduled_at = datetime.fromtimestamp(time.time() + max(0, jeda_detik), timezone.utc)
+        data_run.started_at = None
+        data_run.finished_at = None
+        data_run.result = None
+        await save_run(data_run)
     await append_event(
         "run.retry_scheduled",
         {"run_id": run_id, "job_id": job_id, "attempt": attempt + 1, "delay_sec": jeda_detik},
@@ -3,7 +3,7 @@ import hashlib
 import time
 import uuid
 from datetime import datetime, timezone
-from typing import Dict
+from typing import Dict, List, Set
 
 from .config import settings
 from .approval_queue import has_pending_approval_for_job
@@ -11,17 +11,20 @@ from .models import JobSpec, QueueEvent, Run, RunStatus
 from .queue import (
     add_run_to_job_history,
     append_event,
+    archive_old_runs,
     count_active_runs_for_flow_group,
     enqueue_job,
+    enqueue_jobs,
     get_job_cooldown_remaining,
-    get_due_jobs,
     get_queue_metrics,
+    get_queue_stats,
     get_run,
     has_active_runs,
-    list_enabled_job_ids,
-    get_job_spec,
+    list_enabled_specs,
+    promote_due_jobs,
     is_mode_fallback_redis,
     save_run,
+    trim_job_streams,
 )
 from .redis_client import redis_client
 
@@ -47,18 +50,24 @@ class Scheduler:
         self.queue_depth_snapshot = 0
         self.queue_delayed_snapshot = 0
         self.max_dispatch_per_tick = max(1, int(settings.SCHEDULER_MAX_DISPATCH_PER_TICK))
+        self.due_batch_limit = max(1, int(settings.SCHEDULER_DUE_BATCH_LIMIT))
+        self.run_archive_interval_sec = max(1, int(settings.RUN_ARCHIVE_INTERVAL_SEC))
+        self.run_archive_batch = max(1, int(settings.RUN_ARCHIVE_BATCH))
+        self.next_run_archive_at = 0.0
+        self.stream_trim_interval_sec = max(1, int(settings.QUEUE_TRIM_INTERVAL_SEC))
+        self.next_stream_trim_at = 0.0
         self.pressure_depth_high = max(1, int(settings.SCHEDULER_PRESSURE_DEPTH_HIGH))
         configured_low = max(0, int(settings.SCHEDULER_PRESSURE_DEPTH_LOW))
         self.pressure_depth_low = min(configured_low, self.pressure_depth_high - 1)
+        metric = str(settings.SCHEDULER_PRESSURE_METRIC or "").strip().lower()
+        self.pressure_metric = metric if metric in {"lag", "depth"} else "lag"
 
     async def load_jobs(self):
         """Load all enabled jobs from Redis."""
-        daftar_id_job = await list_enabled_job_ids()
         job_terbaru: Dict[str, JobSpec] = {}
-        for job_id in daftar_id_job:
-            spesifikasi = await get_job_spec(job_id)
-            if spesifikasi:
-                job_terbaru[job_id] = JobSpec(**spesifikasi)
+        for spesifikasi in await list_enabled_specs():
+            job = JobSpec(**spesifikasi)
+            job_terbaru[job.job_id] = job
         self.jobs = job_terbaru
 
         # Cleanup stale state for removed/disabled jobs.
@@ -107,6 +116,8 @@ class Scheduler:
             await self.process_interval_jobs()
             await self.process_cron_jobs()
             await self.process_due_jobs()
+            await self.process_run_retention()
+            await self.process_stream_trim()
             putaran += 1
             await asyncio.sleep(1)  # Check every second
 
@@ -146,8 +157,9 @@ class Scheduler:
         return max(0, min(value, 1000))
 
     async def _refresh_pressure_state(self) -> None:
-        metrik = await get_queue_metrics()
-        depth = max(0, int(metrik.get("depth", 0)))
+        # "lag" counts only undelivered messages; "depth" is the raw stream length including acked entries.
+        metrik = await get_queue_stats() if self.pressure_metric == "lag" else await get_queue_metrics()
+        depth = max(0, int(metrik.get(self.pressure_metric, 0)))
         delayed = max(0, int(metrik.get("delayed", 0)))
         self.queue_depth_snapshot = depth
         self.queue_delayed_snapshot = delayed
@@ -425,6 +437,8 @@ class Scheduler:
         """Process jobs with interval scheduling."""
         sekarang = datetime.now(timezone.utc)
         waktu_sekarang_ts = time.time()
+        batch_antrean: List[QueueEvent] = []
+        flow_dalam_batch: Set[str] = set()
 
         for job_id, spesifikasi in self.jobs.items():
             if not await self._cek_batas_dispatch_tick():
@@ -441,32 +455,40 @@ class Scheduler:
             waktu_dispatch_terakhir = self.last_dispatch.get(job_id, 0)
             if waktu_sekarang_ts - waktu_dispatch_terakhir < interval_detik:
                 continue
+
+            # Flow limits count runs already written, so flush before checking a group we are holding.
+            flow_group = self._job_flow_group(spesifikasi)
+            if flow_group and flow_group in flow_dalam_batch:
+                await enqueue_jobs(batch_antrean, source="scheduler")
+                batch_antrean = []
+                flow_dalam_batch.clear()
             if not await self._boleh_dispatch_job(job_id, spesifikasi):
                 continue
 
             run_id = f"run_{int(waktu_sekarang_ts)}_{uuid.uuid4().hex[:8]}"
-            event_antrean = QueueEvent(
-                run_id=run_id,
-                job_id=job_id,
-                type=spesifikasi.type,
-                inputs=spesifikasi.inputs,
-                attempt=0,
-                scheduled_at=sekarang.isoformat(),
-                timeout_ms=spesifikasi.timeout_ms,
-                trace_id=f"trace_{uuid.uuid4().hex}",
-                agent_pool=spesifikasi.agent_pool,
-                priority=spesifikasi.priority,
-            )
-
-            await self._simpan_run_queued(event_antrean)
-            await enqueue_job(event_antrean)
-            await append_event(
-                "run.queued",
-                {"run_id": run_id, "job_id": job_id, "job_type": spesifikasi.type, "source": "scheduler"},
+            batch_antrean.append(
+                QueueEvent(
+                    run_id=run_id,
+                    job_id=job_id,
+                    type=spesifikasi.type,
+                    inputs=spesifikasi.inputs,
+                    attempt=0,
+                    scheduled_at=sekarang.isoformat(),
+                    timeout_ms=spesifikasi.timeout_ms,
+                    trace_id=f"trace_{uuid.uuid4().hex}",
+                    agent_pool=spesifikasi.agent_pool,
+                    priority=spesifikasi.priority,
+                    executor=spesifikasi.executor,
+                )
             )
+            if flow_group:
+                flow_dalam_batch.add(flow_group)
             self.last_dispatch[job_id] = waktu_sekarang_ts
             self.dispatch_count_tick += 1
 
+        if batch_antrean:
+            await enqueue_jobs(batch_antrean, source="scheduler")
+
     async def process_cron_jobs(self):
         """Process jobs with cron scheduling."""
         sekarang = datetime.now(timezone.utc)
@@ -499,6 +521,7 @@ class Scheduler:
                 trace_id=f"trace_{uuid.uuid4().hex}",
                 agent_pool=spesifikasi.agent_pool,
                 priority=spesifikasi.priority,
+                executor=spesifikasi.executor,
             )
 
             await self._simpan_run_queued(event_antrean)
@@ -512,11 +535,13 @@ class Scheduler:
 
     async def process_due_jobs(self):
         """Move delayed jobs into stream when due."""
-        job_jatuh_tempo = await get_due_jobs()
-        for job in job_jatuh_tempo:
+        # Promotion is atomic and bounded, so several schedulers can run this concurrently.
+        for row in await promote_due_jobs(limit=self.due_batch_limit):
+            job = row["data"]
             event_antrean = QueueEvent(**job)
-            await self._simpan_run_queued(event_antrean)
-            await enqueue_job(event_antrean)
+            if not row.get("message_id"):
+                await self._simpan_run_queued(event_antrean)
+                await enqueue_job(event_antrean)
             await append_event(
                 "run.queued",
                 {
@@ -526,3 +551,28 @@ class Scheduler:
                     "source": "retry",
                 },
             )
+
+    async def process_run_retention(self):
+        """Archive runs past the retention window, one bounded batch per tick."""
+        sekarang_ts = time.time()
+        if sekarang_ts < self.next_run_archive_at:
+            return
+        jumlah = await archive_old_runs(limit=self.run_archive_batch, now=sekarang_ts)
+        # A full batch means a backlog remains; keep draining on the next tick instead of waiting.
+        if jumlah < self.run_archive_batch:
+            self.next_run_archive_at = sekarang_ts + self.run_archive_interval_sec
+        if jumlah:
+            await append_event("system.runs_archived", {"count": jumlah, "scheduler_id": self.scheduler_id})
+
+    async def process_stream_trim(self):
+        """Trim job stream entries every consumer is done with, once per trim interval."""
+        sekarang_ts = time.time()
+        if sekarang_ts < self.next_stream_trim_at:
+            return
+        self.next_stream_trim_at = sekarang_ts + self.stream_trim_interval_sec
+        trimmed = await trim_job_streams()
+        if trimmed:
+            await append_event(
+                "system.job_streams_trimmed",
+                {"count": sum(trimmed.values()), "streams": trimmed, "scheduler_id": self.scheduler_id},
+            )
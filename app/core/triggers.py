@@ -8,7 +8,7 @@ from redis.exceptions import RedisError
 
 from app.core.approval_queue import create_approval_request
 from app.core.models import QueueEvent
-from app.core.queue import append_event, enqueue_job, get_job_spec
+from app.core.queue import append_event, enqueue_jobs, get_job_spec
 from app.core.redis_client import redis_client
 
 TRIGGERS_SET = "trigger:all"
@@ -207,6 +207,9 @@ async def fire_trigger(
         scheduled_at=_sekarang_iso(),
         timeout_ms=timeout_ms,
         trace_id=f"trigger:{trigger_id}:{uuid.uuid4().hex}",
+        agent_pool=job_spec.get("agent_pool"),
+        priority=int(job_spec.get("priority", 0) or 0),
+        executor=job_spec.get("executor"),
     )
 
     now = _sekarang_iso()
@@ -254,7 +257,8 @@ async def fire_trigger(
             "channel": row["channel"],
         }
 
-    message_id = await enqueue_job(event)
+    # Run record, history, stream entry and run.queued event go out in one pipeline.
+    message_id = (await enqueue_jobs([event], source=source))[0]
 
     await _simpan_trigger(normalized_id, row)
     await append_event(
@@ -3,7 +3,7 @@ import json
 from datetime import datetime, timezone
 
 from app.core.observability import logger
-from app.core.queue import get_job_run_ids, get_job_spec, get_run, list_enabled_job_ids
+from app.core.queue import get_job_run_ids, get_run, list_enabled_specs
 
 async def run(ctx, inputs: Dict[str, Any]) -> Dict[str, Any]:
     """Export job registry and run history to file"""
@@ -11,13 +11,8 @@ async def run(ctx, inputs: Dict[str, Any]) -> Dict[str, Any]:
         path_output = inputs.get("output_path", "backup.json")
 
         # Get all job specs
-        daftar_id_job = await list_enabled_job_ids()
-        data_job = {}
-
-        for job_id in daftar_id_job:
-            spesifikasi = await get_job_spec(job_id)
-            if spesifikasi:
-                data_job[job_id] = spesifikasi
+        data_job = {spesifikasi["job_id"]: spesifikasi for spesifikasi in await list_enabled_specs()}
+        daftar_id_job = list(data_job)
 
         # Get recent runs (last 10 per job)
         data_run = {}
@@ -0,0 +1,87 @@
+import math
+import time
+from typing import Any, Dict, List, Tuple
+
+
+def _persentil(nilai_urut: List[float], p: float) -> float:
+    # Linear interpolation between the closest ranks, as in numpy's default.
+    if len(nilai_urut) == 1:
+        return nilai_urut[0]
+    posisi = (len(nilai_urut) - 1) * p
+    bawah = int(math.floor(posisi))
+    atas = min(bawah + 1, len(nilai_urut) - 1)
+    return nilai_urut[bawah] + (nilai_urut[atas] - nilai_urut[bawah]) * (posisi - bawah)
+
+
+def _ringkas(nilai: List[float]) -> Dict[str, Any]:
+    nilai_urut = sorted(nilai)
+    jumlah = math.fsum(nilai_urut)
+    rata = jumlah / len(nilai_urut)
+    varians = math.fsum((x - rata) ** 2 for x in nilai_urut) / len(nilai_urut)
+    return {
+        "count": len(nilai_urut),
+        "sum": jumlah,
+        "mean": rata,
+        "min": nilai_urut[0],
+        "max": nilai_urut[-1],
+        "stddev": math.sqrt(varians),
+        "p50": _persentil(nilai_urut, 0.5),
+        "p95": _persentil(nilai_urut, 0.95),
+    }
+
+
+def _angka(value: Any) -> Any:
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return None
+    return float(value) if math.isfinite(value) else None
+
+
+async def run(ctx, inputs: Dict[str, Any]) -> Dict[str, Any]:
+    """Aggregate raw metric rows into per-group statistics (sum, mean, stddev, p50/p95) for reports.
+
+    The rows come in ``inputs`` (already fetched by whoever queued the job), and the job touches nothing
+    else, so it runs in the worker's process pool. ``group_by`` names the grouping fields (default
+    ``["platform"]``) and ``fields`` the numeric fields to summarise (default: every numeric field).
+    """
+    rows = inputs.get("rows") or []
+    if not isinstance(rows, list):
+        return {"success": False, "error": "rows must be a list of objects"}
+    group_by = [str(field) for field in (inputs.get("group_by") or ["platform"])]
+    fields = [str(field) for field in (inputs.get("fields") or [])]
+
+    mulai = time.perf_counter()
+    per_grup: Dict[Tuple[Any, ...], Dict[str, List[float]]] = {}
+    total: Dict[str, List[float]] = {}
+    dilewati = 0
+    for row in rows:
+        if not isinstance(row, dict):
+            dilewati += 1
+            continue
+        kunci = tuple(row.get(field) for field in group_by)
+        nama_field = fields or [field for field in row if field not in group_by and _angka(row[field]) is not None]
+        nilai_grup = per_grup.setdefault(kunci, {})
+        for field in nama_field:
+            value = _angka(row.get(field))
+            if value is None:
+                continue
+            nilai_grup.setdefault(field, []).append(value)
+            total.setdefault(field, []).append(value)
+
+    groups = [
+        {
+            "group": dict(zip(group_by, kunci)),
+            "metrics": {field: _ringkas(nilai) for field, nilai in sorted(nilai_grup.items())},
+        }
+        for kunci, nilai_grup in sorted(per_grup.items(), key=lambda item: tuple(str(part) for part in item[0]))
+    ]
+    return {
+        "success": True,
+        "job_id": ctx.job_id,
+        "run_id": ctx.run_id,
+        "rows": len(rows),
+        "skipped_rows": dilewati,
+        "group_by": group_by,
+        "groups": groups,
+        "totals": {field: _ringkas(nilai) for field, nilai in sorted(total.items())},
+        "work_ms": int((time.perf_counter() - mulai) * 1000),
+    }
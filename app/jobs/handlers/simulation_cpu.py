@@ -0,0 +1,31 @@
+import hashlib
+import time
+from typing import Any, Dict
+
+
+async def run(ctx, inputs: Dict[str, Any]) -> Dict[str, Any]:
+    """Synthetic CPU-bound workload (chained SHA-256) for load simulation of the process executor.
+
+    Uses nothing but the run identifiers on ``ctx``, so it runs unchanged in the worker's process pool.
+    """
+    rounds_raw = inputs.get("rounds", 200000)
+    try:
+        rounds = int(rounds_raw)
+    except Exception:
+        rounds = 200000
+    rounds = max(1, min(rounds, 50000000))
+
+    digest = hashlib.sha256(str(inputs.get("seed") or ctx.run_id).encode("utf-8")).digest()
+    mulai = time.perf_counter()
+    for _ in range(rounds):
+        digest = hashlib.sha256(digest).digest()
+    durasi_ms = int((time.perf_counter() - mulai) * 1000)
+
+    return {
+        "success": True,
+        "job_id": ctx.job_id,
+        "run_id": ctx.run_id,
+        "rounds": rounds,
+        "digest": digest.hex(),
+        "work_ms": durasi_ms,
+    }
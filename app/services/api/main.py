@@ -87,7 +87,8 @@ from app.core.triggers import (
     list_triggers,
     upsert_trigger,
 )
-from app.core.observability import expose_metrics, logger
+from app.core.handlers_registry import validate_job_executor
+from app.core.observability import expose_metrics, expose_queue_metrics, logger
 from app.core.queue import (
     add_run_to_job_history,
     append_event,
@@ -99,14 +100,23 @@ from app.core.queue import (
     get_job_spec,
     get_job_cooldown_remaining,
     get_job_failure_state,
-    get_queue_metrics,
+    get_dead_letter,
+    get_queue_stats,
     get_run,
     init_queue,
     is_job_enabled,
     list_enabled_job_ids,
+    list_dead_letters,
     list_job_specs,
+    get_job_spec_version,
     list_job_spec_versions,
     list_runs,
+    load_run_output,
+    read_events_after,
+    purge_dead_letters,
+    redis_recovery_loop,
+    replay_dead_letters,
+    requeue_dead_letters,
     rollback_job_spec_to_version,
     save_job_spec,
     save_run,
@@ -702,6 +712,16 @@ class AuditLogView(BaseModel):
     client_ip: str = ""
 
 
+class DeadLetterRequeueRequest(BaseModel):
+    ids: List[str] = Field(default_factory=list, min_length=1, max_length=1000)
+
+
+class DeadLetterReplayRequest(BaseModel):
+    limit: int = Field(default=100, ge=1, le=10000)
+    rate_per_sec: Optional[int] = Field(default=None, ge=1, le=1000)
+    reason: Optional[str] = Field(default=None, max_length=64)
+
+
 class ApprovalDecisionRequest(BaseModel):
     decision_by: Optional[str] = None
     decision_note: Optional[str] = None
@@ -803,12 +823,26 @@ async def _stop_local_runtime():
                 await task
 
 
+async def _saat_redis_pulih(hasil_migrasi: Dict[str, int]) -> None:
+    app.state.redis_ready = True
+    await init_queue()
+    # Local runtime only exists to cover a Redis outage; dedicated services take over again.
+    await _stop_local_runtime()
+    app.state.local_mode = False
+    logger.info("Redis recovered; fallback state migrated", extra=hasil_migrasi)
+    await append_event("system.redis_recovered", {"message": "Redis recovered", "migrated": hasil_migrasi})
+
+
 @app.on_event("startup")
 async def on_startup():
     app.state.local_mode = False
     app.state.local_scheduler = None
     app.state.local_worker_task = None
     app.state.local_scheduler_task = None
+    # Created before the local runtime so this loop, not the embedded worker's, owns recovery.
+    app.state.redis_recovery_task = asyncio.create_task(
+        redis_recovery_loop(on_recovered=_saat_redis_pulih), name="redis-recovery"
+    )
 
     redis_ready = await _is_redis_ready()
     app.state.redis_ready = redis_ready
@@ -824,6 +858,11 @@ async def on_startup():
 
 @app.on_event("shutdown")
 async def on_shutdown():
+    recovery_task = getattr(app.state, "redis_recovery_task", None)
+    if recovery_task and not recovery_task.done():
+        recovery_task.cancel()
+        with suppress(asyncio.CancelledError, Exception):
+            await recovery_task
     await _stop_local_runtime()
     await close_redis()
 
@@ -844,7 +883,10 @@ async def readyz():
 
 @app.get("/metrics")
 async def metrics():
-    return PlainTextResponse(expose_metrics(), media_type="text/plain; version=0.0.4")
+    body = expose_metrics()
+    with suppress(RedisError):
+        body = f"{body}\n{expose_queue_metrics(await get_queue_stats())}"
+    return PlainTextResponse(body, media_type="text/plain; version=0.0.4")
 
 
 @app.get("/auth/me")
@@ -907,6 +949,10 @@ async def planner_execute(request: PlannerExecuteRequest):
 
 @app.post("/jobs")
 async def create_job(job_spec: JobSpec):
+    try:
+        validate_job_executor(job_spec.type, job_spec.executor)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
     spesifikasi = _serialisasi_model(job_spec)
     await save_job_spec(job_spec.job_id, spesifikasi, source="api.jobs.create")
     await enable_job(job_spec.job_id)
@@ -935,6 +981,14 @@ async def get_job_versions(job_id: str, limit: int = Query(default=20, ge=1, le=
     return await list_job_spec_versions(job_id, limit=limit)
 
 
+@app.get("/jobs/{job_id}/versions/{version_id}", response_model=JobSpecVersionView)
+async def get_job_version(job_id: str, version_id: str):
+    row = await get_job_spec_version(job_id, version_id)
+    if not row:
+        raise HTTPException(status_code=404, detail="Job version not found")
+    return row
+
+
 @app.post("/jobs/{job_id}/rollback/{version_id}", response_model=JobRollbackResponse)
 async def rollback_job(job_id: str, version_id: str, request: Request):
     spec = await get_job_spec(job_id)
@@ -1049,6 +1103,9 @@ async def trigger_job(job_id: str):
         scheduled_at=_sekarang_iso(),
         timeout_ms=int(spesifikasi.get("timeout_ms", 30000)),
         trace_id=trace_id,
+        agent_pool=spesifikasi.get("agent_pool"),
+        priority=int(spesifikasi.get("priority", 0) or 0),
+        executor=spesifikasi.get("executor"),
     )
     await enqueue_job(event_antrean)
     await append_event(
@@ -1336,9 +1393,59 @@ async def reject_approval(approval_id: str, request: ApprovalDecisionRequest):
 @app.get("/queue")
 async def queue_metrics():
     try:
-        return await get_queue_metrics()
+        return await get_queue_stats()
     except RedisError:
-        return _fallback_payload("/queue", {"depth": 0, "delayed": 0})
+        return _fallback_payload("/queue", {"depth": 0, "lag": 0, "pending": 0, "delayed": 0, "delayed_due": 0})
+
+
+@app.get("/queue/dead-letters")
+async def list_dead_letters_endpoint(
+    limit: int = Query(default=50, ge=1, le=1000),
+    reason: Optional[str] = Query(default=None, max_length=64),
+):
+    try:
+        return await list_dead_letters(limit=limit, reason=reason)
+    except RedisError:
+        return _fallback_payload("/queue/dead-letters", [])
+
+
+@app.get("/queue/dead-letters/{dead_letter_id}")
+async def get_dead_letter_endpoint(dead_letter_id: str):
+    row = await get_dead_letter(dead_letter_id)
+    if not row:
+        raise HTTPException(status_code=404, detail="Dead letter not found")
+    return row
+
+
+@app.post("/queue/dead-letters/requeue")
+async def requeue_dead_letters_endpoint(request: DeadLetterRequeueRequest):
+    hasil = await requeue_dead_letters(request.ids)
+    with suppress(Exception):
+        await append_event("queue.dead_letters_requeued", {key: len(value) for key, value in hasil.items()})
+    return hasil
+
+
+@app.post("/queue/dead-letters/replay")
+async def replay_dead_letters_endpoint(request: DeadLetterReplayRequest):
+    hasil = await replay_dead_letters(request.limit, rate_per_sec=request.rate_per_sec, reason=request.reason)
+    with suppress(Exception):
+        await append_event("queue.dead_letters_replayed", {**hasil, "reason": request.reason or ""})
+    return hasil
+
+
+@app.delete("/queue/dead-letters/{dead_letter_id}")
+async def delete_dead_letter_endpoint(dead_letter_id: str):
+    if not await purge_dead_letters([dead_letter_id]):
+        raise HTTPException(status_code=404, detail="Dead letter not found")
+    return {"dead_letter_id": dead_letter_id, "status": "deleted"}
+
+
+@app.delete("/queue/dead-letters")
+async def purge_dead_letters_endpoint(reason: Optional[str] = Query(default=None, max_length=64)):
+    jumlah = await purge_dead_letters(reason=reason)
+    with suppress(Exception):
+        await append_event("queue.dead_letters_purged", {"count": jumlah, "reason": reason or ""})
+    return {"status": "purged", "count": jumlah}
 
 
 @app.get("/connector/telegram/accounts", response_model=List[TelegramConnectorAccountView])
@@ -2129,11 +2236,12 @@ async def runs(
 
 
 @app.get("/runs/{run_id}")
-async def run_detail(run_id: str):
-    run = await get_run(run_id)
+async def run_detail(run_id: str, include_archived: bool = False):
+    # The archive is searched on its own for IDs past the retention cutoff; the flag forces it for the rest.
+    run = await get_run(run_id, include_archived=True if include_archived else None)
     if not run:
         raise HTTPException(status_code=404, detail="Run not found")
-    return _serialisasi_model(run)
+    return _serialisasi_model(await load_run_output(run))
 
 
 @app.get("/audit/logs", response_model=List[AuditLogView])
@@ -2204,27 +2312,23 @@ async def events(
 
     if "text/event-stream" in accept:
         async def stream():
-            seen_ids = set()
+            last_id: Optional[str] = None
+            rows: List[Dict[str, Any]] = []
+            try:
+                rows = await get_events(limit=limit, since=since)
+            except RedisError:
+                pass
             while True:
+                for row in rows:
+                    # Tail from the newest entry seen, even when it is filtered out of the response.
+                    last_id = row.get("stream_id") or last_id
+                    if cocok_filter_event(row):
+                        yield f"data: {json.dumps(row)}\n\n"
                 try:
-                    rows = await get_events(limit=limit, since=since)
+                    rows = await read_events_after(last_id, count=limit)
                 except RedisError:
+                    rows = []
                     await asyncio.sleep(1)
-                    continue
-                for row in rows:
-                    if not cocok_filter_event(row):
-                        continue
-                    event_id = row.get("id")
-                    if event_id in seen_ids:
-                        continue
-                    seen_ids.add(event_id)
-                    yield f"data: {json.dumps(row)}\n\n"
-
-                # Keep memory bounded
-                if len(seen_ids) > 2000:
-                    seen_ids.clear()
-
-                await asyncio.sleep(1)
 
         return StreamingResponse(
             stream(),
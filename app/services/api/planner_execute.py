@@ -1,20 +1,19 @@
 import asyncio
 import uuid
 from datetime import datetime, timezone
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 
 from pydantic import BaseModel, Field
 
-from app.core.models import QueueEvent, Run, RunStatus
+from app.core.handlers_registry import validate_job_executor
+from app.core.models import QueueEvent
 from app.core.queue import (
-    add_run_to_job_history,
     append_event,
     enable_job,
-    enqueue_job,
+    enqueue_jobs,
     get_job_spec,
     get_run,
     save_job_spec,
-    save_run,
 )
 from app.services.api.planner import build_plan_from_prompt
 from app.services.api.planner_ai import PlannerAiRequest, build_plan_with_ai_dari_dashboard
@@ -55,40 +54,26 @@ class PlannerExecuteResponse(BaseModel):
     results: List[PlannerExecutionResult] = Field(default_factory=list)
 
 
-async def _antrikan_run_dari_spesifikasi(job_id: str, spesifikasi: Dict[str, Any]) -> Dict[str, str]:
-    run_id = f"run_{int(datetime.now(timezone.utc).timestamp())}_{uuid.uuid4().hex[:8]}"
-    trace_id = f"trace_{uuid.uuid4().hex}"
-
-    data_run = Run(
-        run_id=run_id,
-        job_id=job_id,
-        status=RunStatus.QUEUED,
-        attempt=0,
-        scheduled_at=datetime.now(timezone.utc),
-        inputs=spesifikasi.get("inputs", {}),
-        trace_id=trace_id,
-    )
-    await save_run(data_run)
-    await add_run_to_job_history(job_id, run_id)
-
-    event_antrean = QueueEvent(
-        run_id=run_id,
+def _buat_event_run_dari_spesifikasi(job_id: str, spesifikasi: Dict[str, Any]) -> QueueEvent:
+    return QueueEvent(
+        run_id=f"run_{int(datetime.now(timezone.utc).timestamp())}_{uuid.uuid4().hex[:8]}",
         job_id=job_id,
         type=spesifikasi["type"],
         inputs=spesifikasi.get("inputs", {}),
         attempt=0,
         scheduled_at=_sekarang_iso(),
         timeout_ms=int(spesifikasi.get("timeout_ms", 30000)),
-        trace_id=trace_id,
+        trace_id=f"trace_{uuid.uuid4().hex}",
+        agent_pool=spesifikasi.get("agent_pool"),
+        priority=int(spesifikasi.get("priority", 0) or 0),
+        executor=spesifikasi.get("executor"),
     )
-    await enqueue_job(event_antrean)
 
-    await append_event(
-        "run.queued",
-        {"run_id": run_id, "job_id": job_id, "job_type": spesifikasi["type"], "source": "planner_execute"},
-    )
 
-    return {"run_id": run_id, "status": "queued"}
+async def _antrikan_runs_dari_spesifikasi(daftar_spesifikasi: List[Tuple[str, Dict[str, Any]]]) -> List[Dict[str, str]]:
+    daftar_event = [_buat_event_run_dari_spesifikasi(job_id, spesifikasi) for job_id, spesifikasi in daftar_spesifikasi]
+    await enqueue_jobs(daftar_event, source="planner_execute")
+    return [{"run_id": event.run_id, "status": "queued"} for event in daftar_event]
 
 
 async def execute_prompt_plan(request: PlannerExecuteRequest) -> PlannerExecuteResponse:
@@ -98,6 +83,7 @@ async def execute_prompt_plan(request: PlannerExecuteRequest) -> PlannerExecuteR
         rencana = build_plan_from_prompt(request)
 
     daftar_hasil: List[PlannerExecutionResult] = []
+    antrean_run: List[Tuple[PlannerExecutionResult, str, Dict[str, Any]]] = []
 
     for rencana_job in rencana.jobs:
         model_spesifikasi = rencana_job.job_spec
@@ -106,6 +92,7 @@ async def execute_prompt_plan(request: PlannerExecuteRequest) -> PlannerExecuteR
         tipe_job = spesifikasi["type"]
 
         try:
+            validate_job_executor(tipe_job, spesifikasi.get("executor"))
             sudah_ada = await get_job_spec(job_id) is not None
             await save_job_spec(job_id, spesifikasi)
             await enable_job(job_id)
@@ -127,20 +114,7 @@ async def execute_prompt_plan(request: PlannerExecuteRequest) -> PlannerExecuteR
             )
 
             if request.run_immediately:
-                respons_run = await _antrikan_run_dari_spesifikasi(job_id, spesifikasi)
-                hasil.run_id = respons_run["run_id"]
-                hasil.queue_status = respons_run["status"]
-
-                if request.wait_seconds > 0:
-                    await asyncio.sleep(request.wait_seconds)
-                    data_run = await get_run(respons_run["run_id"])
-                    if data_run:
-                        hasil.run_status = (
-                            data_run.status.value if hasattr(data_run.status, "value") else str(data_run.status)
-                        )
-                        if data_run.result:
-                            hasil.result_success = data_run.result.success
-                            hasil.result_error = data_run.result.error
+                antrean_run.append((hasil, job_id, spesifikasi))
 
             daftar_hasil.append(hasil)
         except Exception as error:
@@ -153,6 +127,32 @@ async def execute_prompt_plan(request: PlannerExecuteRequest) -> PlannerExecuteR
                 )
             )
 
+    if antrean_run:
+        # All runs of the plan are queued together so the batch costs one Redis round trip.
+        try:
+            daftar_respons = await _antrikan_runs_dari_spesifikasi(
+                [(job_id, spesifikasi) for _, job_id, spesifikasi in antrean_run]
+            )
+        except Exception as error:
+            for hasil, _, _ in antrean_run:
+                hasil.queue_status = "error"
+                hasil.result_error = str(error)
+            daftar_respons = []
+
+        for (hasil, _, _), respons_run in zip(antrean_run, daftar_respons):
+            hasil.run_id = respons_run["run_id"]
+            hasil.queue_status = respons_run["status"]
+
+        if daftar_respons and request.wait_seconds > 0:
+            await asyncio.sleep(request.wait_seconds)
+            for hasil, _, _ in antrean_run:
+                data_run = await get_run(hasil.run_id)
+                if data_run:
+                    hasil.run_status = data_run.status.value if hasattr(data_run.status, "value") else str(data_run.status)
+                    if data_run.result:
+                        hasil.result_success = data_run.result.success
+                        hasil.result_error = data_run.result.error
+
     return PlannerExecuteResponse(
         planner_source=rencana.planner_source,
         summary=rencana.summary,
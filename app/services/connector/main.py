@@ -10,7 +10,7 @@ from app.core.connector_accounts import (
     set_telegram_last_update_id,
 )
 from app.core.observability import logger
-from app.core.queue import append_event, is_mode_fallback_redis, set_mode_fallback_redis
+from app.core.queue import append_event, is_mode_fallback_redis, redis_recovery_loop, set_mode_fallback_redis
 from app.core.redis_client import redis_client
 from app.services.api.planner import PlannerRequest, build_plan_from_prompt
 from app.services.api.planner_ai import PlannerAiRequest, build_plan_with_ai_dari_dashboard
@@ -499,6 +499,10 @@ async def telegram_connector():
                 await asyncio.sleep(3)
 
 
+async def _saat_redis_pulih(hasil_migrasi: Dict[str, int]) -> None:
+    logger.info("Redis connector pulih, fallback mode dimatikan", extra=hasil_migrasi)
+
+
 async def connector_main():
     """Main connector loop."""
     redis_ready = await _is_redis_ready()
@@ -513,6 +517,7 @@ async def connector_main():
     daftar_tugas = [
         asyncio.create_task(telegram_connector()),
         asyncio.create_task(pantau_konektor()),
+        asyncio.create_task(redis_recovery_loop(on_recovered=_saat_redis_pulih)),
     ]
     await asyncio.gather(*daftar_tugas)
 
@@ -1,20 +1,28 @@
 import asyncio
+from typing import Dict
 
 from app.core.observability import logger
-from app.core.queue import append_event
+from app.core.queue import append_event, redis_recovery_loop
 from app.core.scheduler import Scheduler
 
+async def _saat_redis_pulih(hasil_migrasi: Dict[str, int]) -> None:
+    logger.info("Redis recovered; scheduler left fallback mode", extra=hasil_migrasi)
+
+
 async def scheduler_main():
     """Main scheduler loop"""
     penjadwal = Scheduler()
     logger.info("Scheduler started")
     await append_event("system.scheduler_started", {"message": "Scheduler started"})
+    tugas_pemulihan = asyncio.create_task(redis_recovery_loop(on_recovered=_saat_redis_pulih))
 
     try:
         await penjadwal.start()
     except KeyboardInterrupt:
         logger.info("Scheduler shutting down")
         await penjadwal.stop()
+    finally:
+        tugas_pemulihan.cancel()
 
 if __name__ == "__main__":
     asyncio.run(scheduler_main())
@@ -1,18 +1,32 @@
 import asyncio
+import contextlib
 import time
 import uuid
 from datetime import datetime, timezone
+from typing import Dict, Optional, Tuple
 
+from app.core.concurrency_limit import AdaptiveConcurrencyLimit
 from app.core.config import settings
 from app.core.handlers_registry import get_handler
 from app.core.observability import logger, metrics_collector
+from app.core.models import RunStatus
+from app.core.process_executor import shutdown_process_pool
 from app.core.queue import (
+    ack_job,
     append_event,
+    dead_letter_job,
     dequeue_job,
+    dequeue_jobs,
+    extend_job_claims,
     get_job_spec,
+    get_queue_lag,
+    get_run,
     init_queue,
+    is_mode_deferred_ack,
     is_mode_fallback_redis,
     is_mode_legacy_redis_queue,
+    reclaim_stalled_jobs,
+    redis_recovery_loop,
 )
 from app.core.redis_client import redis_client
 from app.core.registry import policy_manager, tool_registry
@@ -27,6 +41,13 @@ from app.core.tools.multimedia import MultimediaTool
 from app.core.tools.revenue import RevenueTool
 
 AGENT_HEARTBEAT_TTL = 30
+LOOP_LAG_SAMPLE_SEC = 0.5
+
+# Set by worker_main in adaptive concurrency mode; None means a fixed number of slots.
+_batas_konkruensi: Optional[AdaptiveConcurrencyLimit] = None
+
+# Deferred-ack messages this process holds (buffered or in a handler), keyed by (shard, stream, message_id).
+_pesan_dipegang: Dict[Tuple[Optional[int], str, str], dict] = {}
 
 # Initialize tools
 tool_registry.register_tool("http", "1.0.0", HTTPTool().run)
@@ -55,7 +76,8 @@ async def update_heartbeat(worker_id: str):
         payload = {
             "timestamp": datetime.now(timezone.utc).isoformat(),
             "pool": _get_agent_pool(),
-            "concurrency": _normalisasi_konkruensi()
+            "concurrency": _konkruensi_saat_ini(),
+            "concurrency_mode": "adaptive" if _batas_konkruensi else "fixed",
         }
         await redis_client.setex(
             f"hb:agent:worker:{worker_id}",
@@ -74,11 +96,60 @@ def _normalisasi_konkruensi() -> int:
         value = 1
     return max(1, min(value, 64))
 
+
+def _konkruensi_saat_ini() -> int:
+    return _batas_konkruensi.limit if _batas_konkruensi else _normalisasi_konkruensi()
+
+
+def _mode_konkruensi_adaptif() -> bool:
+    return str(settings.WORKER_CONCURRENCY_MODE or "").strip().lower() == "adaptive"
+
+
+def _buat_batas_konkruensi() -> AdaptiveConcurrencyLimit:
+    minimum = max(1, min(int(settings.WORKER_CONCURRENCY_MIN), 256))
+    return AdaptiveConcurrencyLimit(
+        _normalisasi_konkruensi(),
+        minimum,
+        max(minimum, min(int(settings.WORKER_CONCURRENCY_MAX), 256)),
+        latency_ratio=settings.WORKER_CONCURRENCY_LATENCY_RATIO,
+        loop_lag_ms=settings.WORKER_CONCURRENCY_LOOP_LAG_MS,
+        error_rate=settings.WORKER_CONCURRENCY_ERROR_RATE,
+    )
+
+
+@contextlib.asynccontextmanager
+async def _izin_slot():
+    """Hold one of the adaptive limit's permits while a slot fetches and runs a job."""
+    if _batas_konkruensi is None:
+        yield
+        return
+    batas = _batas_konkruensi
+    await batas.acquire()
+    try:
+        yield
+    finally:
+        await batas.release()
+
+
+def _mode_fetch_batched() -> bool:
+    return str(settings.WORKER_FETCH_MODE or "").strip().lower() == "batched"
+
+
+def _hitung_prefetch(concurrency: int) -> int:
+    try:
+        value = int(settings.WORKER_PREFETCH_COUNT)
+    except Exception:
+        value = 0
+    if value <= 0:
+        value = concurrency * 2
+    return max(1, min(value, 256))
+
+
 def _get_agent_pool() -> str:
     import os
     return str(os.getenv("AGENT_POOL", "default")).strip().lower()
 
-async def _proses_satu_job(worker_id: str, data_event: dict):
+async def _proses_satu_job(worker_id: str, data_event: dict) -> bool:
     tipe_event = data_event.get("type")
     
     # Handle Armory Events (Internal System Tasks)
@@ -88,23 +159,13 @@ async def _proses_satu_job(worker_id: str, data_event: dict):
         if account_id:
             logger.info(f"Starting stealth onboarding for account: {account_id}")
             await verify_account_stealth(account_id)
-        return
+        return True
 
     # Handle standard job processing...
     tipe_job = tipe_event
     
-    # Check pool assignment
-    job_pool = str(data_event.get("agent_pool") or "default").strip().lower()
+    # Pool routing happens in the queue: workers only read the streams of their own pool.
     worker_pool = _get_agent_pool()
-    
-    # Skip if job is meant for another pool (basic routing simulation for phase 3)
-    # For a real implementation, jobs for different pools should go to different Redis Streams.
-    if job_pool != worker_pool and worker_pool != "global":
-        logger.debug(f"Skipping job meant for pool '{job_pool}', worker is on '{worker_pool}'")
-        # In a fully-fledged Phase 3, we would re-enqueue or use multiple streams.
-        # For now, we simulate processing or just mark it skipped (if it was dequeued).
-        return
-
     metrics_collector.increment("worker_job_dequeued", tags={"pool": worker_pool, "type": tipe_job})
     
     handler = get_handler(tipe_job)
@@ -124,11 +185,12 @@ async def _proses_satu_job(worker_id: str, data_event: dict):
                 "error": f"No handler for {tipe_job}",
             },
         )
-        return
+        await dead_letter_job(data_event, reason="no_handler", error=f"No handler for {tipe_job}")
+        return False
 
     # Pass the entire registry, process_job_event will resolve 'skill:*' dynamically
     handler_map = {tipe_job: handler} if handler else {}
-    from app.core.handlers_registry import peta_handler_job
+    from app.core.handlers_registry import peta_executor_job, peta_handler_job
     
     berhasil = await process_job_event(
         data_event,
@@ -137,9 +199,10 @@ async def _proses_satu_job(worker_id: str, data_event: dict):
         tool_registry.tools,
         logger,
         metrics_collector,
+        peta_executor_job,
     )
     if berhasil:
-        return
+        return True
 
     # If failed, schedule retry when possible.
     job_id = data_event.get("job_id")
@@ -147,38 +210,182 @@ async def _proses_satu_job(worker_id: str, data_event: dict):
     attempt = int(data_event.get("attempt", 0))
     spesifikasi = await get_job_spec(job_id) if job_id else None
     if not spesifikasi:
-        return
+        return False
 
     kebijakan_retry = spesifikasi.get("retry_policy", {"max_retry": 0, "backoff_sec": [1, 2, 5]})
-    await handle_retry(
+    dijadwalkan = await handle_retry(
         job_id=job_id,
         run_id=run_id,
         attempt=attempt,
         retry_policy=kebijakan_retry,
         scheduled_at=datetime.now(timezone.utc),
     )
+    if not dijadwalkan:
+        # Out of retries: keep the event so it can be re-driven once the cause is fixed.
+        data_run = await get_run(run_id) if run_id else None
+        error = data_run.result.error if data_run and data_run.result else ""
+        await dead_letter_job(data_event, reason="retries_exhausted", error=error or "")
+    return False
+
+
+async def _run_sudah_selesai(data_event: dict) -> bool:
+    run_id = data_event.get("run_id")
+    if not run_id:
+        return False
+    data_run = await get_run(run_id)
+    if not data_run or data_run.status not in {RunStatus.SUCCESS, RunStatus.FAILED}:
+        return False
+    return int(data_run.attempt or 0) >= int(data_event.get("attempt", 0) or 0)
+
+
+async def _proses_satu_job_terukur(worker_id: str, data_event: dict) -> None:
+    batas = _batas_konkruensi
+    if batas is None:
+        await _proses_satu_job(worker_id, data_event)
+        return
+    # Latency and outcome of every handled job feed the adaptive limit's current window.
+    berhasil = False
+    mulai = time.monotonic()
+    batas.job_started()
+    try:
+        berhasil = await _proses_satu_job(worker_id, data_event)
+    finally:
+        batas.job_finished((time.monotonic() - mulai) * 1000, berhasil)
+
+
+def _kunci_pesan(data_job: dict) -> Tuple[Optional[int], str, str]:
+    return (data_job.get("shard"), str(data_job.get("stream") or ""), str(data_job.get("message_id") or ""))
 
 
-async def _worker_slot_loop(worker_id: str, consumer_id: str):
+def _pegang_pesan(data_job: Optional[dict]) -> None:
+    if data_job and data_job.get("ack_pending"):
+        _pesan_dipegang[_kunci_pesan(data_job)] = data_job
+
+
+async def _proses_pesan(worker_id: str, data_job: dict):
+    _pegang_pesan(data_job)
+    try:
+        # A reclaimed message may belong to a run that finished right before its worker died.
+        if not (data_job.get("reclaimed") and await _run_sudah_selesai(data_job["data"])):
+            await _proses_satu_job_terukur(worker_id, data_job["data"])
+    finally:
+        # On an error or cancellation the message stays pending: it is reclaimed after the visibility
+        # timeout and retried, or dead-lettered once it exceeds QUEUE_MAX_DELIVERIES.
+        _pesan_dipegang.pop(_kunci_pesan(data_job), None)
+
+    if data_job.get("ack_pending"):
+        await ack_job(data_job["message_id"], data_job.get("stream"), data_job.get("shard"))
+
+
+async def _worker_slot_loop(worker_id: str, consumer_id: str, antrean_lokal: Optional[asyncio.Queue] = None):
     while True:
         try:
-            data_job = await dequeue_job(consumer_id)
+            async with _izin_slot():
+                data_job = None
+                if antrean_lokal is not None and not antrean_lokal.empty():
+                    data_job = antrean_lokal.get_nowait()
+                if not data_job:
+                    data_job = await dequeue_job(consumer_id, _get_agent_pool())
+                if data_job:
+                    await _proses_pesan(worker_id, data_job)
             if not data_job:
                 await asyncio.sleep(0.1)
+
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(
+                f"Worker slot error: {e}",
+                extra={"worker_id": worker_id, "consumer_id": consumer_id},
+            )
+            await asyncio.sleep(0.5)
+
+
+async def _fetch_loop(worker_id: str, consumer_id: str, buffer: asyncio.Queue):
+    # Refill once at least half of the buffer is free so each round trip carries a real batch.
+    while True:
+        try:
+            # The adaptive limit shrinks the prefetch target with it, so a cut does not leave a full buffer.
+            target = min(buffer.maxsize, _hitung_prefetch(_konkruensi_saat_ini()))
+            batas_isi_ulang = max(1, target // 2)
+            ruang = target - buffer.qsize()
+            if ruang < batas_isi_ulang:
+                await asyncio.sleep(0.005)
+                continue
+
+            rows = await dequeue_jobs(consumer_id, _get_agent_pool(), count=ruang, block_ms=settings.QUEUE_BLOCK_MS)
+            if not rows:
+                await asyncio.sleep(0.1)
                 continue
+            for row in rows:
+                # Buffered rows count as held from now on, so waiting in the buffer does not age them out.
+                _pegang_pesan(row)
+                await buffer.put(row)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(
+                f"Worker fetch error: {e}",
+                extra={"worker_id": worker_id, "consumer_id": consumer_id},
+            )
+            await asyncio.sleep(0.5)
 
-            await _proses_satu_job(worker_id, data_job["data"])
 
+async def _worker_slot_loop_buffer(worker_id: str, slot_id: str, buffer: asyncio.Queue):
+    while True:
+        try:
+            async with _izin_slot():
+                data_job = await buffer.get()
+                await _proses_pesan(worker_id, data_job)
         except asyncio.CancelledError:
             raise
         except Exception as e:
             logger.error(
                 f"Worker slot error: {e}",
-                extra={"worker_id": worker_id, "consumer_id": consumer_id},
+                extra={"worker_id": worker_id, "consumer_id": slot_id},
             )
             await asyncio.sleep(0.5)
 
 
+async def _reclaim_loop(worker_id: str, antrean_lokal: asyncio.Queue):
+    consumer_id = f"{worker_id}_reclaim"
+    interval = max(1, int(settings.QUEUE_RECLAIM_INTERVAL_SEC))
+    while True:
+        try:
+            if antrean_lokal.empty():
+                rows = await reclaim_stalled_jobs(
+                    consumer_id,
+                    agent_pool=_get_agent_pool(),
+                    count=antrean_lokal.maxsize,
+                )
+                for row in rows:
+                    _pegang_pesan(row)
+                    await antrean_lokal.put(row)
+            await asyncio.sleep(interval)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Reclaim loop error: {e}", extra={"worker_id": worker_id})
+            await asyncio.sleep(interval)
+
+
+def _interval_perpanjang_klaim() -> float:
+    # Three refreshes per visibility timeout, so one slow round trip cannot let a held message expire.
+    return max(1.0, int(settings.QUEUE_VISIBILITY_TIMEOUT_MS) / 3000)
+
+
+async def _perpanjang_klaim_loop(worker_id: str):
+    interval = _interval_perpanjang_klaim()
+    while True:
+        try:
+            await asyncio.sleep(interval)
+            await extend_job_claims(list(_pesan_dipegang.values()))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Claim refresh error: {e}", extra={"worker_id": worker_id})
+
+
 async def _heartbeat_loop(worker_id: str):
     while True:
         try:
@@ -190,19 +397,67 @@ async def _heartbeat_loop(worker_id: str):
             await asyncio.sleep(1)
 
 
+async def _loop_lag_monitor():
+    loop = asyncio.get_running_loop()
+    while True:
+        mulai = loop.time()
+        await asyncio.sleep(LOOP_LAG_SAMPLE_SEC)
+        # Oversleep is time the loop spent running something else: a CPU-bound handler or too many slots.
+        if _batas_konkruensi:
+            _batas_konkruensi.record_loop_lag((loop.time() - mulai - LOOP_LAG_SAMPLE_SEC) * 1000)
+
+
+async def _lag_antrean_pool() -> Optional[int]:
+    try:
+        return await get_queue_lag(_get_agent_pool())
+    except Exception:
+        return None
+
+
+async def _adaptive_concurrency_loop(worker_id: str, batas: AdaptiveConcurrencyLimit):
+    interval = max(0.5, float(settings.WORKER_CONCURRENCY_ADJUST_SEC))
+    while True:
+        try:
+            await asyncio.sleep(interval)
+            sebelumnya = batas.limit
+            limit = await batas.adjust(await _lag_antrean_pool())
+            if limit != sebelumnya:
+                logger.info(
+                    "Worker concurrency adjusted",
+                    extra={"worker_id": worker_id, "concurrency": limit, "previous": sebelumnya, "reason": batas.last_reason},
+                )
+                metrics_collector.observe("worker_concurrency_limit", limit, tags={"pool": _get_agent_pool()})
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Adaptive concurrency error: {e}", extra={"worker_id": worker_id})
+
+
+async def _saat_redis_pulih(hasil_migrasi: Dict[str, int]) -> None:
+    logger.info("Redis recovered; worker left fallback mode", extra=hasil_migrasi)
+
+
 async def worker_main():
     """Main worker loop."""
     await init_queue()
 
+    global _batas_konkruensi
     worker_id = f"worker_{int(time.time())}_{uuid.uuid4().hex[:6]}"
-    concurrency = _normalisasi_konkruensi()
+    _batas_konkruensi = _buat_batas_konkruensi() if _mode_konkruensi_adaptif() else None
+    concurrency = _konkruensi_saat_ini()
+    # Adaptive mode starts a slot per possible permit; the limit decides how many of them take jobs.
+    jumlah_slot = _batas_konkruensi.maximum if _batas_konkruensi else concurrency
     logger.info(
         "Worker started",
         extra={
             "worker_id": worker_id,
             "concurrency": concurrency,
+            "agent_pool": _get_agent_pool(),
             "fallback_mode": is_mode_fallback_redis(),
             "legacy_queue_mode": is_mode_legacy_redis_queue(),
+            "deferred_ack": is_mode_deferred_ack(),
+            "fetch_mode": "batched" if _mode_fetch_batched() else "per_slot",
+            "concurrency_mode": "adaptive" if _batas_konkruensi else "fixed",
         },
     )
     try:
@@ -217,10 +472,48 @@ async def worker_main():
         # Startup event should not block worker execution in degraded Redis conditions.
         pass
 
-    tasks = [asyncio.create_task(_heartbeat_loop(worker_id), name=f"{worker_id}:heartbeat")]
-    for index in range(concurrency):
-        consumer_id = f"{worker_id}_c{index + 1}"
-        tasks.append(asyncio.create_task(_worker_slot_loop(worker_id, consumer_id), name=f"{worker_id}:{consumer_id}"))
+    tasks = [
+        asyncio.create_task(_heartbeat_loop(worker_id), name=f"{worker_id}:heartbeat"),
+        asyncio.create_task(redis_recovery_loop(on_recovered=_saat_redis_pulih), name=f"{worker_id}:redis-recovery"),
+    ]
+    if _batas_konkruensi:
+        tasks.append(asyncio.create_task(_loop_lag_monitor(), name=f"{worker_id}:loop-lag"))
+        tasks.append(
+            asyncio.create_task(
+                _adaptive_concurrency_loop(worker_id, _batas_konkruensi), name=f"{worker_id}:adaptive-concurrency"
+            )
+        )
+    if is_mode_deferred_ack():
+        # Held messages stay owned however long their handler runs or they wait in the prefetch buffer.
+        tasks.append(asyncio.create_task(_perpanjang_klaim_loop(worker_id), name=f"{worker_id}:claim-refresh"))
+    if _mode_fetch_batched():
+        # One reader per process feeds every slot through a bounded prefetch buffer.
+        buffer: asyncio.Queue = asyncio.Queue(maxsize=_hitung_prefetch(jumlah_slot))
+        consumer_id = f"{worker_id}_fetch"
+        tasks.append(asyncio.create_task(_fetch_loop(worker_id, consumer_id, buffer), name=f"{worker_id}:fetch"))
+        if is_mode_deferred_ack():
+            tasks.append(asyncio.create_task(_reclaim_loop(worker_id, buffer), name=f"{worker_id}:reclaim"))
+        for index in range(jumlah_slot):
+            slot_id = f"{worker_id}_c{index + 1}"
+            tasks.append(
+                asyncio.create_task(
+                    _worker_slot_loop_buffer(worker_id, slot_id, buffer),
+                    name=f"{worker_id}:{slot_id}",
+                )
+            )
+    else:
+        antrean_lokal: Optional[asyncio.Queue] = None
+        if is_mode_deferred_ack():
+            antrean_lokal = asyncio.Queue(maxsize=jumlah_slot)
+            tasks.append(asyncio.create_task(_reclaim_loop(worker_id, antrean_lokal), name=f"{worker_id}:reclaim"))
+        for index in range(jumlah_slot):
+            consumer_id = f"{worker_id}_c{index + 1}"
+            tasks.append(
+                asyncio.create_task(
+                    _worker_slot_loop(worker_id, consumer_id, antrean_lokal),
+                    name=f"{worker_id}:{consumer_id}",
+                )
+            )
 
     try:
         await asyncio.gather(*tasks)
@@ -232,6 +525,7 @@ async def worker_main():
             if not task.done():
                 task.cancel()
         await asyncio.gather(*tasks, return_exceptions=True)
+        shutdown_process_pool()
 
 
 if __name__ == "__main__":
@@ -56,6 +56,8 @@ def test_resolve_required_role_for_admin_endpoints():
     assert resolve_required_role("/integrations/mcp/servers/mcp_main", "DELETE") == ROLE_ADMIN
     assert resolve_required_role("/integrations/catalog/bootstrap", "POST") == ROLE_ADMIN
     assert resolve_required_role("/agents/memory/flow_a", "DELETE") == ROLE_ADMIN
+    assert resolve_required_role("/queue/dead-letters", "DELETE") == ROLE_ADMIN
+    assert resolve_required_role("/queue/dead-letters/requeue", "POST") == ROLE_OPERATOR
 
 
 def test_role_memenuhi_hierarchy():
@@ -0,0 +1,88 @@
+import asyncio
+
+from app.core.concurrency_limit import AdaptiveConcurrencyLimit
+
+
+def _jalankan_window(batas, jumlah_job, durasi_ms, gagal=0):
+    for _ in range(jumlah_job):
+        batas.job_started()
+    for index in range(jumlah_job):
+        batas.job_finished(durasi_ms, success=index >= gagal)
+
+
+def test_limit_grows_additively_while_saturated_with_queue_lag():
+    batas = AdaptiveConcurrencyLimit(4, 1, 6)
+
+    hasil = []
+    for _ in range(4):
+        _jalankan_window(batas, batas.limit, 100)
+        hasil.append(asyncio.run(batas.adjust(queue_lag=50)))
+
+    # +1 per window, capped at the maximum.
+    assert hasil == [5, 6, 6, 6]
+    assert batas.last_reason == "queue_lag"
+
+
+def test_limit_holds_when_lagging_queue_does_not_fill_the_slots():
+    batas = AdaptiveConcurrencyLimit(8, 1, 16)
+    _jalankan_window(batas, 5, 100)
+    assert asyncio.run(batas.adjust(queue_lag=50)) == 8
+
+
+def test_limit_cuts_multiplicatively_on_latency_spike_and_keeps_baseline():
+    batas = AdaptiveConcurrencyLimit(20, 2, 64, latency_ratio=2.0)
+    _jalankan_window(batas, 20, 100)
+    asyncio.run(batas.adjust(queue_lag=10))
+    assert batas.baseline_ms == 100
+
+    _jalankan_window(batas, 5, 450)
+    limit = asyncio.run(batas.adjust(queue_lag=10))
+    assert batas.last_reason == "latency"
+    assert limit == 14
+    # The slow window does not drag the baseline up.
+    assert batas.baseline_ms == 100
+
+
+def test_limit_cuts_on_error_rate_and_loop_lag_but_not_below_minimum():
+    batas = AdaptiveConcurrencyLimit(10, 3, 64, error_rate=0.5, loop_lag_ms=200)
+    _jalankan_window(batas, 4, 100, gagal=3)
+    assert asyncio.run(batas.adjust(queue_lag=10)) == 7
+    assert batas.last_reason == "error_rate"
+
+    for _ in range(5):
+        batas.record_loop_lag(350)
+        asyncio.run(batas.adjust(queue_lag=10))
+    assert batas.limit == 3
+    assert batas.last_reason == "loop_lag"
+
+
+def test_limit_shrinks_slowly_when_queue_is_drained_and_unknown_lag_never_grows():
+    batas = AdaptiveConcurrencyLimit(6, 2, 64)
+    _jalankan_window(batas, 1, 100)
+    assert asyncio.run(batas.adjust(queue_lag=0)) == 5
+    assert batas.last_reason == "idle"
+
+    _jalankan_window(batas, batas.limit, 100)
+    assert asyncio.run(batas.adjust(queue_lag=None)) == 5
+
+
+def test_permits_follow_the_current_limit():
+    async def _skenario():
+        batas = AdaptiveConcurrencyLimit(2, 1, 4)
+        await batas.acquire()
+        await batas.acquire()
+        ketiga = asyncio.create_task(batas.acquire())
+        await asyncio.sleep(0.01)
+        assert not ketiga.done()
+
+        # A higher limit wakes waiting slots without anyone releasing.
+        batas.job_started()
+        batas.job_started()
+        await batas.adjust(queue_lag=5)
+        await asyncio.wait_for(ketiga, timeout=1)
+
+        await batas.release()
+        return batas
+
+    batas = asyncio.run(_skenario())
+    assert batas.limit == 3
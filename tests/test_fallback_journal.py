@@ -0,0 +1,148 @@
+import asyncio
+from datetime import datetime, timezone
+
+from app.core import queue
+from app.core.fallback_journal import FallbackJournal
+from app.core.models import Run, RunStatus
+
+
+def _reset_fallback_state():
+    queue.set_mode_fallback_redis(False)
+    queue._fallback_streams.clear()
+    queue._fallback_delayed.clear()
+    queue._fallback_job_specs.clear()
+    queue._fallback_job_all.clear()
+    queue._fallback_job_enabled.clear()
+    queue._fallback_job_spec_versions.clear()
+    queue._fallback_runs.clear()
+    queue._fallback_run_scores.clear()
+    queue._fallback_run_urutan.clear()
+    queue._fallback_job_runs.clear()
+    queue._fallback_active_runs.clear()
+    queue._fallback_active_flow_runs.clear()
+    queue._fallback_failure_state.clear()
+    queue._fallback_events.clear()
+    queue._fallback_dedup.clear()
+    queue._fallback_dedup_kedaluwarsa.clear()
+
+
+def _restart_process(monkeypatch, journal_dir, compact_every=10000):
+    # Simulates a fresh process: empty memory, journal not yet replayed.
+    _reset_fallback_state()
+    monkeypatch.setattr(queue, "_jurnal_fallback", FallbackJournal(str(journal_dir), compact_every=compact_every))
+    monkeypatch.setattr(queue, "_jurnal_fallback_dimuat", False)
+    queue.set_mode_fallback_redis(True)
+
+
+def _event(run_id):
+    return {"run_id": run_id, "job_id": "job_persist", "type": "monitor.channel", "inputs": {}, "attempt": 0}
+
+
+async def _isi_state_fallback():
+    await queue.save_job_spec("job_persist", {"job_id": "job_persist", "type": "monitor.channel"})
+    await queue.enable_job("job_persist")
+    await queue.save_run(
+        Run(
+            run_id="run_a",
+            job_id="job_persist",
+            status=RunStatus.QUEUED,
+            scheduled_at=datetime(2026, 1, 1, tzinfo=timezone.utc),
+        )
+    )
+    for run_id in ("run_a", "run_b", "run_c"):
+        await queue.enqueue_job(_event(run_id))
+    await queue.dequeue_job("worker_persist")
+    await queue.schedule_delayed_job(_event("run_retry"), 3600)
+    await queue.append_event("run.queued", {"run_id": "run_a"})
+
+
+def test_fallback_state_survives_restart(monkeypatch, tmp_path):
+    _restart_process(monkeypatch, tmp_path)
+    asyncio.run(_isi_state_fallback())
+
+    _restart_process(monkeypatch, tmp_path)
+
+    assert asyncio.run(queue.get_job_spec("job_persist"))["type"] == "monitor.channel"
+    assert asyncio.run(queue.list_enabled_job_ids()) == ["job_persist"]
+    assert asyncio.run(queue.get_run("run_a")).status == RunStatus.QUEUED
+    assert asyncio.run(queue.has_active_runs("job_persist")) is True
+    assert [asyncio.run(queue.dequeue_job("worker_persist"))["data"]["run_id"] for _ in range(2)] == ["run_b", "run_c"]
+    assert asyncio.run(queue.dequeue_job("worker_persist")) is None
+    assert len(queue._fallback_delayed) == 1
+    assert [row["data"]["run_id"] for row in asyncio.run(queue.get_events(limit=10)) if row["type"] == "run.queued"] == [
+        "run_a"
+    ]
+    _reset_fallback_state()
+
+
+def test_fallback_compaction_replays_snapshot_plus_tail(monkeypatch, tmp_path):
+    _restart_process(monkeypatch, tmp_path, compact_every=4)
+    asyncio.run(_isi_state_fallback())
+    assert (tmp_path / "snapshot.json").exists()
+
+    _restart_process(monkeypatch, tmp_path, compact_every=4)
+
+    assert asyncio.run(queue.get_run("run_a")) is not None
+    assert [asyncio.run(queue.dequeue_job("worker_persist"))["data"]["run_id"] for _ in range(2)] == ["run_b", "run_c"]
+    assert len(list(tmp_path.glob("journal-*.log"))) <= 1
+    _reset_fallback_state()
+
+
+def test_fallback_journal_ignores_torn_final_line(tmp_path):
+    journal = FallbackJournal(str(tmp_path))
+    journal.append("job_enabled", "job_a", True)
+    journal.close()
+    with open(tmp_path / "journal-0.log", "a", encoding="utf-8") as handle:
+        handle.write('["job_enabled", "job_b"')
+
+    snapshot, ops = FallbackJournal(str(tmp_path)).load()
+    assert snapshot is None
+    assert ops == [["job_enabled", "job_a", True]]
+
+
+def test_init_queue_replays_journal_and_migrates_it_before_consuming(monkeypatch, tmp_path):
+    _restart_process(monkeypatch, tmp_path)
+    asyncio.run(_isi_state_fallback())
+
+    # A fresh process whose Redis is up: nothing would ever switch it into fallback mode.
+    _reset_fallback_state()
+    monkeypatch.setattr(queue, "_jurnal_fallback", FallbackJournal(str(tmp_path)))
+    monkeypatch.setattr(queue, "_jurnal_fallback_dimuat", False)
+    migrated = []
+
+    async def _noop(*args, **kwargs):
+        return None
+
+    async def _migrate(batch_size=None):
+        migrated.append((sorted(queue._fallback_runs), sum(len(rows) for rows in queue._fallback_streams.values())))
+        return {}
+
+    for name in ("_siapkan_stream_antrean", "_pastikan_index_run", "_pindahkan_event_log_lama"):
+        monkeypatch.setattr(queue, name, _noop)
+    monkeypatch.setattr(queue, "migrate_fallback_to_redis", _migrate)
+
+    asyncio.run(queue.init_queue())
+    assert migrated == [(["run_a"], 2)]
+
+    # Nothing left to replay: a later init (e.g. after recovery) does not migrate again.
+    _reset_fallback_state()
+    asyncio.run(queue.init_queue())
+    assert len(migrated) == 1
+    _reset_fallback_state()
+
+
+def test_replayed_events_keep_their_stream_ids(monkeypatch, tmp_path):
+    _restart_process(monkeypatch, tmp_path)
+    for index in range(3):
+        asyncio.run(queue.append_event("run.queued", {"run_id": f"run_{index}"}))
+    sebelum = [row["stream_id"] for row in asyncio.run(queue.get_events(limit=10))]
+    queue._fallback_stream_seq = 0
+
+    _restart_process(monkeypatch, tmp_path)
+
+    assert [row["stream_id"] for row in asyncio.run(queue.get_events(limit=10))] == sebelum
+    # A client tailing from the last ID it saw still gets the next event.
+    asyncio.run(queue.append_event("run.queued", {"run_id": "run_next"}))
+    baru = asyncio.run(queue.get_events(limit=10, since=sebelum[-1]))
+    assert [row["data"]["run_id"] for row in baru] == ["run_next"]
+    _reset_fallback_state()
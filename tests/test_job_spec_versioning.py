@@ -1,6 +1,8 @@
 import asyncio
+import json
 
 from app.core import queue
+from app.core.json_patch import apply_patch, make_patch
 
 
 class _MustNotCallRedis:
@@ -14,7 +16,7 @@ class _MustNotCallRedis:
 def _reset_queue_fallback_state():
     queue.set_mode_fallback_redis(False)
     queue.set_mode_legacy_redis_queue(False)
-    queue._fallback_stream.clear()
+    queue._fallback_streams.clear()
     queue._fallback_delayed.clear()
     queue._fallback_job_specs.clear()
     queue._fallback_job_all.clear()
@@ -22,11 +24,14 @@ def _reset_queue_fallback_state():
     queue._fallback_job_spec_versions.clear()
     queue._fallback_runs.clear()
     queue._fallback_run_scores.clear()
+    queue._fallback_run_urutan.clear()
     queue._fallback_job_runs.clear()
     queue._fallback_active_runs.clear()
     queue._fallback_active_flow_runs.clear()
     queue._fallback_failure_state.clear()
     queue._fallback_events.clear()
+    queue._fallback_dedup.clear()
+    queue._fallback_dedup_kedaluwarsa.clear()
 
 
 def test_save_job_spec_creates_versions_in_fallback(monkeypatch):
@@ -82,3 +87,219 @@ def test_rollback_job_spec_to_previous_version(monkeypatch):
     assert len(versions_after) == 3
     assert versions_after[0]["source"] == "api.rollback"
     assert versions_after[0]["actor"] == "admin"
+
+
+class _Pipeline:
+    def __init__(self, client):
+        self.client = client
+        self.calls = []
+
+    def __getattr__(self, name):
+        def _antre(*args, **kwargs):
+            self.calls.append((name, args))
+            return self
+
+        return _antre
+
+    async def execute(self, raise_on_error=True):
+        return [await getattr(self.client, name)(*args) for name, args in self.calls]
+
+
+class _SpecRedis:
+    def __init__(self):
+        self.kv = {}
+        self.hashes = {}
+        self.sets = {}
+        self.lists = {}
+        self.calls = []
+
+    def pipeline(self, transaction=True):
+        return _Pipeline(self)
+
+    async def get(self, key):
+        self.calls.append(("get", key))
+        return self.kv.get(key)
+
+    async def set(self, key, value):
+        self.kv[key] = value
+
+    async def incr(self, key):
+        self.kv[key] = str(int(self.kv.get(key, 0)) + 1)
+        return int(self.kv[key])
+
+    async def sadd(self, key, *members):
+        self.sets.setdefault(key, set()).update(members)
+
+    async def hincrby(self, key, field, amount):
+        row = self.hashes.setdefault(key, {})
+        row[field] = str(int(row.get(field, 0)) + amount)
+        return int(row[field])
+
+    async def hget(self, key, field):
+        return self.hashes.get(key, {}).get(field)
+
+    async def mget(self, keys):
+        self.calls.append(("mget", len(keys)))
+        return [self.kv.get(key) for key in keys]
+
+    async def hmget(self, key, fields):
+        return [self.hashes.get(key, {}).get(field) for field in fields]
+
+    async def smembers(self, key):
+        return set(self.sets.get(key, set()))
+
+    async def hgetall(self, key):
+        self.calls.append(("hgetall", key))
+        return dict(self.hashes.get(key, {}))
+
+    async def lpush(self, key, *values):
+        row = self.lists.setdefault(key, [])
+        for value in values:
+            row.insert(0, value)
+        return len(row)
+
+    async def ltrim(self, key, start, end):
+        self.lists[key] = self.lists.get(key, [])[start : end + 1]
+        return True
+
+    async def lrange(self, key, start, end):
+        self.calls.append(("lrange", key, start, end))
+        rows = self.lists.get(key, [])
+        return rows[start:] if end == -1 else rows[start : end + 1]
+
+    async def eval(self, script, numkeys, *keys_and_args):
+        # Mirrors _SKRIP_TAMBAH_VERSI_SPEC.
+        assert script == queue._SKRIP_TAMBAH_VERSI_SPEC
+        list_key, index_key, expected_head, payload, version_id, seq, akhir = keys_and_args
+        index = self.hashes.setdefault(index_key, {})
+        if index.get("_head", "") != expected_head:
+            return 0
+        await self.lpush(list_key, payload)
+        index["_head"] = seq
+        index[version_id] = seq
+        for raw in self.lists[list_key][int(akhir) + 1 :]:
+            index.pop(json.loads(raw).get("version_id"), None)
+        await self.ltrim(list_key, 0, int(akhir))
+        return 1
+
+
+def _reset_spec_cache(monkeypatch):
+    _reset_queue_fallback_state()
+    queue._cache_job_spec.clear()
+    queue._cache_job_spec_meta.update({"global_rev": None, "checked_at": 0.0})
+    fake = _SpecRedis()
+    monkeypatch.setattr(queue, "redis_client", fake)
+    monkeypatch.setattr(queue.settings, "JOB_SPEC_CACHE_CHECK_SEC", 0)
+    return fake
+
+
+def test_job_spec_cache_skips_get_until_revision_changes(monkeypatch):
+    fake = _reset_spec_cache(monkeypatch)
+    asyncio.run(queue.save_job_spec("job_cache", {"job_id": "job_cache", "timeout_ms": 1000}))
+    fake.calls.clear()
+
+    for _ in range(5):
+        spec = asyncio.run(queue.get_job_spec("job_cache"))
+        spec["timeout_ms"] = 1
+    assert asyncio.run(queue.get_job_spec("job_cache"))["timeout_ms"] == 1000
+    assert ("get", f"{queue.JOB_SPEC_PREFIX}job_cache") not in fake.calls
+    assert fake.calls.count(("hgetall", queue.JOB_SPEC_REV_HASH)) == 1
+
+    # Another process saves a new revision.
+    fake.kv[f"{queue.JOB_SPEC_PREFIX}job_cache"] = '{"job_id": "job_cache", "timeout_ms": 2000}'
+    asyncio.run(fake.hincrby(queue.JOB_SPEC_REV_HASH, "job_cache", 1))
+    asyncio.run(fake.incr(queue.JOB_SPEC_REV_GLOBAL))
+
+    assert asyncio.run(queue.get_job_spec("job_cache"))["timeout_ms"] == 2000
+    queue._cache_job_spec.clear()
+
+
+def test_job_spec_cache_honours_check_interval(monkeypatch):
+    fake = _reset_spec_cache(monkeypatch)
+    monkeypatch.setattr(queue.settings, "JOB_SPEC_CACHE_CHECK_SEC", 3600)
+    asyncio.run(queue.save_job_spec("job_cache", {"job_id": "job_cache"}, save_version=False))
+    asyncio.run(queue.get_job_spec("job_cache"))
+    fake.calls.clear()
+
+    for _ in range(10):
+        asyncio.run(queue.get_job_spec("job_cache"))
+    assert fake.calls == []
+    queue._cache_job_spec.clear()
+
+
+def test_list_specs_batches_misses_and_reuses_cache(monkeypatch):
+    fake = _reset_spec_cache(monkeypatch)
+    monkeypatch.setattr(queue.settings, "JOB_SPEC_MGET_CHUNK", 2)
+    for index in range(5):
+        job_id = f"job_{index}"
+        fake.kv[f"{queue.JOB_SPEC_PREFIX}{job_id}"] = f'{{"job_id": "{job_id}", "type": "monitor.channel"}}'
+        fake.sets.setdefault(queue.JOB_ALL_SET, set()).add(job_id)
+        fake.hashes.setdefault(queue.JOB_SPEC_REV_HASH, {})[job_id] = "1"
+    fake.sets[queue.JOB_ENABLED_SET] = {"job_3", "job_1", "job_missing"}
+
+    specs = asyncio.run(queue.list_job_specs())
+    assert [spec["job_id"] for spec in specs] == [f"job_{index}" for index in range(5)]
+    assert [call for call in fake.calls if call[0] == "mget"] == [("mget", 2), ("mget", 2), ("mget", 1)]
+    assert not any(call[0] == "get" and call[1].startswith(queue.JOB_SPEC_PREFIX) for call in fake.calls)
+
+    fake.calls.clear()
+    enabled = asyncio.run(queue.list_enabled_specs())
+    assert [spec["job_id"] for spec in enabled] == ["job_1", "job_3"]
+    assert [call for call in fake.calls if call[0] == "mget"] == [("mget", 1)]
+    queue._cache_job_spec.clear()
+
+
+def test_json_patch_round_trip():
+    source = {"job_id": "a", "inputs": {"x": 1, "a/b": [1, 2], "drop": True}, "timeout_ms": 1000}
+    target = {"job_id": "a", "inputs": {"x": 1.0, "a/b": [1, 2, 3], "new": {"k": "v"}}, "timeout_ms": 1000}
+
+    patch = make_patch(source, target)
+    assert {op["path"] for op in patch} == {"/inputs/drop", "/inputs/x", "/inputs/a~1b", "/inputs/new"}
+    assert apply_patch(source, patch) == target
+    assert source["inputs"]["drop"] is True
+
+
+def test_version_history_stores_deltas_and_finds_versions_by_index(monkeypatch):
+    fake = _reset_spec_cache(monkeypatch)
+    monkeypatch.setattr(queue, "JOB_SPEC_VERSION_SNAPSHOT_EVERY", 4)
+    job_id = "job_delta"
+    for step in range(15):
+        spec = {"job_id": job_id, "type": "monitor.channel", "inputs": {"step": step, "payload": "x" * 200}}
+        asyncio.run(queue.save_job_spec(job_id, spec, note=f"v{step}"))
+
+    stored = [json.loads(raw) for raw in fake.lists[queue._kunci_job_spec_versions(job_id)]]
+    assert sum(1 for row in stored if "spec" in row) == 4
+    assert all("payload" not in json.dumps(row.get("patch", [])) for row in stored)
+
+    versions = asyncio.run(queue.list_job_spec_versions(job_id, limit=15))
+    assert [row["spec"]["inputs"]["step"] for row in versions] == list(range(14, -1, -1))
+    assert "patch" not in versions[0] and "seq" not in versions[0]
+
+    fake.calls.clear()
+    target = versions[9]
+    found = asyncio.run(queue.get_job_spec_version(job_id, target["version_id"]))
+    assert found == target
+    lranges = [call for call in fake.calls if call[0] == "lrange"]
+    assert len(lranges) == 1 and lranges[0][3] - lranges[0][2] < 4
+
+    restored = asyncio.run(queue.rollback_job_spec_to_version(job_id, target["version_id"]))
+    assert restored["inputs"]["step"] == 5
+    queue._cache_job_spec.clear()
+
+
+def test_version_history_trims_on_snapshot_boundary(monkeypatch):
+    fake = _reset_spec_cache(monkeypatch)
+    monkeypatch.setattr(queue, "JOB_SPEC_VERSION_SNAPSHOT_EVERY", 4)
+    job_id = "job_trim"
+    version_ids = []
+    for step in range(12):
+        row = asyncio.run(queue.append_job_spec_version(job_id, {"job_id": job_id, "step": step}, max_versions=5))
+        version_ids.append(row["version_id"])
+
+    stored = [json.loads(raw) for raw in fake.lists[queue._kunci_job_spec_versions(job_id)]]
+    # At least five rows are kept, cut back to the snapshot the oldest one depends on.
+    assert [row["seq"] for row in stored] == list(range(11, 3, -1))
+    assert "spec" in stored[-1]
+    index = fake.hashes[queue._kunci_index_versi(job_id)]
+    assert set(index) == {"_head", *version_ids[4:]}
+    assert asyncio.run(queue.get_job_spec_version(job_id, version_ids[0])) is None
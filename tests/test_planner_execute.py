@@ -54,8 +54,9 @@ def test_execute_prompt_plan_creates_and_runs_job(monkeypatch):
     async def fake_append_event(event_type: str, data):
         return None
 
-    async def fake_enqueue_run_from_spec(job_id: str, spec):
-        return {"run_id": "run_test_1", "status": "queued"}
+    async def fake_enqueue_runs_from_spec(daftar):
+        assert [job_id for job_id, _ in daftar] == ["monitor-1"]
+        return [{"run_id": "run_test_1", "status": "queued"}]
 
     async def fake_sleep(seconds: float):
         return None
@@ -76,7 +77,7 @@ def test_execute_prompt_plan_creates_and_runs_job(monkeypatch):
     monkeypatch.setattr(planner_execute, "save_job_spec", fake_save_job_spec)
     monkeypatch.setattr(planner_execute, "enable_job", fake_enable_job)
     monkeypatch.setattr(planner_execute, "append_event", fake_append_event)
-    monkeypatch.setattr(planner_execute, "_antrikan_run_dari_spesifikasi", fake_enqueue_run_from_spec)
+    monkeypatch.setattr(planner_execute, "_antrikan_runs_dari_spesifikasi", fake_enqueue_runs_from_spec)
     monkeypatch.setattr(planner_execute, "get_run", fake_get_run)
     monkeypatch.setattr(planner_execute.asyncio, "sleep", fake_sleep)
 
@@ -115,7 +116,7 @@ def test_execute_prompt_plan_updates_existing_job_without_run(monkeypatch):
     async def fake_append_event(event_type: str, data):
         return None
 
-    async def should_not_enqueue(job_id: str, spec):
+    async def should_not_enqueue(daftar):
         raise AssertionError("enqueue must not be called when run_immediately is false")
 
     monkeypatch.setattr(planner_execute, "build_plan_from_prompt", lambda request: plan)
@@ -123,7 +124,7 @@ def test_execute_prompt_plan_updates_existing_job_without_run(monkeypatch):
     monkeypatch.setattr(planner_execute, "save_job_spec", fake_save_job_spec)
     monkeypatch.setattr(planner_execute, "enable_job", fake_enable_job)
     monkeypatch.setattr(planner_execute, "append_event", fake_append_event)
-    monkeypatch.setattr(planner_execute, "_antrikan_run_dari_spesifikasi", should_not_enqueue)
+    monkeypatch.setattr(planner_execute, "_antrikan_runs_dari_spesifikasi", should_not_enqueue)
 
     result = asyncio.run(
         planner_execute.execute_prompt_plan(
@@ -163,7 +164,7 @@ def test_execute_prompt_plan_keeps_processing_when_single_job_fails(monkeypatch)
     async def fake_append_event(event_type: str, data):
         return None
 
-    async def should_not_enqueue(job_id: str, spec):
+    async def should_not_enqueue(daftar):
         raise AssertionError("enqueue must not be called when run_immediately is false")
 
     monkeypatch.setattr(planner_execute, "build_plan_from_prompt", lambda request: plan)
@@ -171,7 +172,7 @@ def test_execute_prompt_plan_keeps_processing_when_single_job_fails(monkeypatch)
     monkeypatch.setattr(planner_execute, "save_job_spec", fake_save_job_spec)
     monkeypatch.setattr(planner_execute, "enable_job", fake_enable_job)
     monkeypatch.setattr(planner_execute, "append_event", fake_append_event)
-    monkeypatch.setattr(planner_execute, "_antrikan_run_dari_spesifikasi", should_not_enqueue)
+    monkeypatch.setattr(planner_execute, "_antrikan_runs_dari_spesifikasi", should_not_enqueue)
 
     result = asyncio.run(
         planner_execute.execute_prompt_plan(
@@ -206,7 +207,7 @@ def test_execute_prompt_plan_uses_ai_planner_when_enabled(monkeypatch):
     async def fake_append_event(event_type: str, data):
         return None
 
-    async def should_not_enqueue(job_id: str, spec):
+    async def should_not_enqueue(daftar):
         raise AssertionError("enqueue must not be called when run_immediately is false")
 
     def should_not_use_rule_builder(request):
@@ -221,7 +222,7 @@ def test_execute_prompt_plan_uses_ai_planner_when_enabled(monkeypatch):
     monkeypatch.setattr(planner_execute, "save_job_spec", fake_save_job_spec)
     monkeypatch.setattr(planner_execute, "enable_job", fake_enable_job)
     monkeypatch.setattr(planner_execute, "append_event", fake_append_event)
-    monkeypatch.setattr(planner_execute, "_antrikan_run_dari_spesifikasi", should_not_enqueue)
+    monkeypatch.setattr(planner_execute, "_antrikan_runs_dari_spesifikasi", should_not_enqueue)
 
     result = asyncio.run(
         planner_execute.execute_prompt_plan(
@@ -0,0 +1,230 @@
+import asyncio
+import multiprocessing
+import os
+import signal
+import time
+
+from app.core import handlers_registry, process_executor, runner
+
+
+class _LoggerStub:
+    def warning(self, *args, **kwargs):
+        return None
+
+    def error(self, *args, **kwargs):
+        return None
+
+
+def _ctx(timeout_ms=5000):
+    return runner.JobContext(
+        job_id="job_cpu",
+        run_id="run_cpu",
+        trace_id="trace_cpu",
+        redis_client=None,
+        tools={},
+        logger=_LoggerStub(),
+        metrics=None,
+        span=None,
+        timeout_ms=timeout_ms,
+    )
+
+
+def _hitung_prima(ctx, inputs):
+    batas = int(inputs["limit"])
+    jumlah = sum(1 for n in range(2, batas) if all(n % d for d in range(2, int(n**0.5) + 1)))
+    return {"success": True, "run_id": ctx.run_id, "primes": jumlah, "pid": os.getpid()}
+
+
+async def _hitung_async(ctx, inputs):
+    return {"success": True, "echo": inputs["value"], "pid": os.getpid()}
+
+
+def _loop_tanpa_akhir(ctx, inputs):
+    while True:
+        pass
+
+
+def _loop_abaikan_alarm(ctx, inputs):
+    # Stands in for native code that never returns to the interpreter's signal handler.
+    signal.signal(signal.SIGALRM, signal.SIG_IGN)
+    while True:
+        pass
+
+
+def _tidur(ctx, inputs):
+    time.sleep(float(inputs["sec"]))
+    return {"success": True, "pid": os.getpid()}
+
+
+def test_process_executor_runs_handlers_off_the_worker_process(monkeypatch):
+    monkeypatch.setattr(process_executor.settings, "WORKER_PROCESS_POOL_SIZE", 1)
+    try:
+        hasil = asyncio.run(runner.execute_job_handler(_hitung_prima, _ctx(), {"limit": 1000}, "process"))
+        assert hasil.success is True
+        assert hasil.output["primes"] == 168
+        assert hasil.output["run_id"] == "run_cpu"
+        assert hasil.output["pid"] != os.getpid()
+
+        hasil = asyncio.run(runner.execute_job_handler(_hitung_async, _ctx(), {"value": "ok"}, "process"))
+        assert hasil.output["echo"] == "ok"
+        assert hasil.output["pid"] != os.getpid()
+    finally:
+        process_executor.shutdown_process_pool()
+
+
+def test_process_executor_enforces_timeout_and_keeps_pool_usable(monkeypatch):
+    monkeypatch.setattr(process_executor.settings, "WORKER_PROCESS_POOL_SIZE", 1)
+    try:
+        # Warm the pool so the timeout below measures the handler, not process start-up.
+        asyncio.run(runner.execute_job_handler(_hitung_async, _ctx(), {"value": "warm"}, "process"))
+
+        mulai = time.time()
+        hasil = asyncio.run(runner.execute_job_handler(_loop_tanpa_akhir, _ctx(timeout_ms=300), {}, "process"))
+        assert hasil.success is False
+        assert "timed out" in hasil.error
+        assert time.time() - mulai < 3
+
+        # The pool process stopped the loop on its own timer, so the single slot is free again.
+        hasil = asyncio.run(runner.execute_job_handler(_hitung_prima, _ctx(timeout_ms=2000), {"limit": 100}, "process"))
+        assert hasil.output["primes"] == 25
+    finally:
+        process_executor.shutdown_process_pool()
+
+
+def test_process_job_event_prefers_spec_executor_over_registry(monkeypatch):
+    dipanggil = []
+
+    async def fake_run_in_process_pool(handler, ctx, inputs):
+        dipanggil.append(ctx.run_id)
+        return {"success": True}
+
+    async def _noop(*args, **kwargs):
+        return None
+
+    async def handler(ctx, inputs):
+        return {"success": True, "executor": "async"}
+
+    monkeypatch.setattr(runner, "run_in_process_pool", fake_run_in_process_pool)
+    for name in ["get_run", "save_run", "add_run_to_job_history", "append_event", "record_job_outcome"]:
+        monkeypatch.setattr(runner, name, _noop)
+
+    def _event(run_id, executor=None):
+        return {"run_id": run_id, "job_id": "job_cpu", "type": "report.cpu", "inputs": {}, "attempt": 0, "executor": executor}
+
+    registry = {"report.cpu": handler}
+    for event, executors in [
+        (_event("run_registry"), {"report.cpu": "process"}),
+        (_event("run_spec", "process"), {"report.cpu": "process"}),
+        (_event("run_override", "async"), {"report.cpu": "process"}),
+        (_event("run_default"), {}),
+        # Not registered for the pool: the handler may need tools or Redis, so it stays on the loop.
+        (_event("run_unregistered", "process"), {}),
+    ]:
+        assert asyncio.run(runner.process_job_event(event, "worker_1", registry, {}, _LoggerStub(), None, executors))
+
+    assert dipanggil == ["run_registry", "run_spec"]
+
+
+def test_process_executor_is_only_accepted_for_registered_job_types():
+    handlers_registry.validate_job_executor("simulation.cpu", "process")
+    handlers_registry.validate_job_executor("agent.workflow", "async")
+    handlers_registry.validate_job_executor("agent.workflow", None)
+    try:
+        handlers_registry.validate_job_executor("agent.workflow", "process")
+    except ValueError as exc:
+        assert "agent.workflow" in str(exc)
+    else:
+        raise AssertionError("executor 'process' accepted for a handler that needs tools")
+
+
+def test_registered_cpu_handler_runs_in_the_pool(monkeypatch):
+    monkeypatch.setattr(process_executor.settings, "WORKER_PROCESS_POOL_SIZE", 1)
+    handler = handlers_registry.get_handler("simulation.cpu")
+    try:
+        hasil = asyncio.run(runner.execute_job_handler(handler, _ctx(), {"rounds": 1000, "seed": "s"}, "process"))
+        lokal = asyncio.run(handler(_ctx(), {"rounds": 1000, "seed": "s"}))
+        assert hasil.success is True
+        assert hasil.output["digest"] == lokal["digest"]
+    finally:
+        process_executor.shutdown_process_pool()
+
+
+def test_stuck_pool_process_is_killed_after_the_grace_period(monkeypatch):
+    monkeypatch.setattr(process_executor.settings, "WORKER_PROCESS_POOL_SIZE", 1)
+    monkeypatch.setattr(process_executor, "PROCESS_STOP_GRACE_SEC", 0.3)
+
+    async def _skenario():
+        await runner.execute_job_handler(_hitung_async, _ctx(), {"value": "warm"}, "process")
+        pool = process_executor._ambil_pool()
+        pids = set(process_executor._pid_proses_pool(pool))
+        hasil = await runner.execute_job_handler(_loop_abaikan_alarm, _ctx(timeout_ms=200), {}, "process")
+        await asyncio.sleep(1.0)
+        return pool, pids, hasil
+
+    try:
+        pool, pids, hasil = asyncio.run(_skenario())
+        assert hasil.success is False and "timed out" in hasil.error
+        assert len(pids) == 1
+        assert process_executor._pool is not pool and pool not in process_executor._pid_pool
+        batas = time.time() + 5
+        while pids & {proses.pid for proses in multiprocessing.active_children()} and time.time() < batas:
+            time.sleep(0.05)
+        assert not pids & {proses.pid for proses in multiprocessing.active_children()}
+    finally:
+        process_executor.shutdown_process_pool()
+
+
+def test_stuck_job_does_not_kill_sibling_jobs_in_the_pool(monkeypatch):
+    monkeypatch.setattr(process_executor.settings, "WORKER_PROCESS_POOL_SIZE", 2)
+    monkeypatch.setattr(process_executor, "PROCESS_STOP_GRACE_SEC", 0.3)
+
+    async def _skenario():
+        await asyncio.gather(
+            *(runner.execute_job_handler(_hitung_async, _ctx(), {"value": "warm"}, "process") for _ in range(2))
+        )
+        pool = process_executor._ambil_pool()
+        saudara = asyncio.create_task(runner.execute_job_handler(_tidur, _ctx(timeout_ms=10000), {"sec": 2.0}, "process"))
+        macet = await runner.execute_job_handler(_loop_abaikan_alarm, _ctx(timeout_ms=200), {}, "process")
+        await asyncio.sleep(0.6)
+        # Past the grace period: the pool is retired, but the sibling keeps running in it.
+        pensiun = process_executor._pool is not pool and pool in process_executor._pid_pool
+        baru = await runner.execute_job_handler(_hitung_async, _ctx(), {"value": "fresh"}, "process")
+        hasil_saudara = await saudara
+        await asyncio.sleep(0.3)
+        return pool, macet, pensiun, baru, hasil_saudara
+
+    try:
+        pool, macet, pensiun, baru, hasil_saudara = asyncio.run(_skenario())
+        assert macet.success is False and "timed out" in macet.error
+        assert pensiun is True
+        assert baru.output["echo"] == "fresh"
+        assert hasil_saudara.success is True
+        # Once the sibling finished, the retired pool (and its stuck process) was killed.
+        assert pool not in process_executor._pid_pool
+    finally:
+        process_executor.shutdown_process_pool()
+
+
+def test_report_aggregate_handler_summarises_rows_in_the_pool(monkeypatch):
+    monkeypatch.setattr(process_executor.settings, "WORKER_PROCESS_POOL_SIZE", 1)
+    handler = handlers_registry.get_handler("report.aggregate")
+    assert handlers_registry.peta_executor_job["report.aggregate"] == process_executor.EXECUTOR_PROCESS
+    rows = [{"platform": "shopee" if n % 2 else "tokopedia", "sales": n, "orders": n % 7} for n in range(1, 101)]
+    rows.append("not a row")
+    try:
+        hasil = asyncio.run(
+            runner.execute_job_handler(handler, _ctx(), {"rows": rows, "fields": ["sales"]}, "process")
+        )
+    finally:
+        process_executor.shutdown_process_pool()
+
+    assert hasil.success is True
+    output = hasil.output
+    assert (output["rows"], output["skipped_rows"]) == (101, 1)
+    shopee = output["groups"][0]
+    assert shopee["group"] == {"platform": "shopee"}
+    assert shopee["metrics"]["sales"]["count"] == 50
+    assert shopee["metrics"]["sales"]["sum"] == 2500
+    assert shopee["metrics"]["sales"]["p50"] == 50
+    assert output["totals"]["sales"]["max"] == 100
+    assert list(output["totals"]) == ["sales"]
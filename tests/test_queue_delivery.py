@@ -0,0 +1,1074 @@
+import asyncio
+import json
+
+from redis.exceptions import ResponseError
+
+from app.core import queue
+
+
+class _StreamRedisRecorder:
+    def __init__(self, messages=None, autoclaim_supported=True):
+        self.streams = {queue.STREAM_JOBS: list(messages or [])}
+        self.autoclaim_supported = autoclaim_supported
+        self.acked = []
+        self.claimed = []
+        self.read_calls = 0
+        self.dedup = {}
+
+    async def xreadgroup(self, groupname, consumername, streams, count=1, block=None):
+        self.read_calls += 1
+        result = []
+        for stream in streams:
+            rows = self.streams.get(stream, [])
+            if rows:
+                taken, self.streams[stream] = rows[:count], rows[count:]
+                result.append((stream, taken))
+        return result
+
+    async def xadd(self, stream, fields, id="*", maxlen=None, approximate=True):
+        rows = self.streams.setdefault(stream, [])
+        message_id = f"{len(rows) + 1}-{len(stream)}"
+        rows.append((message_id, fields))
+        return message_id
+
+    async def xack(self, stream, group, *message_ids):
+        self.acked.extend(message_ids)
+        return len(message_ids)
+
+    async def eval(self, script, numkeys, *args):
+        assert script == queue._SKRIP_ENQUEUE_IDEMPOTEN
+        key, stream, payload, _ttl = args
+        if key in self.dedup:
+            return [self.dedup[key], 0]
+        self.dedup[key] = await self.xadd(stream, {"data": payload})
+        return [self.dedup[key], 1]
+
+    async def xautoclaim(self, name, groupname, consumername, min_idle_time, start_id="0-0", count=None):
+        if not self.autoclaim_supported:
+            raise ResponseError("unknown command 'XAUTOCLAIM'")
+        self.claimed.append((consumername, min_idle_time))
+        if name != queue.STREAM_JOBS:
+            return ["0-0", [], []]
+        return ["0-0", [("5-0", {"data": json.dumps({"run_id": "run_stalled", "job_id": "job_x"})})], []]
+
+    async def xpending_range(self, name, groupname, min, max, count, consumername=None, idle=None):
+        if name != queue.STREAM_JOBS:
+            return []
+        return [
+            {"message_id": "7-0", "consumer": "dead", "time_since_delivered": 900000, "times_delivered": 1},
+            {"message_id": "8-0", "consumer": "live", "time_since_delivered": 10, "times_delivered": 1},
+        ]
+
+    async def xclaim(self, name, groupname, consumername, min_idle_time, message_ids):
+        self.claimed.append((consumername, tuple(message_ids)))
+        return [(message_id, {"data": json.dumps({"run_id": f"run_{message_id}"})}) for message_id in message_ids]
+
+
+def _reset_state():
+    queue.set_mode_fallback_redis(False)
+    queue.set_mode_legacy_redis_queue(False)
+    queue.set_mode_deferred_ack(False)
+    queue._fallback_streams.clear()
+    queue._fallback_dead_letters.clear()
+    queue._fallback_dedup.clear()
+    queue._fallback_dedup_kedaluwarsa.clear()
+    queue._stash_konsumen.clear()
+    queue._giliran_shard.clear()
+    queue._pool_terdaftar.clear()
+    queue._cache_pool_aktif["expires_at"] = 0.0
+    for lane in queue.QUEUE_LANES:
+        queue._kredit_lane[lane] = 0
+
+
+def _event(run_id, priority=0, inputs=None):
+    return {
+        "run_id": run_id,
+        "job_id": "job_lane",
+        "type": "monitor.channel",
+        "inputs": inputs or {},
+        "attempt": 0,
+        "priority": priority,
+    }
+
+
+def test_deferred_ack_mode_acks_only_when_requested(monkeypatch):
+    _reset_state()
+    fake = _StreamRedisRecorder(messages=[("1-0", {"data": json.dumps({"run_id": "run_1", "job_id": "job_1"})})])
+    monkeypatch.setattr(queue, "redis_client", fake)
+    queue.set_mode_deferred_ack(True)
+
+    row = asyncio.run(queue.dequeue_job("worker_1"))
+    assert row["data"]["run_id"] == "run_1"
+    assert row["ack_pending"] is True
+    assert fake.acked == []
+
+    asyncio.run(queue.ack_job(row["message_id"], row["stream"]))
+    assert fake.acked == ["1-0"]
+    _reset_state()
+
+
+def test_immediate_ack_mode_keeps_ack_on_read(monkeypatch):
+    _reset_state()
+    fake = _StreamRedisRecorder(messages=[("1-0", {"data": json.dumps({"run_id": "run_1"})})])
+    monkeypatch.setattr(queue, "redis_client", fake)
+
+    row = asyncio.run(queue.dequeue_job("worker_1"))
+    assert row["data"]["run_id"] == "run_1"
+    assert "ack_pending" not in row
+    assert fake.acked == ["1-0"]
+
+
+def test_reclaim_stalled_jobs_uses_xautoclaim(monkeypatch):
+    _reset_state()
+    fake = _StreamRedisRecorder()
+    monkeypatch.setattr(queue, "redis_client", fake)
+    queue.set_mode_deferred_ack(True)
+
+    rows = asyncio.run(queue.reclaim_stalled_jobs("worker_live", min_idle_ms=60000, count=5))
+    assert [row["message_id"] for row in rows] == ["5-0"]
+    assert rows[0]["reclaimed"] is True
+    assert fake.claimed[0] == ("worker_live", 60000)
+    _reset_state()
+
+
+def test_reclaim_stalled_jobs_falls_back_to_xpending_on_old_redis(monkeypatch):
+    _reset_state()
+    fake = _StreamRedisRecorder(autoclaim_supported=False)
+    monkeypatch.setattr(queue, "redis_client", fake)
+    queue.set_mode_deferred_ack(True)
+
+    rows = asyncio.run(queue.reclaim_stalled_jobs("worker_live", min_idle_ms=60000, count=5))
+    assert [row["message_id"] for row in rows] == ["7-0"]
+    assert fake.claimed == [("worker_live", ("7-0",))]
+    _reset_state()
+
+
+def test_reclaim_is_noop_outside_deferred_mode(monkeypatch):
+    _reset_state()
+    fake = _StreamRedisRecorder()
+    monkeypatch.setattr(queue, "redis_client", fake)
+
+    assert asyncio.run(queue.reclaim_stalled_jobs("worker_live")) == []
+    assert fake.claimed == []
+
+
+def test_enqueue_routes_events_to_priority_lanes(monkeypatch):
+    _reset_state()
+    fake = _StreamRedisRecorder()
+    monkeypatch.setattr(queue, "redis_client", fake)
+
+    asyncio.run(queue.enqueue_job(_event("run_normal")))
+    asyncio.run(queue.enqueue_job(_event("run_high", priority=5)))
+    asyncio.run(queue.enqueue_job(_event("run_critical", inputs={"pressure_priority": "critical"})))
+    asyncio.run(queue.enqueue_job(_event("run_low", priority=-1)))
+
+    assert len(fake.streams[queue.STREAM_JOBS]) == 1
+    assert len(fake.streams[f"{queue.STREAM_JOBS}:high"]) == 2
+    assert len(fake.streams[f"{queue.STREAM_JOBS}:low"]) == 1
+
+
+def test_high_lane_skips_deep_normal_backlog(monkeypatch):
+    _reset_state()
+    fake = _StreamRedisRecorder()
+    monkeypatch.setattr(queue, "redis_client", fake)
+
+    for index in range(50):
+        asyncio.run(queue.enqueue_job(_event(f"run_bulk_{index}")))
+    asyncio.run(queue.enqueue_job(_event("run_urgent", inputs={"pressure_priority": "critical"})))
+
+    first_two = [asyncio.run(queue.dequeue_job("worker_1"))["data"]["run_id"] for _ in range(2)]
+    assert "run_urgent" in first_two
+
+
+def test_weighted_fair_dequeue_does_not_starve_low_lane_in_fallback(monkeypatch):
+    _reset_state()
+    queue.set_mode_fallback_redis(True)
+
+    for index in range(20):
+        asyncio.run(queue.enqueue_job(_event(f"run_h{index}", priority=1)))
+        asyncio.run(queue.enqueue_job(_event(f"run_n{index}")))
+        asyncio.run(queue.enqueue_job(_event(f"run_l{index}", priority=-1)))
+
+    picked = [asyncio.run(queue.dequeue_job("worker_1"))["data"]["run_id"][4] for _ in range(10)]
+    assert picked.count("h") == 6
+    assert picked.count("n") == 3
+    assert picked.count("l") == 1
+    _reset_state()
+
+
+class _PoolRedisRecorder(_StreamRedisRecorder):
+    def __init__(self):
+        super().__init__()
+        self.pools = set()
+
+    async def sadd(self, key, *members):
+        self.pools.update(members)
+        return len(members)
+
+    async def smembers(self, key):
+        return set(self.pools)
+
+
+def test_enqueue_routes_agent_pools_to_separate_streams(monkeypatch):
+    _reset_state()
+    fake = _PoolRedisRecorder()
+    monkeypatch.setattr(queue, "redis_client", fake)
+    monkeypatch.setattr(queue, "redis_blocking_client", fake)
+
+    asyncio.run(queue.enqueue_job(_event("run_default")))
+    asyncio.run(queue.enqueue_job({**_event("run_agency"), "agent_pool": "Agency"}))
+
+    assert len(fake.streams[queue.STREAM_JOBS]) == 1
+    assert len(fake.streams[f"{queue.STREAM_JOBS}:pool:agency"]) == 1
+    assert fake.pools == {"agency"}
+
+    assert asyncio.run(queue.dequeue_job("worker_default", "default"))["data"]["run_id"] == "run_default"
+    assert asyncio.run(queue.dequeue_job("worker_default", "default")) is None
+    assert asyncio.run(queue.dequeue_job("worker_agency", "agency"))["data"]["run_id"] == "run_agency"
+
+
+def test_global_pool_worker_consumes_every_pool(monkeypatch):
+    _reset_state()
+    fake = _PoolRedisRecorder()
+    monkeypatch.setattr(queue, "redis_client", fake)
+
+    asyncio.run(queue.enqueue_job(_event("run_default")))
+    asyncio.run(queue.enqueue_job({**_event("run_agency"), "agent_pool": "agency"}))
+
+    picked = {asyncio.run(queue.dequeue_job("worker_global", "global"))["data"]["run_id"] for _ in range(2)}
+    assert picked == {"run_default", "run_agency"}
+
+
+def test_fallback_mode_keeps_pool_backlogs_isolated():
+    _reset_state()
+    queue.set_mode_fallback_redis(True)
+
+    asyncio.run(queue.enqueue_job({**_event("run_agency"), "agent_pool": "agency"}))
+
+    assert asyncio.run(queue.dequeue_job("worker_default")) is None
+    assert asyncio.run(queue.list_agent_pools()) == ["agency", "default"]
+    assert asyncio.run(queue.dequeue_job("worker_agency", "agency"))["data"]["run_id"] == "run_agency"
+    _reset_state()
+
+
+class _PipelineRecorder:
+    def __init__(self, client):
+        self.client = client
+        self.calls = []
+
+    def __getattr__(self, name):
+        def _antre(*args, **kwargs):
+            self.calls.append((name, args, kwargs))
+            return self
+
+        return _antre
+
+    def __len__(self):
+        return len(self.calls)
+
+    async def execute(self, raise_on_error=True):
+        self.client.pipeline_rounds += 1
+        return [await getattr(self.client, name)(*args, **kwargs) for name, args, kwargs in self.calls]
+
+
+class _BatchRedisRecorder(_StreamRedisRecorder):
+    def __init__(self):
+        super().__init__()
+        self.pipeline_rounds = 0
+
+    def pipeline(self, transaction=True):
+        return _PipelineRecorder(self)
+
+
+def test_dequeue_jobs_reads_weighted_batch_in_one_round_trip(monkeypatch):
+    _reset_state()
+    fake = _BatchRedisRecorder()
+    monkeypatch.setattr(queue, "redis_client", fake)
+
+    for index in range(10):
+        asyncio.run(queue.enqueue_job(_event(f"run_h{index}", priority=1)))
+        asyncio.run(queue.enqueue_job(_event(f"run_n{index}")))
+        asyncio.run(queue.enqueue_job(_event(f"run_l{index}", priority=-1)))
+
+    rows = asyncio.run(queue.dequeue_jobs("worker_fetch", count=10))
+    picked = [row["data"]["run_id"][4] for row in rows]
+    assert len(rows) == 10
+    assert (picked.count("h"), picked.count("n"), picked.count("l")) == (6, 3, 1)
+    assert picked[0] == "h"
+    assert fake.read_calls == 3
+    # One pipelined read plus one pipelined ack for the whole batch.
+    assert fake.pipeline_rounds == 2
+    assert len(fake.acked) == 10
+
+
+def test_dequeue_jobs_never_exceeds_requested_count(monkeypatch):
+    _reset_state()
+    fake = _BatchRedisRecorder()
+    monkeypatch.setattr(queue, "redis_client", fake)
+
+    for index in range(3):
+        asyncio.run(queue.enqueue_job(_event(f"run_h{index}", priority=1)))
+        asyncio.run(queue.enqueue_job(_event(f"run_l{index}", priority=-1)))
+
+    sizes = [len(asyncio.run(queue.dequeue_jobs("worker_fetch", count=1, block_ms=None))) for _ in range(30)]
+    assert max(sizes) == 1
+    assert sum(sizes) == 6
+
+
+def test_dequeue_jobs_batches_in_fallback_mode():
+    _reset_state()
+    queue.set_mode_fallback_redis(True)
+
+    for index in range(4):
+        asyncio.run(queue.enqueue_job(_event(f"run_{index}")))
+
+    rows = asyncio.run(queue.dequeue_jobs("worker_fetch", count=3))
+    assert [row["data"]["run_id"] for row in rows] == ["run_0", "run_1", "run_2"]
+    assert len(asyncio.run(queue.dequeue_jobs("worker_fetch", count=3))) == 1
+    _reset_state()
+
+
+class _BulkRedisRecorder(_BatchRedisRecorder):
+    def __init__(self):
+        super().__init__()
+        self.kv = {}
+        self.sets = {}
+        self.lists = {}
+        self.zsets = {}
+
+    async def set(self, key, value):
+        self.kv[key] = value
+
+    async def zadd(self, key, mapping):
+        self.zsets.setdefault(key, {}).update(mapping)
+
+    async def sadd(self, key, *members):
+        self.sets.setdefault(key, set()).update(members)
+        return len(members)
+
+    async def lpush(self, key, *values):
+        self.lists.setdefault(key, [])[:0] = list(reversed(values))
+
+    async def ltrim(self, key, start, end):
+        self.lists[key] = self.lists.get(key, [])[start : end + 1]
+
+
+def test_enqueue_jobs_writes_whole_batch_in_one_pipeline(monkeypatch):
+    _reset_state()
+    fake = _BulkRedisRecorder()
+    monkeypatch.setattr(queue, "redis_client", fake)
+
+    events = [_event("run_a"), {**_event("run_b", priority=1), "agent_pool": "agency"}]
+    events[0]["scheduled_at"] = "2026-01-01T00:00:00+00:00"
+    events[1]["scheduled_at"] = "2026-01-01T00:00:01+00:00"
+    message_ids = asyncio.run(queue.enqueue_jobs(events, source="scheduler"))
+
+    assert fake.pipeline_rounds == 1
+    assert message_ids == [
+        fake.streams[queue.STREAM_JOBS][0][0],
+        fake.streams[f"{queue.STREAM_JOBS}:pool:agency:high"][0][0],
+    ]
+    assert json.loads(fake.kv["run:run_a"])["status"] == "queued"
+    assert fake.sets[f"{queue.JOB_ACTIVE_RUNS_PREFIX}job_lane"] == {"run_a", "run_b"}
+    assert fake.lists[f"{queue.JOB_RUNS_PREFIX}job_lane"] == ["run_b", "run_a"]
+    assert fake.sets[queue.QUEUE_POOLS_SET] == {"agency"}
+    timeline = [json.loads(fields["data"]) for _, fields in fake.streams[queue.EVENTS_STREAM]]
+    assert [row["data"]["run_id"] for row in timeline] == ["run_a", "run_b"]
+    assert {row["data"]["source"] for row in timeline} == {"scheduler"}
+
+
+def test_enqueue_jobs_in_fallback_mode_keeps_run_and_stream_state():
+    _reset_state()
+    queue.set_mode_fallback_redis(True)
+
+    event = _event("run_fallback_bulk")
+    event["scheduled_at"] = "2026-01-01T00:00:00+00:00"
+    message_ids = asyncio.run(queue.enqueue_jobs([event], source="planner_execute"))
+
+    assert len(message_ids) == 1
+    assert asyncio.run(queue.get_run("run_fallback_bulk")).status.value == "queued"
+    assert asyncio.run(queue.has_active_runs("job_lane")) is True
+    assert asyncio.run(queue.dequeue_job("worker_1"))["message_id"] == message_ids[0]
+    queue._fallback_runs.pop("run_fallback_bulk", None)
+    queue._fallback_run_scores.pop("run_fallback_bulk", None)
+    queue._fallback_active_runs.pop("job_lane", None)
+    queue._fallback_job_runs.pop("job_lane", None)
+    _reset_state()
+
+
+class _LegacyBulkRedis(_BulkRedisRecorder):
+    async def rpush(self, key, *values):
+        self.lists.setdefault(key, []).extend(values)
+        return len(self.lists[key])
+
+    async def eval(self, script, numkeys, *args):
+        assert script == queue._SKRIP_ENQUEUE_LEGACY_IDEMPOTEN
+        dedup_key, list_key, payload, message_id, _ttl = args
+        if dedup_key in self.dedup:
+            return [self.dedup[dedup_key], 0]
+        self.dedup[dedup_key] = message_id
+        await self.rpush(list_key, payload)
+        return [message_id, 1]
+
+
+def test_enqueue_jobs_in_legacy_mode_is_idempotent_and_returns_dedup_ids(monkeypatch):
+    _reset_state()
+    fake = _LegacyBulkRedis()
+    monkeypatch.setattr(queue, "redis_client", fake)
+    queue.set_mode_legacy_redis_queue(True)
+
+    pertama = asyncio.run(queue.enqueue_jobs([_event("run_a"), _event("run_b")], source="scheduler"))
+    ulang = asyncio.run(queue.enqueue_jobs([_event("run_a"), _event("run_c")], source="scheduler"))
+
+    assert fake.pipeline_rounds == 2
+    assert ulang[0] == pertama[0]
+    assert len(set(pertama + ulang)) == 3
+    antrean = [json.loads(row)["run_id"] for row in fake.lists[queue._kunci_list_pool(queue.DEFAULT_AGENT_POOL)]]
+    assert antrean == ["run_a", "run_b", "run_c"]
+
+    monkeypatch.setattr(queue.settings, "QUEUE_DEDUP_TTL_SEC", 0)
+    # Without a dedup marker a list entry has no ID to report.
+    assert asyncio.run(queue.enqueue_jobs([_event("run_d")], source="scheduler")) == [None]
+    _reset_state()
+
+
+class _DelayedRedisRecorder(_StreamRedisRecorder):
+    def __init__(self, members):
+        super().__init__()
+        self.delayed = list(members)
+        self.eval_calls = []
+
+    async def zrangebyscore(self, key, minimum, maximum, start=0, num=None):
+        assert key == queue.ZSET_DELAYED
+        return self.delayed[start : start + num]
+
+    async def eval(self, script, numkeys, *args):
+        if script == queue._SKRIP_ENQUEUE_IDEMPOTEN:
+            return await super().eval(script, numkeys, *args)
+        keys, argv = list(args[:numkeys]), list(args[numkeys:])
+        self.eval_calls.append((script, keys, argv))
+        if script == queue._SKRIP_KLAIM_DELAYED:
+            due, self.delayed = self.delayed[: argv[1]], self.delayed[argv[1] :]
+            return due
+        assert script == queue._SKRIP_PROMOSI_DELAYED and keys[0] == queue.ZSET_DELAYED
+        hasil = []
+        for index in range(1, len(argv), 3):
+            member, payload, dedup_index = argv[index : index + 3]
+            if member not in self.delayed:
+                continue
+            dedup_key = keys[dedup_index - 1] if dedup_index else None
+            if dedup_key not in self.dedup:
+                self.dedup[dedup_key] = await self.xadd(keys[1], {"data": payload})
+            self.delayed.remove(member)
+            hasil.append([member, self.dedup[dedup_key]])
+        return hasil
+
+
+def test_promote_due_jobs_is_bounded_and_routes_to_lane_streams_in_fallback(monkeypatch):
+    _reset_state()
+    queue._fallback_delayed.clear()
+    queue.set_mode_fallback_redis(True)
+
+    for index in range(5):
+        asyncio.run(queue.schedule_delayed_job(_event(f"run_retry_{index}", priority=1), 0))
+    asyncio.run(queue.schedule_delayed_job(_event("run_later"), 3600))
+
+    rows = asyncio.run(queue.promote_due_jobs(limit=3))
+    assert [row["data"]["run_id"] for row in rows] == ["run_retry_0", "run_retry_1", "run_retry_2"]
+    assert all(row["message_id"] for row in rows)
+    assert len(queue._fallback_streams[f"{queue.STREAM_JOBS}:high"]) == 3
+    assert len(asyncio.run(queue.promote_due_jobs(limit=10))) == 2
+    assert asyncio.run(queue.promote_due_jobs(limit=10)) == []
+    assert len(queue._fallback_delayed) == 1
+    queue._fallback_delayed.clear()
+    _reset_state()
+
+
+def test_promote_due_jobs_declares_every_stream_and_dedup_key(monkeypatch):
+    _reset_state()
+    high = f"{queue.STREAM_JOBS}:high"
+    routed = [queue._member_delayed(high, json.dumps(_event(f"run_routed_{index}"))) for index in range(2)]
+    bare = json.dumps(_event("run_old_format"))
+    fake = _DelayedRedisRecorder(routed + [bare])
+    monkeypatch.setattr(queue, "redis_client", fake)
+
+    rows = asyncio.run(queue.promote_due_jobs(limit=25))
+
+    # One script call per target stream; bare members are routed on the client.
+    assert sorted(keys[1] for _, keys, _ in fake.eval_calls) == sorted([high, queue.STREAM_JOBS])
+    for _, keys, _ in fake.eval_calls:
+        assert keys[0] == queue.ZSET_DELAYED
+        assert all(key.startswith(queue.QUEUE_DEDUP_PREFIX) for key in keys[2:])
+    assert sorted(row["data"]["run_id"] for row in rows) == ["run_old_format", "run_routed_0", "run_routed_1"]
+    assert all(row["message_id"] for row in rows)
+    assert len(fake.streams[high]) == 2 and fake.delayed == []
+
+
+def test_promote_due_jobs_is_idempotent_per_run_attempt(monkeypatch):
+    _reset_state()
+    fake = _DelayedRedisRecorder([])
+    monkeypatch.setattr(queue, "redis_client", fake)
+    original = asyncio.run(queue.enqueue_job(_event("run_retry")))
+    fake.delayed = [queue._member_delayed(queue.STREAM_JOBS, json.dumps(_event("run_retry")))]
+
+    rows = asyncio.run(queue.promote_due_jobs(limit=5))
+
+    # The same run_id/attempt is already in the stream, so promotion returns it instead of adding a copy.
+    assert [row["message_id"] for row in rows] == [original]
+    assert len(fake.streams[queue.STREAM_JOBS]) == 1
+    assert fake.delayed == []
+
+
+class _EventStreamRedis:
+    def __init__(self):
+        self.entries = []
+        self.xread_calls = []
+
+    async def xadd(self, stream, fields, id="*", maxlen=None, approximate=True):
+        assert stream == queue.EVENTS_STREAM and maxlen == queue.settings.EVENTS_STREAM_MAXLEN
+        message_id = f"{1000 + len(self.entries)}-0"
+        self.entries.append((message_id, fields))
+        return message_id
+
+    @staticmethod
+    def _dalam_batas(message_id, minimum, maximum):
+        kunci = queue._urutan_id_stream(message_id)
+        if minimum != "-":
+            eksklusif = minimum.startswith("(")
+            batas = queue._urutan_id_stream(minimum.lstrip("("))
+            if kunci < batas or (eksklusif and kunci == batas):
+                return False
+        if maximum != "+":
+            eksklusif = maximum.startswith("(")
+            batas = queue._urutan_id_stream(maximum.lstrip("("))
+            if kunci > batas or (eksklusif and kunci == batas):
+                return False
+        return True
+
+    async def xrevrange(self, stream, max="+", min="-", count=None):
+        rows = [row for row in reversed(self.entries) if self._dalam_batas(row[0], min, max)]
+        return rows[:count]
+
+    async def xread(self, streams, count=None, block=None):
+        self.xread_calls.append((dict(streams), block))
+        last_id = streams[queue.EVENTS_STREAM]
+        rows = [row for row in self.entries if last_id != "$" and self._dalam_batas(row[0], f"({last_id}", "+")]
+        return [[queue.EVENTS_STREAM, rows[:count]]] if rows else []
+
+
+def test_event_timeline_reads_stream_by_id(monkeypatch):
+    _reset_state()
+    fake = _EventStreamRedis()
+    monkeypatch.setattr(queue, "redis_client", fake)
+    monkeypatch.setattr(queue, "redis_blocking_client", fake)
+    for index in range(6):
+        asyncio.run(queue.append_event("test.tick", {"index": index}))
+
+    latest = asyncio.run(queue.get_events(limit=3))
+    assert [row["data"]["index"] for row in latest] == [3, 4, 5]
+    assert latest[0]["stream_id"] == "1003-0"
+    assert [row["data"]["index"] for row in asyncio.run(queue.get_events(limit=2, offset=1))] == [3, 4]
+
+    since_id = asyncio.run(queue.get_events(limit=10, since="1003-0"))
+    assert [row["data"]["index"] for row in since_id] == [4, 5]
+
+    tail = asyncio.run(queue.read_events_after("1004-0", count=10, block_ms=2000))
+    assert [row["data"]["index"] for row in tail] == [5]
+    assert fake.xread_calls == [({queue.EVENTS_STREAM: "1004-0"}, 2000)]
+
+
+def test_event_tail_polls_fallback_store_by_stream_id():
+    _reset_state()
+    queue._fallback_events.clear()
+    queue.set_mode_fallback_redis(True)
+    asyncio.run(queue.append_event("test.tick", {"index": 0}))
+    first = asyncio.run(queue.get_events(limit=1))[0]
+    asyncio.run(queue.append_event("test.tick", {"index": 1}))
+
+    tail = asyncio.run(queue.read_events_after(first["stream_id"], block_ms=0))
+    assert [row["data"]["index"] for row in tail] == [1]
+    queue._fallback_events.clear()
+    _reset_state()
+
+
+class _GroupStatsPipeline(_PipelineRecorder):
+    async def execute(self, raise_on_error=True):
+        hasil = []
+        for name, args, kwargs in self.calls:
+            try:
+                hasil.append(await getattr(self.client, name)(*args, **kwargs))
+            except ResponseError as exc:
+                if raise_on_error:
+                    raise
+                hasil.append(exc)
+        return hasil
+
+
+class _GroupStatsRedis:
+    def __init__(self, now_ms):
+        high = queue._kunci_stream(queue.DEFAULT_AGENT_POOL, queue.LANE_HIGH)
+        self.streams = {
+            queue.STREAM_JOBS: [(f"{now_ms - 9000 + index}-0", {}) for index in range(10)],
+            high: [(f"{now_ms - 2000}-0", {})],
+        }
+        # Normal lane: 6 delivered (2 still pending), 4 undelivered; high lane: group created, nothing read.
+        self.groups = {
+            queue.STREAM_JOBS: {"name": queue.CG_WORKERS, "last-delivered-id": f"{now_ms - 9000 + 5}-0", "lag": 4},
+            high: {"name": queue.CG_WORKERS, "last-delivered-id": "0-0", "lag": None, "entries-read": None},
+        }
+        self.pending = {
+            queue.STREAM_JOBS: {"pending": 2, "consumers": [{"name": "worker_a", "pending": 2}]},
+            high: {"pending": 0, "consumers": []},
+        }
+
+    def pipeline(self, transaction=True):
+        return _GroupStatsPipeline(self)
+
+    async def smembers(self, key):
+        return set()
+
+    async def xlen(self, stream):
+        return len(self.streams.get(stream, []))
+
+    async def xinfo_groups(self, stream):
+        if stream not in self.groups:
+            raise ResponseError("no such key")
+        return [self.groups[stream]]
+
+    async def xpending(self, stream, group):
+        if stream not in self.pending:
+            raise ResponseError("NOGROUP No such key or consumer group")
+        return self.pending[stream]
+
+    async def xrange(self, stream, min="-", max="+", count=None):
+        rows = [row for row in self.streams.get(stream, []) if tuple(map(int, row[0].split("-"))) >= tuple(map(int, min.split("-")))]
+        return rows[:count]
+
+    async def zcard(self, key):
+        return 3
+
+    async def zcount(self, key, minimum, maximum):
+        return 1
+
+
+def test_queue_stats_report_group_lag_pending_and_oldest_age(monkeypatch):
+    _reset_state()
+    now = 1_800_000_000.0
+    monkeypatch.setattr(queue.time, "time", lambda: now)
+    monkeypatch.setattr(queue, "redis_client", _GroupStatsRedis(int(now * 1000)))
+
+    stats = asyncio.run(queue.get_queue_stats())
+    assert stats["mode"] == "redis"
+    assert (stats["depth"], stats["lag"], stats["pending"]) == (11, 5, 2)
+    assert stats["consumers"] == {"worker_a": 2}
+    assert (stats["delayed"], stats["delayed_due"]) == (3, 1)
+    default_pool = stats["pools"][queue.DEFAULT_AGENT_POOL]
+    assert default_pool[queue.LANE_NORMAL]["oldest_undelivered_age_sec"] == 8.994
+    assert default_pool[queue.LANE_HIGH] == {"length": 1, "lag": 1, "pending": 0, "oldest_undelivered_age_sec": 2.0}
+    assert default_pool[queue.LANE_LOW]["lag"] == 0
+    assert stats["oldest_undelivered_age_sec"] == 8.994
+    _reset_state()
+
+
+def test_queue_lag_reads_only_group_info_of_the_consumer_streams(monkeypatch):
+    _reset_state()
+    now = 1_800_000_000.0
+    fake = _GroupStatsRedis(int(now * 1000))
+    dipanggil = []
+    for name in ["xpending", "xrange", "zcard", "zcount"]:
+        monkeypatch.setattr(fake, name, lambda *args, _name=name, **kwargs: dipanggil.append(_name))
+    monkeypatch.setattr(queue, "redis_client", fake)
+
+    # Same lag as get_queue_stats, without the pending, age and delayed scans.
+    assert asyncio.run(queue.get_queue_lag(queue.DEFAULT_AGENT_POOL)) == 5
+    assert dipanggil == []
+    _reset_state()
+
+
+def test_queue_stats_in_fallback_mode_count_every_stored_entry_as_lag():
+    _reset_state()
+    queue.set_mode_fallback_redis(True)
+    for index in range(3):
+        asyncio.run(queue.enqueue_job(_event(f"run_{index}", priority=10 if index == 0 else 0)))
+    asyncio.run(queue.dequeue_job("worker_stats"))
+
+    stats = asyncio.run(queue.get_queue_stats())
+    assert (stats["mode"], stats["depth"], stats["lag"], stats["pending"]) == ("fallback", 2, 2, 0)
+    assert asyncio.run(queue.get_queue_lag(queue.DEFAULT_AGENT_POOL)) == 2
+    assert stats["oldest_undelivered_age_sec"] is not None
+    _reset_state()
+
+
+def test_poison_messages_go_to_dead_letter_stream_and_are_acked(monkeypatch):
+    _reset_state()
+    fake = _BatchRedisRecorder()
+    monkeypatch.setattr(queue, "redis_client", fake)
+    asyncio.run(queue.enqueue_job(_event("run_ok")))
+    fake.streams[queue.STREAM_JOBS].append(("90-0", {"data": "{not json"}))
+    fake.streams[queue.STREAM_JOBS].append(("91-0", {"data": json.dumps({"job_id": "job_lane", "type": "x"})}))
+
+    rows = asyncio.run(queue.dequeue_jobs("worker_fetch", count=10))
+    assert [row["data"]["run_id"] for row in rows] == ["run_ok"]
+    assert set(fake.acked) >= {"90-0", "91-0"}
+    # Written in the same pipeline round as the acks.
+    assert fake.pipeline_rounds == 2
+    dead = [json.loads(fields["data"]) for _, fields in fake.streams[queue.DEAD_LETTER_STREAM]]
+    assert [(row["reason"], row["source_message_id"]) for row in dead] == [
+        ("unparseable_payload", "90-0"),
+        ("invalid_event", "91-0"),
+    ]
+    assert dead[0]["payload"] == "{not json"
+    _reset_state()
+
+
+class _OverDeliveredRedis(_StreamRedisRecorder):
+    async def xpending_range(self, name, groupname, min, max, count, consumername=None, idle=None):
+        if name != queue.STREAM_JOBS:
+            return []
+        return [{"message_id": "5-0", "consumer": consumername, "time_since_delivered": 0, "times_delivered": 6}]
+
+
+def test_reclaim_dead_letters_messages_past_max_deliveries(monkeypatch):
+    _reset_state()
+    fake = _OverDeliveredRedis()
+    monkeypatch.setattr(queue, "redis_client", fake)
+    monkeypatch.setattr(queue.settings, "QUEUE_MAX_DELIVERIES", 5)
+    queue.set_mode_deferred_ack(True)
+
+    rows = asyncio.run(queue.reclaim_stalled_jobs("worker_live", min_idle_ms=60000, count=5))
+    assert rows == []
+    assert fake.acked == ["5-0"]
+    dead = json.loads(fake.streams[queue.DEAD_LETTER_STREAM][0][1]["data"])
+    assert (dead["reason"], dead["deliveries"], dead["run_id"]) == ("max_deliveries", 6, "run_stalled")
+    _reset_state()
+
+
+def test_dead_letters_inspect_requeue_purge_and_replay_in_fallback(monkeypatch):
+    _reset_state()
+    queue.set_mode_fallback_redis(True)
+    sleeps = []
+
+    async def _fake_sleep(delay):
+        sleeps.append(delay)
+
+    monkeypatch.setattr(queue.asyncio, "sleep", _fake_sleep)
+    for index in range(5):
+        asyncio.run(queue.dead_letter_job(_event(f"run_dead{index}"), reason="retries_exhausted", error="boom"))
+    poison_id = asyncio.run(queue.dead_letter_job("{oops", reason="unparseable_payload"))
+
+    newest = asyncio.run(queue.list_dead_letters(limit=2))
+    assert [row["reason"] for row in newest] == ["unparseable_payload", "retries_exhausted"]
+    exhausted = asyncio.run(queue.list_dead_letters(reason="retries_exhausted"))
+    assert [row["run_id"] for row in exhausted] == [f"run_dead{index}" for index in range(4, -1, -1)]
+
+    hasil = asyncio.run(queue.requeue_dead_letters([exhausted[0]["dead_letter_id"], poison_id, "missing"]))
+    assert (len(hasil["requeued"]), hasil["failed"], hasil["missing"]) == (1, [poison_id], ["missing"])
+    assert asyncio.run(queue.dequeue_job("worker_dlq"))["data"]["run_id"] == "run_dead4"
+
+    replayed = asyncio.run(queue.replay_dead_letters(10, rate_per_sec=2, reason="retries_exhausted"))
+    assert replayed == {"requeued": 4, "failed": 0, "missing": 0}
+    assert sleeps == [1.0]
+    assert [asyncio.run(queue.dequeue_job("worker_dlq"))["data"]["run_id"] for _ in range(4)] == [
+        f"run_dead{index}" for index in range(4)
+    ]
+
+    assert asyncio.run(queue.get_dead_letter(poison_id))["payload"] == "{oops"
+    assert asyncio.run(queue.purge_dead_letters()) == 1
+    assert asyncio.run(queue.list_dead_letters()) == []
+    _reset_state()
+
+
+def test_fallback_dequeue_parks_events_without_run_id():
+    _reset_state()
+    queue.set_mode_fallback_redis(True)
+    asyncio.run(queue.enqueue_job({"job_id": "job_lane", "type": "monitor.channel", "inputs": {}, "attempt": 0}))
+    asyncio.run(queue.enqueue_job(_event("run_after")))
+
+    assert asyncio.run(queue.dequeue_job("worker_dlq")) is None
+    assert asyncio.run(queue.dequeue_job("worker_dlq"))["data"]["run_id"] == "run_after"
+    assert [row["reason"] for row in asyncio.run(queue.list_dead_letters())] == ["invalid_event"]
+    _reset_state()
+
+
+class _TrimRedis(_GroupStatsRedis):
+    def __init__(self, now_ms, minid_supported=True):
+        super().__init__(now_ms)
+        self.minid_supported = minid_supported
+        self.trims = []
+        self.deleted = []
+        self.pending[queue.STREAM_JOBS]["min"] = f"{now_ms - 9000 + 4}-0"
+
+    async def xtrim(self, name, maxlen=None, approximate=True, minid=None, limit=None):
+        if not self.minid_supported:
+            raise ResponseError("ERR syntax error")
+        self.trims.append((name, minid, approximate, limit))
+        return 4
+
+    async def xrange(self, stream, min="-", max="+", count=None):
+        bound = tuple(map(int, max.split("-")))
+        return [row for row in self.streams.get(stream, []) if tuple(map(int, row[0].split("-"))) <= bound][:count]
+
+    async def xdel(self, name, *ids):
+        self.deleted.extend(ids)
+        return len(ids)
+
+
+def test_trim_job_streams_keeps_pending_and_undelivered_entries(monkeypatch):
+    _reset_state()
+    now_ms = 1_800_000_000_000
+    fake = _TrimRedis(now_ms)
+    monkeypatch.setattr(queue, "redis_client", fake)
+
+    trimmed = asyncio.run(queue.trim_job_streams(limit=50))
+    # Normal lane is cut at its oldest pending entry; the high lane has delivered nothing and is untouched.
+    assert fake.trims == [(queue.STREAM_JOBS, f"{now_ms - 9000 + 4}-0", True, 50)]
+    assert trimmed == {queue.STREAM_JOBS: 4}
+
+    fake.pending[queue.STREAM_JOBS] = {"pending": 0, "min": None, "consumers": []}
+    fake.trims.clear()
+    asyncio.run(queue.trim_job_streams(limit=50))
+    assert fake.trims[0][1] == f"{now_ms - 9000 + 5}-1"
+    _reset_state()
+
+
+def test_trim_job_streams_falls_back_to_xdel_without_minid(monkeypatch):
+    _reset_state()
+    now_ms = 1_800_000_000_000
+    fake = _TrimRedis(now_ms, minid_supported=False)
+    monkeypatch.setattr(queue, "redis_client", fake)
+
+    trimmed = asyncio.run(queue.trim_job_streams(limit=50))
+    assert fake.deleted == [f"{now_ms - 9000 + index}-0" for index in range(4)]
+    assert trimmed == {queue.STREAM_JOBS: 4}
+    _reset_state()
+
+
+def test_trim_job_streams_is_noop_in_fallback_mode():
+    _reset_state()
+    queue.set_mode_fallback_redis(True)
+    asyncio.run(queue.enqueue_job(_event("run_trim")))
+    assert asyncio.run(queue.trim_job_streams()) == {}
+    _reset_state()
+
+
+def test_enqueue_job_dedups_same_run_and_attempt_in_fallback():
+    _reset_state()
+    queue.set_mode_fallback_redis(True)
+
+    first = asyncio.run(queue.enqueue_job(_event("run_dup")))
+    assert asyncio.run(queue.enqueue_job(_event("run_dup"))) == first
+    retry = asyncio.run(queue.enqueue_job({**_event("run_dup"), "attempt": 1}))
+    assert retry != first
+    assert len(queue._fallback_streams[queue.STREAM_JOBS]) == 2
+    _reset_state()
+
+
+def test_enqueue_job_returns_original_message_id_for_duplicate_key(monkeypatch):
+    _reset_state()
+    fake = _StreamRedisRecorder()
+    monkeypatch.setattr(queue, "redis_client", fake)
+
+    first = asyncio.run(queue.enqueue_job(_event("run_race")))
+    assert asyncio.run(queue.enqueue_job(_event("run_race"))) == first
+    other = asyncio.run(queue.enqueue_job(_event("run_race"), idempotency_key="manual:1"))
+    assert other != first
+    assert len(fake.streams[queue.STREAM_JOBS]) == 2
+    assert f"{queue.QUEUE_DEDUP_PREFIX}run_race:0" in fake.dedup
+    _reset_state()
+
+
+def test_enqueue_dedup_window_expires(monkeypatch):
+    _reset_state()
+    queue.set_mode_fallback_redis(True)
+    now = [1_800_000_000.0]
+    monkeypatch.setattr(queue.time, "time", lambda: now[0])
+
+    first = asyncio.run(queue.enqueue_job(_event("run_window")))
+    now[0] += queue.settings.QUEUE_DEDUP_TTL_SEC + 1
+    assert asyncio.run(queue.enqueue_job(_event("run_window"))) != first
+    assert len(queue._fallback_dedup) == 1
+    _reset_state()
+
+
+def test_blocking_reads_use_dedicated_client(monkeypatch):
+    _reset_state()
+    short = _StreamRedisRecorder()
+    blocking = _StreamRedisRecorder(messages=[("1-0", {"data": json.dumps({"run_id": "run_woken"})})])
+    monkeypatch.setattr(queue, "redis_client", short)
+    monkeypatch.setattr(queue, "redis_blocking_client", blocking)
+
+    row = asyncio.run(queue.dequeue_job("worker_idle"))
+    assert row["data"]["run_id"] == "run_woken"
+    # The non-blocking lane refill stays on the short-command client; only the parked read moves.
+    assert (short.read_calls, blocking.read_calls) == (1, 1)
+    _reset_state()
+
+
+def test_blocking_client_timeout_outlasts_block_interval():
+    from app.core import redis_client as modul_redis
+
+    blocking_kwargs = modul_redis.redis_blocking_client.connection_pool.connection_kwargs
+    assert blocking_kwargs["socket_timeout"] > queue.settings.QUEUE_BLOCK_MS / 1000
+    assert modul_redis.redis_client.connection_pool.connection_kwargs["socket_timeout"] == 0.2
+
+
+def _pasang_shard(monkeypatch, jumlah):
+    shards = [_BatchRedisRecorder() for _ in range(jumlah)]
+    monkeypatch.setattr(queue, "queue_shard_clients", shards)
+    monkeypatch.setattr(queue, "queue_shard_blocking_clients", shards)
+    return shards
+
+
+def _event_job(run_id, job_id):
+    return {**_event(run_id), "job_id": job_id}
+
+
+def test_sharded_queue_routes_by_job_id_and_workers_drain_every_shard(monkeypatch):
+    _reset_state()
+    primary = _StreamRedisRecorder()
+    monkeypatch.setattr(queue, "redis_client", primary)
+    monkeypatch.setattr(queue, "redis_blocking_client", primary)
+    shards = _pasang_shard(monkeypatch, 3)
+    queue.set_mode_deferred_ack(True)
+
+    events = [_event_job(f"run_{index}", f"job_{index}") for index in range(12)]
+    for event in events:
+        asyncio.run(queue.enqueue_job(event))
+
+    assert primary.streams[queue.STREAM_JOBS] == []
+    for event in events:
+        shard = shards[queue._shard_untuk_event(event)]
+        assert event["run_id"] in [json.loads(fields["data"])["run_id"] for _, fields in shard.streams[queue.STREAM_JOBS]]
+    # The same job always lands on the same shard.
+    assert queue._shard_untuk_event(_event_job("run_x", "job_3")) == queue._shard_untuk_event(events[3])
+    assert len({queue._shard_untuk_event(event) for event in events}) > 1
+
+    rows = []
+    for _ in range(6):
+        rows.extend(asyncio.run(queue.dequeue_jobs("worker_shard", count=4, block_ms=None)))
+    assert sorted(row["data"]["run_id"] for row in rows) == sorted(event["run_id"] for event in events)
+
+    for row in rows:
+        asyncio.run(queue.ack_job(row["message_id"], row["stream"], row["shard"]))
+    for index, shard in enumerate(shards):
+        assert sorted(shard.acked) == sorted(row["message_id"] for row in rows if row["shard"] == index)
+    assert primary.acked == []
+    _reset_state()
+
+
+def test_sharded_enqueue_jobs_returns_ids_from_each_shard(monkeypatch):
+    _reset_state()
+    primary = _BulkRedisRecorder()
+    monkeypatch.setattr(queue, "redis_client", primary)
+    shards = _pasang_shard(monkeypatch, 2)
+
+    events = [_event_job(f"run_{index}", f"job_{index}") for index in range(6)]
+    message_ids = asyncio.run(queue.enqueue_jobs(events))
+
+    for event, message_id in zip(events, message_ids):
+        shard = shards[queue._shard_untuk_event(event)]
+        assert (message_id, event["run_id"]) in [
+            (row_id, json.loads(fields["data"])["run_id"]) for row_id, fields in shard.streams[queue.STREAM_JOBS]
+        ]
+    # Run records and the timeline stay on the main Redis; only stream entries move.
+    assert json.loads(primary.kv["run:run_0"])["status"] == "queued"
+    assert primary.streams[queue.STREAM_JOBS] == []
+    assert len(primary.streams[queue.EVENTS_STREAM]) == 6
+    assert all(shard.pipeline_rounds == 1 for shard in shards if shard.streams[queue.STREAM_JOBS])
+    _reset_state()
+
+
+def test_sharded_queue_leaves_delayed_promotion_to_the_caller(monkeypatch):
+    _reset_state()
+    routed = queue._member_delayed(queue.STREAM_JOBS, json.dumps(_event("run_retry")))
+    fake = _DelayedRedisRecorder([routed])
+    monkeypatch.setattr(queue, "redis_client", fake)
+    _pasang_shard(monkeypatch, 2)
+
+    rows = asyncio.run(queue.promote_due_jobs(limit=5))
+
+    # The script cannot XADD into a stream on another instance, so it only claims.
+    assert [(script, keys) for script, keys, _ in fake.eval_calls] == [(queue._SKRIP_KLAIM_DELAYED, [queue.ZSET_DELAYED])]
+    assert [(row["data"]["run_id"], row["message_id"]) for row in rows] == [("run_retry", None)]
+    _reset_state()
+
+
+class _ClaimRefreshRedis(_BatchRedisRecorder):
+    def __init__(self, messages=None, owned=None):
+        super().__init__()
+        self.streams[queue.STREAM_JOBS] = list(messages or [])
+        self.owned = set(owned or [])
+        self.refreshed = []
+
+    async def eval(self, script, numkeys, *args):
+        if script != queue._SKRIP_PERPANJANG_KLAIM:
+            return await super().eval(script, numkeys, *args)
+        stream, _group, consumer, *ids = args
+        diperpanjang = [message_id for message_id in ids if (consumer, message_id) in self.owned]
+        self.refreshed.append((stream, consumer, tuple(diperpanjang)))
+        return len(diperpanjang)
+
+
+def test_extend_job_claims_refreshes_held_and_stashed_messages_of_their_own_consumer(monkeypatch):
+    _reset_state()
+    messages = [("1-0", {"data": json.dumps({"run_id": "run_1"})}), ("2-0", {"data": json.dumps({"run_id": "run_2"})})]
+    fake = _ClaimRefreshRedis(messages, owned={("worker_fetch", "1-0"), ("worker_c1", "3-0")})
+    monkeypatch.setattr(queue, "redis_client", fake)
+    queue.set_mode_deferred_ack(True)
+
+    rows = asyncio.run(queue.dequeue_jobs("worker_fetch", count=10, block_ms=None))
+    assert [row["consumer"] for row in rows] == ["worker_fetch", "worker_fetch"]
+    queue._stash_konsumen["worker_c1"]["normal"].append(
+        {"message_id": "3-0", "stream": queue.STREAM_JOBS, "ack_pending": True, "consumer": "worker_c1"}
+    )
+
+    # 2-0 was reclaimed by another consumer meanwhile, so it is not pulled back.
+    assert asyncio.run(queue.extend_job_claims(rows)) == 2
+    assert sorted(fake.refreshed) == [
+        (queue.STREAM_JOBS, "worker_c1", ("3-0",)),
+        (queue.STREAM_JOBS, "worker_fetch", ("1-0",)),
+    ]
+    assert fake.acked == []
+    _reset_state()
+
+
+def test_extend_job_claims_is_noop_outside_deferred_mode(monkeypatch):
+    _reset_state()
+    fake = _ClaimRefreshRedis()
+    monkeypatch.setattr(queue, "redis_client", fake)
+
+    row = {"message_id": "1-0", "stream": queue.STREAM_JOBS, "ack_pending": True, "consumer": "worker_fetch"}
+    assert asyncio.run(queue.extend_job_claims([row])) == 0
+    assert fake.refreshed == []
+
+
+def test_worker_leaves_message_pending_when_handler_raises(monkeypatch):
+    from app.services.worker import main as worker_main
+
+    acked = []
+
+    async def _ack(message_id, stream=None, shard=None):
+        acked.append(message_id)
+
+    async def _gagal(worker_id, data_event):
+        assert worker_main._kunci_pesan(row) in worker_main._pesan_dipegang
+        raise RuntimeError("boom")
+
+    async def _berhasil(worker_id, data_event):
+        return None
+
+    monkeypatch.setattr(worker_main, "ack_job", _ack)
+    monkeypatch.setattr(worker_main, "_proses_satu_job_terukur", _gagal)
+    row = {"message_id": "1-0", "stream": queue.STREAM_JOBS, "ack_pending": True, "data": _event("run_boom")}
+
+    try:
+        asyncio.run(worker_main._proses_pesan("worker_1", row))
+    except RuntimeError:
+        pass
+    # Unacked, so reclaim retries it or dead-letters it past QUEUE_MAX_DELIVERIES; no longer refreshed either.
+    assert acked == []
+    assert worker_main._pesan_dipegang == {}
+
+    monkeypatch.setattr(worker_main, "_proses_satu_job_terukur", _berhasil)
+    asyncio.run(worker_main._proses_pesan("worker_1", row))
+    assert acked == ["1-0"]
@@ -1,4 +1,5 @@
 import asyncio
+import json
 from datetime import datetime, timedelta, timezone
 
 from redis.exceptions import RedisError, ResponseError, TimeoutError as RedisTimeoutError
@@ -23,6 +24,10 @@ class _FailingRedisOnXadd:
         self.xadd_calls += 1
         raise RedisError("redis unavailable")
 
+    async def eval(self, script, numkeys, *args):
+        # The idempotent enqueue script XADDs server-side.
+        return await self.xadd(args[1], {"data": args[2]})
+
 
 class _LegacyRedisNoStreams:
     def __init__(self):
@@ -41,11 +46,18 @@ class _LegacyRedisNoStreams:
         return (key, self._items.pop(0))
 
     async def llen(self, key):
-        return len(self._items)
+        return len(self._items) if key == queue.LIST_JOBS else 0
+
+    async def smembers(self, key):
+        return set()
 
     async def zcard(self, key):
         return 0
 
+    async def set(self, key, value, nx=False, ex=None):
+        # Run indexes already marked as built; enqueue dedup keys are always new.
+        return True if key.startswith(queue.QUEUE_DEDUP_PREFIX) else None
+
 
 class _LegacyRedisTimeoutOnBlpop:
     async def blpop(self, key, timeout=0):
@@ -60,7 +72,9 @@ class _RedisTimeoutOnXreadgroup:
 def _reset_queue_fallback_state():
     queue.set_mode_fallback_redis(False)
     queue.set_mode_legacy_redis_queue(False)
-    queue._fallback_stream.clear()
+    queue._fallback_streams.clear()
+    queue._pool_terdaftar.clear()
+    queue._cache_pool_aktif["expires_at"] = 0.0
     queue._fallback_delayed.clear()
     queue._fallback_job_specs.clear()
     queue._fallback_job_all.clear()
@@ -68,11 +82,14 @@ def _reset_queue_fallback_state():
     queue._fallback_job_spec_versions.clear()
     queue._fallback_runs.clear()
     queue._fallback_run_scores.clear()
+    queue._fallback_run_urutan.clear()
     queue._fallback_job_runs.clear()
     queue._fallback_active_runs.clear()
     queue._fallback_active_flow_runs.clear()
     queue._fallback_failure_state.clear()
     queue._fallback_events.clear()
+    queue._fallback_dedup.clear()
+    queue._fallback_dedup_kedaluwarsa.clear()
 
 
 def test_queue_fallback_mode_short_circuits_redis(monkeypatch):
@@ -166,6 +183,7 @@ def test_queue_switches_to_legacy_mode_when_stream_not_supported(monkeypatch):
     _reset_queue_fallback_state()
     legacy_redis = _LegacyRedisNoStreams()
     monkeypatch.setattr(queue, "redis_client", legacy_redis)
+    monkeypatch.setattr(queue, "redis_blocking_client", legacy_redis)
 
     asyncio.run(queue.init_queue())
     assert queue.is_mode_fallback_redis() is False
@@ -196,6 +214,7 @@ def test_legacy_dequeue_timeout_does_not_trigger_fallback(monkeypatch):
     _reset_queue_fallback_state()
     queue.set_mode_legacy_redis_queue(True)
     monkeypatch.setattr(queue, "redis_client", _LegacyRedisTimeoutOnBlpop())
+    monkeypatch.setattr(queue, "redis_blocking_client", _LegacyRedisTimeoutOnBlpop())
 
     row = asyncio.run(queue.dequeue_job("worker_legacy_timeout"))
     assert row is None
@@ -326,13 +345,16 @@ def test_get_events_supports_offset_and_since_in_fallback_mode(monkeypatch):
     monkeypatch.setattr(queue, "redis_client", _MustNotCallRedis())
     queue.set_mode_fallback_redis(True)
 
-    queue._fallback_events[:] = [
-        {"id": "evt_5", "type": "run.failed", "timestamp": "2026-01-05T00:00:00+00:00", "data": {"run_id": "run_5"}},
-        {"id": "evt_4", "type": "run.success", "timestamp": "2026-01-04T00:00:00+00:00", "data": {"run_id": "run_4"}},
-        {"id": "evt_3", "type": "run.started", "timestamp": "2026-01-03T00:00:00+00:00", "data": {"run_id": "run_3"}},
-        {"id": "evt_2", "type": "run.queued", "timestamp": "2026-01-02T00:00:00+00:00", "data": {"run_id": "run_2"}},
-        {"id": "evt_1", "type": "system.ready", "timestamp": "2026-01-01T00:00:00+00:00", "data": {"ok": True}},
-    ]
+    queue._fallback_events.clear()
+    queue._fallback_events.extend(
+        [
+            {"id": "evt_5", "type": "run.failed", "timestamp": "2026-01-05T00:00:00+00:00", "data": {"run_id": "run_5"}},
+            {"id": "evt_4", "type": "run.success", "timestamp": "2026-01-04T00:00:00+00:00", "data": {"run_id": "run_4"}},
+            {"id": "evt_3", "type": "run.started", "timestamp": "2026-01-03T00:00:00+00:00", "data": {"run_id": "run_3"}},
+            {"id": "evt_2", "type": "run.queued", "timestamp": "2026-01-02T00:00:00+00:00", "data": {"run_id": "run_2"}},
+            {"id": "evt_1", "type": "system.ready", "timestamp": "2026-01-01T00:00:00+00:00", "data": {"ok": True}},
+        ]
+    )
 
     page = asyncio.run(queue.get_events(limit=2, offset=1))
     assert [row["id"] for row in page] == ["evt_3", "evt_4"]
@@ -342,3 +364,257 @@ def test_get_events_supports_offset_and_since_in_fallback_mode(monkeypatch):
 
     second_page = asyncio.run(queue.get_events(limit=1, offset=1, since="2026-01-01T00:00:00+00:00"))
     assert [row["id"] for row in second_page] == ["evt_4"]
+
+
+def test_fallback_backlog_stays_fifo_and_linear_at_scale(monkeypatch):
+    _reset_queue_fallback_state()
+    monkeypatch.setattr(queue, "redis_client", _MustNotCallRedis())
+    queue.set_mode_fallback_redis(True)
+
+    async def _isi_dan_kuras():
+        for index in range(100000):
+            await queue.enqueue_job({"run_id": f"run_{index}", "job_id": "job_bulk", "type": "x", "inputs": {}, "attempt": 0})
+        assert (await queue.get_queue_metrics())["depth"] == 100000
+        return [(await queue.dequeue_job("worker_bulk"))["data"]["run_id"] for _ in range(100000)]
+
+    drained = asyncio.run(_isi_dan_kuras())
+    assert drained[0] == "run_0"
+    assert drained[-1] == "run_99999"
+    assert asyncio.run(queue.dequeue_job("worker_bulk")) is None
+
+
+def test_fallback_run_index_follows_rescheduled_runs(monkeypatch):
+    _reset_queue_fallback_state()
+    monkeypatch.setattr(queue, "redis_client", _MustNotCallRedis())
+    queue.set_mode_fallback_redis(True)
+
+    base = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    for index in range(3):
+        run = Run(run_id=f"run_{index}", job_id="job_a", status=RunStatus.QUEUED, attempt=0, scheduled_at=base + timedelta(minutes=index))
+        asyncio.run(queue.save_run(run))
+
+    moved = Run(run_id="run_0", job_id="job_a", status=RunStatus.QUEUED, attempt=1, scheduled_at=base + timedelta(hours=1))
+    asyncio.run(queue.save_run(moved))
+
+    rows = asyncio.run(queue.list_runs(limit=10))
+    assert [run.run_id for run in rows] == ["run_0", "run_2", "run_1"]
+    assert len(queue._fallback_run_urutan) == 3
+
+
+class _MigrationPipeline:
+    def __init__(self, client):
+        self.client = client
+        self.calls = []
+
+    def __getattr__(self, name):
+        def _antre(*args, **kwargs):
+            self.calls.append((name, args))
+            return self
+
+        return _antre
+
+    async def execute(self, raise_on_error=True):
+        if self.client.fail_execute:
+            raise RedisError("redis went away again")
+        if self.client.on_execute:
+            self.client.on_execute()
+        self.client.batches.append(list(self.calls))
+        return [await self.client.eval(*args) if name == "eval" else True for name, args in self.calls]
+
+
+class _MigrationRedis:
+    def __init__(self, fail_execute=False):
+        self.fail_execute = fail_execute
+        self.batches = []
+        self.groups = []
+        self.kv = {}
+        self.streams = {}
+        self.on_execute = None
+
+    def pipeline(self, transaction=True):
+        return _MigrationPipeline(self)
+
+    async def get(self, key):
+        return self.kv.get(key)
+
+    async def eval(self, script, numkeys, *args):
+        if script == queue._SKRIP_ENQUEUE_IDEMPOTEN:
+            dedup_key, stream, payload, _ttl = args
+            if dedup_key in self.kv:
+                return [self.kv[dedup_key], 0]
+            rows = self.streams.setdefault(stream, [])
+            rows.append(json.loads(payload))
+            self.kv[dedup_key] = f"{len(rows)}-0"
+            return [self.kv[dedup_key], 1]
+        # The save_run compare-and-set, without the index writes.
+        assert script == queue._SKRIP_SIMPAN_RUN
+        key, (expected, payload) = args[0], args[numkeys : numkeys + 2]
+        index = json.loads(self.kv[key])["_index"] if key in self.kv else None
+        lama = "\n".join((index["status"], index["job_id"], index["flow_group"])) if index else ""
+        if lama != expected:
+            return [0, lama]
+        self.kv[key] = payload
+        return [1, ""]
+
+    async def ping(self):
+        return True
+
+    async def xgroup_create(self, name, groupname, id="$", mkstream=False):
+        self.groups.append(name)
+        return True
+
+
+async def _isi_fallback_untuk_migrasi():
+    await queue.save_job_spec("job_migrate", {"job_id": "job_migrate", "type": "monitor.channel"})
+    await queue.enable_job("job_migrate")
+    await queue.save_run(
+        Run(
+            run_id="run_migrate",
+            job_id="job_migrate",
+            status=RunStatus.QUEUED,
+            scheduled_at=datetime(2026, 1, 1, tzinfo=timezone.utc),
+        )
+    )
+    for index in range(5):
+        await queue.enqueue_job({"run_id": f"run_q{index}", "job_id": "job_migrate", "type": "monitor.channel"})
+    await queue.schedule_delayed_job({"run_id": "run_retry", "job_id": "job_migrate", "type": "monitor.channel"}, 60)
+    await queue.append_event("run.queued", {"run_id": "run_migrate"})
+
+
+def test_recovery_probe_migrates_fallback_state_in_batches(monkeypatch):
+    _reset_queue_fallback_state()
+    queue.set_mode_fallback_redis(True)
+    asyncio.run(_isi_fallback_untuk_migrasi())
+    fake = _MigrationRedis()
+    monkeypatch.setattr(queue, "redis_client", fake)
+    monkeypatch.setattr(queue.settings, "FALLBACK_MIGRATION_BATCH", 4)
+
+    hasil = asyncio.run(queue.probe_redis_recovery())
+
+    assert hasil["stream_items"] == 5
+    assert hasil["runs"] == 1 and hasil["delayed"] == 1 and hasil["job_specs"] == 1
+    assert queue.is_mode_fallback_redis() is False
+    assert all(len(batch) <= 4 for batch in fake.batches)
+    calls = [call for batch in fake.batches for call in batch]
+    assert [row["run_id"] for row in fake.streams[queue.STREAM_JOBS]] == [f"run_q{index}" for index in range(5)]
+    simpan = [args for name, args in calls if name == "eval" and args[0] == queue._SKRIP_SIMPAN_RUN]
+    assert len(simpan) == 1 and queue._kunci_active_runs("job_migrate") in simpan[0]
+    assert json.loads(fake.kv[f"{queue.RUN_PREFIX}run_migrate"])["status"] == "queued"
+    assert any(name == "zadd" and args[0] == queue.ZSET_DELAYED for name, args in calls)
+    assert [json.loads(args[1]["data"])["type"] for name, args in calls if name == "xadd" and args[0] == queue.EVENTS_STREAM] == [
+        "run.queued"
+    ]
+    assert fake.groups == [queue.STREAM_JOBS]
+    assert not queue._fallback_runs and not queue._fallback_streams.get(queue.STREAM_JOBS)
+    assert asyncio.run(queue.probe_redis_recovery()) is None
+    _reset_queue_fallback_state()
+
+
+def test_migration_keeps_runs_redis_moved_on_since_recovery(monkeypatch):
+    _reset_queue_fallback_state()
+    queue.set_mode_fallback_redis(True)
+    asyncio.run(_isi_fallback_untuk_migrasi())
+    fake = _MigrationRedis()
+    selesai = Run(
+        run_id="run_migrate",
+        job_id="job_migrate",
+        status=RunStatus.SUCCESS,
+        scheduled_at=datetime(2026, 1, 1, tzinfo=timezone.utc),
+        finished_at=datetime(2026, 1, 1, 0, 5, tzinfo=timezone.utc),
+    )
+    fake.kv[f"{queue.RUN_PREFIX}run_migrate"] = queue._payload_run_redis(queue._serialisasi_model(selesai))
+    monkeypatch.setattr(queue, "redis_client", fake)
+
+    asyncio.run(queue.probe_redis_recovery())
+
+    # The stale queued copy from fallback does not replace the run a worker already finished.
+    assert json.loads(fake.kv[f"{queue.RUN_PREFIX}run_migrate"])["status"] == "success"
+    simpan = [args for batch in fake.batches for name, args in batch if name == "eval" and args[0] == queue._SKRIP_SIMPAN_RUN]
+    assert len(simpan) == 1
+    _reset_queue_fallback_state()
+
+
+def test_migration_replaces_an_older_redis_copy(monkeypatch):
+    _reset_queue_fallback_state()
+    queue.set_mode_fallback_redis(True)
+    asyncio.run(_isi_fallback_untuk_migrasi())
+    lama = Run(
+        run_id="run_migrate",
+        job_id="job_migrate",
+        status=RunStatus.FAILED,
+        attempt=0,
+        scheduled_at=datetime(2025, 12, 31, tzinfo=timezone.utc),
+    )
+    asyncio.run(queue.save_run(lama.model_copy(update={"attempt": 1, "status": RunStatus.QUEUED})))
+    fake = _MigrationRedis()
+    fake.kv[f"{queue.RUN_PREFIX}run_migrate"] = queue._payload_run_redis(queue._serialisasi_model(lama))
+    monkeypatch.setattr(queue, "redis_client", fake)
+
+    asyncio.run(queue.probe_redis_recovery())
+
+    run = json.loads(fake.kv[f"{queue.RUN_PREFIX}run_migrate"])
+    assert (run["attempt"], run["status"]) == (1, "queued")
+    _reset_queue_fallback_state()
+
+
+def test_failed_migration_keeps_fallback_state(monkeypatch):
+    _reset_queue_fallback_state()
+    queue.set_mode_fallback_redis(True)
+    asyncio.run(_isi_fallback_untuk_migrasi())
+    monkeypatch.setattr(queue, "redis_client", _MigrationRedis(fail_execute=True))
+
+    assert asyncio.run(queue.probe_redis_recovery()) is None
+
+    assert queue.is_mode_fallback_redis() is True
+    assert asyncio.run(queue.get_run("run_migrate")).status == RunStatus.QUEUED
+    assert asyncio.run(queue.has_active_runs("job_migrate")) is True
+    assert asyncio.run(queue.dequeue_job("worker_migrate"))["data"]["run_id"] == "run_q0"
+    _reset_queue_fallback_state()
+
+
+def test_migration_keeps_fallback_state_readable_until_the_mode_switch(monkeypatch):
+    _reset_queue_fallback_state()
+    queue.set_mode_fallback_redis(True)
+    asyncio.run(_isi_fallback_untuk_migrasi())
+    fake = _MigrationRedis()
+    terlihat = []
+
+    def _baca_saat_migrasi():
+        if queue.is_mode_fallback_redis():
+            terlihat.append(
+                (
+                    tuple(sorted(queue._fallback_runs)),
+                    tuple(sorted(queue._fallback_job_specs)),
+                    tuple(sorted(queue._fallback_active_runs.get("job_migrate", ()))),
+                )
+            )
+
+    fake.on_execute = _baca_saat_migrasi
+    monkeypatch.setattr(queue, "redis_client", fake)
+
+    asyncio.run(queue.probe_redis_recovery())
+
+    assert terlihat and set(terlihat) == {(("run_migrate",), ("job_migrate",), ("run_migrate",))}
+    # The unchanged run is not written a second time by the final pass.
+    assert len([args for batch in fake.batches for name, args in batch if args and args[0] == queue._SKRIP_SIMPAN_RUN]) == 1
+    assert queue.is_mode_fallback_redis() is False
+    _reset_queue_fallback_state()
+
+
+def test_replaying_a_migration_does_not_duplicate_stream_items(monkeypatch):
+    _reset_queue_fallback_state()
+    queue.set_mode_fallback_redis(True)
+    asyncio.run(_isi_fallback_untuk_migrasi())
+    snapshot = json.loads(json.dumps(queue._snapshot_state_fallback()))
+    fake = _MigrationRedis()
+    monkeypatch.setattr(queue, "redis_client", fake)
+
+    asyncio.run(queue.probe_redis_recovery())
+    # A crash before the journal was compacted replays the same state into the next process.
+    _reset_queue_fallback_state()
+    queue.set_mode_fallback_redis(True)
+    queue._pulihkan_snapshot_fallback(snapshot)
+    asyncio.run(queue.probe_redis_recovery())
+
+    assert [row["run_id"] for row in fake.streams[queue.STREAM_JOBS]] == [f"run_q{index}" for index in range(5)]
+    _reset_queue_fallback_state()
@@ -0,0 +1,212 @@
+import asyncio
+import json
+import gzip
+from datetime import datetime, timedelta, timezone
+
+from app.core import queue
+from app.core.models import Run, RunStatus
+from app.core.run_archive import RunArchive
+
+
+class _Pipeline:
+    def __init__(self, client):
+        self.client = client
+        self.calls = []
+
+    def __getattr__(self, name):
+        def _antre(*args, **kwargs):
+            self.calls.append((name, args, kwargs))
+            return self
+
+        return _antre
+
+    async def execute(self, raise_on_error=True):
+        return [await getattr(self.client, name)(*args, **kwargs) for name, args, kwargs in self.calls]
+
+
+class _RetentionRedis:
+    def __init__(self):
+        self.kv = {}
+        self.zsets = {}
+        self.sets = {}
+
+    def pipeline(self, transaction=True):
+        return _Pipeline(self)
+
+    async def get(self, key):
+        return self.kv.get(key)
+
+    async def set(self, key, value, nx=False, ex=None):
+        if nx and key in self.kv:
+            return None
+        self.kv[key] = value
+        return True
+
+    async def delete(self, key):
+        self.kv.pop(key, None)
+
+    async def mget(self, keys):
+        return [self.kv.get(key) for key in keys]
+
+    async def zadd(self, key, mapping):
+        self.zsets.setdefault(key, {}).update(mapping)
+
+    async def zrem(self, key, member):
+        self.zsets.get(key, {}).pop(member, None)
+
+    async def zrangebyscore(self, key, minimum, maximum, start=0, num=None):
+        rows = sorted(self.zsets.get(key, {}).items(), key=lambda item: (item[1], item[0]))
+        rows = [member for member, score in rows if score <= float(maximum)]
+        return rows[start : start + num]
+
+    async def eval(self, script, numkeys, *args):
+        if script == queue._SKRIP_LEPAS_KUNCI:
+            key, token = args
+            if self.kv.get(key) != token:
+                return 0
+            del self.kv[key]
+            return 1
+        # Python stand-in for the save_run script.
+        assert script == queue._SKRIP_SIMPAN_RUN
+        keys, argv = args[:numkeys], args[numkeys:]
+        previous = json.loads(self.kv[keys[0]])["_index"] if keys[0] in self.kv else None
+        lama = "\n".join((previous["status"], previous["job_id"], previous["flow_group"])) if previous else ""
+        if lama != argv[0]:
+            return [0, lama]
+        self.kv[keys[0]] = argv[1]
+        for index in range(2, len(argv), 4):
+            op, posisi, member, score = argv[index : index + 4]
+            key = keys[posisi - 1]
+            if op == "zadd":
+                await self.zadd(key, {member: score})
+            elif op == "zrem":
+                await self.zrem(key, member)
+            else:
+                await getattr(self, op)(key, member)
+        return [1, ""]
+
+    async def sadd(self, key, *members):
+        self.sets.setdefault(key, set()).update(members)
+
+    async def srem(self, key, *members):
+        self.sets.setdefault(key, set()).difference_update(members)
+
+
+def _run(run_id, status, hari):
+    return Run(
+        run_id=run_id,
+        job_id="job_retensi",
+        status=status,
+        scheduled_at=datetime(2026, 1, 1, tzinfo=timezone.utc) + timedelta(days=hari),
+        inputs={"payload": "x" * 200},
+    )
+
+
+def test_archive_moves_old_finished_runs_out_of_redis(monkeypatch, tmp_path):
+    queue.set_mode_fallback_redis(False)
+    fake = _RetentionRedis()
+    monkeypatch.setattr(queue, "redis_client", fake)
+    monkeypatch.setattr(queue, "_arsip_run", RunArchive(str(tmp_path)))
+    asyncio.run(queue.save_run(_run("run_lama_1", RunStatus.SUCCESS, 0)))
+    asyncio.run(queue.save_run(_run("run_lama_2", RunStatus.FAILED, 1)))
+    asyncio.run(queue.save_run(_run("run_macet", RunStatus.RUNNING, 1)))
+    asyncio.run(queue.save_run(_run("run_baru", RunStatus.SUCCESS, 30)))
+    now = datetime(2026, 1, 31, tzinfo=timezone.utc).timestamp()
+
+    assert asyncio.run(queue.archive_old_runs(older_than_sec=7 * 24 * 3600, limit=1, now=now)) == 1
+    assert asyncio.run(queue.archive_old_runs(older_than_sec=7 * 24 * 3600, limit=10, now=now)) == 1
+    assert asyncio.run(queue.archive_old_runs(older_than_sec=7 * 24 * 3600, limit=10, now=now)) == 0
+
+    assert sorted(fake.zsets[queue.ZSET_RUNS]) == ["run_baru", "run_macet"]
+    assert f"{queue.RUN_PREFIX}run_lama_1" not in fake.kv
+    assert "run_lama_2" not in fake.zsets[queue._kunci_index_status_run("failed")]
+    assert queue.RUN_ARCHIVE_LOCK_KEY not in fake.kv
+
+    archived = asyncio.run(queue.get_run("run_lama_2"))
+    assert archived.status == RunStatus.FAILED
+    assert archived.inputs["payload"] == "x" * 200
+    assert asyncio.run(queue.get_run("run_tidak_ada")) is None
+    assert sorted(RunArchive(str(tmp_path)).load_index()) == ["2026-01-01", "2026-01-02"]
+
+
+def test_archive_lookup_survives_torn_segment(tmp_path):
+    arsip = RunArchive(str(tmp_path))
+    arsip.append([queue._serialisasi_model(_run("run_a", RunStatus.SUCCESS, 0))])
+    with open(tmp_path / "runs-2026-01-01.jsonl.gz", "ab") as handle:
+        handle.write(gzip.compress(b'{"run_id": "run_b"}\n')[:12])
+
+    assert RunArchive(str(tmp_path)).get("run_a")["run_id"] == "run_a"
+
+
+def test_archive_lock_release_keeps_a_lock_taken_by_another_instance(monkeypatch, tmp_path):
+    queue.set_mode_fallback_redis(False)
+    fake = _RetentionRedis()
+    monkeypatch.setattr(queue, "redis_client", fake)
+    monkeypatch.setattr(queue, "_arsip_run", RunArchive(str(tmp_path)))
+    asyncio.run(queue.save_run(_run("run_lama", RunStatus.SUCCESS, 0)))
+    now = datetime(2026, 1, 31, tzinfo=timezone.utc).timestamp()
+    mget_asli = fake.mget
+
+    async def mget_lambat(keys):
+        # The pass outlives its TTL and another instance takes the lock meanwhile.
+        fake.kv[queue.RUN_ARCHIVE_LOCK_KEY] = "token_lain"
+        return await mget_asli(keys)
+
+    monkeypatch.setattr(fake, "mget", mget_lambat)
+
+    assert asyncio.run(queue.archive_old_runs(older_than_sec=0, limit=10, now=now)) == 1
+    assert fake.kv[queue.RUN_ARCHIVE_LOCK_KEY] == "token_lain"
+
+
+def test_archive_lookup_sees_runs_appended_by_another_process(tmp_path):
+    pembaca = RunArchive(str(tmp_path))
+    penulis = RunArchive(str(tmp_path))
+    penulis.append([queue._serialisasi_model(_run("run_a", RunStatus.SUCCESS, 0))])
+    assert pembaca.get("run_a")["run_id"] == "run_a"
+
+    penulis.append([queue._serialisasi_model(_run("run_b", RunStatus.SUCCESS, 0))])
+
+    assert pembaca.get("run_b")["run_id"] == "run_b"
+    assert pembaca.get("run_a")["run_id"] == "run_a"
+
+
+def test_archive_index_is_reread_only_when_it_changes(monkeypatch, tmp_path):
+    arsip = RunArchive(str(tmp_path))
+    arsip.append([queue._serialisasi_model(_run("run_a", RunStatus.SUCCESS, 0))])
+    dibaca = []
+    load_asli = json.load
+
+    def _load_terhitung(handle):
+        dibaca.append(handle.name)
+        return load_asli(handle)
+
+    monkeypatch.setattr("app.core.run_archive.json.load", _load_terhitung)
+    pembaca = RunArchive(str(tmp_path))
+    for _ in range(3):
+        assert pembaca.get("run_tidak_ada") is None
+    assert len(dibaca) == 1
+
+    arsip.append([queue._serialisasi_model(_run("run_b", RunStatus.SUCCESS, 1))])
+    assert pembaca.get("run_b")["run_id"] == "run_b"
+    assert len(dibaca) == 2
+
+
+def test_get_run_skips_the_archive_for_runs_inside_the_retention_window(monkeypatch, tmp_path):
+    queue.set_mode_fallback_redis(False)
+    monkeypatch.setattr(queue, "redis_client", _RetentionRedis())
+    arsip = RunArchive(str(tmp_path))
+    monkeypatch.setattr(queue, "_arsip_run", arsip)
+    monkeypatch.setattr(queue.settings, "RUN_RETENTION_SEC", 3600)
+    now = 1_800_000_000
+    monkeypatch.setattr(queue.time, "time", lambda: now)
+    lama, baru = f"run_{now - 7200}_aaaa", f"run_{now - 60}_bbbb"
+    arsip.append([{**queue._serialisasi_model(_run(run_id, RunStatus.SUCCESS, 0)), "run_id": run_id} for run_id in (lama, baru)])
+    dicari = []
+    get_asli = arsip.get
+    monkeypatch.setattr(arsip, "get", lambda run_id: dicari.append(run_id) or get_asli(run_id))
+
+    assert asyncio.run(queue.get_run(lama)).run_id == lama
+    assert asyncio.run(queue.get_run(baru)) is None
+    assert asyncio.run(queue.get_run(baru, include_archived=True)).run_id == baru
+    assert asyncio.run(queue.get_run(lama, include_archived=False)) is None
+    assert dicari == [lama, baru]
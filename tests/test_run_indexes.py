@@ -0,0 +1,221 @@
+import asyncio
+import json
+from datetime import datetime, timedelta, timezone
+
+from app.core import queue
+from app.core.models import Run, RunStatus
+
+
+class _Pipeline:
+    def __init__(self, client):
+        self.client = client
+        self.calls = []
+
+    def __getattr__(self, name):
+        def _antre(*args, **kwargs):
+            self.calls.append((name, args, kwargs))
+            return self
+
+        return _antre
+
+    async def execute(self, raise_on_error=True):
+        return [await getattr(self.client, name)(*args, **kwargs) for name, args, kwargs in self.calls]
+
+
+class _IndexedRedis:
+    def __init__(self):
+        self.kv = {}
+        self.zsets = {}
+        self.sets = {}
+        self.get_calls = 0
+        self.mget_calls = 0
+
+    def pipeline(self, transaction=True):
+        return _Pipeline(self)
+
+    async def get(self, key):
+        self.get_calls += 1
+        return self.kv.get(key)
+
+    async def set(self, key, value, nx=False):
+        if nx and key in self.kv:
+            return None
+        self.kv[key] = value
+        return True
+
+    async def delete(self, key):
+        self.kv.pop(key, None)
+
+    async def mget(self, keys):
+        self.mget_calls += 1
+        return [self.kv.get(key) for key in keys]
+
+    async def zadd(self, key, mapping):
+        self.zsets.setdefault(key, {}).update(mapping)
+
+    async def zrem(self, key, member):
+        self.zsets.get(key, {}).pop(member, None)
+
+    async def zscore(self, key, member):
+        return self.zsets.get(key, {}).get(member)
+
+    def _urut(self, key):
+        return sorted(self.zsets.get(key, {}).items(), key=lambda item: (item[1], item[0]))
+
+    async def zrange(self, key, start, end, withscores=False):
+        rows = self._urut(key)[start : end + 1]
+        return rows if withscores else [member for member, _ in rows]
+
+    async def zrevrange(self, key, start, end, withscores=False):
+        rows = list(reversed(self._urut(key)))[start : None if end == -1 else end + 1]
+        return rows if withscores else [member for member, _ in rows]
+
+    async def zrangebylex(self, key, minimum, maximum, start=None, num=None):
+        members = sorted(self.zsets.get(key, {}))
+        rows = [member for member in members if minimum[1:] <= member <= maximum[1:]]
+        return rows[start : start + num] if num is not None else rows
+
+    async def eval(self, script, numkeys, *args):
+        # Python stand-in for the save_run script.
+        assert script == queue._SKRIP_SIMPAN_RUN
+        keys, argv = args[:numkeys], args[numkeys:]
+        previous = json.loads(self.kv[keys[0]])["_index"] if keys[0] in self.kv else None
+        lama = "\n".join((previous["status"], previous["job_id"], previous["flow_group"])) if previous else ""
+        if lama != argv[0]:
+            return [0, lama]
+        self.kv[keys[0]] = argv[1]
+        for index in range(2, len(argv), 4):
+            op, posisi, member, score = argv[index : index + 4]
+            key = keys[posisi - 1]
+            if op == "zadd":
+                await self.zadd(key, {member: score})
+            elif op == "zrem":
+                await self.zrem(key, member)
+            else:
+                await getattr(self, op)(key, member)
+        return [1, ""]
+
+    async def smembers(self, key):
+        return set(self.sets.get(key, set()))
+
+    async def sadd(self, key, *members):
+        self.sets.setdefault(key, set()).update(members)
+
+    async def srem(self, key, *members):
+        self.sets.setdefault(key, set()).difference_update(members)
+
+
+def _run(run_id, job_id, status, menit):
+    return Run(
+        run_id=run_id,
+        job_id=job_id,
+        status=status,
+        scheduled_at=datetime(2026, 1, 1, tzinfo=timezone.utc) + timedelta(minutes=menit),
+    )
+
+
+def _siapkan(monkeypatch):
+    queue.set_mode_fallback_redis(False)
+    fake = _IndexedRedis()
+    monkeypatch.setattr(queue, "redis_client", fake)
+    fake.sets[queue.JOB_ALL_SET] = {"job_alpha", "job_beta"}
+    for index in range(30):
+        job_id = "job_alpha" if index % 2 else "job_beta"
+        status = RunStatus.FAILED if index % 3 == 0 else RunStatus.SUCCESS
+        asyncio.run(queue.save_run(_run(f"run_{index:02d}", job_id, status, index)))
+    return fake
+
+
+def test_save_run_moves_run_between_status_indexes(monkeypatch):
+    fake = _siapkan(monkeypatch)
+    asyncio.run(queue.save_run(_run("run_new", "job_alpha", RunStatus.QUEUED, 100)))
+    asyncio.run(queue.save_run(_run("run_new", "job_alpha", RunStatus.RUNNING, 100)))
+
+    assert "run_new" not in fake.zsets[queue._kunci_index_status_run("queued")]
+    assert "run_new" in fake.zsets[queue._kunci_index_status_run("running")]
+    assert "run_new" in fake.zsets[queue._kunci_index_job_run("job_alpha")]
+    assert "run_new\nrun_new" in fake.zsets[queue.ZSET_RUNS_LEX]
+
+
+def test_list_runs_pages_filtered_runs_from_indexes(monkeypatch):
+    fake = _siapkan(monkeypatch)
+    fake.get_calls = 0
+
+    failed = asyncio.run(queue.list_runs(limit=3, status="failed"))
+    assert [run.run_id for run in failed] == ["run_27", "run_24", "run_21"]
+
+    alpha_failed = asyncio.run(queue.list_runs(limit=2, offset=1, job_id="job_alpha", status="failed"))
+    assert [run.run_id for run in alpha_failed] == ["run_21", "run_15"]
+
+    by_prefix = asyncio.run(queue.list_runs(limit=5, search="RUN_1"))
+    assert [run.run_id for run in by_prefix] == [f"run_{index}" for index in range(19, 14, -1)]
+
+    by_job = asyncio.run(queue.list_runs(limit=2, search="beta"))
+    assert [run.run_id for run in by_job] == ["run_28", "run_26"]
+    assert fake.get_calls == 0
+
+
+def test_rebuild_run_indexes_backfills_existing_runs(monkeypatch):
+    fake = _siapkan(monkeypatch)
+    for key in list(fake.zsets):
+        if key != queue.ZSET_RUNS:
+            del fake.zsets[key]
+
+    asyncio.run(queue._pastikan_index_run())
+
+    assert len(fake.zsets[queue._kunci_index_status_run("failed")]) == 10
+    assert len(fake.zsets[queue._kunci_index_job_run("job_beta")]) == 15
+    assert len(fake.zsets[queue.ZSET_RUNS_LEX]) == 30
+    assert fake.kv[queue.RUN_INDEX_READY_KEY] == "1"
+    # Claimed once; a second call leaves the indexes alone.
+    del fake.zsets[queue.ZSET_RUNS_LEX]
+    asyncio.run(queue._pastikan_index_run())
+    assert queue.ZSET_RUNS_LEX not in fake.zsets
+
+
+def test_save_run_declares_every_index_key(monkeypatch):
+    queue.set_mode_fallback_redis(False)
+    fake = _IndexedRedis()
+    calls = []
+    asli = fake.eval
+
+    async def _eval(script, numkeys, *args):
+        calls.append(args)
+        return await asli(script, numkeys, *args)
+
+    fake.eval = _eval
+    monkeypatch.setattr(queue, "redis_client", fake)
+    run = _run("run_flow", "job_alpha", RunStatus.RUNNING, 1)
+    run.inputs = {"flow_group": "  konten_harian  "}
+
+    asyncio.run(queue.save_run(run))
+
+    # The guessed previous index (queued) is wrong for a new run, so the script reports it and one retry follows.
+    assert len(calls) == 2 and fake.get_calls == 0
+    assert calls[1][:4] == ("run:run_flow", queue.ZSET_RUNS, queue.ZSET_RUNS_LEX, queue._kunci_index_status_run("running"))
+    assert queue._kunci_active_flow_runs("konten_harian") in calls[1]
+    assert json.loads(fake.kv["run:run_flow"])["_index"]["flow_group"] == "konten_harian"
+    assert asyncio.run(queue.get_run("run_flow")).status == RunStatus.RUNNING
+    assert fake.sets[queue._kunci_active_runs("job_alpha")] == {"run_flow"}
+
+
+def test_save_run_follows_the_usual_transition_in_one_call(monkeypatch):
+    queue.set_mode_fallback_redis(False)
+    fake = _IndexedRedis()
+    monkeypatch.setattr(queue, "redis_client", fake)
+    asyncio.run(queue.save_run(_run("run_alur", "job_alpha", RunStatus.QUEUED, 1)))
+    asyncio.run(queue.save_run(_run("run_alur", "job_alpha", RunStatus.RUNNING, 1)))
+    calls = []
+    asli = fake.eval
+
+    async def _eval(script, numkeys, *args):
+        calls.append(args[:numkeys])
+        return await asli(script, numkeys, *args)
+
+    fake.eval = _eval
+    asyncio.run(queue.save_run(_run("run_alur", "job_alpha", RunStatus.SUCCESS, 1)))
+
+    assert len(calls) == 1
+    assert queue._kunci_index_status_run("running") in calls[0]
+    assert "run_alur" not in fake.zsets[queue._kunci_index_status_run("running")]
+    assert fake.sets[queue._kunci_active_runs("job_alpha")] == set()
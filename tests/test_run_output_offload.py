@@ -0,0 +1,70 @@
+import asyncio
+from datetime import datetime, timezone
+
+from app.core import queue
+from app.core.blob_store import BlobStore
+from app.core.models import Run, RunResult, RunStatus
+
+
+def _run(run_id, output):
+    return Run(
+        run_id=run_id,
+        job_id="job_heavy",
+        status=RunStatus.SUCCESS,
+        scheduled_at=datetime(2026, 1, 1, tzinfo=timezone.utc),
+        result=RunResult(success=True, output=output, duration_ms=10),
+    )
+
+
+def _siapkan(monkeypatch, tmp_path):
+    queue.set_mode_fallback_redis(True)
+    monkeypatch.setattr(queue, "_blob_output_run", BlobStore(str(tmp_path)))
+    monkeypatch.setattr(queue.settings, "RUN_OUTPUT_OFFLOAD_BYTES", 1024)
+
+
+def _bersihkan(*run_ids):
+    for run_id in run_ids:
+        queue._fallback_runs.pop(run_id, None)
+        queue._fallback_run_scores.pop(run_id, None)
+    queue._fallback_run_urutan.clear()
+    queue._fallback_active_runs.clear()
+    queue.set_mode_fallback_redis(False)
+
+
+def test_large_output_is_offloaded_once_and_loaded_lazily(monkeypatch, tmp_path):
+    _siapkan(monkeypatch, tmp_path)
+    output = {"payload": "x" * 4096, "steps": [{"ok": True}]}
+
+    asyncio.run(queue.save_run(_run("run_besar_1", output)))
+    asyncio.run(queue.save_run(_run("run_besar_2", output)))
+
+    stored = queue._fallback_runs["run_besar_1"]["result"]
+    assert stored["output"] is None
+    assert stored["output_ref"].startswith("sha256:")
+    assert stored["output_bytes"] > 4096
+    assert len(list(tmp_path.rglob("*.gz"))) == 1
+
+    run = asyncio.run(queue.get_run("run_besar_1"))
+    assert run.result.output is None
+    assert asyncio.run(queue.load_run_output(run)).result.output == output
+    _bersihkan("run_besar_1", "run_besar_2")
+
+
+def test_small_output_stays_inline(monkeypatch, tmp_path):
+    _siapkan(monkeypatch, tmp_path)
+
+    asyncio.run(queue.save_run(_run("run_kecil", {"ok": True})))
+
+    assert queue._fallback_runs["run_kecil"]["result"]["output"] == {"ok": True}
+    assert queue._fallback_runs["run_kecil"]["result"]["output_ref"] is None
+    assert not list(tmp_path.rglob("*.gz"))
+    _bersihkan("run_kecil")
+
+
+def test_blob_store_rejects_malformed_refs(tmp_path):
+    store = BlobStore(str(tmp_path))
+    ref = store.put(b'{"a":1}')
+
+    assert store.get(ref) == b'{"a":1}'
+    assert store.get("sha256:../../etc/passwd") is None
+    assert store.get("md5:abc") is None
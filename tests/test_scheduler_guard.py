@@ -9,6 +9,13 @@ async def _noop(*args, **kwargs):
     return None
 
 
+def _batch_dari(fake_enqueue_job):
+    async def fake_enqueue_jobs(events, **kwargs):
+        return [await fake_enqueue_job(event) for event in events]
+
+    return fake_enqueue_jobs
+
+
 def _patch_guard_defaults(monkeypatch):
     async def _no_pending(job_id: str):
         return False
@@ -70,6 +77,7 @@ def test_scheduler_skips_interval_dispatch_when_previous_run_still_active(monkey
 
     monkeypatch.setattr(scheduler_module, "has_active_runs", fake_has_active_runs)
     monkeypatch.setattr(scheduler_module, "enqueue_job", fake_enqueue_job)
+    monkeypatch.setattr(scheduler_module, "enqueue_jobs", _batch_dari(fake_enqueue_job))
     monkeypatch.setattr(scheduler_module, "append_event", fake_append_event)
     monkeypatch.setattr(scheduler_module, "save_run", _noop)
     monkeypatch.setattr(scheduler_module, "add_run_to_job_history", _noop)
@@ -115,6 +123,7 @@ def test_scheduler_cron_dispatches_once_per_minute_slot(monkeypatch):
     monkeypatch.setattr(scheduler_module, "datetime", _FixedDatetime)
     monkeypatch.setattr(scheduler_module, "has_active_runs", fake_has_active_runs)
     monkeypatch.setattr(scheduler_module, "enqueue_job", fake_enqueue_job)
+    monkeypatch.setattr(scheduler_module, "enqueue_jobs", _batch_dari(fake_enqueue_job))
     monkeypatch.setattr(scheduler_module, "append_event", _noop)
     monkeypatch.setattr(scheduler_module, "save_run", _noop)
     monkeypatch.setattr(scheduler_module, "add_run_to_job_history", _noop)
@@ -163,6 +172,7 @@ def test_scheduler_initial_jitter_offsets_first_interval_dispatch(monkeypatch):
 
     monkeypatch.setattr(scheduler_module, "has_active_runs", fake_has_active_runs)
     monkeypatch.setattr(scheduler_module, "enqueue_job", fake_enqueue_job)
+    monkeypatch.setattr(scheduler_module, "enqueue_jobs", _batch_dari(fake_enqueue_job))
     monkeypatch.setattr(scheduler_module, "append_event", _noop)
     monkeypatch.setattr(scheduler_module, "save_run", _noop)
     monkeypatch.setattr(scheduler_module, "add_run_to_job_history", _noop)
@@ -211,6 +221,7 @@ def test_scheduler_skips_dispatch_when_pending_approval_exists(monkeypatch):
     monkeypatch.setattr(scheduler_module, "get_job_cooldown_remaining", _no_cooldown)
     monkeypatch.setattr(scheduler_module, "has_active_runs", _no_active)
     monkeypatch.setattr(scheduler_module, "enqueue_job", fake_enqueue_job)
+    monkeypatch.setattr(scheduler_module, "enqueue_jobs", _batch_dari(fake_enqueue_job))
     monkeypatch.setattr(scheduler_module, "append_event", fake_append_event)
     monkeypatch.setattr(scheduler_module, "save_run", _noop)
     monkeypatch.setattr(scheduler_module, "add_run_to_job_history", _noop)
@@ -248,6 +259,7 @@ def test_scheduler_skips_dispatch_when_job_in_cooldown(monkeypatch):
     monkeypatch.setattr(scheduler_module, "get_job_cooldown_remaining", _cooldown)
     monkeypatch.setattr(scheduler_module, "has_active_runs", _no_active)
     monkeypatch.setattr(scheduler_module, "enqueue_job", fake_enqueue_job)
+    monkeypatch.setattr(scheduler_module, "enqueue_jobs", _batch_dari(fake_enqueue_job))
     monkeypatch.setattr(scheduler_module, "append_event", fake_append_event)
     monkeypatch.setattr(scheduler_module, "save_run", _noop)
     monkeypatch.setattr(scheduler_module, "add_run_to_job_history", _noop)
@@ -280,6 +292,7 @@ def test_scheduler_skips_non_critical_during_pressure_mode(monkeypatch):
 
     monkeypatch.setattr(scheduler_module, "has_active_runs", _no_active)
     monkeypatch.setattr(scheduler_module, "enqueue_job", fake_enqueue_job)
+    monkeypatch.setattr(scheduler_module, "enqueue_jobs", _batch_dari(fake_enqueue_job))
     monkeypatch.setattr(scheduler_module, "append_event", fake_append_event)
     monkeypatch.setattr(scheduler_module, "save_run", _noop)
     monkeypatch.setattr(scheduler_module, "add_run_to_job_history", _noop)
@@ -317,6 +330,7 @@ def test_scheduler_allows_critical_job_during_pressure_mode(monkeypatch):
 
     monkeypatch.setattr(scheduler_module, "has_active_runs", _no_active)
     monkeypatch.setattr(scheduler_module, "enqueue_job", fake_enqueue_job)
+    monkeypatch.setattr(scheduler_module, "enqueue_jobs", _batch_dari(fake_enqueue_job))
     monkeypatch.setattr(scheduler_module, "append_event", _noop)
     monkeypatch.setattr(scheduler_module, "save_run", _noop)
     monkeypatch.setattr(scheduler_module, "add_run_to_job_history", _noop)
@@ -352,6 +366,7 @@ def test_scheduler_respects_dispatch_cap_per_tick(monkeypatch):
 
     monkeypatch.setattr(scheduler_module, "has_active_runs", _no_active)
     monkeypatch.setattr(scheduler_module, "enqueue_job", fake_enqueue_job)
+    monkeypatch.setattr(scheduler_module, "enqueue_jobs", _batch_dari(fake_enqueue_job))
     monkeypatch.setattr(scheduler_module, "append_event", fake_append_event)
     monkeypatch.setattr(scheduler_module, "save_run", _noop)
     monkeypatch.setattr(scheduler_module, "add_run_to_job_history", _noop)
@@ -395,6 +410,7 @@ def test_scheduler_skips_dispatch_when_flow_limit_reached(monkeypatch):
     monkeypatch.setattr(scheduler_module, "has_active_runs", _no_active)
     monkeypatch.setattr(scheduler_module, "count_active_runs_for_flow_group", _flow_cap)
     monkeypatch.setattr(scheduler_module, "enqueue_job", fake_enqueue_job)
+    monkeypatch.setattr(scheduler_module, "enqueue_jobs", _batch_dari(fake_enqueue_job))
     monkeypatch.setattr(scheduler_module, "append_event", fake_append_event)
     monkeypatch.setattr(scheduler_module, "save_run", _noop)
     monkeypatch.setattr(scheduler_module, "add_run_to_job_history", _noop)
@@ -403,3 +419,78 @@ def test_scheduler_skips_dispatch_when_flow_limit_reached(monkeypatch):
     asyncio.run(sched.process_interval_jobs())
 
     assert any(name == "scheduler.dispatch_skipped_flow_limit" for name, _ in events)
+
+
+def test_scheduler_flushes_batch_before_rechecking_same_flow_group(monkeypatch):
+    _patch_guard_defaults(monkeypatch)
+    sched = scheduler_module.Scheduler()
+    flow_inputs = {"prompt": "x", "flow_group": "tim_a", "flow_max_active_runs": 1}
+    sched.jobs = {
+        job_id: JobSpec(
+            job_id=job_id,
+            type="agent.workflow",
+            schedule=Schedule(interval_sec=1),
+            timeout_ms=30000,
+            retry_policy=RetryPolicy(max_retry=1, backoff_sec=[1]),
+            inputs=flow_inputs,
+        )
+        for job_id in ("job_flow_a", "job_flow_b")
+    }
+
+    batches = []
+
+    async def _no_active(job_id: str):
+        return False
+
+    async def _flow_active(group: str):
+        return sum(len(batch) for batch in batches)
+
+    async def fake_enqueue_jobs(events, **kwargs):
+        batches.append(list(events))
+        return ["1-0"] * len(events)
+
+    monkeypatch.setattr(scheduler_module, "has_active_runs", _no_active)
+    monkeypatch.setattr(scheduler_module, "count_active_runs_for_flow_group", _flow_active)
+    monkeypatch.setattr(scheduler_module, "enqueue_jobs", fake_enqueue_jobs)
+    monkeypatch.setattr(scheduler_module, "append_event", _noop)
+
+    asyncio.run(sched.process_interval_jobs())
+
+    assert [[event.job_id for event in batch] for batch in batches] == [["job_flow_a"]]
+
+
+def test_scheduler_enqueues_only_due_jobs_not_promoted_server_side(monkeypatch):
+    sched = scheduler_module.Scheduler()
+    sched.due_batch_limit = 7
+    enqueued = []
+    limits = []
+
+    def _row(run_id):
+        return {
+            "run_id": run_id,
+            "job_id": "job_retry",
+            "type": "agent.workflow",
+            "inputs": {},
+            "attempt": 1,
+            "scheduled_at": "2026-01-01T00:00:00+00:00",
+        }
+
+    async def fake_promote_due_jobs(limit=None):
+        limits.append(limit)
+        return [{"data": _row("run_promoted"), "message_id": "1-0"}, {"data": _row("run_legacy"), "message_id": None}]
+
+    async def fake_enqueue_job(event):
+        enqueued.append(event.run_id)
+        return "2-0"
+
+    monkeypatch.setattr(scheduler_module, "promote_due_jobs", fake_promote_due_jobs)
+    monkeypatch.setattr(scheduler_module, "enqueue_job", fake_enqueue_job)
+    monkeypatch.setattr(scheduler_module, "append_event", _noop)
+    monkeypatch.setattr(scheduler_module, "save_run", _noop)
+    monkeypatch.setattr(scheduler_module, "add_run_to_job_history", _noop)
+    monkeypatch.setattr(scheduler_module, "get_run", lambda run_id: _noop())
+
+    asyncio.run(sched.process_due_jobs())
+
+    assert limits == [7]
+    assert enqueued == ["run_legacy"]